@@ -0,0 +1,95 @@
+"""Snapshot latency and size of incremental checkpoints as a conversation grows.
+
+Every turn is checkpointed twice: as an incremental snapshot appended to a
+`CheckpointStore`, and as a full JSON re-dump of the conversation for
+comparison.
+
+Usage: python benchmarks/checkpoint.py [--turns 1000] [--fsync]
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from fastagents.checkpoint import CheckpointStore, ConversationState
+
+
+def run(directory: Path, turns: int, fsync: bool) -> List[Dict[str, float]]:
+    store = CheckpointStore(directory, fsync=fsync)
+    conversation = ConversationState(state={"system_message": "Be helpful."})
+    conversation.messages.append({"role": "system", "content": "Be helpful."})
+    full_path = directory / "full.json"
+    rows = []
+    for i in range(turns):
+        conversation.messages.append(
+            {"role": "user", "content": f"question {i}: " + "lorem ipsum " * 20}
+        )
+        conversation.messages.append(
+            {"role": "assistant", "content": f"answer {i}: " + "dolor sit amet " * 40}
+        )
+        conversation.state["turn"] = i
+
+        t0 = time.perf_counter()
+        size = store.save("conversation", conversation)
+        incremental = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        data = json.dumps(
+            {
+                "messages": conversation.messages.to_dicts(),
+                "state": conversation.state,
+                "pending_tool_calls": conversation.pending_tool_calls,
+            }
+        ).encode()
+        with open(full_path, "wb") as f:
+            f.write(data)
+        full = time.perf_counter() - t0
+
+        rows.append(
+            {
+                "turn": i + 1,
+                "incremental_bytes": size,
+                "incremental_seconds": incremental,
+                "full_bytes": len(data),
+                "full_seconds": full,
+            }
+        )
+
+    t0 = time.perf_counter()
+    store.load("conversation")
+    rows[-1]["load_seconds"] = time.perf_counter() - t0
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--fsync", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        rows = run(Path(directory), args.turns, args.fsync)
+
+    print(
+        f"{'turn':>6}{'delta bytes':>14}{'delta ms':>12}"
+        f"{'full bytes':>14}{'full ms':>12}"
+    )
+    step = max(1, args.turns // 10)
+    for row in rows[step - 1 :: step]:
+        print(
+            f"{row['turn']:>6.0f}{row['incremental_bytes']:>14.0f}"
+            f"{1000 * row['incremental_seconds']:>12.3f}"
+            f"{row['full_bytes']:>14.0f}{1000 * row['full_seconds']:>12.3f}"
+        )
+    print()
+    print(
+        f"written: {sum(r['incremental_bytes'] for r in rows) / 1e6:.2f} MB "
+        f"incremental, {sum(r['full_bytes'] for r in rows) / 1e6:.2f} MB full"
+    )
+    print(f"resume: {1000 * rows[-1]['load_seconds']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Tail latency of hedged model requests against mock servers.
+
+Two local mock servers answer after a long-tailed, lognormal latency. The
+same requests are sent to the first server alone, then through a
+`HedgedClient` sending a duplicate request to the second server once the
+p95 latency of the first one has passed. Hedging should cut the p99
+latency to a small multiple of the p50 for about 5% more requests.
+
+Usage: python benchmarks/hedging.py [--requests 2000] [--concurrency 20]
+    [--median-ms 50] [--sigma 1.0] [--quantile 0.95]
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from fastagents.bench import Latency, MockLLMServer
+from fastagents.client import ClientRegistry, ModelClient
+from fastagents.hedging import HedgedClient, HedgingPolicy
+
+PARAMS = {"model": "gpt-mock", "messages": [{"role": "user", "content": "hi"}]}
+
+
+async def _measure(client: ModelClient, requests: int, concurrency: int) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def request() -> None:
+        async with semaphore:
+            t0 = time.perf_counter()
+            await client.create(PARAMS)
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(request() for _ in range(requests)))
+    return sorted(latencies)
+
+
+def _report(name: str, latencies: List[float], sent: int) -> None:
+    def q(p: float) -> float:
+        return 1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    print(
+        f"{name:>12}{q(0.5):>9.1f}{q(0.95):>9.1f}{q(0.99):>9.1f}"
+        f"{q(0.99) / q(0.5):>9.1f}x{100 * (sent / len(latencies) - 1):>9.1f}%"
+    )
+
+
+async def _main(args: argparse.Namespace) -> None:
+    latency = Latency.lognormal(args.median_ms / 1000, args.sigma)
+    async with MockLLMServer(latency=latency, seed=1) as primary, MockLLMServer(
+        latency=latency, seed=2
+    ) as secondary:
+        registry = ClientRegistry(max_connections=args.concurrency * 2)
+        single = ModelClient(primary.url, registry=registry)
+        hedged = HedgedClient(
+            [single, ModelClient(secondary.url, registry=registry)],
+            HedgingPolicy(quantile=args.quantile, max_hedges=1),
+        )
+        # learn the latency distribution of the primary before measuring
+        await _measure(hedged, hedged.policy.min_samples * 5, args.concurrency)
+        primary.stats.requests = secondary.stats.requests = 0
+
+        print(
+            f"{'':>12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'p99/p50':>10}{'extra':>10}"
+        )
+        latencies = await _measure(single, args.requests, args.concurrency)
+        _report("single", latencies, primary.stats.requests)
+        primary.stats.requests = 0
+
+        latencies = await _measure(hedged, args.requests, args.concurrency)
+        _report("hedged", latencies, primary.stats.requests + secondary.stats.requests)
+        await registry.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--median-ms", type=float, default=50.0)
+    parser.add_argument("--sigma", type=float, default=1.0)
+    parser.add_argument("--quantile", type=float, default=0.95)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
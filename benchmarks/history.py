@@ -0,0 +1,99 @@
+"""Prompt size and compaction time of history strategies over long conversations.
+
+Usage: python benchmarks/history.py [--turns 200] [--max-tokens 4000]
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from fastagents.history import (
+    History,
+    HistoryStrategy,
+    SlidingWindow,
+    SummaryCheckpoints,
+)
+
+
+async def _summarize(messages: List[Dict[str, Any]]) -> str:
+    return " ".join(str(m.get("content", ""))[:20] for m in messages[-5:])
+
+
+def _turn(i: int) -> List[Dict[str, Any]]:
+    return [
+        {"role": "user", "content": f"question {i}: " + "lorem ipsum " * 20},
+        {"role": "assistant", "content": f"answer {i}: " + "dolor sit amet " * 40},
+    ]
+
+
+async def run(
+    strategy: Optional[HistoryStrategy], turns: int, max_tokens: int
+) -> List[Dict[str, float]]:
+    history = History([{"role": "system", "content": "You are a helpful assistant."}])
+    rows = []
+    for i in range(turns):
+        user, assistant = _turn(i)
+        history.append(user)
+        t0 = time.perf_counter()
+        if strategy is None:
+            selected = list(history.messages)
+        else:
+            selected = await strategy.select(history, max_tokens)
+        elapsed = time.perf_counter() - t0
+        rows.append(
+            {
+                "turn": i + 1,
+                "prompt_tokens": history.counter.total(selected),
+                "seconds": elapsed,
+            }
+        )
+        history.append(assistant)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--max-tokens", type=int, default=4000)
+    args = parser.parse_args()
+
+    strategies: Dict[str, Optional[HistoryStrategy]] = {
+        "full history": None,
+        "sliding window": SlidingWindow(),
+        "summary checkpoints": SummaryCheckpoints(_summarize),
+    }
+    results = {
+        name: asyncio.run(run(strategy, args.turns, args.max_tokens))
+        for name, strategy in strategies.items()
+    }
+
+    header = f"{'turn':>6}" + "".join(f"{name:>22}" for name in results)
+    print("prompt tokens per turn")
+    print(header)
+    step = max(1, args.turns // 8)
+    for i in list(range(step - 1, args.turns, step)):
+        print(
+            f"{i + 1:>6}"
+            + "".join(f"{rows[i]['prompt_tokens']:>22.0f}" for rows in results.values())
+        )
+
+    print()
+    print(f"{'':>6}" + "".join(f"{name:>22}" for name in results))
+    print(
+        f"{'total':>6}"
+        + "".join(
+            f"{sum(r['prompt_tokens'] for r in rows):>22.0f}"
+            for rows in results.values()
+        )
+    )
+    print(
+        f"{'ms':>6}"
+        + "".join(
+            f"{1000 * sum(r['seconds'] for r in rows):>22.2f}"
+            for rows in results.values()
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
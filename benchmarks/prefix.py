@@ -0,0 +1,105 @@
+"""Time spent encoding the requests of a growing conversation.
+
+Every turn of a conversation sends the system message, the tool schemas
+and the whole history to the model. Without a `PrefixCache`, all the
+messages are encoded again for every request. With one, the encoding of
+each message is memoized, so a turn only encodes its new messages and
+reuses the bytes of the prefix. Every request then starts with the same
+bytes as the one before it, which is what a provider's prefix KV cache
+needs.
+
+Usage: python benchmarks/prefix.py [--turns 200] [--tools 20]
+"""
+import argparse
+import logging
+import time
+import warnings
+from typing import Any, Dict, List
+
+from fastagents.autogen import AutogenAgent
+from fastagents.client import encode_params
+from fastagents.prefix import PrefixCache
+
+
+def _turn(i: int) -> List[Dict[str, Any]]:
+    return [
+        {"role": "user", "content": f"question {i}: " + "lorem ipsum, dolor " * 30},
+        {
+            "role": "assistant",
+            "content": f"answer {i}: " + "sit amet; consectetur " * 60,
+        },
+    ]
+
+
+def _tools(n: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": f"tool_{i}",
+                "description": "Look something up. " * 5,
+                "parameters": {
+                    "type": "object",
+                    "properties": {"query": {"type": "string"}},
+                    "required": ["query"],
+                },
+            },
+        }
+        for i in reversed(range(n))
+    ]
+
+
+def _agent(tools: int, prefix_cache: Any) -> AutogenAgent:
+    from autogen import ConversableAgent
+
+    config_list = [{"model": "gpt-mock", "api_key": "sk-bench"}]
+    llm_config: Dict[str, Any] = {"config_list": config_list, "cache_seed": None}
+    if tools:
+        llm_config["tools"] = _tools(tools)
+    return AutogenAgent(
+        ConversableAgent(
+            name="assistant",
+            system_message="You are a helpful assistant. " * 50,
+            llm_config=llm_config,
+            human_input_mode="NEVER",
+        ),
+        prefix_cache=prefix_cache,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--tools", type=int, default=20)
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+    logging.getLogger("autogen.oai.client").setLevel(logging.ERROR)
+    prefix_cache = PrefixCache()
+    agents = [_agent(args.tools, None), _agent(args.tools, prefix_cache)]
+    seconds = [0.0, 0.0]
+    stable = 0
+    previous = b""
+    messages: List[Dict[str, Any]] = []
+    print(f"{'turn':>6}{'kB':>8}{'plain ms':>11}{'prefix ms':>11}")
+    for i in range(args.turns):
+        messages += _turn(i)
+        for j, agent in enumerate(agents):
+            t0 = time.perf_counter()
+            body = encode_params(agent._build_params(messages))
+            seconds[j] += time.perf_counter() - t0
+        # the request starts with the messages of the one before
+        stable += body.startswith(previous[: previous.rindex(b"]")]) if previous else 1
+        previous = body
+        if (i + 1) % (args.turns // 5 or 1) == 0:
+            print(
+                f"{i + 1:>6}{len(body) / 1000:>8.0f}"
+                f"{1000 * seconds[0]:>11.1f}{1000 * seconds[1]:>11.1f}"
+            )
+    print(f"speedup {seconds[0] / seconds[1]:.1f}x")
+    print(f"requests extending the previous one: {stable}/{args.turns}")
+    print(f"reused bytes: {prefix_cache.stats.reuse_ratio:.1%}")
+
+
+if __name__ == "__main__":
+    main()
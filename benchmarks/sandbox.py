@@ -0,0 +1,63 @@
+"""Wall time of running many tiny code blocks, as data-analysis agents do.
+
+Runs the same code blocks with pyautogen's `LocalCommandLineCodeExecutor`,
+which starts a new Python process for every code block, and with a
+`SandboxCodeExecutor`, whose pre-warmed workers have already imported the
+`--preload` modules.
+
+Usage: python benchmarks/sandbox.py [--snippets 50] [--workers 2]
+    [--preload numpy]
+"""
+import argparse
+import tempfile
+import time
+import warnings
+from typing import Any, List
+
+from fastagents.autogen import SandboxCodeExecutor
+from fastagents.sandbox import SandboxPool
+
+
+def _snippets(n: int) -> List[str]:
+    return [
+        f"import numpy as np\nprint(np.arange({i + 10}).reshape(-1, 2).sum(axis=0))"
+        for i in range(0, 2 * n, 2)
+    ]
+
+
+def _measure(executor: Any, snippets: List[str]) -> float:
+    from autogen.coding import CodeBlock
+
+    t0 = time.perf_counter()
+    for code in snippets:
+        result = executor.execute_code_blocks([CodeBlock(code=code, language="python")])
+        assert result.exit_code == 0, result.output  # nosec: B101
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--snippets", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--preload", default="numpy")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+    from autogen.coding import LocalCommandLineCodeExecutor
+
+    snippets = _snippets(args.snippets)
+    print(f"{'executor':>12}{'total s':>10}{'per block ms':>14}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        seconds = _measure(LocalCommandLineCodeExecutor(work_dir=work_dir), snippets)
+        print(f"{'local':>12}{seconds:>10.2f}{1000 * seconds / len(snippets):>14.1f}")
+
+    preload = [m for m in args.preload.split(",") if m]
+    with SandboxPool(args.workers, preload=preload) as pool:
+        # let the workers start and import the preloaded modules
+        pool.run("pass")
+        seconds = _measure(SandboxCodeExecutor(pool), snippets)
+        print(f"{'sandbox':>12}{seconds:>10.2f}{1000 * seconds / len(snippets):>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Lookup time and memory of SemanticCache.
+
+Fills a cache with generated questions and measures the time per lookup of
+one request at a time with `get` and of a batch with `get_many`.
+
+Usage: python benchmarks/semantic_cache.py [--entries 10000] [--batch 64]
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from fastagents.cache import SemanticCache
+
+_WORDS = (
+    "what how why when who capital city river mountain population language "
+    "history weather recipe bread cake python java error install update "
+    "france germany japan brazil largest smallest oldest fastest best"
+).split()
+
+
+def _params(content: str) -> Dict[str, Any]:
+    return {"model": "gpt-4", "messages": [{"role": "user", "content": content}]}
+
+
+def _questions(n: int, rng: random.Random) -> List[str]:
+    return [" ".join(rng.choices(_WORDS, k=8)) + "?" for _ in range(n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=10_000)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--lookups", type=int, default=1024)
+    args = parser.parse_args()
+
+    rng = random.Random(0)  # nosec: B311
+    cache = SemanticCache(max_entries=args.entries)
+    questions = _questions(args.entries, rng)
+    response = {"choices": [{"message": {"role": "assistant", "content": "ok"}}]}
+    t0 = time.perf_counter()
+    for i in range(0, len(questions), args.batch):
+        chunk = questions[i : i + args.batch]
+        cache.set_many([_params(q) for q in chunk], [response] * len(chunk))
+    fill = time.perf_counter() - t0
+
+    queries = [_params(q) for q in _questions(args.lookups, rng)]
+    t0 = time.perf_counter()
+    for query in queries:
+        cache.get(query)
+    single = (time.perf_counter() - t0) / len(queries)
+
+    t0 = time.perf_counter()
+    for i in range(0, len(queries), args.batch):
+        cache.get_many(queries[i : i + args.batch])
+    batched = (time.perf_counter() - t0) / len(queries)
+
+    assert cache.index is not None  # nosec: B101
+    print(f"{'entries':>24}{len(cache):>10}")
+    print(f"{'index memory':>24}{cache.index.nbytes / 2**20:>10.1f} MiB")
+    print(f"{'insert':>24}{1e6 * fill / args.entries:>10.1f} us")
+    print(f"{'get':>24}{1e6 * single:>10.1f} us")
+    print(
+        f"{'get_many':>24}{1e6 * batched:>10.1f} us"
+        f"  ({single / batched:.1f}x, batches of {args.batch})"
+    )
+
+
+if __name__ == "__main__":
+    main()
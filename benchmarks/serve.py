@@ -0,0 +1,193 @@
+"""Sustained concurrent sessions against `fastagents serve` and a mock model.
+
+Starts a mock model answering after `--latency` seconds and an
+`AgentServer` in processes of their own. Then `--sessions` clients each
+create a session and send `--turns` messages one after the other, with all
+sessions running at once. The same load is then sent to a
+thread-per-request server that wraps the blocking pyautogen agent, as
+hand-written Flask wrappers do.
+
+Usage: python benchmarks/serve.py [--sessions 500] [--turns 5]
+    [--latency lognormal:0.2,0.4] [--stream] [--no-baseline]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+from autogen import ConversableAgent
+
+from fastagents.autogen import AutogenAgent
+from fastagents.bench import Latency, MockLLMServer
+from fastagents.client import ClientRegistry, ConnectionPool
+from fastagents.server import AgentServer
+
+
+def _llm_config(model_url: str) -> Dict[str, Any]:
+    return {
+        "config_list": [
+            {"model": "gpt-mock", "api_key": "sk-bench", "base_url": model_url}
+        ],
+        "cache_seed": None,
+    }
+
+
+def _create_agent(model_url: str) -> ConversableAgent:
+    return ConversableAgent(
+        name="assistant",
+        system_message="You are a helpful assistant.",
+        llm_config=_llm_config(model_url),
+        human_input_mode="NEVER",
+    )
+
+
+def _run_model(latency: str, urls: "multiprocessing.Queue[str]") -> None:
+    async def serve() -> None:
+        async with MockLLMServer(latency=Latency.parse(latency)) as server:
+            urls.put(server.url)
+            await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def _run_agent_server(
+    model_url: str, urls: "multiprocessing.Queue[str]", sessions: int
+) -> None:
+    async def serve() -> None:
+        # as many connections to the model as turns in flight, as the
+        # connection pool of the OpenAI client of the baseline allows
+        registry = ClientRegistry(max_connections=sessions)
+        agent = AutogenAgent(_create_agent(model_url), registry=registry)
+        async with AgentServer({"assistant": agent}) as server:
+            urls.put(server.url)
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def _run_threaded_server(
+    model_url: str, urls: "multiprocessing.Queue[str]", sessions: int
+) -> None:
+    # pyautogen warns about the cost of the mock model on every call
+    logging.getLogger("autogen.oai.client").setLevel(logging.ERROR)
+    agent = _create_agent(model_url)
+    histories: Dict[str, List[Dict[str, Any]]] = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:  # noqa: N802
+            data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/sessions":
+                session_id = os.urandom(16).hex()
+                histories[session_id] = []
+                status, body = 201, {"id": session_id}
+            else:
+                messages = histories[self.path.split("/")[2]]
+                messages.append({"role": "user", "content": data["content"]})
+                reply = agent.generate_reply(messages=messages)
+                messages.append({"role": "assistant", "content": reply})
+                status, body = 200, {"reply": reply}
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    urls.put(f"http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
+
+
+async def _load(
+    url: str, sessions: int, turns: int, stream: bool
+) -> Tuple[float, List[float], int]:
+    pool = ConnectionPool(url, max_connections=sessions)
+    latencies: List[float] = []
+    errors = 0
+
+    async def run_session(i: int) -> None:
+        nonlocal errors
+        response = await pool.request("POST", "/sessions", body=b"{}")
+        target = f"/sessions/{json.loads(await response.aread())['id']}/messages"
+        for j in range(turns):
+            body = {"content": f"message {j} of session {i}", "stream": stream}
+            t0 = time.perf_counter()
+            response = await pool.request(
+                "POST", target, body=json.dumps(body).encode()
+            )
+            payload = await response.aread()
+            latencies.append(time.perf_counter() - t0)
+            errors += response.status != 200 or b'"error"' in payload
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[run_session(i) for i in range(sessions)])
+    return time.perf_counter() - t0, latencies, errors
+
+
+def _measure(name: str, target: Any, model_url: str, args: argparse.Namespace) -> None:
+    urls: "multiprocessing.Queue[str]" = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=target, args=(model_url, urls, args.sessions)
+    )
+    process.start()
+    try:
+        url = urls.get(timeout=60)
+        seconds, latencies, errors = asyncio.run(
+            _load(url, args.sessions, args.turns, args.stream)
+        )
+    finally:
+        process.terminate()
+        process.join()
+    latencies.sort()
+    p50 = 1000 * statistics.median(latencies)
+    p99 = 1000 * latencies[int(0.99 * (len(latencies) - 1))]
+    print(
+        f"{name:>10}{seconds:>10.2f}{len(latencies) / seconds:>10.0f}"
+        f"{p50:>10.0f}{p99:>10.0f}{errors:>8}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency", default="lognormal:0.2,0.4")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--no-baseline", dest="baseline", action="store_false")
+    args = parser.parse_args()
+
+    urls: "multiprocessing.Queue[str]" = multiprocessing.Queue()
+    model = multiprocessing.Process(target=_run_model, args=(args.latency, urls))
+    model.start()
+    try:
+        model_url = urls.get(timeout=60)
+        print(
+            f"{args.sessions} sessions of {args.turns} turns, "
+            f"model latency {args.latency}"
+        )
+        print(
+            f"{'server':>10}{'total s':>10}{'turns/s':>10}{'p50 ms':>10}"
+            f"{'p99 ms':>10}{'errors':>8}"
+        )
+        _measure("fastagents", _run_agent_server, model_url, args)
+        if args.baseline:
+            _measure("threaded", _run_threaded_server, model_url, args)
+    finally:
+        model.terminate()
+        model.join()
+
+
+if __name__ == "__main__":
+    main()
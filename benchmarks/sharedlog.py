@@ -0,0 +1,83 @@
+"""Cost of handing a conversation over to another worker process.
+
+For histories of growing length, compares pickling the list of messages or
+a `MessageLog`, as `WorkerPool.submit` does, with pickling a `SharedLog`,
+which only pickles its path. Every handoff is timed from pickling in the
+sending worker to the JSON array of the messages ready to send to the
+model in the receiving one, and the memory it allocates is measured with
+`tracemalloc`, the shared memory of the log itself is not counted.
+
+Usage: python benchmarks/sharedlog.py [--messages 100,1000,10000]
+    [--repeat 20]
+"""
+import argparse
+import json
+import pickle
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastagents.messages import MessageLog
+from fastagents.sharedlog import SharedLog
+
+
+def _messages(n: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"message {i}: " + "lorem ipsum dolor sit amet " * 20,
+        }
+        for i in range(n)
+    ]
+
+
+def _handoff(obj: Any, to_request: Callable[[Any], bytes]) -> Tuple[int, bytes]:
+    data = pickle.dumps(obj)
+    return len(data), to_request(pickle.loads(data))  # nosec: B301
+
+
+def _measure(
+    obj: Any, to_request: Callable[[Any], bytes], repeat: int
+) -> Tuple[float, int, int]:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        size, _ = _handoff(obj, to_request)
+    seconds = (time.perf_counter() - t0) / repeat
+    tracemalloc.start()
+    _handoff(obj, to_request)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, size, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'messages':>9}{'':>12}{'ms':>10}{'pickled KB':>12}{'peak KB':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for n in (int(n) for n in args.messages.split(",")):
+            messages = _messages(n)
+            log = MessageLog(messages)
+            shared = SharedLog(Path(directory) / f"c{n}", writable=True)
+            shared.extend(messages)
+            cases: List[Tuple[str, Any, Callable[[Any], bytes]]] = [
+                ("dicts", messages, lambda m: json.dumps(m).encode()),
+                ("MessageLog", log, lambda m: m.json_array()),
+                ("SharedLog", shared, lambda m: m.json_array()),
+            ]
+            for name, obj, to_request in cases:
+                seconds, size, peak = _measure(obj, to_request, args.repeat)
+                print(
+                    f"{n:>9}{name:>12}{1000 * seconds:>10.3f}"
+                    f"{size / 1024:>12.1f}{peak / 1024:>10.0f}"
+                )
+            shared.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Time spent counting the tokens of a growing conversation.
+
+Before every model call an agent counts the tokens of the whole
+conversation to fit it in its budget. This compares counting every
+message again each turn with a `TokenCounter`, which only tokenizes the
+messages of the new turn, in a single batch, and looks up the counts of
+the others by the hash of their text.
+
+Without `--model`, texts are tokenized by a regular expression splitting
+words and punctuation, which costs about as much as a BPE tokenizer; with
+it, by the tiktoken encoding of the model.
+
+Usage: python benchmarks/tokens.py [--turns 200] [--model gpt-4o]
+"""
+import argparse
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from fastagents.history import message_tokens
+from fastagents.tokens import TokenCounter, Tokenizer
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def _regex_tokens(text: str) -> int:
+    return len(_WORDS.findall(text))
+
+
+def _turn(i: int) -> List[Dict[str, Any]]:
+    return [
+        {"role": "user", "content": f"question {i}: " + "lorem ipsum, dolor " * 30},
+        {
+            "role": "assistant",
+            "content": f"answer {i}: " + "sit amet; consectetur " * 60,
+        },
+    ]
+
+
+def _counter(model: Optional[str]) -> TokenCounter:
+    if model is not None:
+        return TokenCounter.from_model(model)
+    return TokenCounter(
+        _regex_tokens,
+        batch_tokenizer=lambda texts: [_regex_tokens(text) for text in texts],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--model", default=None)
+    args = parser.parse_args()
+
+    counter = _counter(args.model)
+    tokenizer: Tokenizer = counter.tokenizer
+    messages: List[Dict[str, Any]] = [{"role": "system", "content": "Be helpful."}]
+    uncached = cached = 0.0
+    print(f"{'turn':>6}{'tokens':>10}{'uncached ms':>14}{'cached ms':>12}")
+    for i in range(args.turns):
+        messages += _turn(i)
+        t0 = time.perf_counter()
+        expected = sum(message_tokens(m, tokenizer) for m in messages)
+        t1 = time.perf_counter()
+        total = counter.total(messages)
+        t2 = time.perf_counter()
+        assert total == expected  # nosec: B101
+        uncached += t1 - t0
+        cached += t2 - t1
+        if (i + 1) % max(1, args.turns // 5) == 0:
+            print(
+                f"{i + 1:>6}{total:>10}{1000 * (t1 - t0):>14.3f}"
+                f"{1000 * (t2 - t1):>12.3f}"
+            )
+    print(
+        f"{'all':>6}{'':>10}{1000 * uncached:>14.1f}{1000 * cached:>12.1f}"
+        f"  ({uncached / cached:.0f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
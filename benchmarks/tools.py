@@ -0,0 +1,88 @@
+"""Cost of tool schemas and argument validation.
+
+Compares, for an agent with many tools, building the schemas of all tools
+on every turn with getting them from the per-process cache, and parsing
+the arguments of a tool call with `json.loads` then validating the dict
+with validating the raw JSON in one pass.
+
+Usage: python benchmarks/tools.py [--tools 50] [--iterations 20000]
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from fastagents.tools import ToolSchema, get_tool_schema
+
+
+class Address(BaseModel):
+    street: str
+    city: str
+    country: str = "US"
+
+
+def _make_tool(i: int) -> Callable[..., Any]:
+    def tool(
+        name: str,
+        quantity: int,
+        tags: List[str],
+        address: Address,
+        note: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return {}
+
+    tool.__name__ = f"tool_{i}"
+    return tool
+
+
+ARGUMENTS = json.dumps(
+    {
+        "name": "widget",
+        "quantity": "3",
+        "tags": ["a", "b", "c"],
+        "address": {"street": "1 Main St", "city": "Springfield"},
+    }
+)
+
+
+def _per_call(func: Callable[[], Any], iterations: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - t0) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tools", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    tools = [_make_tool(i) for i in range(args.tools)]
+    rebuild = _per_call(
+        lambda: [ToolSchema(t).to_tool() for t in tools],
+        max(1, args.iterations // 1000),
+    )
+    cached = _per_call(
+        lambda: [get_tool_schema(t).to_tool() for t in tools], args.iterations // 10
+    )
+    print(f"schemas of {args.tools} tools per turn")
+    print(f"{'rebuilt':>24}{1e6 * rebuild:>10.1f} us")
+    print(f"{'cached':>24}{1e6 * cached:>10.1f} us")
+
+    schema = get_tool_schema(tools[0])
+    adapter = schema._adapter
+    two_pass = _per_call(
+        lambda: adapter.validate_python(json.loads(ARGUMENTS)), args.iterations
+    )
+    one_pass = _per_call(lambda: schema.validate_json(ARGUMENTS), args.iterations)
+    print()
+    print("arguments of a tool call")
+    print(f"{'json.loads + validate':>24}{1e6 * two_pass:>10.1f} us")
+    print(f"{'validate_json':>24}{1e6 * one_pass:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Overhead of tracing on the hot path of AutogenAgent.
+
+Measures the cost of an instrumented block with tracing disabled and
+enabled, and the time per turn of an agent whose reply does no work, so
+that the measured time is the overhead of fastagents itself.
+
+Usage: python benchmarks/tracing.py [--iterations 200000] [--turns 20000]
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from autogen import Agent, ConversableAgent
+
+from fastagents.autogen import AutogenAgent
+from fastagents.tracing import RingBufferExporter, Tracer, span
+
+
+def _block(iterations: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        with span("cache.lookup") as s:
+            s.set("hit", True)
+    return (time.perf_counter() - t0) / iterations
+
+
+def _bare(iterations: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    return (time.perf_counter() - t0) / iterations
+
+
+def _create_agent(tracer: Optional[Tracer]) -> AutogenAgent:
+    agent = ConversableAgent(name="echo", llm_config=False, human_input_mode="NEVER")
+
+    def reply(
+        recipient: ConversableAgent,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        config: Optional[Any] = None,
+    ) -> Tuple[bool, str]:
+        return True, "ok"
+
+    agent.register_reply([Agent, None], reply)
+    return AutogenAgent(agent, tracer=tracer)
+
+
+async def _turns(agent: AutogenAgent, turns: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(turns):
+        await agent.run("hello")
+    return (time.perf_counter() - t0) / turns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--turns", type=int, default=20_000)
+    args = parser.parse_args()
+
+    bare = _bare(args.iterations)
+    disabled = _block(args.iterations)
+    tracer = Tracer(RingBufferExporter())
+    with tracer.span("root"):
+        enabled = _block(args.iterations)
+    print("instrumented block")
+    print(f"{'empty loop':>24}{1e9 * bare:>10.0f} ns")
+    print(f"{'tracing disabled':>24}{1e9 * disabled:>10.0f} ns")
+    print(f"{'tracing enabled':>24}{1e9 * enabled:>10.0f} ns")
+
+    untraced = asyncio.run(_turns(_create_agent(None), args.turns))
+    traced = asyncio.run(_turns(_create_agent(tracer), args.turns))
+    print()
+    print("agent turn")
+    print(f"{'tracing disabled':>24}{1e6 * untraced:>10.1f} us")
+    print(
+        f"{'tracing enabled':>24}{1e6 * traced:>10.1f} us"
+        f"  (+{100 * (traced / untraced - 1):.1f}%)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Throughput of a WorkerPool against a mock model server as workers are added.
+
+Every conversation makes one model call to a local mock server answering
+after `--latency` ms, and burns `--cpu-ms` ms of CPU holding the GIL, as
+tool code and JSON handling do. With enough conversations in flight, a
+single process is CPU bound and throughput should grow with the number of
+worker processes, up to the number of cores.
+
+Usage: python benchmarks/workers.py [--tasks 2000] [--workers 1,2,4,8]
+    [--cpu-ms 5] [--latency 50]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from autogen import Agent, ConversableAgent
+
+from fastagents.autogen import AutogenAgent
+from fastagents.workers import WorkerPool
+
+_RESPONSE = {
+    "id": "chatcmpl-0",
+    "object": "chat.completion",
+    "model": "gpt-mock",
+    "choices": [
+        {
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": "lorem ipsum " * 50},
+        }
+    ],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+async def _handle(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, latency: float
+) -> None:
+    body = json.dumps(_RESPONSE).encode()
+    head = (
+        "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode()
+    try:
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in request.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            await asyncio.sleep(latency)
+            writer.write(head + body)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def _serve(sock: socket.socket, latency: float) -> None:
+    async def serve() -> None:
+        server = await asyncio.start_server(
+            lambda r, w: _handle(r, w, latency), sock=sock
+        )
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def create_agent() -> AutogenAgent:
+    """Agent factory of the workers, configured by environment variables."""
+    cpu_seconds = float(os.environ["BENCH_CPU_MS"]) / 1000
+    agent = ConversableAgent(
+        name="assistant",
+        llm_config={
+            "config_list": [
+                {
+                    "model": "gpt-mock",
+                    "api_key": "sk-bench",
+                    "base_url": os.environ["BENCH_URL"],
+                }
+            ],
+            "cache_seed": None,
+        },
+        human_input_mode="NEVER",
+    )
+
+    def burn_cpu(
+        recipient: ConversableAgent,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        config: Optional[Any] = None,
+    ) -> Tuple[bool, None]:
+        deadline = time.process_time() + cpu_seconds
+        while time.process_time() < deadline:
+            pass
+        return False, None
+
+    agent.register_reply([Agent, None], burn_cpu)
+    return AutogenAgent(agent)
+
+
+def run(workers: int, tasks: int, concurrency: int) -> float:
+    with WorkerPool(
+        "workers:create_agent", workers=workers, concurrency=concurrency
+    ) as pool:
+        # wait for the workers to start before measuring
+        pool.submit(-1, "warm up")
+        pool.get_result()
+        t0 = time.perf_counter()
+        for i in range(tasks):
+            pool.submit(i, f"question {i}")
+        for _ in range(tasks):
+            result = pool.get_result()
+            if result.error is not None:
+                raise RuntimeError(result.error)
+        elapsed = time.perf_counter() - t0
+    return tasks / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument(
+        "--workers",
+        default=",".join(
+            str(n) for n in (1, 2, 4, 8, 16, 32) if n <= (os.cpu_count() or 1)
+        ),
+    )
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--cpu-ms", type=float, default=5.0)
+    parser.add_argument("--latency", type=float, default=50.0)
+    parser.add_argument("--server-processes", type=int, default=2)
+    args = parser.parse_args()
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(1024)
+    servers = [
+        multiprocessing.Process(
+            target=_serve, args=(sock, args.latency / 1000), daemon=True
+        )
+        for _ in range(args.server_processes)
+    ]
+    for server in servers:
+        server.start()
+    os.environ["BENCH_URL"] = "http://127.0.0.1:%d" % sock.getsockname()[1]
+    os.environ["BENCH_CPU_MS"] = str(args.cpu_ms)
+
+    print(f"{'workers':>8}{'turns/s':>12}{'speedup':>10}")
+    baseline = None
+    for n in [int(n) for n in args.workers.split(",")]:
+        throughput = run(n, args.tasks, args.concurrency)
+        baseline = baseline or throughput
+        print(f"{n:>8}{throughput:>12.1f}{throughput / baseline:>10.2f}")
+
+    for server in servers:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
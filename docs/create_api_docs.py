@@ -1,52 +1,152 @@
+import ast
+import hashlib
 import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from importlib import import_module
+from importlib.util import find_spec
 from inspect import getmembers, isclass, isfunction
 from pathlib import Path
-from pkgutil import walk_packages
 from types import FunctionType, ModuleType
-from typing import Any, List, Optional, Tuple, Type, Union
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Type, Union
 
+# hashes of the modules and their pages from the last run, next to the docs
+MANIFEST_NAME = ".api_docs_manifest.json"
+MANIFEST_VERSION = 1
 
-def _get_submodules(package_name: str) -> List[str]:
-    """Get all submodules of a package.
+_TYPE_CHECKING_TESTS = ("TYPE_CHECKING", "typing.TYPE_CHECKING")
+
+
+def _get_submodules(package_name: str) -> List[Tuple[str, Path]]:
+    """Get all submodules of a package and their source files, without importing them.
+
+    Submodules are listed in the order of `pkgutil.walk_packages`, private
+    ones included, as public modules may depend on them.
 
     Args:
         package_name: The name of the package.
 
     Returns:
-        A list of submodules.
+        A list of submodule names and paths of their source files.
+    """
+    spec = find_spec(package_name)
+    if spec is None or spec.origin is None:
+        raise ModuleNotFoundError(f"No module named {package_name!r}")
+    origin = Path(spec.origin)
+
+    def _walk(name: str, directory: Path) -> Iterator[Tuple[str, Path]]:
+        for path in sorted(directory.iterdir()):
+            if path.is_dir() and (path / "__init__.py").exists():
+                yield f"{name}.{path.name}", path / "__init__.py"
+                yield from _walk(f"{name}.{path.name}", path)
+            elif path.suffix == ".py" and path.name != "__init__.py":
+                yield f"{name}.{path.stem}", path
 
-    !!! note
+    if origin.name != "__init__.py":
+        return [(package_name, origin)]
+    return [(package_name, origin)] + list(_walk(package_name, origin.parent))
 
-        The above docstring is autogenerated by docstring-gen library (https://github.com/airtai/docstring-gen)
+
+def _get_imports(
+    module_name: str, path: Path, modules: Set[str]
+) -> Tuple[Set[str], Set[str]]:
+    """Get the modules of the package imported anywhere in the source of a module.
+
+    Parent packages of imported modules are included, as importing a module
+    imports them.
+
+    Args:
+        module_name: The name of the module.
+        path: The path of the source of the module.
+        modules: The names of all modules of the package.
+
+    Returns:
+        The names of the modules imported at runtime, and of the modules only
+        imported in `if TYPE_CHECKING:` blocks.
     """
-    try:
-        # nosemgrep: python.lang.security.audit.non-literal-import.non-literal-import
-        m = import_module(package_name)
-    except ModuleNotFoundError as e:
-        raise e
-    submodules = [
-        info.name for info in walk_packages(m.__path__, prefix=f"{package_name}.")
-    ]
-    submodules = [
-        x
-        for x in submodules
-        if not any([name.startswith("_") for name in x.split(".")])
-    ]
-    return [package_name] + submodules
+    tree = ast.parse(path.read_bytes(), filename=str(path))
+    type_checking = {
+        id(node)
+        for block in ast.walk(tree)
+        if isinstance(block, ast.If) and ast.unparse(block.test) in _TYPE_CHECKING_TESTS
+        for statement in block.body
+        for node in ast.walk(statement)
+    }
+    nodes = list(ast.walk(tree))
+    runtime = [node for node in nodes if id(node) not in type_checking]
+    typing_only = [node for node in nodes if id(node) in type_checking]
+    return (
+        _resolve_imports(module_name, path, modules, runtime),
+        _resolve_imports(module_name, path, modules, typing_only),
+    )
 
 
-def _import_submodules(module_name: str) -> List[ModuleType]:
-    def _import_module(name: str) -> Optional[ModuleType]:
-        try:
-            # nosemgrep: python.lang.security.audit.non-literal-import.non-literal-import
-            return import_module(name)
-        except Exception as e:
-            return None
+def _resolve_imports(
+    module_name: str, path: Path, modules: Set[str], nodes: List[ast.AST]
+) -> Set[str]:
+    is_package = path.name == "__init__.py"
+    names: Set[str] = set()
+    for node in nodes:
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = module_name.split(".")
+                base = parts[: len(parts) - node.level + is_package]
+                prefix = ".".join(base + ([node.module] if node.module else []))
+            else:
+                prefix = node.module or ""
+            names.add(prefix)
+            names.update(f"{prefix}.{alias.name}" for alias in node.names)
+
+    imports = set()
+    for name in names:
+        parts = name.split(".")
+        for i in range(1, len(parts) + 1):
+            if ".".join(parts[:i]) in modules:
+                imports.add(".".join(parts[:i]))
+    return imports - {module_name}
+
+
+def _get_source_hashes(package_name: str) -> Dict[str, str]:
+    """Hash the sources of every module together with the modules it imports.
+
+    A module has to be documented again only if its hash changes.
+
+    Args:
+        package_name: The name of the package.
 
-    package_names = _get_submodules(module_name)
-    modules = [_import_module(n) for n in package_names]
-    return [m for m in modules if m is not None]
+    Returns:
+        A dictionary of the hashes of the public modules, in the order of
+        `_get_submodules`.
+    """
+    paths = dict(_get_submodules(package_name))
+    digests = {
+        name: hashlib.sha256(path.read_bytes()).hexdigest()
+        for name, path in paths.items()
+    }
+    imports = {
+        name: _get_imports(name, path, set(paths)) for name, path in paths.items()
+    }
+
+    hashes = {}
+    for name in paths:
+        if _is_private(name):
+            continue
+        # modules imported for type checking only are imported when the
+        # members of the module are documented, not when it is imported
+        runtime, type_checking = imports[name]
+        todo = list(runtime | type_checking)
+        dependencies = {name, *todo}
+        while todo:
+            for dependency in imports[todo.pop()][0] - dependencies:
+                dependencies.add(dependency)
+                todo.append(dependency)
+        hashes[name] = hashlib.sha256(
+            "".join(f"{d}:{digests[d]}\n" for d in sorted(dependencies)).encode()
+        ).hexdigest()
+    return hashes
 
 
 def _import_functions_and_classes(
@@ -69,21 +169,6 @@ def _is_private(name: str) -> bool:
     return any([part.startswith("_") for part in parts])
 
 
-def _import_all_members(module_name: str) -> List[str]:
-    submodules = _import_submodules(module_name)
-    members: List[Tuple[str, Union[FunctionType, Type[Any]]]] = list(
-        itertools.chain(*[_import_functions_and_classes(m) for m in submodules])
-    )
-
-    names = [
-        y if isinstance(y, str) else f"{y.__module__}.{y.__name__}" for x, y in members
-    ]
-    names = [
-        name for name in names if not _is_private(name) and name.startswith(module_name)
-    ]
-    return names
-
-
 def _merge_lists(members: List[str], submodules: List[str]) -> List[str]:
     members_copy = members[:]
     for sm in submodules:
@@ -124,131 +209,153 @@ def _get_api_summary(members: List[str]) -> str:
     return "\n".join([_get_api_summary_item(x) for x in members]) + "\n"
 
 
-def _generate_api_doc(name: str, docs_path: Path) -> Path:
-    xs = name.split(".")
-    module_name = ".".join(xs[:-1])
-    member_name = xs[-1]
-    path = docs_path / f"{('/').join(xs)}.md"
-    content = f"::: {module_name}.{member_name}\n"
-
-    path.parent.mkdir(exist_ok=True, parents=True)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
-
-    return path
-
+def _get_page_content(symbol: Union[str, FunctionType, Type[Any]]) -> str:
+    if isinstance(symbol, str):
+        class_name = symbol.split(".")[-1]
+        module_name = ".".join(symbol.split(".")[:-1])
+        # nosemgrep: python.lang.security.audit.non-literal-import.non-literal-import
+        obj = getattr(import_module(module_name), class_name)
+        if obj.__module__.startswith(module_name):
+            obj = symbol
+    else:
+        obj = symbol
 
-def _generate_api_docs(members: List[str], docs_path: Path) -> List[Path]:
-    return [_generate_api_doc(x, docs_path) for x in members if not x.endswith(".")]
+    return f"\n\n::: {obj}\n" if isinstance(obj, str) else f"\n\n::: {obj.__module__}.{obj.__qualname__}\n"
 
 
-def _get_submodule_members(module_name: str) -> List[str]:
-    """Get a list of all submodules contained within the module.
+def _get_module_pages(module_name: str) -> Optional[List[Tuple[str, str]]]:
+    """Get the API pages of the public functions and classes found in a module.
 
     Args:
-        module_name: The name of the module to retrieve submodules from
+        module_name: The name of the module.
 
     Returns:
-        A list of submodule names within the module
+        A list of names of the members and the content of their pages, or
+        `None` if the module cannot be imported.
     """
-    members = _import_all_members(module_name)
-    members_with_submodules = _add_all_submodules(members)
-    members_with_submodules_str: List[str] = [
-        x[:-1] if x.endswith(".") else x for x in members_with_submodules
-    ]
-    return members_with_submodules_str
+    package_name = module_name.split(".")[0]
+    try:
+        # nosemgrep: python.lang.security.audit.non-literal-import.non-literal-import
+        m = import_module(module_name)
+    except Exception:
+        return None
+
+    pages = []
+    for _, y in _import_functions_and_classes(m):
+        name = y if isinstance(y, str) else f"{y.__module__}.{y.__name__}"
+        if not _is_private(name) and name.startswith(package_name):
+            pages.append((name, _get_page_content(y)))
+    return pages
 
 
-def _load_submodules(
-    module_name: str, members_with_submodules: List[str]
-) -> List[Union[FunctionType, Type[Any]]]:
-    """Load the given submodules from the module.
+def _get_pages(
+    module_names: List[str], jobs: Optional[int]
+) -> Dict[str, Optional[List[Tuple[str, str]]]]:
+    """Get the API pages of modules, importing them in a pool of processes.
 
     Args:
-        module_name: The name of the module whose submodules to load
-        members_with_submodules: A list of submodule names to load
+        module_names: The names of the modules.
+        jobs: The number of processes, defaults to the number of CPUs.
 
     Returns:
-        A list of imported submodule objects.
+        A dictionary of the pages of every module.
     """
-    submodules = _import_submodules(module_name)
-    members: List[Tuple[str, Union[FunctionType, Type[Any]]]] = list(
-        itertools.chain(*[_import_functions_and_classes(m) for m in submodules])
-    )
-    names = [
-        y
-        for x, y in members
-        if (isinstance(y, str) and y in members_with_submodules)
-        or (f"{y.__module__}.{y.__name__}" in members_with_submodules)
-    ]
-    return names
-
+    jobs = min(jobs or os.cpu_count() or 1, len(module_names))
+    if jobs <= 1:
+        return {name: _get_module_pages(name) for name in module_names}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return dict(zip(module_names, executor.map(_get_module_pages, module_names)))
 
-def _update_single_api_doc(
-    symbol: Union[FunctionType, Type[Any]], docs_path: Path, module_name: str
-) -> None:
-    en_docs_path = docs_path / "docs" / "en"
 
-    if isinstance(symbol, str):
-        class_name = symbol.split(".")[-1]
-        module_name = ".".join(symbol.split(".")[:-1])
-        # nosemgrep: python.lang.security.audit.non-literal-import.non-literal-import
-        obj = getattr(import_module(module_name), class_name)
-        if obj.__module__.startswith(module_name):
-            obj = symbol
-        filename = symbol
-    else:
-        obj = symbol
-        filename = f"{symbol.__module__}.{symbol.__name__}"
-
-    content = f"\n\n::: {obj}\n" if isinstance(obj, str) else f"\n\n::: {obj.__module__}.{obj.__qualname__}\n"
-
-    target_file_path = "/".join(filename.split(".")) + ".md"
-
-    with open((en_docs_path / "api" / target_file_path), "w", encoding="utf-8") as f:
+def _write_if_changed(path: Path, content: str) -> bool:
+    if path.exists() and path.read_text(encoding="utf-8") == content:
+        return False
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with open(path, "w", encoding="utf-8") as f:
         f.write(content)
+    return True
 
 
-def _update_api_docs(
-    symbols: List[Union[FunctionType, Type[Any]]], docs_path: Path, module_name: str
-) -> None:
-    for symbol in symbols:
-        _update_single_api_doc(symbol=symbol, docs_path=docs_path, module_name=module_name)
-
-
-def _generate_api_docs_for_module(root_path: str, module_name: str) -> str:
+def _generate_api_docs_for_module(
+    root_path: str, module_name: str, jobs: Optional[int] = None, force: bool = False
+) -> str:
     """Generate API documentation for a module.
 
+    Only the modules whose source, or the source of a module they import,
+    changed since the last run are imported again, see `_get_source_hashes`.
+    Their pages are kept in a manifest next to the docs together with the
+    hashes of the modules.
+
     Args:
         root_path: The root path of the project.
         module_name: The name of the module.
+        jobs: The number of processes importing modules, defaults to the
+            number of CPUs.
+        force: Whether to import all modules, ignoring the manifest.
 
     Returns:
         A string containing the API documentation for the module.
-
-    !!! note
-
-        The above docstring is autogenerated by docstring-gen library (https://github.com/airtai/docstring-gen)
     """
-    members = _import_all_members(module_name)
-    members_with_submodules = _add_all_submodules(members)
-    api_summary = _get_api_summary(members_with_submodules)
-
-    _generate_api_docs(members_with_submodules, Path(root_path) / "docs" / "en" / "api")
-
-    members_with_submodules = _get_submodule_members(module_name)
-    symbols = _load_submodules(module_name, members_with_submodules)
-
-    _update_api_docs(symbols, Path(root_path), module_name)
-
-    return api_summary
+    api_path = Path(root_path) / "docs" / "en" / "api"
+    manifest_path = Path(root_path) / MANIFEST_NAME
+    manifest: Dict[str, Any] = {}
+    if manifest_path.exists() and not force:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("module") != module_name:
+            manifest = {}
+    cached = manifest.get("modules", {})
+
+    hashes = _get_source_hashes(module_name)
+    changed = [
+        name
+        for name, h in hashes.items()
+        if name not in cached or cached[name]["hash"] != h
+    ]
+    pages = {
+        name: [tuple(page) for page in cached[name]["pages"]]
+        for name in hashes
+        if name not in changed
+    }
+    pages.update(_get_pages(changed, jobs))
+
+    # later modules override the pages of earlier ones, as re-exports are
+    # documented at the module re-exporting them
+    contents: Dict[str, str] = {}
+    for name in hashes:
+        contents.update(pages[name] or [])
+    for name, content in contents.items():
+        _write_if_changed(api_path / f"{('/').join(name.split('.'))}.md", content)
+
+    old_names = {
+        name for module in cached.values() for name, _ in module["pages"] or []
+    }
+    for name in old_names - set(contents):
+        (api_path / f"{('/').join(name.split('.'))}.md").unlink(missing_ok=True)
+
+    # modules that could not be imported are imported again on the next run
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "module": module_name,
+        "modules": {
+            name: {
+                "hash": h if pages[name] is not None else None,
+                "pages": pages[name],
+            }
+            for name, h in hashes.items()
+        },
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+
+    return _get_api_summary(_add_all_submodules(list(contents)))
 
 
 def create_api_docs(
     root_path: str,
     module: str,
+    jobs: Optional[int] = None,
+    force: bool = False,
 ):
-    api = _generate_api_docs_for_module(root_path, module)
+    api = _generate_api_docs_for_module(root_path, module, jobs=jobs, force=force)
 
     docs_dir = Path(root_path) / "docs"
 
@@ -263,5 +370,4 @@ def create_api_docs(
         [l for l in [l.rstrip() for l in summary.split("\n")] if l != ""]
     )
 
-    with open(Path(docs_dir) / "SUMMARY.md", mode="w", encoding="utf-8") as f:
-        f.write(summary)
+    _write_if_changed(Path(docs_dir) / "SUMMARY.md", summary)
@@ -204,15 +204,19 @@ def update_contributing():
 
 
 @app.command()
-def build_api_docs():
+def build_api_docs(
+    force: bool = typer.Option(
+        False, help="Regenerate the pages of all modules, not only of changed ones"
+    ),
+):
     """Build api docs for fastagents"""
     typer.echo("Updating API docs")
-    create_api_docs(root_path=BASE_DIR, module="fastagents")
+    create_api_docs(root_path=BASE_DIR, module="fastagents", force=force)
 
 
 def _build():
     subprocess.run(["mkdocs", "build", "--site-dir", BUILD_DIR], check=True)
-    build_api_docs()
+    build_api_docs(force=False)
     update_readme()
     # update_contributing()
     update_release_notes(realease_notes_path=EN_DOCS_DIR / "release.md")
@@ -1,6 +1,8 @@
 import logging
 import re
+from functools import lru_cache
 from pathlib import Path
+from typing import Tuple
 
 import typer
 
@@ -10,9 +12,17 @@ logging.basicConfig(level=logging.INFO)
 app = typer.Typer()
 
 
-def read_lines_from_file(file_path, lines_spec):
+@lru_cache(maxsize=256)
+def _read_lines(file_path: Path, mtime_ns: int) -> Tuple[str, ...]:
+    # cached by modification time, so that files included by many directives
+    # are read once and edited files are read again
     with open(file_path, "r") as file:
-        all_lines = file.readlines()
+        return tuple(file.readlines())
+
+
+def read_lines_from_file(file_path, lines_spec):
+    file_path = Path(file_path).resolve()
+    all_lines = _read_lines(file_path, file_path.stat().st_mtime_ns)
 
     # Check if lines_spec is empty (indicating all lines should be read)
     if not lines_spec:
@@ -1,6 +1,38 @@
-from typing import List
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
 
 from .__about__ import __version__
-from .autogen import AutogenAgent
 
-__all__: List[str] = ["__version__", "AutogenAgent"]
+if TYPE_CHECKING:
+    from .agent import Agent
+    from .autogen import AutogenAgent
+    from .backends import create_agent, get_backend_registry
+
+__all__: List[str] = [
+    "__version__",
+    "Agent",
+    "AutogenAgent",
+    "create_agent",
+    "get_backend_registry",
+]
+
+# public names imported from their module on first use, so that importing
+# fastagents does not import the backends and their dependencies
+_LAZY: Dict[str, str] = {
+    "Agent": ".agent",
+    "AutogenAgent": ".autogen",
+    "create_agent": ".backends",
+    "get_backend_registry": ".backends",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY))
@@ -1,9 +1,221 @@
-from . import __version__
+import argparse
+import asyncio
+import json
+import queue
+import signal
+import sys
+import threading
+from typing import IO, TYPE_CHECKING, Dict, List, Optional
 
+from .__about__ import __version__
 
-def main() -> None:
-    print(f"version: {__version__}")
+if TYPE_CHECKING:
+    from .agent import Agent
+    from .workers import WorkResult
+
+__all__ = ["main"]
+
+
+def _write_result(output: IO[str], result: "WorkResult") -> None:
+    output.write(
+        json.dumps({"id": result.task_id, "reply": result.reply, "error": result.error})
+        + "\n"
+    )
+    output.flush()
+
+
+def _run(args: argparse.Namespace) -> int:
+    from .workers import WorkerPool, WorkResult
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    pool = WorkerPool(
+        args.agent_factory, workers=args.workers, concurrency=args.concurrency
+    )
+    failed = 0
+    try:
+        try:
+            pool.start()
+            for i, line in enumerate(input_file):
+                if stop.is_set():
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    failed += 1
+                    _write_result(
+                        output, WorkResult(i, error=f"{type(e).__name__}: {e}")
+                    )
+                    continue
+                if isinstance(item, dict) and "task" in item:
+                    pool.submit(item.get("id", i), item["task"])
+                else:
+                    pool.submit(i, item)
+                # write results as they come, so that they do not pile up
+                while pool.stats.completed < pool.stats.submitted:
+                    try:
+                        result = pool.get_result(timeout=0)
+                    except queue.Empty:
+                        break
+                    failed += result.error is not None
+                    _write_result(output, result)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # finish the conversations already submitted, also after an error
+            if pool.running:
+                for result in pool.drain():
+                    failed += result.error is not None
+                    _write_result(output, result)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+def _load_agents(specs: List[str]) -> Dict[str, "Agent"]:
+    from .workers import load_factory
+
+    agents: Dict[str, "Agent"] = {}
+    for spec in specs:
+        name, sep, factory = spec.rpartition("=")
+        agent = load_factory(factory)()
+        agents[name if sep else agent.name] = agent
+    return agents
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    from .server import AgentServer
+
+    server = AgentServer(
+        _load_agents(args.agents),
+        host=args.host,
+        port=args.port,
+        idle_timeout=args.idle_timeout,
+        max_sessions=args.max_sessions,
+        turn_timeout=args.timeout,
+    )
+    await server.start()
+    print(f"serving {', '.join(sorted(server.agents))} on {server.url}", flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await server.aclose()
+
+
+def _run_server(args: argparse.Namespace) -> int:
+    asyncio.run(_serve(args))
+    return 0
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="fastagents", description="A fast way to build AI agents."
+    )
+    parser.add_argument("--version", action="store_true", help="print the version")
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser(
+        "run",
+        help="run conversations on a pool of worker processes",
+        description=(
+            "Run the conversations read as JSON lines from INPUT on a pool of "
+            "worker processes, and write the replies as JSON lines to OUTPUT. "
+            'A line is a task as passed to Agent.run or {"id": ..., '
+            '"task": ...}. On SIGTERM or Ctrl-C, no more tasks are read and '
+            "the ones already submitted are finished before exiting."
+        ),
+    )
+    run.add_argument(
+        "agent_factory",
+        help="function creating the Agent of a worker, as module:function",
+    )
+    run.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    run.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=100,
+        help="maximum number of conversations run by a worker at once",
+    )
+    run.add_argument("-i", "--input", default="-", help="tasks file (default: stdin)")
+    run.add_argument(
+        "-o", "--output", default="-", help="results file (default: stdout)"
+    )
+    run.set_defaults(func=_run)
+
+    serve = commands.add_parser(
+        "serve",
+        help="serve agents over HTTP and WebSocket",
+        description=(
+            "Serve agents behind an asyncio HTTP and WebSocket server keeping "
+            "the conversation of every session, until SIGTERM or Ctrl-C. See "
+            "AgentServer for the endpoints."
+        ),
+    )
+    serve.add_argument(
+        "agents",
+        nargs="+",
+        metavar="agent",
+        help=(
+            "function creating an Agent, as module:function or "
+            "name=module:function, named after the agent by default"
+        ),
+    )
+    serve.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    serve.add_argument("-p", "--port", type=int, default=8000, help="port")
+    serve.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=600.0,
+        help="seconds after which an idle session is evicted",
+    )
+    serve.add_argument(
+        "--max-sessions", type=int, default=10_000, help="maximum number of sessions"
+    )
+    serve.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        default=None,
+        help="timeout of a turn in seconds (default: the one of the agent)",
+    )
+    serve.set_defaults(func=_run_server)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line interface of fastagents.
+
+    Args:
+        argv: command line arguments, defaults to `sys.argv[1:]`
+
+    Returns:
+        The exit code.
+    """
+    args = _parser().parse_args(argv)
+    if args.command is None:
+        print(f"version: {__version__}")
+        return 0
+    return args.func(args)  # type: ignore[no-any-return]
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
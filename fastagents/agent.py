@@ -0,0 +1,468 @@
+import asyncio
+import inspect
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Union,
+)
+
+from .client import ClientRegistry, ModelClient
+from .concurrency import run_bounded
+from .history import History, HistoryStrategy
+from .messages import MessageLog
+from .prefix import PrefixCache, PromptPrefix, canonical_tools
+from .sharedlog import SharedLog
+from .streaming import Delta, MessageAccumulator
+from .tokens import TokenCounter, get_token_counter
+from .tracing import NOOP_SPAN, NoopSpan, Span, Tracer, span
+
+if TYPE_CHECKING:
+    from .cache import ResponseCache, SemanticCache
+    from .hedging import HedgingPolicy
+    from .scheduler import RequestScheduler
+    from .tools import ToolExecutor
+
+__all__ = ["Agent", "Reply", "Task"]
+
+Task = Union[str, Dict[str, Any], List[Dict[str, Any]], History, MessageLog, SharedLog]
+Reply = Union[str, Dict[str, Any], None]
+
+# function called with the deltas of the turn being generated, set by `run`
+_turn_on_delta: ContextVar[Optional[Callable[[Delta], Any]]] = ContextVar(
+    "fastagents_on_delta", default=None
+)
+
+
+def _to_messages(task: Task) -> List[Dict[str, Any]]:
+    if isinstance(task, History):
+        return list(task.messages)
+    if isinstance(task, (MessageLog, SharedLog)):
+        return task.to_dicts()
+    if isinstance(task, str):
+        return [{"role": "user", "content": task}]
+    if isinstance(task, dict):
+        return [task]
+    return list(task)
+
+
+def _unroll_tool_responses(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    all_messages = []
+    for message in messages:
+        tool_responses = message.get("tool_responses", [])
+        if tool_responses:
+            all_messages += tool_responses
+            if message.get("role") != "tool":
+                all_messages.append(
+                    {k: v for k, v in message.items() if k != "tool_responses"}
+                )
+        else:
+            all_messages.append(message)
+    return all_messages
+
+
+def _extract_reply(response: Dict[str, Any]) -> Reply:
+    message: Dict[str, Any] = response["choices"][0]["message"]
+    if message.get("tool_calls") or message.get("function_call"):
+        return {k: v for k, v in message.items() if v is not None}
+    return message.get("content")  # type: ignore[no-any-return]
+
+
+class Agent(ABC):
+    """Backend-neutral runtime of an agent.
+
+    The runtime implements what is common to all platforms once: model
+    calls through a shared `ModelClient` with caching, scheduling, hedging
+    and streaming, compaction of long conversations, concurrent tool calls,
+    tracing of turns and running many conversations at once. A backend
+    adapts a platform by implementing `_generate`, which produces the reply
+    of the platform's agent to a list of messages and calls `_model_reply`
+    and `_tool_reply` of the runtime instead of the platform's own clients.
+
+    Backends are looked up by name in the `BackendRegistry`, which imports
+    them only when they are first used.
+
+    Every call to `run` is stateless: the conversation history is passed in
+    explicitly, so a single agent can drive many conversations concurrently
+    on one event loop.
+    """
+
+    backend: ClassVar[str] = ""
+
+    def __init__(
+        self,
+        *,
+        timeout: Optional[float] = None,
+        registry: Optional[ClientRegistry] = None,
+        cache: Optional["ResponseCache"] = None,
+        semantic_cache: Optional["SemanticCache"] = None,
+        on_delta: Optional[Callable[[Delta], Any]] = None,
+        scheduler: Optional["RequestScheduler"] = None,
+        history_strategy: Optional[HistoryStrategy] = None,
+        max_prompt_tokens: Optional[int] = None,
+        tools: Optional["ToolExecutor"] = None,
+        tracer: Optional[Tracer] = None,
+        hedging: Optional["HedgingPolicy"] = None,
+        token_counter: Optional[TokenCounter] = None,
+        prefix_cache: Optional[PrefixCache] = None,
+    ) -> None:
+        """Create a new agent.
+
+        Args:
+            timeout: default per-conversation timeout in seconds
+            registry: registry of connection pools, defaults to the process-wide one
+            cache: cache of model responses, responses are not cached if not given
+            semantic_cache: cache of model responses matched by similarity of
+                the last user message, looked up after `cache`
+            on_delta: function or coroutine function called with every delta
+                of streamed model replies, replies are not streamed if not given
+            scheduler: scheduler shared by agents to rate limit, coalesce and
+                batch their model requests
+            history_strategy: strategy selecting the messages of long
+                conversations sent to the model
+            max_prompt_tokens: token budget of the conversation history,
+                including the system messages of the agent
+            tools: executor running the tool calls of a model reply
+                concurrently
+            tracer: tracer recording a span for every turn, with child spans
+                for model calls, tool calls, cache lookups and request
+                serialization, turns are not traced if not given
+            hedging: policy hedging slow model requests and falling back on
+                errors across the configured endpoints of the model, only
+                the first one is used if not given
+            token_counter: counter of the tokens of the messages of
+                conversations not passed as a `History`, defaults to the
+                process-wide counter of `approximate_tokens`
+            prefix_cache: memoized encoding of the messages of requests, which
+                are sent with a byte-identical prefix so that the provider can
+                reuse its KV cache, and tools sorted by name; messages are
+                encoded for every request if not given
+        """
+        self.timeout = timeout
+        self.registry = registry
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.on_delta = on_delta
+        self.scheduler = scheduler
+        self.history_strategy = history_strategy
+        self.max_prompt_tokens = max_prompt_tokens
+        self.tools = tools
+        self.tracer = tracer
+        self.hedging = hedging
+        self.token_counter = token_counter or get_token_counter()
+        self.prefix_cache = prefix_cache
+        self.client: Optional[ModelClient] = None
+        self._model_params: Dict[str, Any] = {}
+        self._prefix: Optional[PromptPrefix] = None
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Name of the agent."""
+
+    @property
+    @abstractmethod
+    def system_messages(self) -> List[Dict[str, Any]]:
+        """Messages sent to the model before the conversation."""
+
+    @abstractmethod
+    async def _generate(self, messages: List[Dict[str, Any]]) -> Reply:
+        """Generate the reply of the agent of the platform to messages."""
+
+    @abstractmethod
+    def get_state(self) -> Dict[str, Any]:
+        """JSON-serializable state of the agent, to checkpoint it."""
+
+    @abstractmethod
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore the state of the agent from `get_state`."""
+
+    def set_tools(self, tools: Optional["ToolExecutor"]) -> None:
+        """Replace the executor running the tool calls of model replies.
+
+        Args:
+            tools: the executor, `None` to let the platform run tool calls
+        """
+        self.tools = tools
+
+    def _set_model(
+        self, config_list: List[Dict[str, Any]], params: Dict[str, Any]
+    ) -> None:
+        """Call the model with the async client of the runtime.
+
+        Args:
+            config_list: endpoints of the model, as the `config_list` of a
+                pyautogen `llm_config`; all of them are used with `hedging`,
+                only the first one otherwise
+            params: parameters sent with every request, e.g. `temperature`
+        """
+        config = config_list[0] if config_list else {}
+        if self.hedging is None:
+            self.client = ModelClient.from_config(config, registry=self.registry)
+        else:
+            from .hedging import HedgedClient
+
+            self.client = HedgedClient.from_config_list(
+                config_list or [{}], self.hedging, registry=self.registry
+            )
+        self._model_params = dict(params)
+        if "model" in config:
+            self._model_params["model"] = config["model"]
+        if self.prefix_cache is not None:
+            for key in ("tools", "functions"):
+                if self._model_params.get(key):
+                    self._model_params[key] = canonical_tools(self._model_params[key])
+
+    async def _model_reply(self, messages: List[Dict[str, Any]]) -> Reply:
+        """Reply of the model to the system messages and messages.
+
+        Args:
+            messages: the messages
+
+        Returns:
+            The content of the reply, or the message with its tool calls.
+
+        Raises:
+            RuntimeError: if the agent has no model
+        """
+        if self.client is None:
+            raise RuntimeError("The agent has no model")
+        params = self._build_params(messages)
+        on_delta = _turn_on_delta.get() or self.on_delta
+        with span("model.call", model=str(params.get("model"))) as model_span:
+            if on_delta is None:
+                response = await self._create(params)
+            else:
+                response = await self._create_streamed(params, on_delta)
+            if self.prefix_cache is not None:
+                self.prefix_cache.record(response.get("usage"))
+            if model_span.recording:
+                for k, v in (response.get("usage") or {}).items():
+                    if isinstance(v, int):
+                        model_span.set(k, v)
+        return _extract_reply(response)
+
+    async def _tool_reply(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        functions: Mapping[str, Callable[..., Any]],
+    ) -> Dict[str, Any]:
+        """Run tool calls concurrently on `tools`.
+
+        Args:
+            tool_calls: the tool calls of a model reply
+            functions: functions of the platform's agent by name, run with
+                the default settings of `tools` if not registered with it
+
+        Returns:
+            The message with the results of the tool calls.
+        """
+        assert self.tools is not None  # nosec: B101
+        tool_responses = await self.tools.execute(tool_calls, functions)
+        return {
+            "role": "tool",
+            "tool_responses": tool_responses,
+            "content": "\n\n".join(str(r["content"]) for r in tool_responses),
+        }
+
+    def _build_params(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        params = dict(self._model_params)
+        if self.prefix_cache is None:
+            params["messages"] = _unroll_tool_responses(self.system_messages + messages)
+            return params
+        system_messages = self.system_messages
+        if self._prefix is None or not self._prefix.matches(system_messages):
+            self._prefix = PromptPrefix(system_messages)
+        params["messages"] = self.prefix_cache.encode(
+            self._prefix, _unroll_tool_responses(messages)
+        )
+        return params
+
+    def _cache_get(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if self.cache is None and self.semantic_cache is None:
+            return None
+        with span("cache.lookup") as lookup_span:
+            response = None if self.cache is None else self.cache.get(params)
+            if response is None and self.semantic_cache is not None:
+                response = self.semantic_cache.get(params)
+                lookup_span.set("semantic", response is not None)
+            lookup_span.set("hit", response is not None)
+        return response
+
+    def _cache_set(self, params: Dict[str, Any], response: Dict[str, Any]) -> None:
+        if self.cache is not None:
+            self.cache.set(params, response)
+        if self.semantic_cache is not None:
+            self.semantic_cache.set(params, response)
+
+    async def _create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        assert self.client is not None  # nosec: B101
+        response = self._cache_get(params)
+        if response is None:
+            if self.scheduler is None:
+                response = await self.client.create(params)
+            else:
+                response = await self.scheduler.submit(self.client, params)
+            self._cache_set(params, response)
+        return response
+
+    async def _create_streamed(
+        self, params: Dict[str, Any], on_delta: Callable[[Delta], Any]
+    ) -> Dict[str, Any]:
+        accumulator = MessageAccumulator()
+        async for delta in self._stream(params):
+            accumulator.add(delta)
+            result = on_delta(delta)
+            if inspect.isawaitable(result):
+                await result
+        return accumulator.to_response()
+
+    async def _stream(self, params: Dict[str, Any]) -> AsyncIterator[Delta]:
+        assert self.client is not None  # nosec: B101
+        cached = self._cache_get(params)
+        if cached is not None:
+            message = cached["choices"][0]["message"]
+            yield Delta(
+                content=message.get("content"),
+                tool_calls=[
+                    {"index": i, **tool_call}
+                    for i, tool_call in enumerate(message.get("tool_calls") or [])
+                ],
+                finish_reason=cached["choices"][0].get("finish_reason"),
+            )
+            return
+
+        if self.scheduler is not None:
+            await self.scheduler.acquire(params)
+        accumulator = MessageAccumulator()
+        async for chunk in self.client.stream(params):
+            delta = Delta.from_chunk(chunk)
+            if delta is None:
+                continue
+            accumulator.add(delta)
+            yield delta
+        self._cache_set(params, accumulator.to_response())
+
+    async def stream(self, task: Task) -> AsyncIterator[Delta]:
+        """Stream the model reply to a conversation.
+
+        Only the model is called: termination checks, tool calls and code
+        execution of the agent are skipped.
+
+        Args:
+            task: a user message or a list of messages with the conversation history
+
+        Yields:
+            Deltas of the reply as they arrive.
+
+        Raises:
+            RuntimeError: if the agent has no model
+        """
+        if self.client is None:
+            raise RuntimeError("Streaming requires an agent with a model")
+        if isinstance(task, (MessageLog, SharedLog)) and self.history_strategy is None:
+            # send the encoded messages of the log without decoding them
+            params = dict(self._model_params)
+            params["messages"] = task.json_array(prefix=self.system_messages)
+        else:
+            params = self._build_params(await self._select_messages(task))
+        async for delta in self._stream(params):
+            yield delta
+
+    async def run(
+        self,
+        task: Task,
+        *,
+        timeout: Optional[float] = None,
+        on_delta: Optional[Callable[[Delta], Any]] = None,
+    ) -> Reply:
+        """Generate the reply to a conversation.
+
+        Args:
+            task: a user message or a list of messages with the conversation history
+            timeout: timeout in seconds, defaults to the one given in the constructor
+            on_delta: function or coroutine function called with every delta
+                of the model replies of this turn only, instead of the
+                `on_delta` given in the constructor
+
+        Returns:
+            The reply generated by the agent.
+
+        Raises:
+            asyncio.TimeoutError: if the reply is not generated in time
+        """
+        if timeout is None:
+            timeout = self.timeout
+        token = _turn_on_delta.set(on_delta)
+        try:
+            return await asyncio.wait_for(self._generate_reply(task), timeout)
+        finally:
+            _turn_on_delta.reset(token)
+
+    async def _generate_reply(self, task: Task) -> Reply:
+        turn_span: Union[Span, NoopSpan] = (
+            NOOP_SPAN
+            if self.tracer is None
+            else self.tracer.span("agent.turn", agent=self.name)
+        )
+        with turn_span:
+            messages = await self._select_messages(task)
+            turn_span.set("messages", len(messages))
+            reply = await self._generate(messages)
+        return reply
+
+    async def _select_messages(self, task: Task) -> List[Dict[str, Any]]:
+        if self.history_strategy is None or self.max_prompt_tokens is None:
+            return _to_messages(task)
+        history = (
+            task
+            if isinstance(task, History)
+            else History(_to_messages(task), tokenizer=self.token_counter)
+        )
+        system_tokens = history.counter.total(self.system_messages)
+        return await self.history_strategy.select(
+            history, self.max_prompt_tokens - system_tokens
+        )
+
+    async def run_many(
+        self,
+        tasks: Iterable[Task],
+        *,
+        max_concurrency: int = 100,
+        max_pending: Optional[int] = None,
+        timeout: Optional[float] = None,
+        return_exceptions: bool = False,
+    ) -> List[Union[Reply, BaseException]]:
+        """Run many conversations concurrently.
+
+        Args:
+            tasks: conversations to run, consumed lazily
+            max_concurrency: maximum number of conversations running at once
+            max_pending: maximum number of tasks taken from `tasks` ahead of time
+            timeout: per-conversation timeout in seconds, defaults to the one
+                given in the constructor
+            return_exceptions: return exceptions in place of replies instead of
+                cancelling the remaining conversations on the first failure
+
+        Returns:
+            Replies in the order of `tasks`.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        return await run_bounded(
+            self._generate_reply,
+            tasks,
+            max_concurrency=max_concurrency,
+            max_pending=max_pending,
+            timeout=timeout,
+            return_exceptions=return_exceptions,
+        )
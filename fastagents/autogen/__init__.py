@@ -1,3 +1,25 @@
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
+
 from .agent import AutogenAgent
 
-__all__ = ["AutogenAgent"]
+if TYPE_CHECKING:
+    from .executor import SandboxCodeExecutor
+
+__all__ = ["AutogenAgent", "SandboxCodeExecutor"]
+
+# the sandbox needs `resource`, which only exists on Unix, it is imported on
+# first use
+_LAZY: Dict[str, str] = {"SandboxCodeExecutor": ".executor"}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY))
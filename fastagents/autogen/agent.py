@@ -1,3 +1,279 @@
-class AutogenAgent:
-    def __init__(self) -> None:
-        pass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from ..agent import Agent, Reply, Task
+from ..tracing import span
+
+if TYPE_CHECKING:
+    from autogen import Agent as PyAutogenAgent
+    from autogen import ConversableAgent
+
+    from ..tools import ToolExecutor
+    from .executor import SandboxCodeExecutor
+
+__all__ = ["AutogenAgent", "Reply", "Task"]
+
+# keys of `llm_config` used by pyautogen itself and not sent to the model
+_NON_MODEL_KEYS = {"config_list", "cache_seed", "cache", "timeout", "max_retries"}
+
+
+class AutogenAgent(Agent):
+    """Async-native wrapper around a pyautogen `ConversableAgent`.
+
+    The `autogen` backend of the `Agent` runtime. Every call to `run` is
+    stateless: the conversation history is passed in explicitly, so a single
+    `AutogenAgent` can drive many conversations concurrently on one event
+    loop.
+
+    If the wrapped agent has an `llm_config`, its blocking OpenAI client is
+    replaced by an async `ModelClient` that takes its connections from the
+    process-wide `ClientRegistry`, so all agents share keep-alive connections.
+    Model responses are looked up in `cache` before calling the model, then
+    in `semantic_cache` to also answer reworded repeats of a prompt, and
+    model requests go through `scheduler` to coordinate them across agents.
+
+    With a `hedging` policy, every entry of the `config_list` of the wrapped
+    agent is an endpoint of a `HedgedClient`: slow model requests are sent
+    again to the next endpoint and failed ones fall back to it.
+
+    Model replies can be streamed with `stream`, or passed to the `on_delta`
+    callback as they arrive while `run` still returns the full reply.
+
+    With a `history_strategy` and `max_prompt_tokens`, long conversations are
+    compacted to fit in the token budget before every model call. Passing a
+    `History` instead of a list of messages keeps token counts and summary
+    checkpoints across turns. Messages are counted by a `TokenCounter`,
+    which caches the counts of messages already seen in earlier turns.
+
+    With a `prefix_cache`, the system message, the tool schemas and the
+    earlier turns are sent byte-identical in every request, so that the
+    provider can reuse its KV cache for them, and only the new messages of
+    a turn are encoded, see `PrefixCache`.
+
+    With `tools`, the tool calls of a model reply run concurrently on a
+    `ToolExecutor` instead of one after the other.
+
+    With a `code_executor`, code blocks in the messages are run on a pool of
+    pre-warmed worker processes without blocking the event loop, see
+    `SandboxCodeExecutor`.
+
+    With a `tracer`, every turn is recorded as a span with child spans for
+    the steps it went through, to find out where the time of a slow
+    conversation goes.
+
+    Conversations can also be passed as a compact `MessageLog`, `stream` then
+    sends its messages to the model without decoding them. Together with
+    `get_state`, a `MessageLog` can be checkpointed to a `CheckpointStore`
+    and the conversation resumed in another process. A `SharedLog` is read
+    the same way from shared memory, to hand conversations over between
+    worker processes without copying them.
+    """
+
+    backend = "autogen"
+
+    def __init__(
+        self,
+        agent: Optional["ConversableAgent"] = None,
+        *,
+        code_executor: Optional["SandboxCodeExecutor"] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Create a new agent.
+
+        Args:
+            agent: the wrapped pyautogen agent, a default one without an LLM is
+                created on first use if not given
+            code_executor: executor running the code blocks of the last
+                messages, instead of the code executor of the wrapped agent
+            kwargs: settings of the runtime, see `Agent`; functions
+                registered with the wrapped agent and not with `tools` run on
+                `tools` with its default settings
+        """
+        super().__init__(**kwargs)
+        self._agent = agent
+        self.code_executor = code_executor
+        if agent is not None:
+            self._install(agent)
+
+    def _install(self, agent: "ConversableAgent") -> None:
+        if agent.llm_config:
+            self._install_model_reply(agent)
+        if self.tools is not None:
+            self._install_tool_reply(agent)
+        if self.code_executor is not None:
+            self._install_code_reply(agent)
+
+    def _install_model_reply(self, agent: "ConversableAgent") -> None:
+        from autogen import ConversableAgent
+
+        llm_config: Dict[str, Any] = agent.llm_config
+        self._set_model(
+            llm_config.get("config_list") or [{}],
+            {k: v for k, v in llm_config.items() if k not in _NON_MODEL_KEYS},
+        )
+        agent.replace_reply_func(
+            ConversableAgent.a_generate_oai_reply, self._a_generate_model_reply
+        )
+
+    def set_tools(self, tools: Optional["ToolExecutor"]) -> None:
+        super().set_tools(tools)
+        if self._agent is None:
+            return
+        if tools is not None:
+            self._install_tool_reply(self._agent)
+        else:
+            self._uninstall_tool_reply(self._agent)
+
+    def _install_tool_reply(self, agent: "ConversableAgent") -> None:
+        from autogen import ConversableAgent
+
+        agent.replace_reply_func(
+            ConversableAgent.a_generate_tool_calls_reply, self._a_generate_tool_reply
+        )
+
+    def _uninstall_tool_reply(self, agent: "ConversableAgent") -> None:
+        from autogen import ConversableAgent
+
+        agent.replace_reply_func(
+            self._a_generate_tool_reply, ConversableAgent.a_generate_tool_calls_reply
+        )
+
+    async def _a_generate_tool_reply(
+        self,
+        recipient: "ConversableAgent",
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional["PyAutogenAgent"] = None,
+        config: Optional[Any] = None,
+    ) -> Tuple[bool, Reply]:
+        if messages is None:
+            messages = recipient.chat_messages[sender]  # type: ignore[index]
+        tool_calls = messages[-1].get("tool_calls") if messages else None
+        if not tool_calls:
+            return False, None
+        return True, await self._tool_reply(tool_calls, recipient.function_map)
+
+    def _install_code_reply(self, agent: "ConversableAgent") -> None:
+        from autogen import Agent as PyAutogenAgent
+        from autogen import ConversableAgent
+
+        reply_funcs = [f["reply_func"] for f in agent._reply_func_list]
+        for old in (
+            ConversableAgent._generate_code_execution_reply_using_executor,
+            ConversableAgent.generate_code_execution_reply,
+        ):
+            if old in reply_funcs:
+                agent.replace_reply_func(old, self._a_generate_code_reply)
+                break
+        else:
+            # right before the model reply, where pyautogen registers it
+            model_replies = (
+                ConversableAgent.generate_oai_reply,
+                ConversableAgent.a_generate_oai_reply,
+                self._a_generate_model_reply,
+            )
+            position = next(
+                (i for i, f in enumerate(reply_funcs) if f in model_replies),
+                len(reply_funcs),
+            )
+            agent.register_reply(
+                [PyAutogenAgent, None], self._a_generate_code_reply, position=position
+            )
+        if not agent._code_execution_config:
+            agent._code_execution_config = {}
+        agent._code_execution_config["executor"] = self.code_executor
+        agent._code_executor = self.code_executor
+
+    async def _a_generate_code_reply(
+        self,
+        recipient: "ConversableAgent",
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional["PyAutogenAgent"] = None,
+        config: Optional[Any] = None,
+    ) -> Tuple[bool, Reply]:
+        assert self.code_executor is not None  # nosec: B101
+        if messages is None:
+            messages = recipient.chat_messages[sender]  # type: ignore[index]
+        last_n_messages = recipient._code_execution_config.get(
+            "last_n_messages", "auto"
+        )
+        if last_n_messages == "auto":
+            # the messages since the agent last spoke
+            last_n_messages = 0
+            for message in reversed(messages):
+                if message.get("role") != "user":
+                    break
+                last_n_messages += 1
+        scanned = messages[len(messages) - min(len(messages), last_n_messages) :]
+        for message in reversed(scanned):
+            if not message.get("content"):
+                continue
+            extractor = self.code_executor.code_extractor
+            code_blocks = extractor.extract_code_blocks(message["content"])
+            if not code_blocks:
+                continue
+            with span("code.execute", blocks=len(code_blocks)) as code_span:
+                result = await self.code_executor.a_execute_code_blocks(code_blocks)
+                code_span.set("exit_code", result.exit_code)
+            status = "succeeded" if result.exit_code == 0 else "failed"
+            return (
+                True,
+                f"exitcode: {result.exit_code} (execution {status})\n"
+                f"Code output: {result.output}",
+            )
+        return False, None
+
+    async def _a_generate_model_reply(
+        self,
+        recipient: "ConversableAgent",
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional["PyAutogenAgent"] = None,
+        config: Optional[Any] = None,
+    ) -> Tuple[bool, Reply]:
+        if self.client is None:
+            return False, None
+        if messages is None:
+            messages = recipient.chat_messages[sender]  # type: ignore[index]
+        reply = await self._model_reply(messages)
+        return (False, None) if reply is None else (True, reply)
+
+    @property
+    def agent(self) -> "ConversableAgent":
+        if self._agent is None:
+            from autogen import ConversableAgent
+
+            self._agent = ConversableAgent(
+                name="fastagents", llm_config=False, human_input_mode="NEVER"
+            )
+            self._install(self._agent)
+        return self._agent
+
+    @property
+    def name(self) -> str:
+        return str(self.agent.name)
+
+    @property
+    def system_messages(self) -> List[Dict[str, Any]]:
+        return self.agent._oai_system_message  # type: ignore[no-any-return]
+
+    async def _generate(self, messages: List[Dict[str, Any]]) -> Reply:
+        reply: Reply = await self.agent.a_generate_reply(messages=messages)
+        return reply
+
+    def get_state(self) -> Dict[str, Any]:
+        """JSON-serializable state of the wrapped agent, to checkpoint it.
+
+        Returns:
+            The name and system message of the wrapped agent.
+        """
+        return {
+            "name": self.agent.name,
+            "system_message": self.agent.system_message,
+        }
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore the state of the wrapped agent from `get_state`.
+
+        Args:
+            state: the state
+        """
+        if "system_message" in state:
+            self.agent.update_system_message(state["system_message"])
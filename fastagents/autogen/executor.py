@@ -0,0 +1,141 @@
+from typing import TYPE_CHECKING, Any, Callable, List, Optional
+
+from ..sandbox import ExecutionResult, Output, SandboxPool
+
+if TYPE_CHECKING:
+    from autogen.coding import CodeBlock, CodeExtractor, CodeResult
+
+__all__ = ["SandboxCodeExecutor"]
+
+PYTHON_LANGUAGES = ("python", "py", "python3")
+SHELL_LANGUAGES = ("sh", "bash", "shell")
+
+# runs a shell code block from a worker, whose output is not a file
+_SHELL_TEMPLATE = """\
+import subprocess, sys
+process = subprocess.run({code!r}, shell=True, capture_output=True, text=True)
+sys.stdout.write(process.stdout)
+sys.stderr.write(process.stderr)
+sys.exit(process.returncode)
+"""
+
+
+class SandboxCodeExecutor:
+    """pyautogen code executor running code blocks on a `SandboxPool`.
+
+    A drop-in replacement of `LocalCommandLineCodeExecutor` that does not
+    start a new process for every code block, pass it as the `executor` of
+    the `code_execution_config` of a pyautogen agent, or as the
+    `code_executor` of an `AutogenAgent` to run code blocks without blocking
+    the event loop.
+
+    Python code blocks run in the worker itself, shell code blocks in a
+    subprocess of it. Code blocks of a message run one after the other until
+    one of them fails.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[SandboxPool] = None,
+        *,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[Output], Any]] = None,
+        code_extractor: Optional["CodeExtractor"] = None,
+    ) -> None:
+        """Create a new executor.
+
+        Args:
+            pool: pool of workers running the code blocks, defaults to a pool
+                with the default settings, started on first use
+            timeout: wall time of a code block in seconds, defaults to the
+                timeout of the pool
+            on_output: function called with the output of the code blocks
+                as it is written
+            code_extractor: extractor of the code blocks of a message, defaults
+                to the markdown code extractor of pyautogen
+        """
+        self.pool = pool or SandboxPool()
+        self.timeout = timeout
+        self.on_output = on_output
+        self._code_extractor = code_extractor
+
+    @property
+    def code_extractor(self) -> "CodeExtractor":
+        if self._code_extractor is None:
+            from autogen.coding import MarkdownCodeExtractor
+
+            self._code_extractor = MarkdownCodeExtractor()
+        return self._code_extractor
+
+    @staticmethod
+    def _to_code(code_block: "CodeBlock") -> Optional[str]:
+        language = code_block.language.lower()
+        if language in PYTHON_LANGUAGES:
+            return str(code_block.code)
+        if language in SHELL_LANGUAGES:
+            return _SHELL_TEMPLATE.format(code=code_block.code)
+        return None
+
+    @staticmethod
+    def _to_code_result(
+        results: List[ExecutionResult], error: str = ""
+    ) -> "CodeResult":
+        from autogen.coding import CodeResult
+
+        output = "".join(result.output for result in results) + error
+        if results and results[-1].timed_out:
+            output += "\nTimeout"
+        exit_code = 1 if error else results[-1].exit_code if results else 0
+        return CodeResult(exit_code=exit_code, output=output)
+
+    def execute_code_blocks(self, code_blocks: List["CodeBlock"]) -> "CodeResult":
+        """Run code blocks, blocking until they are done.
+
+        Args:
+            code_blocks: the code blocks
+
+        Returns:
+            The exit code of the last code block run and the output of all.
+        """
+        results: List[ExecutionResult] = []
+        for code_block in code_blocks:
+            code = self._to_code(code_block)
+            if code is None:
+                return self._to_code_result(
+                    results, f"unknown language {code_block.language}"
+                )
+            result = self.pool.run(code, timeout=self.timeout, on_output=self.on_output)
+            results.append(result)
+            if result.exit_code != 0:
+                break
+        return self._to_code_result(results)
+
+    async def a_execute_code_blocks(
+        self, code_blocks: List["CodeBlock"]
+    ) -> "CodeResult":
+        """Run code blocks without blocking the event loop.
+
+        Args:
+            code_blocks: the code blocks
+
+        Returns:
+            The exit code of the last code block run and the output of all.
+        """
+        results: List[ExecutionResult] = []
+        for code_block in code_blocks:
+            code = self._to_code(code_block)
+            if code is None:
+                return self._to_code_result(
+                    results, f"unknown language {code_block.language}"
+                )
+            result = await self.pool.arun(
+                code, timeout=self.timeout, on_output=self.on_output
+            )
+            results.append(result)
+            if result.exit_code != 0:
+                break
+        return self._to_code_result(results)
+
+    def restart(self) -> None:
+        """Replace the idle workers of the pool by new ones."""
+        self.pool.restart()
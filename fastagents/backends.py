@@ -0,0 +1,149 @@
+import sys
+from importlib.metadata import EntryPoint, entry_points
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Type, Union
+
+if TYPE_CHECKING:
+    from .agent import Agent
+
+__all__ = ["BackendRegistry", "create_agent", "get_backend_registry"]
+
+# entry point group of the backends of installed packages
+ENTRY_POINT_GROUP = "fastagents.backends"
+
+# backends shipped with fastagents
+BUILTIN_BACKENDS: Dict[str, str] = {"autogen": "fastagents.autogen:AutogenAgent"}
+
+
+def _entry_points(group: str) -> List[EntryPoint]:
+    if sys.version_info >= (3, 10):
+        return list(entry_points(group=group))
+    return list(entry_points().get(group, []))  # pragma: no cover
+
+
+class BackendRegistry:
+    """Registry of the platform backends of the `Agent` runtime by name.
+
+    A backend is registered as the import path of its `Agent` subclass,
+    `"module:Class"`, and only imported when it is first used, so that
+    backends which are installed but not used cost nothing. Packages
+    provide backends with an entry point in the `fastagents.backends`
+    group, entry points are read once, the first time a backend that is
+    not registered yet is looked up.
+    """
+
+    def __init__(
+        self,
+        backends: Optional[Dict[str, str]] = None,
+        *,
+        entry_point_group: Optional[str] = ENTRY_POINT_GROUP,
+    ) -> None:
+        """Create a new registry.
+
+        Args:
+            backends: import paths of the backends by name, defaults to the
+                backends shipped with fastagents
+            entry_point_group: entry point group of the backends of installed
+                packages, `None` to not look for them
+        """
+        self._paths: Dict[str, str] = dict(
+            BUILTIN_BACKENDS if backends is None else backends
+        )
+        self._classes: Dict[str, Type["Agent"]] = {}
+        self.entry_point_group = entry_point_group
+        self._scanned = entry_point_group is None
+
+    def _scan(self) -> None:
+        if not self._scanned:
+            assert self.entry_point_group is not None  # nosec: B101
+            for entry_point in _entry_points(self.entry_point_group):
+                # backends registered explicitly take precedence
+                self._paths.setdefault(entry_point.name, entry_point.value)
+            self._scanned = True
+
+    def register(self, name: str, backend: Union[str, Type["Agent"]]) -> None:
+        """Register a backend, replacing any backend of the same name.
+
+        Args:
+            name: name of the backend
+            backend: the `Agent` subclass or its import path as `"module:Class"`
+        """
+        self._classes.pop(name, None)
+        if isinstance(backend, str):
+            self._paths[name] = backend
+        else:
+            self._paths[name] = f"{backend.__module__}:{backend.__qualname__}"
+            self._classes[name] = backend
+
+    def names(self) -> List[str]:
+        """Names of the available backends, without importing them."""
+        self._scan()
+        return sorted(self._paths)
+
+    def __contains__(self, name: object) -> bool:
+        if name not in self._paths:
+            self._scan()
+        return name in self._paths
+
+    def get(self, name: str) -> Type["Agent"]:
+        """Get a backend, importing it on first use.
+
+        Args:
+            name: name of the backend
+
+        Returns:
+            The `Agent` subclass of the backend.
+
+        Raises:
+            KeyError: if there is no backend of that name
+            TypeError: if the backend is not an `Agent` subclass
+        """
+        backend = self._classes.get(name)
+        if backend is None:
+            if name not in self:
+                raise KeyError(
+                    f"Unknown backend {name!r}, available: {', '.join(self.names())}"
+                )
+            from .agent import Agent
+
+            backend = EntryPoint(name, self._paths[name], "").load()
+            if not (isinstance(backend, type) and issubclass(backend, Agent)):
+                raise TypeError(
+                    f"Backend {name!r} is not an Agent subclass: {backend!r}"
+                )
+            self._classes[name] = backend
+        return backend
+
+    def create(self, name: str, *args: Any, **kwargs: Any) -> "Agent":
+        """Create an agent of a backend.
+
+        Args:
+            name: name of the backend
+            args: positional arguments of the constructor of the backend
+            kwargs: keyword arguments of the constructor of the backend
+
+        Returns:
+            The agent.
+        """
+        return self.get(name)(*args, **kwargs)
+
+
+_registry = BackendRegistry()
+
+
+def get_backend_registry() -> BackendRegistry:
+    """Get the process-wide registry of backends."""
+    return _registry
+
+
+def create_agent(backend: str, *args: Any, **kwargs: Any) -> "Agent":
+    """Create an agent of a backend of the process-wide registry.
+
+    Args:
+        backend: name of the backend, e.g. `"autogen"`
+        args: positional arguments of the constructor of the backend
+        kwargs: keyword arguments of the constructor of the backend
+
+    Returns:
+        The agent.
+    """
+    return get_backend_registry().create(backend, *args, **kwargs)
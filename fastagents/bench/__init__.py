@@ -0,0 +1,15 @@
+from .cassette import Cassette, Recorder
+from .runner import BenchmarkResult, compare, replay_agent, run_benchmark
+from .server import Latency, MockLLMServer, ServerStats
+
+__all__ = [
+    "BenchmarkResult",
+    "Cassette",
+    "Latency",
+    "MockLLMServer",
+    "Recorder",
+    "ServerStats",
+    "compare",
+    "replay_agent",
+    "run_benchmark",
+]
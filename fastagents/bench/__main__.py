@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import sys
+from typing import List, Optional
+
+from ..workers import load_factory
+from .cassette import Cassette
+from .runner import BenchmarkResult, compare, run_benchmark
+from .server import Latency
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m fastagents.bench",
+        description=(
+            "Replay the sessions recorded in a cassette against a mock model "
+            "server and report the performance. With --baseline, the run fails "
+            "if a metric is worse than the baseline by more than --tolerance."
+        ),
+    )
+    parser.add_argument("cassette", help="cassette file written by Cassette.save")
+    parser.add_argument(
+        "--agent",
+        required=True,
+        help="function creating the Agent, as module:function",
+    )
+    parser.add_argument(
+        "--latency",
+        default="0",
+        help=(
+            "latency of the mock model in seconds, as a number or kind:params, "
+            "e.g. lognormal:0.5,0.4 (default: 0, full speed)"
+        ),
+    )
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--baseline", help="baseline result file to compare with")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store the result as --baseline"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parser().parse_args(argv)
+    result = asyncio.run(
+        run_benchmark(
+            load_factory(args.agent),
+            Cassette.load(args.cassette),
+            latency=Latency.parse(args.latency),
+            concurrency=args.concurrency,
+            repeat=args.repeat,
+            measure_memory=not args.no_memory,
+            seed=args.seed,
+        )
+    )
+    print(f"turns:                   {result.turns}")
+    print(f"turns/s:                 {result.turns_per_second:.1f}")
+    print(f"p50 turn latency:        {1000 * result.p50:.2f} ms")
+    print(f"p99 turn latency:        {1000 * result.p99:.2f} ms")
+    print(f"overhead per turn:       {1000 * result.overhead_per_turn:.3f} ms")
+    if result.memory_per_conversation is not None:
+        print(
+            f"memory per conversation: {result.memory_per_conversation / 1024:.1f} KiB"
+        )
+
+    if args.baseline is None:
+        return 0
+    if args.save_baseline:
+        result.save(args.baseline)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    regressions = compare(
+        result, BenchmarkResult.load(args.baseline), tolerance=args.tolerance
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
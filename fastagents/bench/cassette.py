@@ -0,0 +1,266 @@
+import json
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Union,
+)
+
+from ..cache import make_cache_key
+from ..client import ModelClient
+from ..history import History
+from ..messages import MessageLog
+from ..sharedlog import SharedLog
+from ..streaming import Delta, MessageAccumulator
+from ..tools import ToolExecutor
+
+if TYPE_CHECKING:
+    from ..agent import Agent, Reply, Task
+
+__all__ = ["Cassette", "Recorder"]
+
+_VERSION = 1
+
+
+def _tool_key(name: str, arguments: str) -> str:
+    try:
+        canonical = json.dumps(json.loads(arguments or "{}"), sort_keys=True)
+    except json.JSONDecodeError:
+        canonical = arguments
+    return f"{name}:{canonical}"
+
+
+def _to_json_task(task: "Task") -> Any:
+    if isinstance(task, History):
+        return list(task.messages)
+    if isinstance(task, (MessageLog, SharedLog)):
+        return task.to_dicts()
+    return task
+
+
+class Cassette:
+    """Recorded turns, model responses and tool outputs of agent sessions.
+
+    Model responses are keyed by `make_cache_key` of their request and tool
+    outputs by the tool name and arguments, so a replay gets the recorded
+    answers as long as the agent sends the same requests. Identical requests
+    recorded many times are answered in the recorded order.
+    """
+
+    def __init__(self) -> None:
+        self.turns: List[Dict[str, Any]] = []
+        self.responses: Dict[str, List[Dict[str, Any]]] = {}
+        self.tool_outputs: Dict[str, List[str]] = {}
+        self._positions: Dict[str, int] = {}
+
+    def add_turn(self, session: str, task: "Task") -> None:
+        """Record the task of a turn.
+
+        Args:
+            session: id of the session, turns of a session are replayed in order
+            task: the task passed to `Agent.run`
+        """
+        self.turns.append({"session": session, "task": _to_json_task(task)})
+
+    def add_response(self, params: Dict[str, Any], response: Dict[str, Any]) -> None:
+        """Record a model response.
+
+        Args:
+            params: parameters of the request
+            response: the response
+        """
+        self.responses.setdefault(make_cache_key(params), []).append(response)
+
+    def add_tool_output(self, name: str, arguments: str, content: str) -> None:
+        """Record the output of a tool call.
+
+        Args:
+            name: name of the tool
+            arguments: JSON arguments of the call
+            content: the output sent back to the model
+        """
+        self.tool_outputs.setdefault(_tool_key(name, arguments), []).append(content)
+
+    def _next(self, key: str, recorded: Optional[List[Any]]) -> Any:
+        if not recorded:
+            return None
+        position = self._positions.get(key, 0)
+        self._positions[key] = position + 1
+        return recorded[position % len(recorded)]
+
+    def response(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The recorded response to a request, `None` if it was not recorded."""
+        key = make_cache_key(params)
+        return self._next(key, self.responses.get(key))  # type: ignore[no-any-return]
+
+    def tool_output(self, name: str, arguments: str) -> Optional[str]:
+        """The recorded output of a tool call, `None` if it was not recorded."""
+        key = _tool_key(name, arguments)
+        return self._next("tool:" + key, self.tool_outputs.get(key))  # type: ignore[no-any-return]
+
+    def rewind(self) -> None:
+        """Start answering identical requests from the first recording again."""
+        self._positions.clear()
+
+    def sessions(self) -> List[List[Any]]:
+        """Tasks of the recorded turns, grouped by session in recording order."""
+        sessions: Dict[str, List[Any]] = {}
+        for turn in self.turns:
+            sessions.setdefault(turn["session"], []).append(turn["task"])
+        return list(sessions.values())
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the cassette as JSON lines.
+
+        Args:
+            path: the file
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "cassette", "version": _VERSION}) + "\n")
+            for turn in self.turns:
+                f.write(json.dumps({"type": "turn", **turn}) + "\n")
+            for key, responses in self.responses.items():
+                for response in responses:
+                    record = {"type": "response", "key": key, "response": response}
+                    f.write(json.dumps(record) + "\n")
+            for key, outputs in self.tool_outputs.items():
+                for content in outputs:
+                    record = {"type": "tool", "key": key, "content": content}
+                    f.write(json.dumps(record) + "\n")
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Cassette":
+        """Read a cassette written by `save`.
+
+        Args:
+            path: the file
+
+        Returns:
+            The cassette.
+
+        Raises:
+            ValueError: if the file is not a cassette
+        """
+        cassette = cls()
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("type") != "cassette" or header.get("version") != _VERSION:
+                raise ValueError(f"Not a cassette: {path}")
+            for line in f:
+                record = json.loads(line)
+                if record["type"] == "turn":
+                    cassette.turns.append(
+                        {"session": record["session"], "task": record["task"]}
+                    )
+                elif record["type"] == "response":
+                    cassette.responses.setdefault(record["key"], []).append(
+                        record["response"]
+                    )
+                elif record["type"] == "tool":
+                    cassette.tool_outputs.setdefault(record["key"], []).append(
+                        record["content"]
+                    )
+        return cassette
+
+
+class _RecordingClient(ModelClient):
+    def __init__(self, client: ModelClient, cassette: Cassette) -> None:
+        super().__init__(client.base_url, registry=client._registry)
+        self._client = client
+        self._cassette = cassette
+
+    async def create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self._client.create(params)
+        self._cassette.add_response(params, response)
+        return response
+
+    async def stream(self, params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        accumulator = MessageAccumulator()
+        async for chunk in self._client.stream(params):
+            delta = Delta.from_chunk(chunk)
+            if delta is not None:
+                accumulator.add(delta)
+            yield chunk
+        self._cassette.add_response(params, accumulator.to_response())
+
+
+class _RecordingToolExecutor(ToolExecutor):
+    def __init__(self, executor: ToolExecutor, cassette: Cassette) -> None:
+        super().__init__(max_concurrency=executor.max_concurrency)
+        self._executor = executor
+        self._cassette = cassette
+
+    async def call(
+        self,
+        tool_call: Dict[str, Any],
+        functions: Optional[Mapping[str, Callable[..., Any]]] = None,
+    ) -> Dict[str, Any]:
+        message = await self._executor.call(tool_call, functions)
+        function = tool_call.get("function") or {}
+        self._cassette.add_tool_output(
+            function.get("name", ""), function.get("arguments", ""), message["content"]
+        )
+        return message
+
+
+class Recorder:
+    """Records the sessions of an `Agent` to a `Cassette`.
+
+    While recording, the model client and the tool executor of the agent are
+    wrapped to record every model response and tool output. An agent without
+    a tool executor gets one for the recording, so that the outputs of the
+    functions registered with the platform are recorded too.
+    """
+
+    def __init__(self, agent: "Agent", cassette: Optional[Cassette] = None) -> None:
+        """Start recording.
+
+        Args:
+            agent: the agent, it must have a model client
+            cassette: where to record, defaults to a new cassette
+        """
+        if agent.client is None:
+            raise ValueError("The agent has no model client to record")
+        self.agent = agent
+        self.cassette = Cassette() if cassette is None else cassette
+        self._client = agent.client
+        self._tools = agent.tools
+        self._own_tools: Optional[ToolExecutor] = None
+        tools = agent.tools
+        if tools is None:
+            tools = self._own_tools = ToolExecutor()
+        agent.client = _RecordingClient(agent.client, self.cassette)
+        agent.set_tools(_RecordingToolExecutor(tools, self.cassette))
+
+    async def run(self, task: "Task", *, session: str = "0") -> "Reply":
+        """Run and record a turn.
+
+        Args:
+            task: the task, as passed to `Agent.run`
+            session: id of the session of the turn
+
+        Returns:
+            The reply of the agent.
+        """
+        self.cassette.add_turn(session, task)
+        return await self.agent.run(task)
+
+    def close(self) -> None:
+        """Stop recording and restore the agent."""
+        self.agent.client = self._client
+        self.agent.set_tools(self._tools)
+        if self._own_tools is not None:
+            self._own_tools.close()
+            self._own_tools = None
+
+    def __enter__(self) -> "Recorder":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
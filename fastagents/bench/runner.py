@@ -0,0 +1,241 @@
+import json
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Union,
+)
+
+from ..client import ClientRegistry, ModelClient
+from ..concurrency import run_bounded
+from ..tools import ToolExecutor
+from .cassette import Cassette
+from .server import Latency, MockLLMServer
+
+if TYPE_CHECKING:
+    from ..agent import Agent
+
+__all__ = ["BenchmarkResult", "compare", "replay_agent", "run_benchmark"]
+
+
+@dataclass
+class BenchmarkResult:
+    """Performance of an agent replaying a cassette.
+
+    Attributes:
+        turns: number of turns run
+        seconds: wall time of all turns
+        turns_per_second: throughput
+        p50: median turn latency in seconds
+        p99: 99th percentile of the turn latency in seconds
+        overhead_per_turn: mean turn latency minus the mean model latency
+            injected by the mock server, i.e. the time spent in fastagents,
+            pyautogen and the local mock server itself
+        memory_per_conversation: peak memory allocated per concurrently
+            running conversation in bytes, `None` if not measured
+    """
+
+    turns: int
+    seconds: float
+    turns_per_second: float
+    p50: float
+    p99: float
+    overhead_per_turn: float
+    memory_per_conversation: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "BenchmarkResult":
+        return cls(**{k: data[k] for k in cls.__dataclass_fields__ if k in data})
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Store the result, e.g. as a baseline for `compare`."""
+        Path(path).write_text(json.dumps(self.to_dict(), indent=2) + "\n")
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "BenchmarkResult":
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+
+# metrics compared with a baseline, and whether higher is better
+_METRICS = {
+    "turns_per_second": True,
+    "p50": False,
+    "p99": False,
+    "overhead_per_turn": False,
+    "memory_per_conversation": False,
+}
+
+
+def compare(
+    result: BenchmarkResult, baseline: BenchmarkResult, *, tolerance: float = 0.1
+) -> List[str]:
+    """Find the metrics of a result worse than a baseline.
+
+    Args:
+        result: the result
+        baseline: the baseline
+        tolerance: relative difference allowed, e.g. 0.1 for 10%
+
+    Returns:
+        A description of every regression, empty if there is none.
+    """
+    regressions = []
+    for name, higher_is_better in _METRICS.items():
+        value, reference = getattr(result, name), getattr(baseline, name)
+        if value is None or reference is None or reference == 0:
+            continue
+        change = value / reference - 1
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(
+                f"{name}: {value:.6g} vs {reference:.6g} baseline ({change:+.1%})"
+            )
+    return regressions
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _ReplayToolExecutor(ToolExecutor):
+    def __init__(self, cassette: Cassette) -> None:
+        super().__init__()
+        self._cassette = cassette
+
+    async def call(
+        self,
+        tool_call: Dict[str, Any],
+        functions: Optional[Mapping[str, Callable[..., Any]]] = None,
+    ) -> Dict[str, Any]:
+        function = tool_call.get("function") or {}
+        name = function.get("name", "")
+        content = self._cassette.tool_output(name, function.get("arguments", ""))
+        message = {
+            "role": "tool",
+            "content": (
+                f"Error: Function {name} not found." if content is None else content
+            ),
+        }
+        if tool_call.get("id") is not None:
+            message["tool_call_id"] = tool_call["id"]
+        return message
+
+
+def replay_agent(
+    agent: "Agent",
+    cassette: Cassette,
+    url: str,
+    *,
+    registry: Optional[ClientRegistry] = None,
+) -> None:
+    """Make an agent get its model responses and tool outputs from a replay.
+
+    Args:
+        agent: the agent, it must have been created with an `llm_config`
+        cassette: cassette with the recorded tool outputs
+        url: base URL of the `MockLLMServer` replaying the model responses
+        registry: registry of connection pools of the new model client
+    """
+    if agent.client is None:
+        raise ValueError("The agent has no model client to replay")
+    agent.client = ModelClient(url, "replay", registry=registry)
+    agent.set_tools(_ReplayToolExecutor(cassette))
+
+
+async def _replay(
+    agent: "Agent", sessions: List[List[Any]], concurrency: int
+) -> List[float]:
+    latencies: List[float] = []
+
+    async def run_session(tasks: List[Any]) -> None:
+        for task in tasks:
+            t0 = time.perf_counter()
+            await agent.run(task)
+            latencies.append(time.perf_counter() - t0)
+
+    await run_bounded(run_session, sessions, max_concurrency=concurrency)
+    return latencies
+
+
+async def run_benchmark(
+    agent_factory: Callable[[], "Agent"],
+    cassette: Cassette,
+    *,
+    latency: Optional[Latency] = None,
+    concurrency: int = 100,
+    repeat: int = 1,
+    measure_memory: bool = True,
+    seed: int = 0,
+) -> BenchmarkResult:
+    """Replay the sessions of a cassette and measure the performance.
+
+    Sessions run concurrently, the turns of a session one after the other.
+    Memory is measured in a separate replay of the sessions, so that
+    tracing allocations does not slow down the timed one.
+
+    Args:
+        agent_factory: function creating the agent, with the same
+            configuration as the one recorded
+        cassette: the cassette
+        latency: latency of the mock model, replays at full speed if not given
+        concurrency: maximum number of sessions running at once
+        repeat: number of times every session is replayed
+        measure_memory: measure the memory per conversation
+        seed: seed of the latency random number generator
+
+    Returns:
+        The measurements.
+    """
+    sessions = cassette.sessions()
+    registry = ClientRegistry()
+    try:
+        async with MockLLMServer(cassette, latency, seed=seed) as server:
+            agent = agent_factory()
+            replay_agent(agent, cassette, server.url, registry=registry)
+
+            # warm up connections and caches with a single session
+            await _replay(agent, sessions[:1], 1)
+            cassette.rewind()
+            server.stats.total_latency = 0.0
+
+            t0 = time.perf_counter()
+            latencies = await _replay(agent, sessions * repeat, concurrency)
+            seconds = time.perf_counter() - t0
+            model_latency = server.stats.total_latency
+
+            memory = None
+            if measure_memory:
+                cassette.rewind()
+                tracemalloc.start()
+                try:
+                    await _replay(agent, sessions, concurrency)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                memory = peak / max(1, min(concurrency, len(sessions)))
+    finally:
+        await registry.aclose()
+
+    turns = len(latencies)
+    return BenchmarkResult(
+        turns=turns,
+        seconds=seconds,
+        turns_per_second=turns / seconds if seconds else 0.0,
+        p50=_percentile(latencies, 0.5),
+        p99=_percentile(latencies, 0.99),
+        overhead_per_turn=(sum(latencies) - model_latency) / turns if turns else 0.0,
+        memory_per_conversation=memory,
+    )
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .cassette import Cassette
+
+__all__ = ["Latency", "MockLLMServer", "ServerStats"]
+
+
+@dataclass(frozen=True)
+class Latency:
+    """Distribution of the response time of a mock model, in seconds.
+
+    Attributes:
+        kind: `"constant"`, `"uniform"`, `"lognormal"` or `"empirical"`
+        params: parameters of the distribution, see the constructors
+    """
+
+    kind: str = "constant"
+    params: Tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def constant(cls, seconds: float) -> "Latency":
+        return cls("constant", (seconds,))
+
+    @classmethod
+    def uniform(cls, low: float, high: float) -> "Latency":
+        return cls("uniform", (low, high))
+
+    @classmethod
+    def lognormal(cls, median: float, sigma: float) -> "Latency":
+        """Long-tailed latency, typical of model APIs.
+
+        Args:
+            median: median latency in seconds
+            sigma: standard deviation of the log of the latency
+        """
+        return cls("lognormal", (median, sigma))
+
+    @classmethod
+    def empirical(cls, samples: Sequence[float]) -> "Latency":
+        """Latency drawn from measured samples."""
+        if not samples:
+            raise ValueError("No samples")
+        return cls("empirical", tuple(samples))
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        """Parse a latency given as `kind:param,...`, e.g. `lognormal:0.5,0.4`.
+
+        Args:
+            spec: the latency, a bare number is a constant
+
+        Returns:
+            The latency.
+
+        Raises:
+            ValueError: if `spec` is not a valid latency
+        """
+        kind, _, params = spec.partition(":")
+        if not params:
+            return cls.constant(float(kind))
+        values = tuple(float(p) for p in params.split(","))
+        expected = {"constant": 1, "uniform": 2, "lognormal": 2}
+        if kind == "empirical" and values:
+            return cls.empirical(values)
+        if expected.get(kind) != len(values):
+            raise ValueError(f"Invalid latency: {spec!r}")
+        return cls(kind, values)
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw a latency in seconds.
+
+        Args:
+            rng: the random number generator
+        """
+        if self.kind == "constant":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return median * rng.lognormvariate(0.0, sigma)
+        return rng.choice(self.params)
+
+
+@dataclass
+class ServerStats:
+    """Counters of a `MockLLMServer`.
+
+    Attributes:
+        requests: requests received
+        misses: requests not found in the cassette
+        total_latency: seconds of latency injected into all responses
+    """
+
+    requests: int = 0
+    misses: int = 0
+    total_latency: float = 0.0
+
+
+def _echo(params: Dict[str, Any]) -> Dict[str, Any]:
+    messages = params.get("messages") or []
+    content = f"echo: {messages[-1].get('content')}" if messages else ""
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "model": params.get("model", "mock"),
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def _to_events(response: Dict[str, Any]) -> bytes:
+    choice = response["choices"][0]
+    message = choice["message"]
+    delta: Dict[str, Any] = {"role": "assistant", "content": message.get("content")}
+    if message.get("tool_calls"):
+        delta["tool_calls"] = [
+            {"index": i, **tool_call}
+            for i, tool_call in enumerate(message["tool_calls"])
+        ]
+    chunk = {
+        "object": "chat.completion.chunk",
+        "choices": [
+            {"index": 0, "delta": delta, "finish_reason": choice.get("finish_reason")}
+        ],
+    }
+    return f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode()
+
+
+class MockLLMServer:
+    """Local OpenAI-compatible chat completion server for benchmarks.
+
+    Requests are answered from a cassette, or with an echo of the last
+    message if no cassette is given, after a latency drawn from `latency`.
+    Requests missing from the cassette get a 404. Streamed requests get the
+    whole response as a single event.
+
+    Use as an async context manager, the server listens on `url` inside it.
+    """
+
+    def __init__(
+        self,
+        cassette: Optional[Cassette] = None,
+        latency: Optional[Latency] = None,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+    ) -> None:
+        """Create a new server.
+
+        Args:
+            cassette: recorded responses, echo replies if not given
+            latency: distribution of the response time, no latency if not given
+            host: address to listen on
+            port: port to listen on, 0 for a free port
+            seed: seed of the latency random number generator
+        """
+        self.cassette = cassette
+        self.latency = Latency() if latency is None else latency
+        self.host = host
+        self.port = port
+        self.stats = ServerStats()
+        self._rng = random.Random(seed)  # nosec: B311
+        self._server: Optional[asyncio.Server] = None
+        self._writers: List[asyncio.StreamWriter] = []
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    @property
+    def url(self) -> str:
+        """Base URL of the API."""
+        if self._server is None:
+            raise RuntimeError("MockLLMServer is not running")
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+
+    async def aclose(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            # requests cancelled by the client may still be waiting
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "MockLLMServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    def _respond(self, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if self.cassette is None:
+            return 200, _echo(params)
+        response = self.cassette.response(params)
+        if response is None:
+            self.stats.misses += 1
+            return 404, {"error": {"message": "Request not found in the cassette"}}
+        return 200, response
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._writers.append(writer)
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks.add(task)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n")[1:]:
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                params = json.loads(await reader.readexactly(length) or b"{}")
+
+                self.stats.requests += 1
+                delay = self.latency.sample(self._rng)
+                self.stats.total_latency += delay
+                status, response = self._respond(params)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                if status == 200 and params.get("stream"):
+                    body, content_type = _to_events(response), "text/event-stream"
+                else:
+                    body, content_type = (
+                        json.dumps(response).encode(),
+                        "application/json",
+                    )
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                        f"Content-Type: {content_type}\r\n"
+                        f"Content-Length: {len(body)}\r\n\r\n"
+                    ).encode()
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # closing the server, end the connection quietly
+            pass
+        finally:
+            self._writers.remove(writer)
+            self._tasks.discard(task)  # type: ignore[arg-type]
+            writer.close()
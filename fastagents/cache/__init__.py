@@ -0,0 +1,57 @@
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from .base import CacheBackend, CacheStats
+from .memory import MemoryCache
+from .response import ResponseCache, make_cache_key, normalize_params
+from .sqlite import SQLiteCache
+from .tiered import TieredCache
+
+if TYPE_CHECKING:
+    from .semantic import (
+        Embedder,
+        FlatIndex,
+        HashingEmbedder,
+        SemanticCache,
+        VectorIndex,
+    )
+
+__all__ = [
+    "CacheBackend",
+    "CacheStats",
+    "Embedder",
+    "FlatIndex",
+    "HashingEmbedder",
+    "MemoryCache",
+    "ResponseCache",
+    "SQLiteCache",
+    "SemanticCache",
+    "TieredCache",
+    "VectorIndex",
+    "make_cache_key",
+    "normalize_params",
+]
+
+# the semantic cache needs numpy, it is imported on first use
+_LAZY: Dict[str, str] = {
+    name: ".semantic"
+    for name in (
+        "Embedder",
+        "FlatIndex",
+        "HashingEmbedder",
+        "SemanticCache",
+        "VectorIndex",
+    )
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY))
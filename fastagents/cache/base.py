@@ -0,0 +1,105 @@
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+__all__ = ["CacheBackend", "CacheStats"]
+
+
+@dataclass
+class CacheStats:
+    """Counters of a cache backend."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CacheBackend(ABC):
+    """Key-value store for cached responses.
+
+    Subclasses implement `_get`, `_set`, `delete`, `clear` and `__len__`,
+    hit and miss counting is done here. `_get` returns the value with its
+    remaining time to live.
+    """
+
+    def __init__(self, *, ttl: Optional[float] = None) -> None:
+        """Create a new backend.
+
+        Args:
+            ttl: default time to live of entries in seconds, `None` for no expiry
+        """
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Get a value.
+
+        Args:
+            key: the key
+
+        Returns:
+            The value or `None` if the key is missing or expired.
+        """
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        """Get a value and the seconds left before it expires.
+
+        Args:
+            key: the key
+
+        Returns:
+            The value and its remaining time to live, `None` if it does not
+            expire, or `None` if the key is missing or expired.
+        """
+        entry = self._get(key)
+        with self._stats_lock:
+            if entry is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        return entry
+
+    def set(self, key: str, value: bytes, *, ttl: Optional[float] = None) -> None:
+        """Set a value, evicting the least recently used entries if needed.
+
+        Args:
+            key: the key
+            value: the value
+            ttl: time to live in seconds, defaults to the one of the backend
+        """
+        self._set(key, value, self.ttl if ttl is None else ttl)
+
+    def _count_evictions(self, n: int) -> None:
+        with self._stats_lock:
+            self.stats.evictions += n
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        ...
+
+    @abstractmethod
+    def _set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Delete a value if present."""
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Delete all values."""
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .base import CacheBackend
+
+__all__ = ["MemoryCache"]
+
+
+class MemoryCache(CacheBackend):
+    """In-memory LRU cache bounded by number of entries and total size."""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """Create a new cache.
+
+        Args:
+            max_entries: maximum number of entries
+            max_bytes: maximum total size of values, `None` for no limit
+            ttl: default time to live of entries in seconds, `None` for no expiry
+        """
+        super().__init__(ttl=ttl)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Total size of the cached values in bytes."""
+        return self._size
+
+    def _get(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= now:
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return value, None if expires is None else expires - now
+
+    def _set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (value, expires)
+            self._size += len(value)
+            evicted = 0
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._size > self.max_bytes
+            ):
+                self._pop(next(iter(self._data)))
+                evicted += 1
+        if evicted:
+            self._count_evictions(evicted)
+
+    def _pop(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,122 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from .base import CacheBackend, CacheStats
+from .memory import MemoryCache
+
+__all__ = ["ResponseCache", "make_cache_key", "normalize_params"]
+
+# message fields that affect the model output
+_MESSAGE_KEYS = (
+    "role",
+    "content",
+    "name",
+    "tool_calls",
+    "tool_call_id",
+    "function_call",
+)
+
+# request parameters that don't affect the model output
+_TRANSPORT_KEYS = {"stream", "timeout", "user"}
+
+
+def _normalize_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: message[k] for k in _MESSAGE_KEYS if message.get(k) is not None}
+
+
+def _tool_name(tool: Dict[str, Any]) -> str:
+    return str(tool.get("function", tool).get("name", ""))
+
+
+def normalize_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Canonical form of the parameters of a chat completion request.
+
+    All parameters are kept except those only affecting how the request is
+    sent, `stream`, `timeout` and `user`, and those set to `None`. Message
+    fields that don't affect the model output are dropped and tools are
+    sorted by name.
+
+    Args:
+        params: the request parameters
+
+    Returns:
+        The normalized parameters.
+    """
+    normalized = {
+        k: v for k, v in params.items() if k not in _TRANSPORT_KEYS and v is not None
+    }
+    messages: List[Dict[str, Any]] = params.get("messages") or []
+    if isinstance(messages, bytes):
+        messages = json.loads(messages)
+    normalized["messages"] = [_normalize_message(m) for m in messages]
+    for key in ("tools", "functions"):
+        if key in normalized:
+            normalized[key] = sorted(normalized[key], key=_tool_name)
+    return normalized
+
+
+def make_cache_key(params: Dict[str, Any]) -> str:
+    """Compute the content address of a chat completion request.
+
+    The key is the SHA-256 of the canonical JSON encoding of the request, see
+    `normalize_params`, so requests differing in any parameter affecting the
+    reply, such as `max_tokens`, `response_format` or `seed`, get different
+    keys.
+
+    Args:
+        params: the request parameters
+
+    Returns:
+        The key as a hex string.
+    """
+    encoded = json.dumps(
+        normalize_params(params),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache of chat completion responses keyed by `make_cache_key`."""
+
+    def __init__(
+        self, backend: Optional[CacheBackend] = None, *, ttl: Optional[float] = None
+    ) -> None:
+        """Create a new cache.
+
+        Args:
+            backend: where responses are stored, defaults to a `MemoryCache`
+            ttl: time to live of responses in seconds, defaults to the one of
+                the backend
+        """
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttl = ttl
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.backend.stats
+
+    def get(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Get the cached response to a request.
+
+        Args:
+            params: the request parameters
+
+        Returns:
+            The response or `None` on a cache miss.
+        """
+        value = self.backend.get(make_cache_key(params))
+        return None if value is None else json.loads(value)  # type: ignore[no-any-return]
+
+    def set(self, params: Dict[str, Any], response: Dict[str, Any]) -> None:
+        """Store the response to a request.
+
+        Args:
+            params: the request parameters
+            response: the response
+        """
+        value = json.dumps(response, separators=(",", ":")).encode("utf-8")
+        self.backend.set(make_cache_key(params), value, ttl=self.ttl)
@@ -0,0 +1,372 @@
+import hashlib
+import json
+import re
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .base import CacheStats
+from .response import normalize_params
+
+__all__ = [
+    "Embedder",
+    "FlatIndex",
+    "HashingEmbedder",
+    "SemanticCache",
+    "VectorIndex",
+]
+
+Vectors = NDArray[np.float32]
+Ids = NDArray[np.int64]
+
+# function returning one L2-normalized float32 row per text
+Embedder = Callable[[Sequence[str]], Vectors]
+
+_WORD = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """Local embedder hashing words and character n-grams into a fixed vector.
+
+    It needs no model and no download, and catches reworded and reordered
+    prompts with mostly the same words, typos included. Pass a real sentence
+    embedding model to `SemanticCache` to also catch paraphrases with
+    different words.
+    """
+
+    def __init__(self, dim: int = 512, ngram: int = 3) -> None:
+        """Create a new embedder.
+
+        Args:
+            dim: dimension of the vectors
+            ngram: length of the character n-grams
+        """
+        self.dim = dim
+        self.ngram = ngram
+
+    def _features(self, text: str) -> List[int]:
+        features = []
+        for word in _WORD.findall(text.lower()):
+            features.append(zlib.crc32(word.encode()) % self.dim)
+            padded = f" {word} "
+            features.extend(
+                zlib.crc32(padded[i : i + self.ngram].encode()) % self.dim
+                for i in range(len(padded) - self.ngram + 1)
+            )
+        return features
+
+    def __call__(self, texts: Sequence[str]) -> Vectors:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            np.add.at(vectors[i], self._features(text), 1.0)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)  # type: ignore[no-any-return]
+
+
+class VectorIndex(ABC):
+    """Nearest-neighbour index of L2-normalized vectors by cosine similarity.
+
+    Every vector belongs to a namespace and is only matched by queries of
+    the same namespace.
+    """
+
+    @abstractmethod
+    def add(self, vectors: Vectors, namespaces: Ids) -> List[int]:
+        """Add vectors.
+
+        Args:
+            vectors: the vectors, one per row
+            namespaces: int64 namespace of every vector
+
+        Returns:
+            The ids of the vectors.
+        """
+        ...
+
+    @abstractmethod
+    def search(self, queries: Vectors, namespaces: Ids) -> Tuple[Vectors, Ids]:
+        """Find the nearest vector of every query.
+
+        Args:
+            queries: the query vectors, one per row
+            namespaces: int64 namespace of every query
+
+        Returns:
+            The similarity and the id of the nearest vector of every query,
+            the id is -1 if the namespace has no vector.
+        """
+        ...
+
+    @abstractmethod
+    def remove(self, ids: Sequence[int]) -> None:
+        """Remove vectors.
+
+        Args:
+            ids: ids of the vectors
+        """
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        """Memory used by the vectors in bytes."""
+        ...
+
+
+class FlatIndex(VectorIndex):
+    """Exact search over all vectors with one matrix product per batch.
+
+    Vectors are stored in a single preallocated float32 matrix that grows by
+    doubling up to `max_entries` rows, and ids are row numbers, reused once
+    removed.
+    """
+
+    def __init__(self, dim: int, *, max_entries: int = 100_000) -> None:
+        """Create a new index.
+
+        Args:
+            dim: dimension of the vectors
+            max_entries: maximum number of vectors
+        """
+        self.dim = dim
+        self.max_entries = max_entries
+        capacity = min(1024, max_entries)
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._namespaces = np.zeros(capacity, dtype=np.int64)
+        self._used = np.zeros(capacity, dtype=bool)
+        self._free: List[int] = []
+        self._size = 0
+        self._count = 0
+
+    def _grow(self) -> None:
+        capacity = min(2 * len(self._vectors), self.max_entries)
+        if capacity <= len(self._vectors):
+            raise MemoryError("FlatIndex is full")
+        self._vectors = np.resize(self._vectors, (capacity, self.dim))
+        self._namespaces = np.resize(self._namespaces, capacity)
+        used = np.zeros(capacity, dtype=bool)
+        used[: len(self._used)] = self._used
+        self._used = used
+
+    def add(self, vectors: Vectors, namespaces: Ids) -> List[int]:
+        ids = []
+        for vector, namespace in zip(vectors, namespaces):
+            if self._free:
+                i = self._free.pop()
+            else:
+                if self._size == len(self._vectors):
+                    self._grow()
+                i = self._size
+                self._size += 1
+            self._vectors[i] = vector
+            self._namespaces[i] = namespace
+            self._used[i] = True
+            ids.append(i)
+        self._count += len(ids)
+        return ids
+
+    def search(self, queries: Vectors, namespaces: Ids) -> Tuple[Vectors, Ids]:
+        n = len(queries)
+        if self._count == 0:
+            return np.full(n, -1.0, dtype=np.float32), np.full(n, -1, dtype=np.int64)
+        stored = self._namespaces[: self._size]
+        # only score the rows of the namespaces queried
+        rows = np.flatnonzero(np.isin(stored, namespaces) & self._used[: self._size])
+        if len(rows) == 0:
+            return np.full(n, -1.0, dtype=np.float32), np.full(n, -1, dtype=np.int64)
+        # a slice avoids copying the vectors when all rows are candidates
+        vectors = (
+            self._vectors[: self._size]
+            if len(rows) == self._size
+            else self._vectors[rows]
+        )
+        scores = queries.astype(np.float32, copy=False) @ vectors.T
+        scores[namespaces[:, None] != stored[rows][None, :]] = -np.inf
+        best_rows = np.argmax(scores, axis=1)
+        best = scores[np.arange(n), best_rows]
+        ids = np.where(np.isfinite(best), rows[best_rows], -1)
+        return best, ids
+
+    def remove(self, ids: Sequence[int]) -> None:
+        for i in ids:
+            if 0 <= i < self._size and self._used[i]:
+                self._used[i] = False
+                self._free.append(i)
+                self._count -= 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._vectors.nbytes + self._namespaces.nbytes + self._used.nbytes)
+
+
+def _split_prompt(params: Dict[str, Any]) -> Tuple[int, str]:
+    """Namespace and text of the last user message of a request.
+
+    The namespace covers everything else that affects the reply: all the
+    request parameters, see `normalize_params`, and all the previous
+    messages, so only requests identical up to the wording of the last user
+    message match.
+    """
+    context = normalize_params(params)
+    messages = context["messages"]
+    last = messages[-1] if messages else {}
+    text = last.get("content") if last.get("role") == "user" else None
+    context["messages"] = messages[:-1]
+    encoded = json.dumps(
+        context, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    digest = hashlib.blake2b(encoded.encode("utf-8"), digest_size=8).digest()
+    namespace = int.from_bytes(digest, "little", signed=True)
+    return namespace, text if isinstance(text, str) else ""
+
+
+class SemanticCache:
+    """Cache of chat completion responses matched by meaning.
+
+    A request hits if the embedding of its last user message is at least
+    `threshold` cosine-similar to the one of a cached request with the same
+    model, tools and earlier messages. Only requests ending with a user
+    message are cached.
+
+    When `max_entries` is reached, the oldest entries are evicted.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        *,
+        threshold: float = 0.9,
+        index: Optional[VectorIndex] = None,
+        max_entries: int = 10_000,
+    ) -> None:
+        """Create a new cache.
+
+        Args:
+            embedder: function embedding texts, defaults to a `HashingEmbedder`
+            threshold: minimum cosine similarity of a hit
+            index: vector index, defaults to a `FlatIndex` with the dimension
+                of the embedder
+            max_entries: maximum number of cached responses, the memory of
+                the index is bounded by `max_entries` times the vector size
+        """
+        if embedder is None:
+            embedder = HashingEmbedder()
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.index = index
+        self.stats = CacheStats()
+        self._responses: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: Sequence[str]) -> Vectors:
+        vectors = np.asarray(self.embedder(texts), dtype=np.float32)
+        if self.index is None:
+            self.index = FlatIndex(vectors.shape[1], max_entries=self.max_entries)
+        return vectors
+
+    def get(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Get the cached response to a request.
+
+        Args:
+            params: the request parameters
+
+        Returns:
+            The response to the most similar cached request or `None` on a
+            cache miss.
+        """
+        return self.get_many([params])[0]
+
+    def get_many(
+        self, params: Sequence[Dict[str, Any]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Get the cached responses to many requests at once.
+
+        All texts are embedded in one call to the embedder and searched with
+        one vectorized lookup.
+
+        Args:
+            params: the parameters of the requests
+
+        Returns:
+            The responses, `None` for cache misses.
+        """
+        prompts = [_split_prompt(p) for p in params]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+        queried = [i for i, (_, text) in enumerate(prompts) if text]
+        with self._lock:
+            if queried and self._responses:
+                vectors = self._embed([prompts[i][1] for i in queried])
+                namespaces = np.array([prompts[i][0] for i in queried], np.int64)
+                assert self.index is not None  # nosec: B101
+                scores, ids = self.index.search(vectors, namespaces)
+                for i, score, id_ in zip(queried, scores, ids):
+                    if id_ >= 0 and score >= self.threshold:
+                        results[i] = json.loads(self._responses[int(id_)])
+            hits = sum(r is not None for r in results)
+            self.stats.hits += hits
+            self.stats.misses += len(results) - hits
+        return results
+
+    def set(self, params: Dict[str, Any], response: Dict[str, Any]) -> None:
+        """Store the response to a request.
+
+        Args:
+            params: the request parameters
+            response: the response
+        """
+        self.set_many([params], [response])
+
+    def set_many(
+        self, params: Sequence[Dict[str, Any]], responses: Sequence[Dict[str, Any]]
+    ) -> None:
+        """Store the responses to many requests at once.
+
+        Args:
+            params: the parameters of the requests
+            responses: the responses
+        """
+        prompts = [_split_prompt(p) for p in params]
+        stored = [(p, r) for p, r in zip(prompts, responses) if p[1]]
+        if not stored:
+            return
+        with self._lock:
+            vectors = self._embed([text for (_, text), _ in stored])
+            assert self.index is not None  # nosec: B101
+            overflow = len(self._responses) + len(stored) - self.max_entries
+            if overflow > 0:
+                # dicts keep insertion order, the first ids are the oldest
+                evicted = list(self._responses)[:overflow]
+                self.index.remove(evicted)
+                for id_ in evicted:
+                    del self._responses[id_]
+                self.stats.evictions += len(evicted)
+            namespaces = np.array([ns for (ns, _), _ in stored], np.int64)
+            ids = self.index.add(
+                vectors[-self.max_entries :], namespaces[-self.max_entries :]
+            )
+            for id_, (_, response) in zip(ids, stored[-self.max_entries :]):
+                self._responses[id_] = json.dumps(
+                    response, separators=(",", ":")
+                ).encode("utf-8")
+
+    def clear(self) -> None:
+        """Delete all cached responses."""
+        with self._lock:
+            if self.index is not None:
+                self.index.remove(list(self._responses))
+            self._responses.clear()
+
+    def __len__(self) -> int:
+        return len(self._responses)
@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from .base import CacheBackend
+
+__all__ = ["SQLiteCache"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+"""
+
+
+class SQLiteCache(CacheBackend):
+    """On-disk LRU cache that can be shared by processes on the same host.
+
+    The database runs in WAL mode and every write is its own transaction, so
+    any number of processes can read and write the same file concurrently.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        timeout: float = 30.0,
+    ) -> None:
+        """Create a new cache, the database file is created if missing.
+
+        Args:
+            path: path to the database file
+            max_entries: maximum number of entries, `None` for no limit
+            max_bytes: maximum total size of values, `None` for no limit
+            ttl: default time to live of entries in seconds, `None` for no expiry
+            timeout: seconds to wait for a lock held by another process
+        """
+        super().__init__(ttl=ttl)
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path),
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _get(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires is not None and expires <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+            return bytes(value), None if expires is None else expires - now
+
+    def _set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), expires, now),
+                )
+                evicted = self._evict(now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if evicted:
+            self._count_evictions(evicted)
+
+    def _evict(self, now: float) -> int:
+        evicted = self._conn.execute(
+            "DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (now,)
+        ).rowcount
+        if self.max_entries is None and self.max_bytes is None:
+            return evicted
+        count, size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+        if self.max_entries is not None and count > self.max_entries:
+            evicted += self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            ).rowcount
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()
+        if self.max_bytes is not None and size > self.max_bytes:
+            excess = size - self.max_bytes
+            rows = self._conn.execute("SELECT key, size FROM cache ORDER BY accessed")
+            keys = []
+            for key, entry_size in rows:
+                if excess <= 0:
+                    break
+                keys.append(key)
+                excess -= entry_size
+            self._conn.executemany(
+                "DELETE FROM cache WHERE key = ?", [(k,) for k in keys]
+            )
+            evicted += len(keys)
+        return evicted  # type: ignore[no-any-return]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        return count  # type: ignore[no-any-return]
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
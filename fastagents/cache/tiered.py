@@ -0,0 +1,52 @@
+from typing import Optional, Tuple
+
+from .base import CacheBackend
+
+__all__ = ["TieredCache"]
+
+
+class TieredCache(CacheBackend):
+    """Chain of caches, from the fastest to the slowest.
+
+    Lookups go through the tiers in order and a hit in a slower tier is copied
+    to all the faster ones with its remaining time to live. Writes go to all
+    tiers.
+    """
+
+    def __init__(self, *tiers: CacheBackend, ttl: Optional[float] = None) -> None:
+        """Create a new cache.
+
+        Args:
+            tiers: the caches, fastest first
+            ttl: default time to live of entries in seconds, defaults to the
+                ones of the tiers
+        """
+        if not tiers:
+            raise ValueError("At least one tier is required")
+        super().__init__(ttl=ttl)
+        self.tiers = tiers
+
+    def _get(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        for i, tier in enumerate(self.tiers):
+            entry = tier.get_entry(key)
+            if entry is not None:
+                value, ttl = entry
+                for faster in self.tiers[:i]:
+                    faster.set(key, value, ttl=ttl)
+                return entry
+        return None
+
+    def _set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        for tier in self.tiers:
+            tier.set(key, value, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def clear(self) -> None:
+        for tier in self.tiers:
+            tier.clear()
+
+    def __len__(self) -> int:
+        return len(self.tiers[-1])
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import os
+import struct
+import weakref
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .messages import MessageLog, check_conversation_id
+
+__all__ = ["CheckpointStore", "ConversationState", "pending_tool_calls"]
+
+# record: type, payload size, payload, CRC32 of type and payload
+_RECORD_HEADER = struct.Struct("<BI")
+_RECORD_CRC = struct.Struct("<I")
+
+_MESSAGES = 1
+_STATE = 2
+_PENDING = 3
+# the records of a snapshot, nested in a single record
+_SNAPSHOT = 4
+
+
+@dataclass
+class ConversationState:
+    """Everything needed to resume a conversation.
+
+    Attributes:
+        messages: the conversation history
+        state: JSON-serializable agent state, e.g. from `Agent.get_state`
+        pending_tool_calls: tool calls requested by the model but not answered yet
+    """
+
+    messages: MessageLog = field(default_factory=MessageLog)
+    state: Dict[str, Any] = field(default_factory=dict)
+    pending_tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def pending_tool_calls(messages: MessageLog) -> List[Dict[str, Any]]:
+    """Tool calls of the last assistant message not answered by a tool message.
+
+    Args:
+        messages: the conversation history
+
+    Returns:
+        The unanswered tool calls, in the order they were requested.
+    """
+    answered = set()
+    for i in range(len(messages) - 1, -1, -1):
+        role = messages.role(i)
+        if role == "tool":
+            answered.add(messages[i].tool_call_id)
+        elif role == "assistant":
+            tool_calls = messages[i].tool_calls or []
+            return [c for c in tool_calls if c.get("id") not in answered]
+        else:
+            break
+    return []
+
+
+def _encode_json(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _hash_messages(hasher: Any, messages: MessageLog, start: int, end: int) -> None:
+    for i in range(start, end):
+        with messages.raw(i) as view:
+            hasher.update(view)
+
+
+@dataclass
+class _Saved:
+    """What is on disk of a conversation."""
+
+    num_messages: int
+    # hash of the saved messages, updated as messages are appended
+    messages_hash: Any
+    state_digest: bytes
+    pending_digest: bytes
+    # the log last saved, it is append-only so its saved messages can't change
+    log: "Optional[weakref.ref[MessageLog]]" = None
+
+    def same_messages(self, messages: MessageLog) -> bool:
+        """Whether `messages` starts with the saved messages."""
+        if len(messages) < self.num_messages:
+            return False
+        if self.log is not None and self.log() is messages:
+            return True
+        hasher = hashlib.blake2b(digest_size=16)
+        _hash_messages(hasher, messages, 0, self.num_messages)
+        return bool(hasher.digest() == self.messages_hash.digest())
+
+
+class CheckpointStore:
+    """Append-only, incremental checkpoints of conversations on local storage.
+
+    Each conversation has its own file of records. A snapshot appends only
+    the messages added since the previous one, plus the agent state and the
+    pending tool calls if they changed, so its cost does not grow with the
+    length of the conversation.
+
+    A snapshot is written as a single record with a checksum: a snapshot
+    torn by a crash is ignored on load as a whole, and the conversation
+    resumes from the previous snapshot.
+    """
+
+    def __init__(self, directory: Union[str, Path], *, fsync: bool = False) -> None:
+        """Create a new store.
+
+        Args:
+            directory: directory of the checkpoint files, created if missing
+            fsync: flush every snapshot to the disk before returning
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self._saved: Dict[str, _Saved] = {}
+
+    def _path(self, conversation_id: str) -> Path:
+        return self.directory / f"{check_conversation_id(conversation_id)}.ckpt"
+
+    def save(self, conversation_id: str, conversation: ConversationState) -> int:
+        """Append a snapshot of a conversation.
+
+        Args:
+            conversation_id: id of the conversation
+            conversation: the conversation
+
+        Returns:
+            The number of bytes written.
+        """
+        path = self._path(conversation_id)
+        messages = conversation.messages
+        saved = self._saved.get(conversation_id)
+        if saved is None and path.exists():
+            # resuming in a new process, find out what is on disk
+            self.load(conversation_id)
+            saved = self._saved.get(conversation_id)
+        rewrite = saved is not None and not saved.same_messages(messages)
+        if rewrite or saved is None:
+            # not the conversation on disk anymore, start over
+            saved = _Saved(0, hashlib.blake2b(digest_size=16), b"", b"")
+
+        records = []
+        if len(messages) > saved.num_messages:
+            records.append((_MESSAGES, messages.to_bytes(saved.num_messages)))
+        state = _encode_json(conversation.state)
+        if _digest(state) != saved.state_digest:
+            records.append((_STATE, state))
+        pending = _encode_json(conversation.pending_tool_calls)
+        if _digest(pending) != saved.pending_digest:
+            records.append((_PENDING, pending))
+
+        data = _encode_snapshot(records) if records else b""
+        if rewrite:
+            # replace the old snapshots only once the new one is on disk
+            _replace(path, data)
+        elif data:
+            with open(path, "ab") as f:
+                f.write(data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        _hash_messages(saved.messages_hash, messages, saved.num_messages, len(messages))
+        saved.num_messages = len(messages)
+        saved.state_digest = _digest(state)
+        saved.pending_digest = _digest(pending)
+        saved.log = weakref.ref(messages)
+        self._saved[conversation_id] = saved
+        return len(data)
+
+    def load(self, conversation_id: str) -> Optional[ConversationState]:
+        """Load the last snapshot of a conversation.
+
+        Args:
+            conversation_id: id of the conversation
+
+        Returns:
+            The conversation or `None` if it has no checkpoint.
+        """
+        path = self._path(conversation_id)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        conversation = ConversationState()
+        state, pending = b"{}", b"[]"
+        valid = 0
+        for end, record_type, payload in _iter_records(data):
+            if record_type != _SNAPSHOT:
+                continue
+            for _, inner_type, inner in _iter_records(payload):
+                if inner_type == _MESSAGES:
+                    conversation.messages.extend_log(MessageLog.from_bytes(inner))
+                elif inner_type == _STATE:
+                    state = bytes(inner)
+                elif inner_type == _PENDING:
+                    pending = bytes(inner)
+            valid = end
+        if valid < len(data):
+            # drop a torn record so that new snapshots are appended after
+            # the last valid one
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+
+        conversation.state = json.loads(state)
+        conversation.pending_tool_calls = json.loads(pending)
+        messages = conversation.messages
+        messages_hash = hashlib.blake2b(digest_size=16)
+        _hash_messages(messages_hash, messages, 0, len(messages))
+        self._saved[conversation_id] = _Saved(
+            len(messages),
+            messages_hash,
+            _digest(state),
+            _digest(pending),
+            weakref.ref(messages),
+        )
+        return conversation
+
+    def compact(self, conversation_id: str) -> None:
+        """Rewrite the checkpoint of a conversation as a single snapshot.
+
+        Args:
+            conversation_id: id of the conversation
+        """
+        conversation = self.load(conversation_id)
+        if conversation is None:
+            return
+        self._saved.pop(conversation_id, None)
+        _replace(
+            self._path(conversation_id),
+            _encode_snapshot(
+                [
+                    (_MESSAGES, conversation.messages.to_bytes()),
+                    (_STATE, _encode_json(conversation.state)),
+                    (_PENDING, _encode_json(conversation.pending_tool_calls)),
+                ]
+            ),
+        )
+
+    def delete(self, conversation_id: str) -> None:
+        """Delete the checkpoint of a conversation if it exists.
+
+        Args:
+            conversation_id: id of the conversation
+        """
+        self._saved.pop(conversation_id, None)
+        self._path(conversation_id).unlink(missing_ok=True)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return self._path(conversation_id).exists()
+
+    def __iter__(self) -> Iterator[str]:
+        return (p.stem for p in sorted(self.directory.glob("*.ckpt")))
+
+
+def _encode_record(record_type: int, payload: bytes) -> bytes:
+    header = _RECORD_HEADER.pack(record_type, len(payload))
+    crc = zlib.crc32(payload, zlib.crc32(header))
+    return header + payload + _RECORD_CRC.pack(crc)
+
+
+def _encode_snapshot(records: List[Tuple[int, bytes]]) -> bytes:
+    return _encode_record(
+        _SNAPSHOT, b"".join(_encode_record(t, payload) for t, payload in records)
+    )
+
+
+def _replace(path: Path, data: bytes) -> None:
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _iter_records(
+    data: Union[bytes, memoryview]
+) -> Iterator[Tuple[int, int, memoryview]]:
+    view = memoryview(data)
+    pos = 0
+    while pos + _RECORD_HEADER.size <= len(view):
+        record_type, size = _RECORD_HEADER.unpack_from(view, pos)
+        start = pos + _RECORD_HEADER.size
+        end = start + size + _RECORD_CRC.size
+        if end > len(view):
+            return
+        payload = view[start : start + size]
+        (crc,) = _RECORD_CRC.unpack_from(view, start + size)
+        if crc != zlib.crc32(payload, zlib.crc32(view[pos:start])):
+            return
+        yield end, record_type, payload
+        pos = end
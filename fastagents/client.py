@@ -0,0 +1,548 @@
+import asyncio
+import json
+import ssl
+import time
+import weakref
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import urlsplit
+
+from .messages import EncodedMessages
+from .streaming import iter_sse_events
+from .tracing import span
+
+__all__ = [
+    "APIError",
+    "ClientRegistry",
+    "ConnectionPool",
+    "HTTPResponse",
+    "ModelClient",
+    "encode_params",
+    "get_registry",
+]
+
+_CHUNK_SIZE = 64 * 1024
+
+Endpoint = Tuple[str, str, int]
+
+
+def _endpoint(url: str) -> Endpoint:
+    parts = urlsplit(url)
+    scheme = parts.scheme or "http"
+    if scheme not in ("http", "https"):
+        raise ValueError(f"Unsupported URL scheme: {url}")
+    host = parts.hostname or "localhost"
+    port = parts.port or (443 if scheme == "https" else 80)
+    return scheme, host, port
+
+
+class APIError(Exception):
+    """Raised when a model endpoint returns an error status code."""
+
+    def __init__(self, status: int, body: bytes) -> None:
+        self.status = status
+        self.body = body
+        super().__init__(f"HTTP {status}: {body[:200]!r}")
+
+
+class _Connection:
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.requests = 0
+
+    def close(self) -> None:
+        self.writer.close()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.writer.is_closing() or self.reader.at_eof()
+
+
+class HTTPResponse:
+    """Response to a request sent through a `ConnectionPool`.
+
+    The body is read lazily. The underlying connection is returned to the pool
+    once the body has been fully read, or closed by `aclose` if it was not.
+    """
+
+    def __init__(
+        self,
+        status: int,
+        headers: Dict[str, str],
+        connection: _Connection,
+        release: Callable[[_Connection, bool], None],
+        head: bool = False,
+    ) -> None:
+        self.status = status
+        self.headers = headers
+        self._connection: Optional[_Connection] = connection
+        self._release = release
+        self._head = head
+
+    def _finish(self, reusable: bool) -> None:
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._release(connection, reusable)
+
+    async def aiter_bytes(self) -> AsyncIterator[bytes]:
+        """Iterate over the response body as it arrives."""
+        if self._connection is None:
+            return
+        reader = self._connection.reader
+        reusable = self.headers.get("connection", "").lower() != "close"
+        try:
+            if self._head or self.status in (204, 304) or 100 <= self.status < 200:
+                pass
+            elif "chunked" in self.headers.get("transfer-encoding", "").lower():
+                while True:
+                    size_line = await reader.readline()
+                    size = int(size_line.split(b";")[0].strip(), 16)
+                    if size == 0:
+                        # skip trailers
+                        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                            pass
+                        break
+                    yield await reader.readexactly(size)
+                    await reader.readexactly(2)
+            elif "content-length" in self.headers:
+                remaining = int(self.headers["content-length"])
+                while remaining > 0:
+                    chunk = await reader.read(min(remaining, _CHUNK_SIZE))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b"", remaining)
+                    remaining -= len(chunk)
+                    yield chunk
+            else:
+                reusable = False
+                while True:
+                    chunk = await reader.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        except BaseException:
+            self._finish(reusable=False)
+            raise
+        self._finish(reusable=reusable)
+
+    async def aiter_lines(self) -> AsyncIterator[str]:
+        """Iterate over the decoded lines of the response body."""
+        buffer = b""
+        async for chunk in self.aiter_bytes():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line.rstrip(b"\r").decode("utf-8")
+        if buffer:
+            yield buffer.rstrip(b"\r").decode("utf-8")
+
+    async def aread(self) -> bytes:
+        """Read the whole response body."""
+        return b"".join([chunk async for chunk in self.aiter_bytes()])
+
+    async def aclose(self) -> None:
+        """Close the connection if the body was not fully read."""
+        self._finish(reusable=False)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to a single endpoint.
+
+    At most `max_connections` requests are in flight at once, further requests
+    wait for a connection to be released. Connections idle for longer than
+    `keepalive_expiry` seconds are closed.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        max_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        """Create a new pool.
+
+        Args:
+            url: URL of the endpoint, only the scheme, host and port are used
+            max_connections: maximum number of open connections
+            keepalive_expiry: seconds after which an idle connection is closed
+            ssl_context: SSL context used for https endpoints
+        """
+        if max_connections < 1:
+            raise ValueError(f"max_connections must be positive, got {max_connections}")
+        self.scheme, self.host, self.port = _endpoint(url)
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._ssl = (
+            (ssl_context or ssl.create_default_context())
+            if self.scheme == "https"
+            else None
+        )
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._idle: List[_Connection] = []
+        self._reaper: Optional[asyncio.TimerHandle] = None
+        self.connections_opened = 0
+
+    @property
+    def num_idle(self) -> int:
+        return len(self._idle)
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self._ssl
+        )
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    def _pop_idle(self) -> Optional[_Connection]:
+        self.reap_idle()
+        while self._idle:
+            # most recently used first, so that rarely used connections expire
+            connection = self._idle.pop()
+            if not connection.is_closed:
+                return connection
+            connection.close()
+        return None
+
+    def _release(self, connection: _Connection, reusable: bool) -> None:
+        self._semaphore.release()
+        if not reusable or connection.is_closed:
+            connection.close()
+            return
+        connection.last_used = time.monotonic()
+        self._idle.append(connection)
+        self._schedule_reaper()
+
+    def _schedule_reaper(self) -> None:
+        if self._reaper is not None or not self._idle:
+            return
+        loop = asyncio.get_running_loop()
+
+        def _reap() -> None:
+            self._reaper = None
+            self.reap_idle()
+            self._schedule_reaper()
+
+        self._reaper = loop.call_later(self.keepalive_expiry, _reap)
+
+    def reap_idle(self, now: Optional[float] = None) -> int:
+        """Close idle connections older than `keepalive_expiry`.
+
+        Args:
+            now: current time as returned by `time.monotonic`
+
+        Returns:
+            The number of closed connections.
+        """
+        if now is None:
+            now = time.monotonic()
+        expired = [c for c in self._idle if now - c.last_used >= self.keepalive_expiry]
+        for connection in expired:
+            self._idle.remove(connection)
+            connection.close()
+        return len(expired)
+
+    async def request(
+        self,
+        method: str,
+        target: str,
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        body: bytes = b"",
+    ) -> HTTPResponse:
+        """Send a request and return the response once its headers arrive.
+
+        The caller must read the body with `HTTPResponse.aread`,
+        `HTTPResponse.aiter_bytes` or `HTTPResponse.aiter_lines`, or call
+        `HTTPResponse.aclose`, to give the connection back to the pool.
+
+        Args:
+            method: HTTP method
+            target: request target, i.e. path and query
+            headers: request headers
+            body: request body
+
+        Returns:
+            The response.
+        """
+        request = self._encode_request(method, target, headers or {}, body)
+        await self._semaphore.acquire()
+        try:
+            connection = self._pop_idle()
+            if connection is not None:
+                try:
+                    return await self._send(connection, request, method)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # the server closed the idle connection, retry on a new one
+                    connection.close()
+            connection = await self._connect()
+            try:
+                return await self._send(connection, request, method)
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def _encode_request(
+        self, method: str, target: str, headers: Dict[str, str], body: bytes
+    ) -> bytes:
+        default_port = 443 if self.scheme == "https" else 80
+        host = self.host if self.port == default_port else f"{self.host}:{self.port}"
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {host}"]
+        lower = {k.lower() for k in headers}
+        if body or method in ("POST", "PUT", "PATCH"):
+            lines.append(f"Content-Length: {len(body)}")
+        if "connection" not in lower:
+            lines.append("Connection: keep-alive")
+        lines.extend(f"{k}: {v}" for k, v in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+    async def _send(
+        self, connection: _Connection, request: bytes, method: str
+    ) -> HTTPResponse:
+        connection.writer.write(request)
+        await connection.writer.drain()
+        status_line = await connection.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+        _, status, *_ = status_line.decode("latin-1").split(" ", 2)
+        headers: Dict[str, str] = {}
+        while True:
+            line = await connection.reader.readline()
+            if line in (b"\r\n", b"\n"):
+                break
+            if not line:
+                raise asyncio.IncompleteReadError(b"", None)
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        connection.requests += 1
+        return HTTPResponse(
+            int(status), headers, connection, self._release, head=method == "HEAD"
+        )
+
+    async def aclose(self) -> None:
+        """Close all idle connections."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
+
+
+class ClientRegistry:
+    """Connection pools shared by all clients in a process.
+
+    Pools are created on first use, one per endpoint and event loop.
+    """
+
+    def __init__(
+        self, *, max_connections: int = 10, keepalive_expiry: float = 60.0
+    ) -> None:
+        """Create a new registry.
+
+        Args:
+            max_connections: default maximum number of connections per endpoint
+            keepalive_expiry: default idle timeout of connections in seconds
+        """
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._limits: Dict[Endpoint, Dict[str, Any]] = {}
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Endpoint, ConnectionPool]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def configure(
+        self,
+        url: str,
+        *,
+        max_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        """Set the limits for an endpoint, pools already created are not affected.
+
+        Args:
+            url: URL of the endpoint
+            max_connections: maximum number of connections to the endpoint
+            keepalive_expiry: idle timeout of connections in seconds
+            ssl_context: SSL context used for https endpoints
+        """
+        limits = self._limits.setdefault(_endpoint(url), {})
+        if max_connections is not None:
+            limits["max_connections"] = max_connections
+        if keepalive_expiry is not None:
+            limits["keepalive_expiry"] = keepalive_expiry
+        if ssl_context is not None:
+            limits["ssl_context"] = ssl_context
+
+    def get_pool(self, url: str) -> ConnectionPool:
+        """Get the pool for an endpoint in the running event loop.
+
+        Args:
+            url: URL of the endpoint
+
+        Returns:
+            The connection pool.
+        """
+        endpoint = _endpoint(url)
+        pools = self._pools.setdefault(asyncio.get_running_loop(), {})
+        if endpoint not in pools:
+            kwargs: Dict[str, Any] = {
+                "max_connections": self.max_connections,
+                "keepalive_expiry": self.keepalive_expiry,
+            }
+            kwargs.update(self._limits.get(endpoint, {}))
+            pools[endpoint] = ConnectionPool(url, **kwargs)
+        return pools[endpoint]
+
+    async def aclose(self) -> None:
+        """Close the idle connections of all pools in the running event loop."""
+        pools = self._pools.pop(asyncio.get_running_loop(), {})
+        await asyncio.gather(*[pool.aclose() for pool in pools.values()])
+
+
+_registry = ClientRegistry()
+
+
+def get_registry() -> ClientRegistry:
+    """Get the process-wide client registry."""
+    return _registry
+
+
+def encode_params(params: Dict[str, Any]) -> bytes:
+    """Encode the parameters of a request to its JSON body.
+
+    Messages already encoded as `EncodedMessages` are spliced into the body
+    as is.
+
+    Args:
+        params: the request parameters
+
+    Returns:
+        The request body.
+    """
+    messages = params.get("messages")
+    if not isinstance(messages, EncodedMessages):
+        return json.dumps(params).encode("utf-8")
+    # splice the already encoded messages into the request body
+    rest = json.dumps({k: v for k, v in params.items() if k != "messages"})
+    separator = "," if len(rest) > 2 else ""
+    return (rest[:-1] + separator + '"messages":').encode("utf-8") + messages + b"}"
+
+
+class ModelClient:
+    """Client for OpenAI-compatible chat completion endpoints.
+
+    Clients don't own any connections, requests go through the pools of a
+    `ClientRegistry`, so all clients for the same endpoint share them.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "https://api.openai.com/v1",
+        api_key: Optional[str] = None,
+        *,
+        registry: Optional[ClientRegistry] = None,
+        default_headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Create a new client.
+
+        Args:
+            base_url: base URL of the API
+            api_key: API key sent as a bearer token
+            registry: registry to take connections from, defaults to the
+                process-wide one
+            default_headers: additional headers sent with every request
+        """
+        self.base_url = base_url.rstrip("/")
+        self._path = urlsplit(self.base_url).path
+        self._registry = registry if registry is not None else get_registry()
+        self._headers = {"Content-Type": "application/json"}
+        if api_key:
+            self._headers["Authorization"] = f"Bearer {api_key}"
+        self._headers.update(default_headers or {})
+
+    @classmethod
+    def from_config(
+        cls, config: Dict[str, Any], *, registry: Optional[ClientRegistry] = None
+    ) -> "ModelClient":
+        """Create a client from an entry of a pyautogen `config_list`.
+
+        Args:
+            config: the config entry
+            registry: registry to take connections from
+
+        Returns:
+            The client.
+        """
+        kwargs: Dict[str, Any] = {}
+        if config.get("base_url"):
+            kwargs["base_url"] = config["base_url"]
+        return cls(
+            api_key=config.get("api_key"),
+            registry=registry,
+            default_headers=config.get("default_headers"),
+            **kwargs,
+        )
+
+    async def _post(self, path: str, params: Dict[str, Any]) -> HTTPResponse:
+        pool = self._registry.get_pool(self.base_url)
+        with span("serialize") as serialize_span:
+            body = encode_params(params)
+            serialize_span.set("bytes", len(body))
+        return await pool.request(
+            "POST", self._path + path, headers=self._headers, body=body
+        )
+
+    async def create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a chat completion.
+
+        Args:
+            params: request parameters, e.g. `model` and `messages`
+
+        Returns:
+            The decoded response.
+
+        Raises:
+            APIError: if the endpoint returns an error status code
+        """
+        response = await self._post("/chat/completions", params)
+        body = await response.aread()
+        if response.status >= 400:
+            raise APIError(response.status, body)
+        return json.loads(body)  # type: ignore[no-any-return]
+
+    async def stream(self, params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Create a streamed chat completion.
+
+        Args:
+            params: request parameters, `stream` is set to `True`
+
+        Yields:
+            The decoded chat completion chunks as they arrive.
+
+        Raises:
+            APIError: if the endpoint returns an error status code
+        """
+        response = await self._post("/chat/completions", {**params, "stream": True})
+        try:
+            if response.status >= 400:
+                raise APIError(response.status, await response.aread())
+            async for chunk in iter_sse_events(response.aiter_lines()):
+                yield chunk
+        finally:
+            await response.aclose()
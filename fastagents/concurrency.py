@@ -0,0 +1,96 @@
+import asyncio
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+__all__ = ["run_bounded"]
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+async def run_bounded(
+    func: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    *,
+    max_concurrency: int = 100,
+    max_pending: Optional[int] = None,
+    timeout: Optional[float] = None,
+    return_exceptions: bool = False,
+) -> List[Union[R, BaseException]]:
+    """Run `func` over `items` with at most `max_concurrency` calls in flight.
+
+    Items are pulled from `items` lazily through a bounded queue, so a large or
+    infinite generator is only consumed as fast as the workers drain it
+    (backpressure). Results are returned in the order of `items`.
+
+    Args:
+        func: coroutine function called once per item
+        items: items to process, consumed lazily
+        max_concurrency: maximum number of concurrently running calls
+        max_pending: maximum number of items pulled from `items` but not yet
+            started, defaults to `max_concurrency`
+        timeout: per-call timeout in seconds, `None` for no timeout
+        return_exceptions: if `True`, exceptions (including timeouts) are
+            returned in place of results instead of cancelling the whole run
+
+    Returns:
+        A list with one result (or exception) per item.
+
+    Raises:
+        asyncio.TimeoutError: if a call times out and `return_exceptions` is `False`
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be positive, got {max_concurrency}")
+    if max_pending is None:
+        max_pending = max_concurrency
+    if max_pending < 1:
+        raise ValueError(f"max_pending must be positive, got {max_pending}")
+
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_pending)
+    results: Dict[int, Union[R, BaseException]] = {}
+
+    async def produce() -> None:
+        for i, item in enumerate(items):
+            await queue.put((i, item))
+        for _ in range(max_concurrency):
+            await queue.put(_DONE)
+
+    async def work() -> None:
+        while True:
+            entry = await queue.get()
+            if entry is _DONE:
+                return
+            i, item = entry
+            try:
+                results[i] = await asyncio.wait_for(func(item), timeout)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[i] = e
+
+    tasks = [asyncio.ensure_future(produce())] + [
+        asyncio.ensure_future(work()) for _ in range(max_concurrency)
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            exc = task.exception()
+            if exc is not None:
+                raise exc
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return [results[i] for i in range(len(results))]
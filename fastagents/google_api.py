@@ -0,0 +1,455 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+import httplib2
+from googleapiclient.discovery import DISCOVERY_URI, build
+from googleapiclient.discovery_cache.base import Cache
+
+from .tools import ToolExecutor
+from .tracing import span
+
+__all__ = ["DiscoveryCache", "GoogleAPI", "GoogleAPIStats"]
+
+# maximum age of cached discovery documents, as in googleapiclient
+_DISCOVERY_MAX_AGE = 24 * 60 * 60
+
+# maximum nesting of request body schemas sent to the model
+_MAX_SCHEMA_DEPTH = 3
+
+_TOOL_NAME = re.compile(r"[^a-zA-Z0-9_-]")
+
+
+def _default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "fastagents" / "discovery"
+
+
+class DiscoveryCache(Cache):  # type: ignore[misc]
+    """On-disk cache of Google API discovery documents.
+
+    Pass it to `googleapiclient.discovery.build` as `cache`, so that
+    services are built without fetching their discovery document again.
+    Documents are kept in memory too, for services built many times in a
+    process.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path, None] = None,
+        *,
+        max_age: float = _DISCOVERY_MAX_AGE,
+    ) -> None:
+        """Create a new cache.
+
+        Args:
+            directory: where documents are stored, defaults to
+                `fastagents/discovery` in the user cache directory
+            max_age: seconds after which a document is fetched again
+        """
+        self.directory = Path(directory) if directory else _default_cache_dir()
+        self.max_age = max_age
+        self._memory: Dict[str, Tuple[float, str]] = {}
+
+    def _path(self, url: str) -> Path:
+        return self.directory / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def get(self, url: str) -> Optional[str]:
+        now = time.time()
+        cached = self._memory.get(url)
+        if cached is not None and now - cached[0] < self.max_age:
+            return cached[1]
+        path = self._path(url)
+        try:
+            mtime = path.stat().st_mtime
+            if now - mtime >= self.max_age:
+                return None
+            content = path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+        self._memory[url] = (mtime, content)
+        return content
+
+    def set(self, url: str, content: Union[str, bytes]) -> None:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        self._memory[url] = (time.time(), content)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so that readers never see a
+        # partial document
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, self._path(url))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+@dataclass
+class GoogleAPIStats:
+    """Counters of a `GoogleAPI`.
+
+    Attributes:
+        calls: API methods called
+        requests: HTTP requests sent, one per batch
+    """
+
+    calls: int = 0
+    requests: int = 0
+
+    @property
+    def batching_ratio(self) -> float:
+        """Mean number of calls per HTTP request."""
+        return self.calls / self.requests if self.requests else 0.0
+
+
+# request, future of its result
+_Batch = List[Tuple[Any, "asyncio.Future[Any]"]]
+
+
+def _to_json_schema(
+    schema: Dict[str, Any], schemas: Dict[str, Any], depth: int = 0
+) -> Dict[str, Any]:
+    """Convert a discovery document schema to a JSON schema for the model."""
+    if "$ref" in schema:
+        if depth >= _MAX_SCHEMA_DEPTH:
+            return {"type": "object"}
+        return _to_json_schema(schemas.get(schema["$ref"], {}), schemas, depth + 1)
+    kind = schema.get("type", "string")
+    result: Dict[str, Any] = {} if kind == "any" else {"type": kind}
+    for key in ("description", "enum", "format"):
+        if key in schema:
+            result[key] = schema[key]
+    if schema.get("repeated"):
+        result = {"type": "array", "items": result}
+    if kind == "array" and "items" in schema:
+        result["items"] = _to_json_schema(schema["items"], schemas, depth)
+    if kind == "object" and depth < _MAX_SCHEMA_DEPTH:
+        properties = schema.get("properties") or {}
+        if properties:
+            result["properties"] = {
+                name: _to_json_schema(value, schemas, depth + 1)
+                for name, value in properties.items()
+                if not value.get("readOnly")
+            }
+        if "additionalProperties" in schema:
+            result["additionalProperties"] = _to_json_schema(
+                schema["additionalProperties"], schemas, depth + 1
+            )
+    return result
+
+
+class GoogleAPI:
+    """Google APIs called by agents as tools.
+
+    All services share one HTTP connection, authorized with `credentials`,
+    and are built once from discovery documents cached on disk by a
+    `DiscoveryCache`. Calls made at the same time, e.g. the tool calls of a
+    model reply run concurrently by a `ToolExecutor`, are collected for up
+    to `batch_window` seconds and sent as a single batch request.
+
+    httplib2 connections are not thread-safe, so all HTTP requests are sent
+    from a single thread.
+
+    Example:
+        ```python
+        google = GoogleAPI(credentials)
+        executor = ToolExecutor()
+        tools = google.register_tools(
+            executor, "sheets", "v4", ["spreadsheets.values.get"]
+        )
+        agent = ConversableAgent(
+            "assistant", llm_config={"config_list": config_list, "tools": tools}
+        )
+        fast_agent = AutogenAgent(agent, tools=executor)
+        ```
+    """
+
+    def __init__(
+        self,
+        credentials: Optional[Any] = None,
+        *,
+        http: Optional[httplib2.Http] = None,
+        discovery_cache: Optional[DiscoveryCache] = None,
+        discovery_url: str = DISCOVERY_URI,
+        max_batch_size: int = 100,
+        batch_window: float = 0.005,
+        timeout: Optional[float] = 60.0,
+    ) -> None:
+        """Create a new client.
+
+        Args:
+            credentials: `google.auth` credentials, requests are not
+                authorized if not given
+            http: HTTP connection, an authorized one is created from
+                `credentials` if not given
+            discovery_cache: cache of discovery documents, defaults to one in
+                the user cache directory
+            discovery_url: URL template of the discovery documents, with
+                `{api}` and `{apiVersion}` placeholders
+            max_batch_size: maximum number of calls sent in one request,
+                1 disables batching
+            batch_window: seconds to wait for more calls to batch
+            timeout: socket timeout of the HTTP connection in seconds
+        """
+        if http is None:
+            http = httplib2.Http(timeout=timeout)
+            if credentials is not None:
+                import google_auth_httplib2
+
+                http = google_auth_httplib2.AuthorizedHttp(credentials, http=http)
+        self.http = http
+        self.discovery_cache = (
+            DiscoveryCache() if discovery_cache is None else discovery_cache
+        )
+        self.discovery_url = discovery_url
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.stats = GoogleAPIStats()
+        self._services: Dict[Tuple[str, str], Any] = {}
+        self._batches: Dict[Tuple[str, str], _Batch] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._thread = ThreadPoolExecutor(1, thread_name_prefix="fastagents-google")
+
+    def service(self, api: str, version: str) -> Any:
+        """Get a service, built on first use.
+
+        This is blocking, as the discovery document may have to be fetched.
+
+        Args:
+            api: name of the API, e.g. `"sheets"`
+            version: version of the API, e.g. `"v4"`
+
+        Returns:
+            The `googleapiclient` resource of the service.
+        """
+        key = (api, version)
+        if key not in self._services:
+            self._services[key] = build(
+                api,
+                version,
+                http=self.http,
+                discoveryServiceUrl=self.discovery_url,
+                cache=self.discovery_cache,
+                static_discovery=False,
+            )
+        return self._services[key]
+
+    async def _service(self, api: str, version: str) -> Any:
+        if (api, version) in self._services:
+            return self._services[(api, version)]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread, self.service, api, version)
+
+    async def call(self, api: str, version: str, method: str, **params: Any) -> Any:
+        """Call an API method.
+
+        Args:
+            api: name of the API, e.g. `"sheets"`
+            version: version of the API, e.g. `"v4"`
+            method: path of the method, e.g. `"spreadsheets.values.get"`
+            **params: parameters of the method, the request body as `body`
+
+        Returns:
+            The decoded response.
+
+        Raises:
+            googleapiclient.errors.HttpError: if the API returns an error
+            TypeError: if the parameters are not the ones of the method
+        """
+        resource = await self._service(api, version)
+        *path, name = method.split(".")
+        for part in path:
+            resource = getattr(resource, part)()
+        request = getattr(resource, name)(**params)
+
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[Any]" = loop.create_future()
+        key = (api, version)
+        batch = self._batches.setdefault(key, [])
+        batch.append((request, future))
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.batch_window, self._flush, key)
+        with span("google.call", api=api, method=method):
+            return await future
+
+    def _flush(self, key: Tuple[str, str]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._batches.pop(key, [])
+        if batch:
+            task = asyncio.ensure_future(self._send(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _execute(
+        self, key: Tuple[str, str], requests: Sequence[Any]
+    ) -> List[Tuple[Any, Optional[Exception]]]:
+        if len(requests) == 1:
+            try:
+                return [(requests[0].execute(http=self.http), None)]
+            except Exception as e:
+                return [(None, e)]
+
+        results: Dict[str, Tuple[Any, Optional[Exception]]] = {}
+
+        def callback(request_id: str, response: Any, exception: Any) -> None:
+            results[request_id] = (response, exception)
+
+        batch = self._services[key].new_batch_http_request(callback=callback)
+        for i, request in enumerate(requests):
+            batch.add(request, request_id=str(i))
+        batch.execute(http=self.http)
+        return [results[str(i)] for i in range(len(requests))]
+
+    async def _send(self, key: Tuple[str, str], batch: _Batch) -> None:
+        self.stats.calls += len(batch)
+        self.stats.requests += 1
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self._thread, self._execute, key, [request for request, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), (response, exception) in zip(batch, results):
+            if future.done():
+                continue
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(response)
+
+    def tool_schema(
+        self, api: str, version: str, method: str, *, name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Describe an API method as a tool for the model.
+
+        The parameters and the description come from the discovery document.
+
+        Args:
+            api: name of the API, e.g. `"sheets"`
+            version: version of the API, e.g. `"v4"`
+            method: path of the method, e.g. `"spreadsheets.values.get"`
+            name: name of the tool, defaults to the API and method names
+                joined with underscores
+
+        Returns:
+            The tool, as in the `tools` of a chat completion request.
+        """
+        # the parsed discovery document the service was built from
+        document = self.service(api, version)._rootDesc
+        schemas = document.get("schemas") or {}
+        *path, method_name = method.split(".")
+        resource = document
+        for part in path:
+            resource = resource["resources"][part]
+        description = resource["methods"][method_name]
+
+        properties = {
+            param: _to_json_schema(value, schemas)
+            for param, value in (description.get("parameters") or {}).items()
+        }
+        required = [
+            param
+            for param, value in (description.get("parameters") or {}).items()
+            if value.get("required")
+        ]
+        if "request" in description:
+            properties["body"] = _to_json_schema(description["request"], schemas)
+            required.append("body")
+        if name is None:
+            name = _TOOL_NAME.sub("_", f"{api}_{method.replace('.', '_')}")[:64]
+        return {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description.get("description", method),
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": required,
+                },
+            },
+        }
+
+    def _tool_function(
+        self, api: str, version: str, method: str
+    ) -> Callable[..., Coroutine[Any, Any, str]]:
+        async def call(**params: Any) -> str:
+            response = await self.call(api, version, method, **params)
+            return json.dumps(response, ensure_ascii=False)
+
+        return call
+
+    def register_tools(
+        self,
+        executor: ToolExecutor,
+        api: str,
+        version: str,
+        methods: Sequence[str],
+        *,
+        timeout: Optional[float] = None,
+        max_result_size: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Register API methods as tools of an executor.
+
+        Args:
+            executor: the executor of the agent
+            api: name of the API, e.g. `"sheets"`
+            version: version of the API, e.g. `"v4"`
+            methods: paths of the methods, e.g. `["spreadsheets.values.get"]`
+            timeout: timeout of the tools in seconds, defaults to the one of
+                the executor
+            max_result_size: result size limit of the tools in characters,
+                defaults to the one of the executor
+
+        Returns:
+            The tools to add to the `tools` of the `llm_config` of the agent.
+        """
+        tools = []
+        for method in methods:
+            tool = self.tool_schema(api, version, method)
+            executor.register(
+                tool["function"]["name"],
+                self._tool_function(api, version, method),
+                timeout=timeout,
+                max_result_size=max_result_size,
+            )
+            tools.append(tool)
+        return tools
+
+    def close(self) -> None:
+        """Close the HTTP connection."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._thread.shutdown(wait=True)
+        self.http.close()
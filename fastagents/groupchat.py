@@ -0,0 +1,494 @@
+import asyncio
+import re
+from abc import ABC
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from .cache.semantic import Embedder, HashingEmbedder
+from .tracing import span
+
+if TYPE_CHECKING:
+    from .agent import Agent, Reply
+
+__all__ = [
+    "ClassifierSelector",
+    "GraphSelector",
+    "GroupChat",
+    "GroupChatStats",
+    "LLMSelector",
+    "Rule",
+    "SpeakerSelector",
+]
+
+Message = Dict[str, Any]
+
+
+def _last_speaker(messages: Sequence[Message]) -> Optional[str]:
+    return messages[-1].get("name") if messages else None
+
+
+def _content(message: Message) -> str:
+    content = message.get("content")
+    return content if isinstance(content, str) else ""
+
+
+class SpeakerSelector(ABC):
+    """Policy choosing the next speaker of a `GroupChat`.
+
+    A `GroupChat` asks its selectors in turn and the first one returning a
+    speaker wins, so cheap and confident policies go first and expensive
+    ones, such as asking a model, last.
+    """
+
+    # whether `select` takes long enough to pre-start the reply of the
+    # guessed next speaker while it runs
+    slow: bool = False
+
+    def candidates(
+        self, messages: Sequence[Message], names: Sequence[str]
+    ) -> Sequence[str]:
+        """Restrict the speakers allowed to speak next.
+
+        Args:
+            messages: the conversation
+            names: the speakers allowed by the previous selectors
+
+        Returns:
+            The allowed speakers, `names` by default.
+        """
+        return names
+
+    async def select(
+        self, messages: Sequence[Message], names: Sequence[str]
+    ) -> Optional[str]:
+        """Choose the next speaker.
+
+        Args:
+            messages: the conversation, every message has the `name` of its
+                speaker except the task
+            names: the allowed speakers
+
+        Returns:
+            The name of the speaker, `None` to leave the choice to the next
+            selectors.
+        """
+        return None
+
+    def guess(self, messages: Sequence[Message], names: Sequence[str]) -> Optional[str]:
+        """Cheap, possibly wrong, guess of the next speaker.
+
+        Used to pre-start the reply of the speaker while slow selectors run.
+
+        Args:
+            messages: the conversation
+            names: the allowed speakers
+
+        Returns:
+            The name of the speaker, `None` if there is no good guess.
+        """
+        return None
+
+    def observe(self, messages: Sequence[Message], name: str) -> None:  # noqa: B027
+        """Learn from the speaker chosen after a conversation.
+
+        Args:
+            messages: the conversation
+            name: the speaker chosen by the group chat
+        """
+
+
+@dataclass
+class Rule:
+    """Transition of a `GraphSelector`.
+
+    Attributes:
+        target: the next speaker
+        source: the last speaker, `None` for any speaker
+        when: condition on the last message, a regular expression searched in
+            its content or a function of the message, `None` to always match
+    """
+
+    target: str
+    source: Optional[str] = None
+    when: Union[str, Pattern[str], Callable[[Message], bool], None] = None
+
+    def matches(self, message: Message) -> bool:
+        if self.source is not None and message.get("name") != self.source:
+            return False
+        if self.when is None:
+            return True
+        if callable(self.when):
+            return self.when(message)
+        return re.search(self.when, _content(message)) is not None
+
+
+class GraphSelector(SpeakerSelector):
+    """Speaker selection by a state machine over the speakers.
+
+    `transitions` gives the speakers allowed after each speaker, and
+    `rules` choose among them from the content of the last message. If a
+    single speaker is allowed it is chosen, otherwise the first matching
+    rule wins.
+    """
+
+    def __init__(
+        self,
+        transitions: Optional[Mapping[str, Sequence[str]]] = None,
+        rules: Sequence[Rule] = (),
+    ) -> None:
+        """Create a new selector.
+
+        Args:
+            transitions: the speakers allowed after every speaker, all are
+                allowed after speakers missing from it
+            rules: rules choosing the next speaker, in order of priority
+        """
+        self.transitions = dict(transitions or {})
+        self.rules = list(rules)
+
+    def candidates(
+        self, messages: Sequence[Message], names: Sequence[str]
+    ) -> Sequence[str]:
+        last = _last_speaker(messages)
+        if last is None or last not in self.transitions:
+            return names
+        return [name for name in self.transitions[last] if name in names]
+
+    async def select(
+        self, messages: Sequence[Message], names: Sequence[str]
+    ) -> Optional[str]:
+        if len(names) == 1:
+            return names[0]
+        if messages:
+            for rule in self.rules:
+                if rule.target in names and rule.matches(messages[-1]):
+                    return rule.target
+        return None
+
+    def guess(self, messages: Sequence[Message], names: Sequence[str]) -> Optional[str]:
+        last = _last_speaker(messages)
+        if last is not None and self.transitions.get(last):
+            return next((n for n in self.transitions[last] if n in names), None)
+        return None
+
+
+class ClassifierSelector(SpeakerSelector):
+    """Speaker selection by a local nearest-neighbour text classifier.
+
+    Every speaker has example messages it should answer, and the speaker of
+    the example closest to the last message is chosen if it is close
+    enough and clearly closer than the examples of the other speakers. The
+    classifier learns from the speakers chosen by the selectors after it,
+    e.g. a `LLMSelector`, so it takes over more and more of the choices.
+    """
+
+    def __init__(
+        self,
+        examples: Optional[Mapping[str, Sequence[str]]] = None,
+        *,
+        embedder: Optional[Embedder] = None,
+        threshold: float = 0.5,
+        margin: float = 0.1,
+        learn: bool = True,
+        max_examples: int = 1000,
+    ) -> None:
+        """Create a new selector.
+
+        Args:
+            examples: messages each speaker should answer, by speaker name
+            embedder: function embedding texts, defaults to a
+                `HashingEmbedder`
+            threshold: minimum cosine similarity of the closest example
+            margin: minimum difference of similarity with the closest
+                example of another speaker
+            learn: learn from the speakers chosen by other selectors
+            max_examples: maximum number of examples kept per speaker, the
+                oldest learned ones are dropped first
+        """
+        if embedder is None:
+            embedder = HashingEmbedder()
+        self.embedder = embedder
+        self.threshold = threshold
+        self.margin = margin
+        self.learn = learn
+        self.max_examples = max_examples
+        self._examples: Dict[str, Any] = {}
+        for name, texts in (examples or {}).items():
+            self.add_examples(name, texts)
+
+    def add_examples(self, name: str, texts: Sequence[str]) -> None:
+        """Add messages a speaker should answer.
+
+        Args:
+            name: the speaker
+            texts: the messages
+        """
+        texts = [t for t in texts if t]
+        if texts:
+            vectors = self.embedder(texts)
+            if name in self._examples:
+                vectors = np.concatenate([self._examples[name], vectors])
+            self._examples[name] = vectors[-self.max_examples :]
+
+    def _scores(
+        self, messages: Sequence[Message], names: Sequence[str]
+    ) -> List[Tuple[float, str]]:
+        known = [n for n in names if n in self._examples]
+        text = _content(messages[-1]) if messages else ""
+        if not known or not text:
+            return []
+        query = self.embedder([text])[0]
+        ranked: List[Tuple[float, str]] = sorted(
+            ((float((self._examples[n] @ query).max()), n) for n in known),
+            reverse=True,
+        )
+        return ranked
+
+    async def select(
+        self, messages: Sequence[Message], names: Sequence[str]
+    ) -> Optional[str]:
+        scores = self._scores(messages, names)
+        if not scores or scores[0][0] < self.threshold:
+            return None
+        if len(scores) > 1 and scores[0][0] - scores[1][0] < self.margin:
+            return None
+        return scores[0][1]
+
+    def guess(self, messages: Sequence[Message], names: Sequence[str]) -> Optional[str]:
+        scores = self._scores(messages, names)
+        return scores[0][1] if scores and scores[0][0] > 0 else None
+
+    def observe(self, messages: Sequence[Message], name: str) -> None:
+        if self.learn and messages:
+            self.add_examples(name, [_content(messages[-1])])
+
+
+_SELECT_PROMPT = """You are in a role play game. The following roles are available:
+{roles}.
+
+Read the above conversation. Then select the next role from {names} to play. \
+Only return the role."""
+
+
+class LLMSelector(SpeakerSelector):
+    """Speaker selection by asking a model, as pyautogen's `GroupChat` does.
+
+    This costs a model call per turn, so put it last, after selectors
+    that can decide without it.
+    """
+
+    slow = True
+
+    def __init__(
+        self,
+        agent: "Agent",
+        *,
+        descriptions: Optional[Mapping[str, str]] = None,
+        prompt: str = _SELECT_PROMPT,
+    ) -> None:
+        """Create a new selector.
+
+        Args:
+            agent: agent asked for the next speaker
+            descriptions: descriptions of the speakers, by name
+            prompt: prompt appended to the conversation, with `{roles}` and
+                `{names}` placeholders
+        """
+        self.agent = agent
+        self.descriptions = dict(descriptions or {})
+        self.prompt = prompt
+
+    async def select(
+        self, messages: Sequence[Message], names: Sequence[str]
+    ) -> Optional[str]:
+        roles = "\n".join(f"{n}: {self.descriptions.get(n, n)}" for n in names)
+        prompt = self.prompt.format(roles=roles, names=list(names))
+        with span("groupchat.select", selector="llm"):
+            reply = await self.agent.run(
+                [*messages, {"role": "user", "content": prompt}]
+            )
+        text = _content(reply) if isinstance(reply, dict) else str(reply or "")
+        if text.strip() in names:
+            return text.strip()
+        # the first speaker mentioned in the reply
+        mentions = [
+            (match.start(), name)
+            for name in names
+            for match in [re.search(rf"\b{re.escape(name)}\b", text)]
+            if match is not None
+        ]
+        return min(mentions)[1] if mentions else None
+
+
+@dataclass
+class GroupChatStats:
+    """Counters of a `GroupChat`.
+
+    Attributes:
+        turns: replies generated
+        selections: speakers chosen by every kind of selector
+        speculations: replies pre-started for a guessed speaker
+        speculation_hits: pre-started replies of the speaker then chosen
+    """
+
+    turns: int = 0
+    selections: Dict[str, int] = field(default_factory=dict)
+    speculations: int = 0
+    speculation_hits: int = 0
+
+
+def _is_termination(message: Message) -> bool:
+    return _content(message).rstrip().endswith("TERMINATE")
+
+
+class GroupChat:
+    """Conversation between `Agent`s with pluggable speaker selection.
+
+    The next speaker is chosen by the first of `selectors` that decides,
+    and by round robin if none does. With the default selectors, a
+    `GraphSelector` and a `ClassifierSelector`, choosing a speaker costs
+    no model call. When a slow selector, such as a `LLMSelector`, is
+    asked, the reply of the speaker guessed by the selectors before it is
+    started at the same time and kept if the guess is right, which saves a
+    model latency on that turn.
+
+    Agents get the conversation with their own messages as assistant
+    messages and the ones of the others as user messages with the name of
+    their speaker. Tool calls are always assistant messages and tool
+    results tool messages.
+    """
+
+    def __init__(
+        self,
+        agents: Sequence["Agent"],
+        selectors: Optional[Sequence[SpeakerSelector]] = None,
+        *,
+        max_turns: int = 10,
+        is_termination: Callable[[Message], bool] = _is_termination,
+        speculate: bool = True,
+    ) -> None:
+        """Create a new group chat.
+
+        Args:
+            agents: the speakers, named after their wrapped agent
+            selectors: speaker selection policies, in order, defaults to a
+                `GraphSelector` allowing every transition
+            max_turns: maximum number of replies of a conversation
+            is_termination: function telling whether a message ends the
+                conversation, defaults to messages ending with `TERMINATE`
+            speculate: pre-start the reply of the guessed speaker while slow
+                selectors run, replies must then be free of side effects, or
+                cheap to discard
+        """
+        self.agents: Dict[str, "Agent"] = {agent.name: agent for agent in agents}
+        self.selectors = list(selectors) if selectors else [GraphSelector()]
+        self.max_turns = max_turns
+        self.is_termination = is_termination
+        self.speculate = speculate
+        self.stats = GroupChatStats()
+
+    def _view(self, messages: Sequence[Message], name: str) -> List[Message]:
+        return [
+            (
+                {**m, "role": "assistant"}
+                if m.get("name") == name and m.get("role") == "user"
+                else m
+            )
+            for m in messages
+        ]
+
+    async def _reply(self, messages: Sequence[Message], name: str) -> Message:
+        with span("groupchat.turn", speaker=name):
+            reply: "Reply" = await self.agents[name].run(self._view(messages, name))
+        if not isinstance(reply, dict):
+            content = "" if reply is None else str(reply)
+            return {"content": content, "role": "user", "name": name}
+        # as in pyautogen, tool calls stay assistant messages and tool
+        # results tool messages, as the model expects them
+        if reply.get("tool_calls") or reply.get("function_call"):
+            role = "assistant"
+        elif reply.get("role") == "tool" or reply.get("tool_responses"):
+            role = "tool"
+        else:
+            role = "user"
+        return {**reply, "role": role, "name": name}
+
+    def _round_robin(self, messages: Sequence[Message], names: Sequence[str]) -> str:
+        order = list(self.agents)
+        last = _last_speaker(messages)
+        start = order.index(last) + 1 if last in order else 0
+        rotated = order[start:] + order[:start]
+        return next(name for name in rotated if name in names)
+
+    async def _turn(self, messages: Sequence[Message]) -> Message:
+        names: Sequence[str] = list(self.agents)
+        for selector in self.selectors:
+            names = selector.candidates(messages, names) or names
+
+        guess: Optional[str] = None
+        speculative: "Optional[asyncio.Task[Message]]" = None
+        chosen: Optional[str] = None
+        try:
+            for i, selector in enumerate(self.selectors):
+                if selector.slow and self.speculate and guess and not speculative:
+                    speculative = asyncio.ensure_future(self._reply(messages, guess))
+                    self.stats.speculations += 1
+                chosen = await selector.select(messages, names)
+                if chosen in self.agents:
+                    kind = type(selector).__name__
+                    self.stats.selections[kind] = self.stats.selections.get(kind, 0) + 1
+                    # teach the selectors that could not decide
+                    for previous in self.selectors[:i]:
+                        previous.observe(messages, chosen)
+                    break
+                chosen = None
+                guess = guess or selector.guess(messages, names)
+        finally:
+            if speculative is not None and (chosen is None or chosen != guess):
+                speculative.cancel()
+                # a failed reply of a wrong guess is not an error
+                speculative.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        if chosen is None:
+            chosen = self._round_robin(messages, names)
+        if speculative is not None and chosen == guess:
+            self.stats.speculation_hits += 1
+            return await speculative
+        return await self._reply(messages, chosen)
+
+    async def run(self, task: Union[str, Message, List[Message]]) -> List[Message]:
+        """Run a conversation.
+
+        Args:
+            task: the first message or messages
+
+        Returns:
+            The messages of the conversation, starting with the task.
+        """
+        if isinstance(task, str):
+            messages: List[Message] = [{"role": "user", "content": task}]
+        elif isinstance(task, dict):
+            messages = [task]
+        else:
+            messages = list(task)
+        for _ in range(self.max_turns):
+            message = await self._turn(messages)
+            messages.append(message)
+            self.stats.turns += 1
+            if self.is_termination(message):
+                break
+        return messages
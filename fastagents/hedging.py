@@ -0,0 +1,433 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from .client import APIError, ClientRegistry, ModelClient
+
+__all__ = [
+    "Endpoint",
+    "EndpointHealth",
+    "HedgedClient",
+    "HedgingPolicy",
+    "HedgingStats",
+    "is_retriable",
+]
+
+T = TypeVar("T")
+
+_Opened = Tuple[AsyncIterator[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+# status codes worth retrying on another endpoint
+_RETRY_STATUS = {408, 409, 429}
+
+
+def is_retriable(error: BaseException) -> bool:
+    """Whether a request failing with `error` may succeed on another endpoint.
+
+    Args:
+        error: the error
+
+    Returns:
+        `True` for server errors, rate limits, timeouts and connection errors.
+    """
+    if isinstance(error, APIError):
+        return error.status >= 500 or error.status in _RETRY_STATUS
+    return isinstance(
+        error, (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError)
+    )
+
+
+@dataclass
+class HedgingPolicy:
+    """When to hedge a request and when to give up on an endpoint.
+
+    Attributes:
+        quantile: quantile of the latency of an endpoint after which a
+            duplicate request is sent to the next endpoint
+        min_samples: requests to an endpoint before its latency quantile is
+            used, `initial_delay` is used until then
+        initial_delay: hedge delay in seconds of endpoints with too few
+            samples, no hedging until then if `None`
+        min_delay: minimum hedge delay in seconds
+        max_hedges: maximum number of duplicate requests per request
+        window: number of recent latencies kept per endpoint
+        alpha: weight of the last request in the health score of an endpoint
+        min_health: health score under which an endpoint is tried last
+        max_failures: consecutive failures after which an endpoint is tried
+            last for `cooldown` seconds
+        cooldown: seconds an endpoint is tried last after `max_failures`
+    """
+
+    quantile: float = 0.95
+    min_samples: int = 20
+    initial_delay: Optional[float] = None
+    min_delay: float = 0.0
+    max_hedges: int = 1
+    window: int = 200
+    alpha: float = 0.1
+    min_health: float = 0.5
+    max_failures: int = 3
+    cooldown: float = 30.0
+
+
+class EndpointHealth:
+    """Latency and health score of an endpoint, from its recent requests.
+
+    The health score is a moving average of the success of requests, from 0
+    when all recent requests failed to 1 when they all succeeded.
+    """
+
+    def __init__(self, policy: HedgingPolicy) -> None:
+        """Create a new health record.
+
+        Args:
+            policy: the hedging policy
+        """
+        self.policy = policy
+        self.score = 1.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._down_until = 0.0
+
+    def latencies(self, kind: str = "create") -> List[float]:
+        """Recent latencies in seconds.
+
+        Args:
+            kind: `"create"` for whole responses, `"stream"` for the first
+                chunk of streamed responses
+        """
+        return list(self._latencies.get(kind, ()))
+
+    def record_latency(self, latency: float, kind: str = "create") -> None:
+        """Record the latency of a request, without changing the health score.
+
+        Used for requests cancelled before completion, which took at least
+        `latency` seconds.
+        """
+        if kind not in self._latencies:
+            self._latencies[kind] = deque(maxlen=self.policy.window)
+        self._latencies[kind].append(latency)
+
+    def record_success(self, latency: float, kind: str = "create") -> None:
+        """Record a successful request.
+
+        Args:
+            latency: seconds until the response, or its first chunk
+            kind: `"create"` or `"stream"`
+        """
+        self.requests += 1
+        self.record_latency(latency, kind)
+        self.score += self.policy.alpha * (1.0 - self.score)
+        self.consecutive_failures = 0
+
+    def record_failure(self, now: Optional[float] = None) -> None:
+        """Record a failed request.
+
+        Args:
+            now: current time as returned by `time.monotonic`
+        """
+        self.requests += 1
+        self.failures += 1
+        self.score -= self.policy.alpha * self.score
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.policy.max_failures:
+            if now is None:
+                now = time.monotonic()
+            self._down_until = now + self.policy.cooldown
+
+    def is_healthy(self, now: Optional[float] = None) -> bool:
+        """Whether the endpoint should be tried in its configured order.
+
+        Args:
+            now: current time as returned by `time.monotonic`
+        """
+        if now is None:
+            now = time.monotonic()
+        return self.score >= self.policy.min_health and now >= self._down_until
+
+    def quantile(self, q: float, kind: str = "create") -> Optional[float]:
+        """Quantile of the recent latencies, `None` without any."""
+        latencies = sorted(self._latencies.get(kind, ()))
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def hedge_delay(self, kind: str = "create") -> Optional[float]:
+        """Seconds after which a request is hedged, `None` to not hedge it.
+
+        Args:
+            kind: `"create"` or `"stream"`
+        """
+        latencies = self._latencies.get(kind, ())
+        if len(latencies) < self.policy.min_samples:
+            delay = self.policy.initial_delay
+        else:
+            delay = self.quantile(self.policy.quantile, kind)
+        return None if delay is None else max(delay, self.policy.min_delay)
+
+
+@dataclass
+class Endpoint:
+    """A model client and the parameters overridden for it.
+
+    Attributes:
+        client: the client
+        params: request parameters overridden for this endpoint, e.g. the
+            `model`
+    """
+
+    client: ModelClient
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        model = self.params.get("model")
+        return self.client.base_url + (f" {model}" if model else "")
+
+
+@dataclass
+class HedgingStats:
+    """Counters of a `HedgedClient`.
+
+    Attributes:
+        requests: requests made
+        hedges: duplicate requests sent because the first one was slow
+        hedge_wins: requests answered by a duplicate request
+        fallbacks: requests sent to another endpoint after a failure
+        failures: requests failing on all endpoints
+    """
+
+    requests: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    fallbacks: int = 0
+    failures: int = 0
+
+    @property
+    def hedge_ratio(self) -> float:
+        """Average number of duplicate requests per request."""
+        return self.hedges / self.requests if self.requests else 0.0
+
+
+def _consume(task: "asyncio.Future[Any]") -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+class HedgedClient(ModelClient):
+    """Model client sending requests to a chain of endpoints.
+
+    Requests go to the first healthy endpoint. If it has not answered after
+    the hedge delay of the policy, by default the 95th percentile of its
+    recent latency, the same request is also sent to the next endpoint, the
+    first response wins and the other request is cancelled. If a request
+    fails with a retriable error, it is sent to the next endpoint right
+    away. Endpoints failing repeatedly are moved to the end of the chain
+    until they recover.
+
+    Streamed requests are hedged on the arrival of the first chunk, errors
+    after it are not retried.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[Union[Endpoint, ModelClient]],
+        policy: Optional[HedgingPolicy] = None,
+    ) -> None:
+        """Create a new client.
+
+        Args:
+            endpoints: endpoints in order of preference
+            policy: the hedging policy, defaults to `HedgingPolicy()`
+        """
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        self.endpoints = [
+            e if isinstance(e, Endpoint) else Endpoint(e) for e in endpoints
+        ]
+        primary = self.endpoints[0].client
+        super().__init__(primary.base_url, registry=primary._registry)
+        self.policy = HedgingPolicy() if policy is None else policy
+        self.health = [EndpointHealth(self.policy) for _ in self.endpoints]
+        self.stats = HedgingStats()
+
+    @classmethod
+    def from_config_list(
+        cls,
+        config_list: Sequence[Dict[str, Any]],
+        policy: Optional[HedgingPolicy] = None,
+        *,
+        registry: Optional[ClientRegistry] = None,
+    ) -> "HedgedClient":
+        """Create a client from a pyautogen `config_list`, one endpoint per entry.
+
+        Args:
+            config_list: the config entries, in order of preference
+            policy: the hedging policy
+            registry: registry to take connections from
+
+        Returns:
+            The client.
+        """
+        return cls(
+            [
+                Endpoint(
+                    ModelClient.from_config(config, registry=registry),
+                    {"model": config["model"]} if "model" in config else {},
+                )
+                for config in config_list
+            ],
+            policy,
+        )
+
+    def _order(self) -> List[int]:
+        now = time.monotonic()
+        healthy = [i for i, h in enumerate(self.health) if h.is_healthy(now)]
+        return healthy + [i for i in range(len(self.health)) if i not in healthy]
+
+    async def _race(
+        self,
+        start: Callable[[Endpoint], Awaitable[T]],
+        kind: str,
+        discard: Optional[Callable[[T], Any]] = None,
+    ) -> T:
+        self.stats.requests += 1
+        queue = self._order()
+        pending: Dict["asyncio.Future[T]", Tuple[int, float]] = {}
+        hedged: List[int] = []
+        deadline: Optional[float] = None
+        error: Optional[BaseException] = None
+
+        def launch(hedge: bool = False) -> None:
+            nonlocal deadline
+            i = queue.pop(0)
+            if hedge:
+                hedged.append(i)
+                self.stats.hedges += 1
+            task = asyncio.ensure_future(start(self.endpoints[i]))
+            now = time.monotonic()
+            pending[task] = (i, now)
+            delay = self.health[i].hedge_delay(kind)
+            deadline = None if delay is None else now + delay
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if (
+                    queue
+                    and len(hedged) < self.policy.max_hedges
+                    and deadline is not None
+                ):
+                    timeout = max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    launch(hedge=True)
+                    continue
+                now = time.monotonic()
+                for task in sorted(done, key=lambda t: pending[t][1]):
+                    i, t0 = pending[task]
+                    e = task.exception()
+                    if e is None:
+                        del pending[task]
+                        self.health[i].record_success(now - t0, kind)
+                        self.stats.hedge_wins += i in hedged
+                        return task.result()
+                    if not is_retriable(e):
+                        raise e
+                    del pending[task]
+                    self.health[i].record_failure(now)
+                    error = e
+                    if queue:
+                        self.stats.fallbacks += 1
+                        launch()
+            self.stats.failures += 1
+            assert error is not None  # nosec: B101
+            raise error
+        finally:
+            now = time.monotonic()
+            for task, (i, t0) in pending.items():
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    if discard is not None:
+                        discard(task.result())
+                else:
+                    task.cancel()
+                    task.add_done_callback(_consume)
+                    # cancelled requests took at least that long
+                    self.health[i].record_latency(now - t0, kind)
+
+    async def create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a chat completion on the first endpoint to answer.
+
+        Args:
+            params: request parameters, overridden by those of the endpoints
+
+        Returns:
+            The decoded response.
+
+        Raises:
+            APIError: if an endpoint returns an error status code that is
+                not retriable, or all endpoints failed
+        """
+
+        async def start(endpoint: Endpoint) -> Dict[str, Any]:
+            return await endpoint.client.create({**params, **endpoint.params})
+
+        return await self._race(start, "create")
+
+    async def stream(self, params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Create a streamed chat completion on the first endpoint to answer.
+
+        Args:
+            params: request parameters, overridden by those of the endpoints
+
+        Yields:
+            The decoded chat completion chunks as they arrive.
+
+        Raises:
+            APIError: if an endpoint returns an error status code that is
+                not retriable, or all endpoints failed
+        """
+
+        async def start(endpoint: Endpoint) -> _Opened:
+            chunks = endpoint.client.stream({**params, **endpoint.params})
+            try:
+                return chunks, await chunks.__anext__()
+            except StopAsyncIteration:
+                return chunks, None
+
+        def discard(opened: _Opened) -> None:
+            aclose = getattr(opened[0], "aclose", None)
+            if aclose is not None:
+                asyncio.ensure_future(aclose())
+
+        chunks, first = await self._race(start, "stream", discard)
+        if first is None:
+            return
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
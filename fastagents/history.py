@@ -0,0 +1,358 @@
+import warnings
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .tokens import (
+    TokenCounter,
+    Tokenizer,
+    approximate_tokens,
+    get_token_counter,
+    message_tokens,
+)
+
+__all__ = [
+    "Checkpoint",
+    "History",
+    "HistoryStrategy",
+    "SlidingWindow",
+    "SummaryCheckpoints",
+    "approximate_tokens",
+    "is_pinned",
+    "message_tokens",
+]
+
+
+def is_pinned(message: Dict[str, Any]) -> bool:
+    """Default pinning rule: system messages are always kept."""
+    return message.get("role") == "system"
+
+
+@dataclass
+class Checkpoint:
+    """Summary replacing the messages of a `History` before `end`.
+
+    Pinned messages before `end` are kept next to the summary.
+    """
+
+    end: int
+    message: Dict[str, Any]
+    tokens: int
+
+
+class History:
+    """Conversation history with incrementally maintained token counts.
+
+    Every message is tokenized exactly once, when it is appended, and the
+    texts of messages appended together are tokenized in a single batch by
+    a `TokenCounter` caching their counts. Token counts of any range of
+    messages are then available in constant time.
+
+    Messages are grouped so that an assistant message with tool calls and the
+    tool messages answering it are always kept or dropped together. A group
+    is pinned if any of its messages is.
+    """
+
+    def __init__(
+        self,
+        messages: Iterable[Dict[str, Any]] = (),
+        *,
+        tokenizer: Union[Tokenizer, TokenCounter] = approximate_tokens,
+        pin: Callable[[Dict[str, Any]], bool] = is_pinned,
+    ) -> None:
+        """Create a new history.
+
+        Args:
+            messages: initial messages
+            tokenizer: function returning the number of tokens of a text, or
+                a token counter shared with other histories to reuse the
+                counts of their messages
+            pin: function returning `True` for messages that must never be dropped
+        """
+        if isinstance(tokenizer, TokenCounter):
+            self.counter = tokenizer
+        elif tokenizer is approximate_tokens:
+            self.counter = get_token_counter()
+        else:
+            self.counter = TokenCounter(tokenizer)
+        self.tokenizer = self.counter.tokenizer
+        self.pin = pin
+        self.checkpoint: Optional[Checkpoint] = None
+        self._messages: List[Dict[str, Any]] = []
+        self._cumulative: List[int] = [0]
+        self._group_starts: List[int] = []
+        self._pinned_groups: List[int] = []
+        self.extend(messages)
+
+    def append(self, message: Dict[str, Any]) -> None:
+        """Append a message.
+
+        Args:
+            message: the message
+        """
+        self.extend([message])
+
+    def extend(self, messages: Iterable[Dict[str, Any]]) -> None:
+        """Append messages, tokenizing their new texts in a single batch.
+
+        Args:
+            messages: the messages
+        """
+        messages = list(messages)
+        for message, tokens in zip(messages, self.counter.messages_tokens(messages)):
+            index = len(self._messages)
+            if message.get("role") != "tool" or not self._group_starts:
+                self._group_starts.append(index)
+            group = len(self._group_starts) - 1
+            if self.pin(message) and (
+                not self._pinned_groups or self._pinned_groups[-1] != group
+            ):
+                self._pinned_groups.append(group)
+            self._messages.append(message)
+            self._cumulative.append(self._cumulative[-1] + tokens)
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """All messages, the list must not be modified."""
+        return self._messages
+
+    @property
+    def total_tokens(self) -> int:
+        """Number of tokens of all messages."""
+        return self._cumulative[-1]
+
+    def tokens(self, start: int = 0, end: Optional[int] = None) -> int:
+        """Number of tokens of the messages in `start:end`."""
+        end = len(self._messages) if end is None else end
+        return self._cumulative[end] - self._cumulative[start]
+
+    @property
+    def num_groups(self) -> int:
+        return len(self._group_starts)
+
+    def group(self, i: int) -> Tuple[int, int]:
+        """Start and end index of the messages of a group."""
+        start = self._group_starts[i]
+        end = (
+            self._group_starts[i + 1]
+            if i + 1 < len(self._group_starts)
+            else len(self._messages)
+        )
+        return start, end
+
+    @property
+    def pinned_groups(self) -> List[int]:
+        """Indices of the pinned groups, in order."""
+        return self._pinned_groups
+
+    def group_at(self, index: int) -> int:
+        """Index of the group of the message at `index`."""
+        lo, hi = 0, len(self._group_starts)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self._group_starts[mid] <= index:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._messages)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self._messages[index]
+
+
+def _select_window(
+    history: History, first_group: int, budget: int
+) -> Tuple[List[int], int]:
+    """Select the pinned groups and the newest groups fitting in the budget.
+
+    Only groups from `first_group` on are considered, pinned groups are
+    selected regardless of `first_group`. The last group, the one being
+    replied to, is always selected, even if it doesn't fit.
+
+    Returns:
+        The indices of the selected groups in order and their number of tokens.
+    """
+    pinned = history.pinned_groups
+    pinned_tokens = sum(history.tokens(*history.group(g)) for g in pinned)
+    pinned_set = set(pinned)
+    remaining = budget - pinned_tokens
+    window: List[int] = []
+    window_tokens = 0
+    last = history.num_groups - 1
+    for g in range(last, first_group - 1, -1):
+        if g in pinned_set:
+            continue
+        n = history.tokens(*history.group(g))
+        if window_tokens + n > remaining and g != last:
+            break
+        window.append(g)
+        window_tokens += n
+    selected = sorted(pinned_set.union(window))
+    return selected, pinned_tokens + window_tokens
+
+
+def _warn_over_budget(tokens: int, budget: int) -> None:
+    if tokens > budget:
+        warnings.warn(
+            f"The pinned messages and the last message of the conversation "
+            f"exceed the token budget, sending {tokens} tokens instead of at "
+            f"most {budget}",
+            RuntimeWarning,
+            stacklevel=3,
+        )
+
+
+def _messages_of(history: History, groups: List[int]) -> List[Dict[str, Any]]:
+    messages: List[Dict[str, Any]] = []
+    for g in groups:
+        start, end = history.group(g)
+        messages.extend(history.messages[start:end])
+    return messages
+
+
+class HistoryStrategy(ABC):
+    """Selects the messages of a `History` sent to the model."""
+
+    @abstractmethod
+    async def select(self, history: History, max_tokens: int) -> List[Dict[str, Any]]:
+        """Select messages to fit in a token budget.
+
+        Args:
+            history: the conversation history
+            max_tokens: maximum number of tokens of the selected messages
+
+        Returns:
+            The selected messages.
+        """
+        ...
+
+
+class SlidingWindow(HistoryStrategy):
+    """Keeps the pinned messages and as many of the newest messages as fit.
+
+    The newest message, the one being replied to, is always kept. If it
+    doesn't fit on its own, the selection exceeds the budget and a
+    `RuntimeWarning` is issued.
+
+    The cost of a selection is proportional to the number of selected
+    messages, not to the length of the history.
+    """
+
+    async def select(self, history: History, max_tokens: int) -> List[Dict[str, Any]]:
+        if history.total_tokens <= max_tokens:
+            return list(history.messages)
+        groups, tokens = _select_window(history, 0, max_tokens)
+        _warn_over_budget(tokens, max_tokens)
+        return _messages_of(history, groups)
+
+
+class SummaryCheckpoints(HistoryStrategy):
+    """Replaces old messages with a summary when the budget is exceeded.
+
+    The summary is stored in `History.checkpoint`, later turns only add the
+    messages after the checkpoint, and the next summary folds the previous
+    one with the messages since. If the result is still over budget, the
+    oldest messages after the checkpoint are dropped as in `SlidingWindow`.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[List[Dict[str, Any]]], Awaitable[str]],
+        *,
+        keep_ratio: float = 0.5,
+    ) -> None:
+        """Create a new strategy.
+
+        Args:
+            summarize: coroutine function returning a summary of messages
+            keep_ratio: fraction of the budget kept for the newest messages
+                when a summary is made
+        """
+        self.summarize = summarize
+        self.keep_ratio = keep_ratio
+
+    def _active_tokens(self, history: History) -> int:
+        checkpoint = history.checkpoint
+        if checkpoint is None:
+            return history.total_tokens
+        pinned = history.pinned_groups
+        folded_pinned = sum(
+            history.tokens(*history.group(g))
+            for g in pinned
+            if history.group(g)[0] < checkpoint.end
+        )
+        return folded_pinned + checkpoint.tokens + history.tokens(checkpoint.end)
+
+    async def select(self, history: History, max_tokens: int) -> List[Dict[str, Any]]:
+        if self._active_tokens(history) > max_tokens:
+            await self._make_checkpoint(history, max_tokens)
+        checkpoint = history.checkpoint
+        if checkpoint is None:
+            return list(history.messages)
+
+        first_group = history.group_at(checkpoint.end)
+        budget = max_tokens - checkpoint.tokens
+        groups, tokens = _select_window(history, first_group, budget)
+        _warn_over_budget(tokens, budget)
+        before = [g for g in groups if g < first_group]
+        after = [g for g in groups if g >= first_group]
+        return (
+            _messages_of(history, before)
+            + [checkpoint.message]
+            + _messages_of(history, after)
+        )
+
+    async def _make_checkpoint(self, history: History, max_tokens: int) -> None:
+        checkpoint = history.checkpoint
+        start = 0 if checkpoint is None else checkpoint.end
+        first_group = history.group_at(start) if start < len(history) else None
+        if first_group is None:
+            return
+
+        # keep the newest messages that fit in the kept part of the budget
+        kept, _ = _select_window(
+            history, first_group, int(max_tokens * self.keep_ratio)
+        )
+        pinned = set(history.pinned_groups)
+        kept_after = [g for g in kept if g >= first_group and g not in pinned]
+        # always keep the last group, it is the one being replied to
+        last = history.num_groups - 1
+        end_group = kept_after[0] if kept_after else last
+        end = history.group(end_group)[0]
+        if end <= start:
+            return
+
+        folded = [
+            m
+            for g in range(first_group, end_group)
+            if g not in pinned
+            for m in history.messages[slice(*history.group(g))]
+        ]
+        previous = [] if checkpoint is None else [checkpoint.message]
+        summary = await self.summarize(previous + folded)
+        message = {
+            "role": "system",
+            "content": f"Summary of the earlier conversation: {summary}",
+        }
+        history.checkpoint = Checkpoint(
+            end=end,
+            message=message,
+            tokens=history.counter.message_tokens(message),
+        )
@@ -0,0 +1,374 @@
+import json
+import re
+import struct
+import sys
+from array import array
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    overload,
+)
+
+__all__ = [
+    "EncodedMessages",
+    "Message",
+    "MessageLog",
+    "check_conversation_id",
+    "encode_message",
+]
+
+# fields of a message sent to the model, in serialization order
+_FIELDS = ("role", "content", "name", "tool_calls", "tool_call_id", "function_call")
+
+_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.\-]+$")
+
+_MAGIC = b"FAML"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBIQ")
+
+
+class EncodedMessages(bytes):
+    """JSON array of messages, sent to the model as is without re-encoding."""
+
+
+class Message:
+    """A chat message with interned role and name."""
+
+    __slots__ = _FIELDS
+
+    def __init__(
+        self,
+        role: str,
+        content: Optional[Any] = None,
+        name: Optional[str] = None,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+        tool_call_id: Optional[str] = None,
+        function_call: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.role = sys.intern(role)
+        self.content = content
+        self.name = None if name is None else sys.intern(name)
+        self.tool_calls = tool_calls
+        self.tool_call_id = tool_call_id
+        self.function_call = function_call
+
+    @classmethod
+    def from_dict(cls, message: Dict[str, Any]) -> "Message":
+        """Create a message from a dictionary, unknown keys are ignored."""
+        return cls(message["role"], *[message.get(k) for k in _FIELDS[1:]])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a dictionary without the fields that are `None`."""
+        message = {k: getattr(self, k) for k in _FIELDS}
+        return {k: v for k, v in message.items() if v is not None}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in _FIELDS)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.to_dict().items())
+        return f"Message({fields})"
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    """Encode a message as sent to the model.
+
+    The encoding is compact JSON of the fields of the message sent to the
+    model, in a fixed order and without those set to `None`, so equal
+    messages always give the same bytes.
+
+    Args:
+        message: the message
+
+    Returns:
+        The UTF-8 JSON encoding.
+    """
+    fields = {k: message[k] for k in _FIELDS if message.get(k) is not None}
+    return json.dumps(fields, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def check_conversation_id(conversation_id: str) -> str:
+    """Check that a conversation id is safe to use as a file name.
+
+    Args:
+        conversation_id: the id
+
+    Returns:
+        The id.
+
+    Raises:
+        ValueError: if the id has characters other than letters, digits,
+            `_`, `.` and `-`
+    """
+    if not _ID_PATTERN.match(conversation_id):
+        raise ValueError(f"Invalid conversation id: {conversation_id!r}")
+    return conversation_id
+
+
+class MessageLog:
+    """Append-only, compact log of chat messages.
+
+    Every message is stored once, JSON-encoded, in a single contiguous byte
+    arena. Roles are kept in a separate array of one-byte codes into a table
+    of interned strings, so filtering by role does not decode anything.
+
+    The JSON array of any range of messages is built by joining slices of the
+    arena, without decoding or re-encoding the messages, and the whole log
+    serializes to a binary format by writing the arena as is.
+    """
+
+    __slots__ = (
+        "_arena",
+        "_ends",
+        "_role_codes",
+        "_roles",
+        "_role_index",
+        "__weakref__",
+    )
+
+    def __init__(self, messages: Iterable[Dict[str, Any]] = ()) -> None:
+        """Create a new log.
+
+        Args:
+            messages: initial messages
+        """
+        self._arena = bytearray()
+        self._ends = array("Q")
+        self._role_codes = array("B")
+        self._roles: List[str] = []
+        self._role_index: Dict[str, int] = {}
+        self.extend(messages)
+
+    def _role_code(self, role: str) -> int:
+        code = self._role_index.get(role)
+        if code is None:
+            if len(self._roles) >= 255 or len(role.encode("utf-8")) > 255:
+                raise ValueError(f"Too many distinct roles or role too long: {role}")
+            code = len(self._roles)
+            self._roles.append(sys.intern(role))
+            self._role_index[self._roles[-1]] = code
+        return code
+
+    def append(self, message: Union[Dict[str, Any], Message]) -> None:
+        """Append a message.
+
+        pyautogen `tool_responses` are unrolled into separate tool messages
+        preceding the message, as they are sent to the model.
+
+        Args:
+            message: the message
+        """
+        if isinstance(message, Message):
+            message = message.to_dict()
+        tool_responses = message.get("tool_responses")
+        if tool_responses:
+            self.extend(tool_responses)
+            if message.get("role") == "tool":
+                return
+        self._arena += encode_message(message)
+        self._ends.append(len(self._arena))
+        self._role_codes.append(self._role_code(message["role"]))
+
+    def extend(self, messages: Iterable[Union[Dict[str, Any], Message]]) -> None:
+        """Append messages.
+
+        Args:
+            messages: the messages
+        """
+        for message in messages:
+            self.append(message)
+
+    def __len__(self) -> int:
+        return len(self._ends)
+
+    def _bounds(self, i: int) -> Tuple[int, int]:
+        if i < 0:
+            i += len(self._ends)
+        if not 0 <= i < len(self._ends):
+            raise IndexError("message index out of range")
+        return (self._ends[i - 1] if i > 0 else 0), self._ends[i]
+
+    def raw(self, i: int) -> memoryview:
+        """JSON encoding of a message, as a view into the arena.
+
+        The view must be released before appending to the log.
+
+        Args:
+            i: index of the message
+
+        Returns:
+            The view.
+        """
+        start, end = self._bounds(i)
+        return memoryview(self._arena)[start:end]
+
+    def role(self, i: int) -> str:
+        """Role of a message, without decoding it."""
+        self._bounds(i)
+        return self._roles[self._role_codes[i]]
+
+    @overload
+    def __getitem__(self, i: int) -> Message:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[Message]:
+        ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Message, List[Message]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        start, end = self._bounds(i)
+        return Message.from_dict(json.loads(self._arena[start:end]))
+
+    def __iter__(self) -> Iterator[Message]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_dicts(
+        self, start: int = 0, end: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Decode messages to dictionaries.
+
+        Args:
+            start: index of the first message
+            end: index after the last message, defaults to the end of the log
+
+        Returns:
+            The messages.
+        """
+        return json.loads(self.json_array(start, end))  # type: ignore[no-any-return]
+
+    def json_array(
+        self,
+        start: int = 0,
+        end: Optional[int] = None,
+        *,
+        prefix: Iterable[Dict[str, Any]] = (),
+    ) -> EncodedMessages:
+        """Build the JSON array of a range of messages from the arena.
+
+        Args:
+            start: index of the first message
+            end: index after the last message, defaults to the end of the log
+            prefix: messages encoded before the ones of the log, e.g. a system
+                message
+
+        Returns:
+            The encoded JSON array.
+        """
+        end = len(self) if end is None else end
+        parts: List[Union[bytes, memoryview]] = [encode_message(m) for m in prefix]
+        if start < end:
+            arena = memoryview(self._arena)
+            first = self._ends[start - 1] if start > 0 else 0
+            # messages are stored back to back, so only commas are added
+            for i in range(start, end):
+                parts.append(arena[first : self._ends[i]])
+                first = self._ends[i]
+        data = EncodedMessages(b"[" + b",".join(parts) + b"]")
+        # release the views so that the arena can grow again
+        parts.clear()
+        if start < end:
+            arena.release()
+        return data
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the log in bytes."""
+        return (
+            sys.getsizeof(self._arena)
+            + sys.getsizeof(self._ends)
+            + sys.getsizeof(self._role_codes)
+        )
+
+    def to_bytes(self, start: int = 0) -> bytes:
+        """Serialize to the binary checkpoint format.
+
+        The format is a header (magic, version, number of messages, arena
+        size), the role table, the role codes, the message end offsets and
+        the arena.
+
+        Args:
+            start: index of the first message to serialize, serializing only
+                the messages appended since an earlier call gives a delta
+                that can be added to the earlier log with `extend_log`
+
+        Returns:
+            The serialized log.
+        """
+        first = self._ends[start - 1] if 0 < start <= len(self) else 0
+        ends = array("Q", (end - first for end in self._ends[start:]))
+        if sys.byteorder != "little":
+            ends.byteswap()
+        roles = b"".join(
+            bytes([len(r.encode("utf-8"))]) + r.encode("utf-8") for r in self._roles
+        )
+        return b"".join(
+            [
+                _HEADER.pack(_MAGIC, _VERSION, len(ends), len(self._arena) - first),
+                bytes([len(self._roles)]),
+                roles,
+                self._role_codes[start:].tobytes(),
+                ends.tobytes(),
+                memoryview(self._arena)[first:],
+            ]
+        )
+
+    def extend_log(self, other: "MessageLog") -> None:
+        """Append all messages of another log without decoding them.
+
+        Args:
+            other: the other log
+        """
+        offset = len(self._arena)
+        codes = [self._role_code(role) for role in other._roles]
+        self._arena += other._arena
+        self._ends.extend(end + offset for end in other._ends)
+        self._role_codes.extend(codes[code] for code in other._role_codes)
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview]) -> "MessageLog":
+        """Deserialize from the binary checkpoint format.
+
+        Args:
+            data: the serialized log
+
+        Returns:
+            The log.
+
+        Raises:
+            ValueError: if `data` is not a serialized log
+        """
+        view = memoryview(data)
+        if len(view) < _HEADER.size:
+            raise ValueError("Not a serialized MessageLog")
+        magic, version, count, arena_size = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a serialized MessageLog")
+        pos = _HEADER.size
+        log = cls()
+        num_roles = view[pos]
+        pos += 1
+        for _ in range(num_roles):
+            n = view[pos]
+            log._role_code(bytes(view[pos + 1 : pos + 1 + n]).decode("utf-8"))
+            pos += 1 + n
+        log._role_codes.frombytes(view[pos : pos + count])
+        pos += count
+        log._ends.frombytes(view[pos : pos + 8 * count])
+        if sys.byteorder != "little":
+            log._ends.byteswap()
+        pos += 8 * count
+        log._arena += view[pos : pos + arena_size]
+        if len(log._arena) != arena_size:
+            raise ValueError("Truncated MessageLog")
+        return log
@@ -0,0 +1,165 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .messages import EncodedMessages, encode_message
+
+__all__ = ["PrefixCache", "PrefixStats", "PromptPrefix", "canonical_tools"]
+
+
+def _sort_keys(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _sort_keys(value[k]) for k in sorted(value)}
+    if isinstance(value, list):
+        return [_sort_keys(v) for v in value]
+    return value
+
+
+def _tool_name(tool: Dict[str, Any]) -> str:
+    return str(tool.get("function", tool).get("name", ""))
+
+
+def canonical_tools(tools: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Tool schemas in a stable order, sorted by name and with sorted keys.
+
+    Tools registered in a different order, or schemas generated with their
+    keys in a different order, then give the same prompt.
+
+    Args:
+        tools: the tool or function schemas
+
+    Returns:
+        The canonical schemas.
+    """
+    return [_sort_keys(tool) for tool in sorted(tools, key=_tool_name)]
+
+
+@dataclass
+class PrefixStats:
+    """Counters of a `PrefixCache`.
+
+    Attributes:
+        requests: requests encoded
+        reused_bytes: bytes of messages reused from earlier requests
+        encoded_bytes: bytes of messages encoded for the first time
+        prompt_tokens: prompt tokens of the responses
+        cached_tokens: prompt tokens the provider read from its prefix cache,
+            as reported in `usage.prompt_tokens_details.cached_tokens`
+    """
+
+    requests: int = 0
+    reused_bytes: int = 0
+    encoded_bytes: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """Fraction of the prompt tokens served from the provider's prefix cache."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    @property
+    def reuse_ratio(self) -> float:
+        """Fraction of the message bytes of requests that were not encoded again."""
+        total = self.reused_bytes + self.encoded_bytes
+        return self.reused_bytes / total if total else 0.0
+
+
+class PromptPrefix:
+    """System messages of an agent, frozen and encoded once."""
+
+    def __init__(self, messages: Sequence[Dict[str, Any]]) -> None:
+        """Create a new prefix.
+
+        Args:
+            messages: the system messages, copied
+        """
+        self.messages = [dict(message) for message in messages]
+        self.encoded = b",".join(encode_message(message) for message in self.messages)
+
+    def matches(self, messages: Sequence[Dict[str, Any]]) -> bool:
+        """Whether the prefix is still the one of `messages`."""
+        return len(messages) == len(self.messages) and all(
+            a == b for a, b in zip(messages, self.messages)
+        )
+
+
+class PrefixCache:
+    """Memoized, canonical encoding of the messages of model requests.
+
+    Providers and inference servers reuse the KV cache of a prompt prefix
+    only if it is serialized identically every time. Requests encoded by a
+    prefix cache start with the system messages of the agent, frozen in a
+    `PromptPrefix`, followed by the conversation. Every message is encoded
+    the same way, as compact JSON with its fields in a fixed order and
+    without `None` fields. The encoding of a message is memoized the first
+    time it is sent, so a turn of a long conversation only encodes its new
+    messages and reuses the bytes of the rest.
+
+    Messages are memoized by identity, the least recently used are evicted
+    first. As for `History`, messages must not be modified once sent.
+    """
+
+    def __init__(self, *, max_entries: int = 10_000) -> None:
+        """Create a new cache.
+
+        Args:
+            max_entries: maximum number of memoized messages
+        """
+        self.max_entries = max_entries
+        self.stats = PrefixStats()
+        self._encoded: Dict[int, Tuple[Dict[str, Any], bytes]] = {}
+
+    def encode(
+        self, prefix: PromptPrefix, messages: Sequence[Dict[str, Any]]
+    ) -> EncodedMessages:
+        """Encode the messages of a request.
+
+        Args:
+            prefix: the system messages
+            messages: the conversation
+
+        Returns:
+            The JSON array of the system messages and the conversation.
+        """
+        parts = [prefix.encoded] if prefix.encoded else []
+        reused = len(prefix.encoded)
+        encoded = 0
+        cache = self._encoded
+        for message in messages:
+            key = id(message)
+            entry = cache.pop(key, None)
+            # the message of a memoized id may have been freed and the id reused
+            if entry is None or entry[0] is not message:
+                entry = (message, encode_message(message))
+                encoded += len(entry[1])
+            else:
+                reused += len(entry[1])
+            cache[key] = entry
+            parts.append(entry[1])
+        excess = len(cache) - self.max_entries
+        if excess > 0:
+            # dicts keep insertion order, the least recently used come first
+            for key in list(cache)[:excess]:
+                del cache[key]
+        self.stats.requests += 1
+        self.stats.reused_bytes += reused
+        self.stats.encoded_bytes += encoded
+        return EncodedMessages(b"[" + b",".join(parts) + b"]")
+
+    def record(self, usage: Optional[Dict[str, Any]]) -> None:
+        """Count the prompt tokens of a response, and those read from cache.
+
+        Args:
+            usage: the `usage` of the response
+        """
+        if usage:
+            self.stats.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            details = usage.get("prompt_tokens_details") or {}
+            self.stats.cached_tokens += int(details.get("cached_tokens") or 0)
+
+    def clear(self) -> None:
+        """Forget all memoized messages."""
+        self._encoded.clear()
+
+    def __len__(self) -> int:
+        return len(self._encoded)
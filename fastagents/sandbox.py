@@ -0,0 +1,552 @@
+import asyncio
+import builtins
+import functools
+import math
+import multiprocessing
+import os
+import queue
+import resource
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from importlib import import_module
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+    from multiprocessing.process import BaseProcess
+
+__all__ = [
+    "ExecutionResult",
+    "Output",
+    "ResourceLimits",
+    "SandboxPool",
+    "SandboxStats",
+]
+
+# exit code of runs that timed out, as the `timeout` command uses
+TIMEOUT_EXIT_CODE = 124
+
+
+@dataclass
+class ResourceLimits:
+    """Resource limits of the worker processes of a `SandboxPool`.
+
+    Attributes:
+        cpu_seconds: CPU time of a single run, the run fails once it is used
+            up, rounded up to whole seconds of CPU time of the worker
+        memory_bytes: maximum size of the address space of a worker process,
+            allocations beyond it raise `MemoryError`
+        max_open_files: maximum number of open files of a worker process
+        max_output: maximum number of characters of the output of a run, the
+            rest is dropped
+    """
+
+    cpu_seconds: Optional[float] = None
+    memory_bytes: Optional[int] = None
+    max_open_files: Optional[int] = None
+    max_output: Optional[int] = 1_000_000
+
+
+@dataclass
+class Output:
+    """Text written by a run to its standard output or error.
+
+    Attributes:
+        stream: `"stdout"` or `"stderr"`
+        text: the text
+    """
+
+    stream: str
+    text: str
+
+
+@dataclass
+class ExecutionResult:
+    """Result of running code in a `SandboxPool`.
+
+    Attributes:
+        exit_code: 0 on success, the code passed to `sys.exit`, 1 if the code
+            raised an exception or exceeded a limit, 124 if it timed out
+        outputs: everything the code wrote, in order
+        seconds: wall time of the run
+        timed_out: whether the run was stopped by its timeout
+    """
+
+    exit_code: int
+    outputs: List[Output] = field(default_factory=list)
+    seconds: float = 0.0
+    timed_out: bool = False
+
+    @property
+    def output(self) -> str:
+        """Standard output and error, interleaved as written."""
+        return "".join(o.text for o in self.outputs)
+
+    @property
+    def stdout(self) -> str:
+        return "".join(o.text for o in self.outputs if o.stream == "stdout")
+
+    @property
+    def stderr(self) -> str:
+        return "".join(o.text for o in self.outputs if o.stream == "stderr")
+
+
+@dataclass
+class SandboxStats:
+    """Counters of a `SandboxPool`.
+
+    Attributes:
+        runs: runs completed, including failed ones
+        timeouts: runs stopped by their timeout
+        workers_started: worker processes started, replacements included
+        warm_runs: runs that found a ready worker and did not wait for one
+            to start
+    """
+
+    runs: int = 0
+    timeouts: int = 0
+    workers_started: int = 0
+    warm_runs: int = 0
+
+
+class _CpuLimitExceeded(BaseException):
+    # not an Exception, so that the code cannot swallow it
+    pass
+
+
+def _on_cpu_limit(signum: int, frame: Any) -> None:
+    raise _CpuLimitExceeded()
+
+
+class _Channel:
+    """Sends what a run writes to stdout and stderr to the parent.
+
+    Text is sent line by line, or once 8 KiB are buffered, so that the
+    parent can stream it while the code runs, and in the order it was
+    written across both streams.
+    """
+
+    def __init__(self, conn: "Connection", max_output: Optional[int]) -> None:
+        self.conn = conn
+        # characters that can still be written
+        self.budget = sys.maxsize if max_output is None else max_output
+        self.truncated = False
+        self.stream = "stdout"
+        self.buffer: List[str] = []
+        self.size = 0
+
+    def write(self, stream: str, text: str) -> None:
+        if self.budget < len(text):
+            text = text[: self.budget]
+            self.truncated = True
+        self.budget -= len(text)
+        if not text:
+            return
+        if stream != self.stream:
+            self.flush()
+            self.stream = stream
+        self.buffer.append(text)
+        self.size += len(text)
+        if "\n" in text or self.size >= 8192:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.conn.send(("out", self.stream, "".join(self.buffer)))
+            self.buffer = []
+            self.size = 0
+
+
+class _Writer:
+    """Stand-in for `sys.stdout` and `sys.stderr` writing to a `_Channel`."""
+
+    def __init__(self, channel: _Channel, stream: str) -> None:
+        self.channel = channel
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        self.channel.write(self.stream, text)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+    @property
+    def encoding(self) -> str:
+        return "utf-8"
+
+
+def _set_limit(limit: int, value: Optional[int]) -> None:
+    if value is not None:
+        _, hard = resource.getrlimit(limit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(limit, (value, hard))
+
+
+def _execute(conn: "Connection", code: str, limits: ResourceLimits) -> Tuple[int, bool]:
+    """Run code in a fresh namespace, returning its exit code and whether the
+    worker must be replaced."""
+    channel = _Channel(conn, limits.max_output)
+    stderr = _Writer(channel, "stderr")
+    sys.stdout, sys.stderr = _Writer(channel, "stdout"), stderr  # type: ignore[assignment]
+    if limits.cpu_seconds is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = usage.ru_utime + usage.ru_stime
+        _set_limit(resource.RLIMIT_CPU, math.ceil(used + limits.cpu_seconds))
+    exit_code, recycle = 0, False
+    try:
+        exec(  # nosec: B102
+            compile(code, "<sandbox>", "exec"),
+            {"__name__": "__main__", "__builtins__": builtins},
+        )
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            exit_code = e.code
+        elif e.code is not None:
+            stderr.write(f"{e.code}\n")
+            exit_code = 1
+    except _CpuLimitExceeded:
+        stderr.write("CPU time limit exceeded\n")
+        exit_code, recycle = 1, True
+    except BaseException as e:
+        # the traceback without the frame of this function
+        frames = traceback.format_tb(e.__traceback__)[1:]
+        if frames:
+            stderr.write("Traceback (most recent call last):\n" + "".join(frames))
+        stderr.write("".join(traceback.format_exception_only(type(e), e)))
+        exit_code, recycle = 1, isinstance(e, MemoryError)
+    finally:
+        if limits.cpu_seconds is not None:
+            _set_limit(resource.RLIMIT_CPU, resource.RLIM_INFINITY)
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    if channel.truncated:
+        channel.budget = sys.maxsize
+        stderr.write("\n[output truncated]\n")
+    channel.flush()
+    return exit_code, recycle
+
+
+def _worker_main(
+    conn: "Connection",
+    preload: Sequence[str],
+    limits: ResourceLimits,
+    work_dir: str,
+) -> None:
+    # the pool decides when to stop, runs are never interrupted by a Ctrl-C
+    # sent to the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    _set_limit(resource.RLIMIT_AS, limits.memory_bytes)
+    _set_limit(resource.RLIMIT_NOFILE, limits.max_open_files)
+    for name in preload:
+        import_module(name)
+    os.chdir(work_dir)
+    environ, path, argv = dict(os.environ), list(sys.path), list(sys.argv)
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message[0] == "stop":
+            return
+        exit_code, recycle = _execute(conn, message[1], limits)
+        # reset what the code may have changed for the next run
+        os.chdir(work_dir)
+        os.environ.clear()
+        os.environ.update(environ)
+        sys.path[:] = path
+        sys.argv[:] = argv
+        conn.send(("done", exit_code, recycle))
+
+
+class _Worker:
+    def __init__(self, ctx: Any, args: Tuple[Any, ...], name: str) -> None:
+        self.conn, child = ctx.Pipe()
+        self.process: "BaseProcess" = ctx.Process(
+            target=_worker_main, args=(child, *args), name=name, daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.ready = False
+        self.uses = 0
+
+    def wait_ready(self) -> None:
+        if not self.ready:
+            message = self.conn.recv()
+            if message[0] != "ready":
+                raise RuntimeError(f"Unexpected message from worker: {message!r}")
+            self.ready = True
+
+    def stop(self) -> None:
+        if self.process.is_alive():
+            try:
+                self.conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(1)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """Runs Python code on a pool of pre-warmed worker processes.
+
+    Starting a Python process and importing libraries often takes longer
+    than running the short snippets written by agents. Workers are started
+    ahead of time, import the `preload` modules once, and run one snippet
+    after the other, each in a fresh namespace. Between runs the working
+    directory, environment variables, `sys.path` and `sys.argv` of the worker
+    are reset. A worker is replaced by a new one, started in the background,
+    after `max_uses` runs, when a run times out or exceeds a limit.
+
+    Workers are ordinary processes of the current user: resource limits keep
+    runaway code in check but this is not a security boundary, untrusted
+    code must still run in a container.
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        *,
+        timeout: Optional[float] = 60.0,
+        limits: Optional[ResourceLimits] = None,
+        preload: Sequence[str] = (),
+        work_dir: Optional[str] = None,
+        max_uses: int = 100,
+        mp_context: Optional[str] = None,
+    ) -> None:
+        """Create a new pool.
+
+        Args:
+            size: number of worker processes, defaults to the number of CPUs
+            timeout: default wall time of a run in seconds, `None` for no limit
+            limits: resource limits of the workers
+            preload: modules imported by every worker when it starts
+            work_dir: working directory of the runs, a temporary directory
+                removed by `close` if not given
+            max_uses: number of runs after which a worker is replaced
+            mp_context: multiprocessing start method, defaults to the one of
+                the platform
+        """
+        self.size = size or os.cpu_count() or 1
+        self.timeout = timeout
+        self.limits = limits or ResourceLimits()
+        self.preload = tuple(preload)
+        self.work_dir = work_dir
+        self.max_uses = max_uses
+        self._ctx: Any = multiprocessing.get_context(mp_context)
+        # `None` tells the runs waiting for a worker that the pool was closed
+        self._idle: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._temp_dir: Optional[str] = None
+        self._stats = SandboxStats()
+
+    @property
+    def stats(self) -> SandboxStats:
+        return self._stats
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        """Start the worker processes, without waiting for them to be ready."""
+        with self._lock:
+            if self._workers:
+                raise RuntimeError("SandboxPool is already started")
+            self._start_workers()
+
+    def _start_workers(self) -> None:
+        if self.work_dir is None:
+            self._temp_dir = tempfile.mkdtemp(prefix="fastagents-sandbox-")
+        for _ in range(self.size):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self) -> _Worker:
+        work_dir = self.work_dir or self._temp_dir
+        assert work_dir is not None  # nosec: B101
+        worker = _Worker(
+            self._ctx,
+            (self.preload, self.limits, work_dir),
+            f"fastagents-sandbox-{self._stats.workers_started}",
+        )
+        self._workers.append(worker)
+        self._stats.workers_started += 1
+        return worker
+
+    def _release(self, worker: _Worker, replace: bool) -> None:
+        if replace:
+            worker.kill()
+        with self._lock:
+            if worker not in self._workers:
+                # the pool was closed while the worker was running
+                worker.stop()
+            elif replace:
+                self._workers.remove(worker)
+                self._idle.put(self._start_worker())
+            else:
+                self._idle.put(worker)
+
+    def run(
+        self,
+        code: str,
+        *,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[Output], Any]] = None,
+    ) -> ExecutionResult:
+        """Run code on the next free worker, blocking until it is done.
+
+        The pool is started on first use.
+
+        Args:
+            code: the Python code
+            timeout: wall time of the run in seconds, defaults to the timeout
+                of the pool
+            on_output: function called with the output of the code as it
+                is written
+
+        Returns:
+            The result of the run.
+
+        Raises:
+            RuntimeError: if the pool is closed while waiting for a worker
+        """
+        with self._lock:
+            if not self._workers:
+                self._start_workers()
+        timeout = self.timeout if timeout is None else timeout
+        idle = self._idle
+        worker = idle.get()
+        if worker is None:
+            # wake up the next waiting run
+            idle.put(None)
+            raise RuntimeError("SandboxPool was closed")
+        if worker.ready or worker.conn.poll():
+            self._stats.warm_runs += 1
+        try:
+            worker.wait_ready()
+        except (EOFError, OSError):
+            self._release(worker, replace=True)
+            raise RuntimeError("Sandbox worker failed to start") from None
+
+        t0 = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        result = ExecutionResult(exit_code=1)
+        recycle = True
+        worker.uses += 1
+        worker.conn.send(("run", code))
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and (
+                    remaining <= 0 or not worker.conn.poll(remaining)
+                ):
+                    result.exit_code, result.timed_out = TIMEOUT_EXIT_CODE, True
+                    self._stats.timeouts += 1
+                    break
+                message = worker.conn.recv()
+                if message[0] == "out":
+                    output = Output(message[1], message[2])
+                    result.outputs.append(output)
+                    if on_output is not None:
+                        on_output(output)
+                else:
+                    _, result.exit_code, recycle = message
+                    break
+        except (EOFError, OSError):
+            worker.process.join()
+            result.outputs.append(
+                Output("stderr", f"Worker died, exit code {worker.process.exitcode}\n")
+            )
+        result.seconds = time.perf_counter() - t0
+        self._stats.runs += 1
+
+        self._release(worker, replace=recycle or worker.uses >= self.max_uses)
+        return result
+
+    async def arun(
+        self,
+        code: str,
+        *,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[Output], Any]] = None,
+    ) -> ExecutionResult:
+        """Run code on the next free worker without blocking the event loop.
+
+        Args:
+            code: the Python code
+            timeout: wall time of the run in seconds, defaults to the timeout
+                of the pool
+            on_output: function called on the event loop with the output of
+                the code as it is written
+
+        Returns:
+            The result of the run.
+        """
+        loop = asyncio.get_running_loop()
+
+        def callback(output: Output) -> None:
+            if on_output is not None:
+                loop.call_soon_threadsafe(on_output, output)
+
+        return await loop.run_in_executor(
+            None, functools.partial(self.run, code, timeout=timeout, on_output=callback)
+        )
+
+    def restart(self) -> None:
+        """Replace all idle workers by new ones."""
+        idle: List[_Worker] = []
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                idle.append(worker)
+        for worker in idle:
+            self._release(worker, replace=True)
+
+    def close(self) -> None:
+        """Stop all workers, running code is given a second to finish."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+        idle, self._idle = self._idle, queue.Queue()
+        idle.put(None)
+        if self._temp_dir is not None:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
+
+    def __enter__(self) -> "SandboxPool":
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
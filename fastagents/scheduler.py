@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+    runtime_checkable,
+)
+
+from .client import ModelClient, encode_params
+from .tracing import current_span
+
+__all__ = [
+    "RateLimit",
+    "RequestScheduler",
+    "SchedulerStats",
+    "SupportsBatch",
+    "TokenBucket",
+    "estimate_tokens",
+]
+
+
+def estimate_tokens(params: Dict[str, Any]) -> int:
+    """Roughly estimate the number of tokens used by a request.
+
+    Counts four characters of message content per token plus the maximum
+    number of completion tokens, if set.
+
+    Args:
+        params: the request parameters
+
+    Returns:
+        The estimated number of tokens.
+    """
+    messages = params.get("messages", [])
+    if isinstance(messages, bytes):
+        chars = len(messages)
+    else:
+        chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return chars // 4 + 1 + int(params.get("max_tokens") or 0)
+
+
+class TokenBucket:
+    """Token bucket rate limiter for coroutines.
+
+    Waiters are served in FIFO order, so a large request is not starved by a
+    stream of small ones.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        """Create a new bucket, initially full.
+
+        Args:
+            rate: tokens added per second
+            capacity: maximum number of tokens, defaults to `rate`
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def tokens(self) -> float:
+        """Number of tokens currently available."""
+        self._refill()
+        return self._tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        """Take tokens if they are available right now.
+
+        Args:
+            amount: number of tokens
+
+        Returns:
+            `True` if the tokens were taken.
+        """
+        self._refill()
+        if self._tokens < amount or (self._lock is not None and self._lock.locked()):
+            return False
+        self._tokens -= amount
+        return True
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until tokens are available and take them.
+
+        Args:
+            amount: number of tokens, capped at the capacity of the bucket
+        """
+        amount = min(amount, self.capacity)
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+
+@dataclass
+class RateLimit:
+    """Rate limits of a model, `None` for no limit.
+
+    Attributes:
+        requests_per_minute: maximum number of requests per minute
+        tokens_per_minute: maximum number of tokens per minute, estimated
+            with `estimate_tokens`
+    """
+
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+
+
+@dataclass
+class SchedulerStats:
+    """Counters of a `RequestScheduler`.
+
+    Attributes:
+        submitted: requests submitted
+        coalesced: requests answered by an identical request already in flight
+        sent: requests sent to the model
+        batches: calls made to the model, one per batch
+        queue_depth: requests waiting for a rate limit or a batch
+        max_queue_depth: maximum of `queue_depth`
+        total_wait: seconds spent waiting by all sent requests
+    """
+
+    submitted: int = 0
+    coalesced: int = 0
+    sent: int = 0
+    batches: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    total_wait: float = 0.0
+
+    @property
+    def batching_ratio(self) -> float:
+        """Average number of requests per model call."""
+        return self.sent / self.batches if self.batches else 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """Average seconds a request waited before being sent."""
+        return self.total_wait / self.sent if self.sent else 0.0
+
+
+@runtime_checkable
+class SupportsBatch(Protocol):
+    """Model client able to answer many requests in one call."""
+
+    async def create_batch(
+        self, params: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:  # pragma: no cover
+        ...
+
+
+# parameters, future of the response and submission time of batched requests
+_Batch = List[Tuple[Dict[str, Any], "asyncio.Future[Dict[str, Any]]", float]]
+
+
+class RequestScheduler:
+    """Coordinates model requests of many agents.
+
+    - byte-identical requests in flight at the same time are sent only once,
+    - requests wait for the rate limits of their model,
+    - requests to the same model of a client implementing `SupportsBatch`
+      are collected for up to `batch_window` seconds and sent together.
+    """
+
+    def __init__(
+        self,
+        *,
+        limits: Optional[Dict[str, RateLimit]] = None,
+        default_limit: Optional[RateLimit] = None,
+        max_batch_size: int = 1,
+        batch_window: float = 0.005,
+    ) -> None:
+        """Create a new scheduler.
+
+        Args:
+            limits: rate limits by model name
+            default_limit: rate limit of models not in `limits`
+            max_batch_size: maximum number of requests sent in one call,
+                1 disables batching
+            batch_window: seconds to wait for more requests to batch
+        """
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.stats = SchedulerStats()
+        self._buckets: Dict[
+            str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]
+        ] = {}
+        self._in_flight: Dict[Tuple[str, bytes], "asyncio.Future[Dict[str, Any]]"] = {}
+        self._batches: Dict[Tuple[int, Any], _Batch] = {}
+        self._timers: Dict[Tuple[int, Any], asyncio.TimerHandle] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    def _get_buckets(
+        self, model: str
+    ) -> Tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        if model not in self._buckets:
+            limit = self.limits.get(model, self.default_limit) or RateLimit()
+            # requests are spread evenly over the minute, while a single
+            # request may use up to the whole token budget of a minute
+            rpm, tpm = limit.requests_per_minute, limit.tokens_per_minute
+            self._buckets[model] = (
+                TokenBucket(rpm / 60, capacity=max(1.0, rpm / 60)) if rpm else None,
+                TokenBucket(tpm / 60, capacity=tpm) if tpm else None,
+            )
+        return self._buckets[model]
+
+    async def acquire(self, params: Dict[str, Any]) -> None:
+        """Wait for the rate limits of the model of a request.
+
+        Args:
+            params: the request parameters
+        """
+        requests, tokens = self._get_buckets(str(params.get("model")))
+        t0 = time.monotonic()
+        self.stats.queue_depth += 1
+        self.stats.max_queue_depth = max(
+            self.stats.max_queue_depth, self.stats.queue_depth
+        )
+        try:
+            if requests is not None:
+                await requests.acquire()
+            if tokens is not None:
+                await tokens.acquire(estimate_tokens(params))
+        finally:
+            self.stats.queue_depth -= 1
+        parent = current_span()
+        if parent is not None:
+            parent.set("queue_wait", time.monotonic() - t0)
+
+    async def submit(
+        self, client: ModelClient, params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Send a chat completion request.
+
+        The returned response may be shared with other callers and must not
+        be modified.
+
+        Args:
+            client: client used to send the request
+            params: the request parameters
+
+        Returns:
+            The response.
+        """
+        self.stats.submitted += 1
+        # every parameter counts, not only those of the response cache key
+        key = (client.base_url, hashlib.sha256(encode_params(params)).digest())
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats.coalesced += 1
+        else:
+            future = asyncio.ensure_future(self._send(client, params))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # a cancelled caller must not cancel the request of the others
+        return await asyncio.shield(future)
+
+    async def _send(
+        self, client: ModelClient, params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        t0 = time.monotonic()
+        await self.acquire(params)
+        if self.max_batch_size > 1 and isinstance(client, SupportsBatch):
+            return await self._enqueue(client, params, t0)
+        self.stats.total_wait += time.monotonic() - t0
+        self.stats.sent += 1
+        self.stats.batches += 1
+        return await client.create(params)
+
+    async def _enqueue(
+        self, client: SupportsBatch, params: Dict[str, Any], t0: float
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[Dict[str, Any]]" = loop.create_future()
+        key = (id(client), params.get("model"))
+        batch = self._batches.setdefault(key, [])
+        batch.append((params, future, t0))
+        self.stats.queue_depth += 1
+        self.stats.max_queue_depth = max(
+            self.stats.max_queue_depth, self.stats.queue_depth
+        )
+        if len(batch) >= self.max_batch_size:
+            self._flush(client, key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(
+                self.batch_window, self._flush, client, key
+            )
+        return await future
+
+    def _flush(self, client: SupportsBatch, key: Tuple[int, Any]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._batches.pop(key, [])
+        if batch:
+            self.stats.queue_depth -= len(batch)
+            task = asyncio.ensure_future(self._send_batch(client, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send_batch(self, client: SupportsBatch, batch: _Batch) -> None:
+        now = time.monotonic()
+        self.stats.total_wait += sum(now - t0 for _, _, t0 in batch)
+        self.stats.sent += len(batch)
+        self.stats.batches += 1
+        try:
+            responses = await client.create_batch([params for params, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+        if len(responses) < len(batch):
+            error = RuntimeError(
+                f"Expected {len(batch)} responses to a batch, got {len(responses)}"
+            )
+            for _, future, _ in batch[len(responses) :]:
+                if not future.done():
+                    future.set_exception(error)
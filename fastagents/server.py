@@ -0,0 +1,822 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .history import History
+
+if TYPE_CHECKING:
+    from .agent import Agent, Reply
+    from .streaming import Delta
+
+__all__ = ["AgentServer", "ServerStats", "Session"]
+
+# appended to the key of a WebSocket handshake, see RFC 6455
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+_OP_CONTINUATION = 0x0
+_OP_TEXT = 0x1
+_OP_BINARY = 0x2
+_OP_CLOSE = 0x8
+_OP_PING = 0x9
+_OP_PONG = 0xA
+
+# WebSocket close codes
+_CLOSE_NORMAL = 1000
+_CLOSE_PROTOCOL_ERROR = 1002
+_CLOSE_TOO_BIG = 1009
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        self.status = status
+        super().__init__(message)
+
+
+class _WebSocketClosed(Exception):
+    pass
+
+
+@dataclass
+class _Request:
+    method: str
+    path: str
+    version: str
+    headers: Dict[str, str]
+    body: bytes
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.body) if self.body else {}
+        except ValueError as e:
+            raise _HTTPError(400, f"Invalid JSON body: {e}") from e
+        if not isinstance(data, dict):
+            raise _HTTPError(400, "Expected a JSON object")
+        return data
+
+
+@dataclass
+class ServerStats:
+    """Counters of an `AgentServer`.
+
+    Attributes:
+        connections: connections accepted
+        requests: HTTP requests received, including WebSocket handshakes
+        errors: requests and WebSocket turns that failed on the server side
+        turns: turns of sessions completed
+        turn_seconds: seconds spent generating the replies of all turns
+        websockets: WebSocket connections accepted
+        sessions_created: sessions created
+        sessions_closed: sessions deleted by their client
+        sessions_evicted: sessions evicted because they were idle or to make
+            room for new ones
+    """
+
+    connections: int = 0
+    requests: int = 0
+    errors: int = 0
+    turns: int = 0
+    turn_seconds: float = 0.0
+    websockets: int = 0
+    sessions_created: int = 0
+    sessions_closed: int = 0
+    sessions_evicted: int = 0
+
+
+@dataclass
+class Session:
+    """Conversation of a client with an agent of an `AgentServer`.
+
+    Attributes:
+        id: id of the session
+        agent: name of the agent
+        history: messages of the conversation
+        last_used: `time.monotonic` of the end of the last turn
+    """
+
+    id: str
+    agent: str
+    history: History
+    last_used: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    @property
+    def busy(self) -> bool:
+        """Whether a turn of the session is running."""
+        return self.lock.locked()
+
+
+def _to_message(data: Dict[str, Any]) -> Dict[str, Any]:
+    message = data.get("message")
+    if message is None and "content" in data:
+        return {"role": "user", "content": data["content"]}
+    if isinstance(message, dict) and "content" in message:
+        return {"role": "user", **message}
+    raise _HTTPError(400, "Expected a content or a message with a content")
+
+
+def _reply_message(reply: "Reply") -> Optional[Dict[str, Any]]:
+    if reply is None:
+        return None
+    if isinstance(reply, str):
+        return {"role": "assistant", "content": reply}
+    return {"role": "assistant", **reply}
+
+
+def _delta_event(delta: "Delta") -> Dict[str, Any]:
+    event: Dict[str, Any] = {"content": delta.content}
+    if delta.tool_calls:
+        event["tool_calls"] = delta.tool_calls
+    if delta.finish_reason is not None:
+        event["finish_reason"] = delta.finish_reason
+    return event
+
+
+def _encode_frame(opcode: int, payload: bytes) -> bytes:
+    n = len(payload)
+    if n < 126:
+        head = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return head + payload
+
+
+def _unmask(payload: bytes, mask: bytes) -> bytes:
+    n = len(payload)
+    # XOR all bytes at once as one big integer instead of byte by byte
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(
+        n, "big"
+    )
+
+
+class _WebSocket:
+    """Server side of a WebSocket connection, text messages only."""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        max_size: int,
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.max_size = max_size
+        self.closed = False
+
+    async def _read_frame(self) -> Tuple[bool, int, bytes]:
+        b0, b1 = await self.reader.readexactly(2)
+        n = b1 & 0x7F
+        if n == 126:
+            (n,) = struct.unpack("!H", await self.reader.readexactly(2))
+        elif n == 127:
+            (n,) = struct.unpack("!Q", await self.reader.readexactly(8))
+        if n > self.max_size:
+            await self.close(_CLOSE_TOO_BIG)
+            raise _WebSocketClosed()
+        if not b1 & 0x80:
+            # clients must mask their frames
+            await self.close(_CLOSE_PROTOCOL_ERROR)
+            raise _WebSocketClosed()
+        mask = await self.reader.readexactly(4)
+        payload = _unmask(await self.reader.readexactly(n), mask) if n else b""
+        return bool(b0 & 0x80), b0 & 0x0F, payload
+
+    async def receive(self) -> str:
+        """Receive the next text message, answering pings on the way.
+
+        Raises:
+            _WebSocketClosed: if the client closed the connection
+        """
+        parts: List[bytes] = []
+        size = 0
+        while True:
+            fin, opcode, payload = await self._read_frame()
+            if opcode == _OP_CLOSE:
+                await self.close(_CLOSE_NORMAL)
+                raise _WebSocketClosed()
+            if opcode == _OP_PING:
+                await self._send(_OP_PONG, payload)
+                continue
+            if opcode == _OP_PONG:
+                continue
+            if opcode not in (_OP_TEXT, _OP_BINARY, _OP_CONTINUATION):
+                await self.close(_CLOSE_PROTOCOL_ERROR)
+                raise _WebSocketClosed()
+            size += len(payload)
+            if size > self.max_size:
+                await self.close(_CLOSE_TOO_BIG)
+                raise _WebSocketClosed()
+            parts.append(payload)
+            if fin:
+                return b"".join(parts).decode("utf-8")
+
+    async def _send(self, opcode: int, payload: bytes) -> None:
+        if self.closed:
+            raise _WebSocketClosed()
+        self.writer.write(_encode_frame(opcode, payload))
+        await self.writer.drain()
+
+    async def send_json(self, data: Any) -> None:
+        await self._send(_OP_TEXT, json.dumps(data).encode())
+
+    async def close(self, code: int) -> None:
+        if not self.closed:
+            try:
+                await self._send(_OP_CLOSE, struct.pack("!H", code))
+            except ConnectionError:
+                pass
+            self.closed = True
+
+
+Route = Callable[[_Request, List[str]], Awaitable[Tuple[int, Any]]]
+
+
+class AgentServer:
+    """Asyncio HTTP and WebSocket server hosting agents.
+
+    All connections are served by coroutines of one event loop, so a turn
+    waiting for the model holds no thread, and the agents share the
+    keep-alive connections of their `ModelClient`. Clients create a session
+    with an agent, then send the messages of the conversation one at a
+    time; the server keeps the history of every session and passes it to
+    the agent, turns of a session run one after the other. Sessions idle
+    for longer than `idle_timeout` are evicted.
+
+    Endpoints, bodies and replies are JSON:
+
+    - `GET /health`: status of the server
+    - `GET /metrics`: counters in the Prometheus text format
+    - `GET /agents`: names of the agents
+    - `POST /sessions`: create a session, `{"agent": name}`, the name may be
+      omitted if there is a single agent
+    - `GET /sessions/<id>`: messages of a session
+    - `DELETE /sessions/<id>`: delete a session
+    - `POST /sessions/<id>/messages`: run a turn, `{"content": text}` or
+      `{"message": message}`; with `"stream": true` the reply is streamed
+      as server-sent events, one per delta, followed by the reply
+    - `GET /sessions/<id>/ws`: WebSocket running a turn for every message
+      sent, as for `POST /sessions/<id>/messages`, and sending a
+      `{"type": "delta"}` message for every delta of the reply, unless
+      `"stream": false`, and then a `{"type": "reply"}` message
+
+    Use as an async context manager, the server listens on `url` inside it.
+    """
+
+    def __init__(
+        self,
+        agents: Mapping[str, "Agent"],
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        idle_timeout: float = 600.0,
+        max_sessions: int = 10_000,
+        turn_timeout: Optional[float] = None,
+        max_body: int = 1_000_000,
+    ) -> None:
+        """Create a new server.
+
+        Args:
+            agents: the agents by name, an agent serves all its sessions
+                concurrently
+            host: address to listen on
+            port: port to listen on, 0 for a free port
+            idle_timeout: seconds after which a session without turns is evicted
+            max_sessions: maximum number of sessions, the least recently used
+                idle session is evicted to make room for a new one
+            turn_timeout: timeout of a turn in seconds, defaults to the
+                timeout of the agent
+            max_body: maximum size in bytes of a request body or a WebSocket
+                message
+        """
+        if not agents:
+            raise ValueError("No agents to serve")
+        self.agents = dict(agents)
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.turn_timeout = turn_timeout
+        self.max_body = max_body
+        self.stats = ServerStats()
+        # ordered from the least to the most recently used
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.started = time.monotonic()
+        self._server: Optional[asyncio.Server] = None
+        self._sweeper: Optional[asyncio.TimerHandle] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._routes: List[Tuple[str, Tuple[str, ...], Route]] = [
+            ("GET", ("health",), self._health),
+            ("GET", ("metrics",), self._metrics),
+            ("GET", ("agents",), self._list_agents),
+            ("POST", ("sessions",), self._create_session),
+            ("GET", ("sessions", "*"), self._get_session),
+            ("DELETE", ("sessions", "*"), self._delete_session),
+            ("POST", ("sessions", "*", "messages"), self._post_message),
+        ]
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        if self._server is None:
+            raise RuntimeError("AgentServer is not running")
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._serve, self.host, self.port, limit=self.max_body
+        )
+        self._schedule_sweep()
+
+    async def serve_forever(self) -> None:
+        """Serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        assert self._server is not None  # nosec: B101
+        await self._server.serve_forever()
+
+    async def aclose(self) -> None:
+        """Stop the server, closing all connections and cancelling their turns."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "AgentServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    # sessions
+
+    def _schedule_sweep(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        def _sweep() -> None:
+            self.evict_idle()
+            self._sweeper = loop.call_later(self.idle_timeout / 2, _sweep)
+
+        self._sweeper = loop.call_later(self.idle_timeout / 2, _sweep)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Evict the sessions idle for longer than `idle_timeout`.
+
+        Args:
+            now: current time as returned by `time.monotonic`
+
+        Returns:
+            The number of evicted sessions.
+        """
+        if now is None:
+            now = time.monotonic()
+        expired = []
+        for session in self.sessions.values():
+            if now - session.last_used < self.idle_timeout:
+                break
+            if not session.busy:
+                expired.append(session.id)
+        for session_id in expired:
+            del self.sessions[session_id]
+        self.stats.sessions_evicted += len(expired)
+        return len(expired)
+
+    def create_session(
+        self, agent: str, messages: Optional[List[Dict[str, Any]]] = None
+    ) -> Session:
+        """Create a session, evicting the least recently used idle one if full.
+
+        Args:
+            agent: name of the agent
+            messages: initial messages of the conversation
+
+        Returns:
+            The session.
+
+        Raises:
+            KeyError: if there is no agent of that name
+            RuntimeError: if there are `max_sessions` sessions and all are busy
+        """
+        if agent not in self.agents:
+            raise KeyError(agent)
+        if len(self.sessions) >= self.max_sessions:
+            idle = next((s for s in self.sessions.values() if not s.busy), None)
+            if idle is None:
+                raise RuntimeError("Too many sessions")
+            del self.sessions[idle.id]
+            self.stats.sessions_evicted += 1
+        history = History(messages or (), tokenizer=self.agents[agent].token_counter)
+        session = Session(os.urandom(16).hex(), agent, history)
+        self.sessions[session.id] = session
+        self.stats.sessions_created += 1
+        return session
+
+    def _session(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise _HTTPError(404, f"Unknown session {session_id!r}")
+        return session
+
+    async def turn(
+        self,
+        session: Session,
+        message: Dict[str, Any],
+        on_delta: Optional[Callable[["Delta"], Any]] = None,
+    ) -> "Reply":
+        """Add a message to a session and generate the reply of its agent.
+
+        Turns of a session run one after the other. The message and the
+        reply are added to the history only if the turn succeeds.
+
+        Args:
+            session: the session
+            message: the message
+            on_delta: function or coroutine function called with every delta
+                of the model replies of the turn, replies are not streamed if
+                not given
+
+        Returns:
+            The reply of the agent.
+        """
+        agent = self.agents[session.agent]
+        async with session.lock:
+            self.sessions.move_to_end(session.id)
+            session.last_used = t0 = time.monotonic()
+            history = session.history
+            history.append(message)
+            try:
+                reply = await agent.run(
+                    history, timeout=self.turn_timeout, on_delta=on_delta
+                )
+            except BaseException:
+                session.history = History(
+                    history.messages[:-1], tokenizer=history.counter
+                )
+                raise
+            finally:
+                session.last_used = time.monotonic()
+            reply_message = _reply_message(reply)
+            if reply_message is not None:
+                history.append(reply_message)
+            self.stats.turns += 1
+            self.stats.turn_seconds += session.last_used - t0
+        return reply
+
+    # HTTP
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.stats.connections += 1
+        self._writers.add(writer)
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks.add(task)
+        try:
+            while True:
+                request = await self._read_request(reader, writer)
+                if request is None:
+                    return
+                self.stats.requests += 1
+                if request.headers.get("upgrade", "").lower() == "websocket":
+                    await self._serve_websocket(request, reader, writer)
+                    return
+                keep_alive = await self._handle(request, writer)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # closing the server, end the connection quietly
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._tasks.discard(task)  # type: ignore[arg-type]
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> Optional[_Request]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            await self._respond(writer, 431, {"error": "Headers too large"}, False)
+            return None
+        request_line, *lines = head[:-4].decode("latin-1").split("\r\n")
+        try:
+            method, target, version = request_line.split(" ")
+        except ValueError:
+            await self._respond(writer, 400, {"error": "Invalid request line"}, False)
+            return None
+        headers: Dict[str, str] = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "transfer-encoding" in headers:
+            await self._respond(writer, 411, {"error": "Length required"}, False)
+            return None
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            await self._respond(writer, 400, {"error": "Invalid Content-Length"}, False)
+            return None
+        if length > self.max_body:
+            await self._respond(writer, 413, {"error": "Body too large"}, False)
+            return None
+        body = await reader.readexactly(length) if length else b""
+        path = target.split("?", 1)[0]
+        return _Request(method, path, version, headers, body)
+
+    def _route(self, request: _Request) -> Tuple[Route, List[str]]:
+        parts = tuple(part for part in request.path.split("/") if part)
+        allowed = False
+        for method, pattern, route in self._routes:
+            if len(pattern) != len(parts) or any(
+                p != "*" and p != part for p, part in zip(pattern, parts)
+            ):
+                continue
+            if method == request.method:
+                args = [part for p, part in zip(pattern, parts) if p == "*"]
+                return route, args
+            allowed = True
+        if allowed:
+            raise _HTTPError(405, f"Method {request.method} not allowed")
+        raise _HTTPError(404, f"Not found: {request.path}")
+
+    async def _handle(self, request: _Request, writer: asyncio.StreamWriter) -> bool:
+        keep_alive = request.keep_alive
+        stream: Optional[Tuple[Session, Dict[str, Any]]] = None
+        try:
+            route, args = self._route(request)
+            if route == self._post_message and request.json().get("stream"):
+                stream = self._session(args[0]), _to_message(request.json())
+            else:
+                status, body = await route(request, args)
+        except _HTTPError as e:
+            status, body = e.status, {"error": str(e)}
+        except asyncio.TimeoutError:
+            status, body = 504, {"error": "Turn timed out"}
+        except Exception as e:
+            status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        if stream is not None:
+            await self._stream_turn(*stream, writer)
+            return keep_alive
+        if status >= 500:
+            self.stats.errors += 1
+        await self._respond(writer, status, body, keep_alive)
+        return keep_alive
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: Any,
+        keep_alive: bool,
+    ) -> None:
+        content_type = "application/json"
+        if body is None:
+            payload = b""
+        elif isinstance(body, str):
+            # the Prometheus text format of the metrics
+            payload = body.encode()
+            content_type = "text/plain; version=0.0.4"
+        else:
+            payload = json.dumps(body).encode()
+        head = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+        ]
+        if not keep_alive:
+            head.append("Connection: close")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+
+    async def _health(self, request: _Request, args: List[str]) -> Tuple[int, Any]:
+        return 200, {
+            "status": "ok",
+            "agents": len(self.agents),
+            "sessions": len(self.sessions),
+            "uptime": time.monotonic() - self.started,
+        }
+
+    async def _metrics(self, request: _Request, args: List[str]) -> Tuple[int, Any]:
+        stats = self.stats
+        counters: Dict[str, float] = {
+            "connections_total": stats.connections,
+            "requests_total": stats.requests,
+            "errors_total": stats.errors,
+            "turns_total": stats.turns,
+            "turn_seconds_total": stats.turn_seconds,
+            "websockets_total": stats.websockets,
+            "sessions_created_total": stats.sessions_created,
+            "sessions_closed_total": stats.sessions_closed,
+            "sessions_evicted_total": stats.sessions_evicted,
+        }
+        gauges: Dict[str, float] = {
+            "open_connections": len(self._writers),
+            "sessions": len(self.sessions),
+            "busy_sessions": sum(s.busy for s in self.sessions.values()),
+        }
+        lines = []
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for name, value in values.items():
+                lines.append(f"# TYPE fastagents_{name} {kind}")
+                lines.append(f"fastagents_{name} {value}")
+        return 200, "\n".join(lines) + "\n"
+
+    async def _list_agents(self, request: _Request, args: List[str]) -> Tuple[int, Any]:
+        return 200, {"agents": sorted(self.agents)}
+
+    async def _create_session(
+        self, request: _Request, args: List[str]
+    ) -> Tuple[int, Any]:
+        data = request.json()
+        agent = data.get("agent")
+        if agent is None:
+            if len(self.agents) > 1:
+                raise _HTTPError(400, "Missing agent")
+            (agent,) = self.agents
+        messages = data.get("messages") or []
+        if not isinstance(messages, list):
+            raise _HTTPError(400, "Expected a list of messages")
+        try:
+            session = self.create_session(agent, messages)
+        except KeyError as e:
+            raise _HTTPError(404, f"Unknown agent {agent!r}") from e
+        except RuntimeError as e:
+            raise _HTTPError(503, str(e)) from e
+        return 201, {"id": session.id, "agent": session.agent}
+
+    async def _get_session(self, request: _Request, args: List[str]) -> Tuple[int, Any]:
+        session = self._session(args[0])
+        return 200, {
+            "id": session.id,
+            "agent": session.agent,
+            "messages": session.history.messages,
+        }
+
+    async def _delete_session(
+        self, request: _Request, args: List[str]
+    ) -> Tuple[int, Any]:
+        self._session(args[0])
+        del self.sessions[args[0]]
+        self.stats.sessions_closed += 1
+        return 204, None
+
+    async def _post_message(
+        self, request: _Request, args: List[str]
+    ) -> Tuple[int, Any]:
+        session = self._session(args[0])
+        message = _to_message(request.json())
+        return 200, {"reply": await self.turn(session, message)}
+
+    async def _stream_turn(
+        self,
+        session: Session,
+        message: Dict[str, Any],
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        head = [
+            "HTTP/1.1 200 OK",
+            "Content-Type: text/event-stream",
+            "Cache-Control: no-cache",
+            "Transfer-Encoding: chunked",
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+        async def send(data: str) -> None:
+            event = f"data: {data}\n\n".encode()
+            writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            await writer.drain()
+
+        async def on_delta(delta: "Delta") -> None:
+            await send(json.dumps(_delta_event(delta)))
+
+        try:
+            reply = await self.turn(session, message, on_delta)
+            await send(json.dumps({"reply": reply}))
+        except asyncio.TimeoutError:
+            self.stats.errors += 1
+            await send(json.dumps({"error": "Turn timed out"}))
+        except Exception as e:
+            # the client may be gone, sending the error raises then
+            self.stats.errors += 1
+            await send(json.dumps({"error": f"{type(e).__name__}: {e}"}))
+        await send("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    # WebSocket
+
+    async def _serve_websocket(
+        self,
+        request: _Request,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        parts = [part for part in request.path.split("/") if part]
+        key = request.headers.get("sec-websocket-key")
+        if len(parts) != 3 or parts[0] != "sessions" or parts[2] != "ws":
+            await self._respond(writer, 404, {"error": "Not found"}, False)
+            return
+        if request.method != "GET" or not key:
+            await self._respond(writer, 400, {"error": "Invalid handshake"}, False)
+            return
+        if parts[1] not in self.sessions:
+            await self._respond(writer, 404, {"error": "Unknown session"}, False)
+            return
+        accept = base64.b64encode(
+            hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()  # nosec: B324
+        ).decode()
+        writer.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+            ).encode("latin-1")
+        )
+        await writer.drain()
+        self.stats.websockets += 1
+
+        websocket = _WebSocket(reader, writer, self.max_body)
+
+        async def on_delta(delta: "Delta") -> None:
+            await websocket.send_json({"type": "delta", **_delta_event(delta)})
+
+        try:
+            while True:
+                text = await websocket.receive()
+                try:
+                    data = json.loads(text)
+                    message = _to_message(data if isinstance(data, dict) else {})
+                    session = self._session(parts[1])
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "error": str(e)})
+                    continue
+                except _HTTPError as e:
+                    await websocket.send_json({"type": "error", "error": str(e)})
+                    if e.status == 404:
+                        # the session was deleted or evicted
+                        await websocket.close(_CLOSE_NORMAL)
+                        return
+                    continue
+                try:
+                    reply = await self.turn(
+                        session, message, on_delta if data.get("stream", True) else None
+                    )
+                except asyncio.TimeoutError:
+                    error = "Turn timed out"
+                except Exception as e:
+                    # the client may be gone, sending the error raises then
+                    error = f"{type(e).__name__}: {e}"
+                else:
+                    await websocket.send_json({"type": "reply", "reply": reply})
+                    continue
+                self.stats.errors += 1
+                await websocket.send_json({"type": "error", "error": error})
+        except _WebSocketClosed:
+            pass
@@ -0,0 +1,509 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    overload,
+)
+
+from .messages import (
+    EncodedMessages,
+    Message,
+    MessageLog,
+    check_conversation_id,
+    encode_message,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from numpy.typing import ArrayLike, NDArray
+
+__all__ = ["SharedLog", "SharedLogStore"]
+
+# index file: header, role table, then one entry per message holding the end
+# offset of the message in the arena file and its role code in the top byte;
+# arena file: messages followed by a comma, so that the JSON array of a range
+# of messages is a single slice of it
+_MAGIC = b"FASL"
+_VERSION = 1
+_PREFIX = struct.Struct("<4sB")
+_COUNT = struct.Struct("<Q")
+_COUNT_OFFSET = 8
+_NUM_ROLES_OFFSET = 16
+_ROLES_OFFSET = 64
+_ROLES_SIZE = 4096
+_ENTRIES_OFFSET = _ROLES_OFFSET + _ROLES_SIZE
+_ENTRY = struct.Struct("<Q")
+_END_MASK = (1 << 56) - 1
+
+# embeddings file: header with the dimension and the number of rows, then
+# the rows as float32
+_EMB_MAGIC = b"FASE"
+_EMB_OFFSET = 64
+
+
+def _default_directory() -> Path:
+    # tmpfs, so that the files never hit the disk
+    shm = Path("/dev/shm")  # nosec: B108
+    base = shm if shm.is_dir() else Path(tempfile.gettempdir())
+    return base / "fastagents"
+
+
+class _MappedFile:
+    """A file mapped in memory, remapped when it grows."""
+
+    def __init__(self, path: Path, writable: bool, size: int) -> None:
+        self.path = path
+        self.writable = writable
+        flags = os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY
+        self.fd = os.open(path, flags, 0o600)
+        if writable and os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.map = self._map()
+
+    def _map(self) -> mmap.mmap:
+        access = mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ
+        return mmap.mmap(self.fd, 0, access=access)
+
+    def ensure(self, size: int) -> mmap.mmap:
+        """Map at least `size` bytes, growing the file if writable."""
+        if size > len(self.map):
+            if self.writable and size > os.fstat(self.fd).st_size:
+                os.ftruncate(self.fd, max(size, 2 * len(self.map)))
+            # views into the old map keep it alive until they are released
+            self.map = self._map()
+        return self.map
+
+    def close(self) -> None:
+        try:
+            self.map.close()
+        except BufferError:
+            # exported views still use it, it is closed when they are released
+            pass
+        os.close(self.fd)
+
+
+class SharedLog:
+    """Append-only message log in files mapped in memory.
+
+    Like a `MessageLog`, the log keeps JSON-encoded messages in an arena and
+    an index of their end offsets and roles, but in memory-mapped files, on
+    tmpfs by default, and with the messages separated by commas in the
+    arena, so that their JSON array is copied from it in one go. Every process on the
+    machine can map the log and read it without copying it, e.g. to send
+    the messages to the model with `json_array`. Pickling a `SharedLog`
+    only pickles its path, so handing a conversation over to another worker
+    process costs the same whatever its length.
+
+    One process at a time, the owner, opens the log writable and appends to
+    it without any lock: the message is written first, then the number of
+    messages is updated, so readers never see partial messages. Ownership is
+    taken with an advisory file lock and released by `close`.
+
+    A matrix of float32 embeddings, e.g. of the messages, can be kept with
+    the log and read as a NumPy array without copying it.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], *, writable: bool = False, size: int = 1 << 16
+    ) -> None:
+        """Open or create a log.
+
+        Args:
+            path: path of the log, without extension
+            writable: open the log to append to it, it is created if missing
+            size: initial size of the arena file in bytes when creating it
+
+        Raises:
+            FileNotFoundError: if the log does not exist and is not writable
+            RuntimeError: if `writable` and another process owns the log
+        """
+        self.path = Path(path)
+        self.writable = writable
+        self._index = _MappedFile(
+            self._file(".idx"), writable, _ENTRIES_OFFSET + 8 * 1024
+        )
+        if writable:
+            self._lock()
+        try:
+            self._arena = _MappedFile(self._file(".arena"), writable, size)
+            self._check_header()
+        except BaseException:
+            self._index.close()
+            raise
+        self._embeddings: Optional[_MappedFile] = None
+        self._roles: List[str] = []
+        self._role_index: Dict[str, int] = {}
+        self._load_roles()
+
+    def _file(self, suffix: str) -> Path:
+        return self.path.parent / (self.path.name + suffix)
+
+    def _lock(self) -> None:
+        if fcntl is None:  # pragma: no cover
+            return
+        try:
+            fcntl.flock(self._index.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._index.close()
+            raise RuntimeError(f"{self.path} is owned by another process") from None
+
+    def _check_header(self) -> None:
+        index = self._index.map
+        magic, version = _PREFIX.unpack_from(index)
+        if magic == b"\0" * 4 and self.writable:
+            _PREFIX.pack_into(index, 0, _MAGIC, _VERSION)
+        elif magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{self.path} is not a SharedLog")
+
+    def _load_roles(self) -> None:
+        index = self._index.map
+        (num_roles,) = _COUNT.unpack_from(index, _NUM_ROLES_OFFSET)
+        pos = _ROLES_OFFSET + sum(len(r.encode("utf-8")) + 1 for r in self._roles)
+        for _ in range(len(self._roles), num_roles):
+            n = index[pos]
+            role = sys.intern(bytes(index[pos + 1 : pos + 1 + n]).decode("utf-8"))
+            self._role_index[role] = len(self._roles)
+            self._roles.append(role)
+            pos += 1 + n
+
+    def _role_code(self, role: str) -> int:
+        code = self._role_index.get(role)
+        if code is None:
+            encoded = role.encode("utf-8")
+            pos = _ROLES_OFFSET + sum(len(r.encode("utf-8")) + 1 for r in self._roles)
+            if len(self._roles) >= 255 or pos + 1 + len(encoded) > _ENTRIES_OFFSET:
+                raise ValueError(f"Too many distinct roles or role too long: {role}")
+            index = self._index.map
+            index[pos] = len(encoded)
+            index[pos + 1 : pos + 1 + len(encoded)] = encoded
+            code = len(self._roles)
+            self._roles.append(sys.intern(role))
+            self._role_index[self._roles[-1]] = code
+            _COUNT.pack_into(index, _NUM_ROLES_OFFSET, len(self._roles))
+        return code
+
+    def __len__(self) -> int:
+        return int(_COUNT.unpack_from(self._index.map, _COUNT_OFFSET)[0])
+
+    def _entry(self, i: int) -> int:
+        offset = _ENTRIES_OFFSET + 8 * i
+        index = self._index.ensure(offset + 8)
+        return int(_ENTRY.unpack_from(index, offset)[0])
+
+    def _end(self, i: int) -> int:
+        # end of the first i messages
+        return self._entry(i - 1) & _END_MASK if i > 0 else 0
+
+    def _start(self, i: int) -> int:
+        # start of message i, after the comma following the previous one
+        return self._end(i) + 1 if i > 0 else 0
+
+    def _entries(self, start: int, end: int) -> "array[int]":
+        offset = _ENTRIES_OFFSET + 8 * start
+        index = self._index.ensure(offset + 8 * (end - start))
+        entries = array("Q", index[offset : offset + 8 * (end - start)])
+        if sys.byteorder != "little":
+            entries.byteswap()
+        return entries
+
+    def _bounds(self, i: int) -> Tuple[int, int]:
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("message index out of range")
+        return self._start(i), self._end(i + 1)
+
+    def append(self, message: Union[Dict[str, Any], Message]) -> None:
+        """Append a message, see `MessageLog.append`.
+
+        Args:
+            message: the message
+
+        Raises:
+            RuntimeError: if the log is not writable
+        """
+        self.extend([message])
+
+    def extend(self, messages: Iterable[Union[Dict[str, Any], Message]]) -> None:
+        """Append messages, readers see them all at once.
+
+        Args:
+            messages: the messages
+
+        Raises:
+            RuntimeError: if the log is not writable
+        """
+        if not self.writable:
+            raise RuntimeError("SharedLog is not writable")
+        # encode them like a MessageLog, then copy them and their index over
+        log = MessageLog()
+        log.extend(messages)
+        if not len(log):
+            return
+        n = len(self)
+        start = self._start(n)
+        data = log.json_array()[1:-1] + b","
+        self._arena.ensure(start + len(data))[start : start + len(data)] = data
+        codes = [self._role_code(role) for role in log._roles]
+        offset = _ENTRIES_OFFSET + 8 * n
+        index = self._index.ensure(offset + 8 * len(log))
+        for i, (end, code) in enumerate(zip(log._ends, log._role_codes)):
+            # i commas before message i
+            entry = (start + end + i) | codes[code] << 56
+            _ENTRY.pack_into(index, offset + 8 * i, entry)
+        # publish the messages
+        _COUNT.pack_into(index, _COUNT_OFFSET, n + len(log))
+
+    def raw(self, i: int) -> memoryview:
+        """JSON encoding of a message, as a view into the shared memory.
+
+        Args:
+            i: index of the message
+
+        Returns:
+            The view.
+        """
+        start, end = self._bounds(i)
+        return memoryview(self._arena.ensure(end))[start:end]
+
+    def role(self, i: int) -> str:
+        """Role of a message, without decoding it."""
+        self._bounds(i)
+        code = self._entry(i) >> 56
+        if code >= len(self._roles):
+            self._load_roles()
+        return self._roles[code]
+
+    @overload
+    def __getitem__(self, i: int) -> Message:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[Message]:
+        ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Message, List[Message]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        start, end = self._bounds(i)
+        return Message.from_dict(json.loads(self._arena.ensure(end)[start:end]))
+
+    def __iter__(self) -> Iterator[Message]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_dicts(
+        self, start: int = 0, end: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Decode messages to dictionaries.
+
+        Args:
+            start: index of the first message
+            end: index after the last message, defaults to the end of the log
+
+        Returns:
+            The messages.
+        """
+        return json.loads(self.json_array(start, end))  # type: ignore[no-any-return]
+
+    def json_array(
+        self,
+        start: int = 0,
+        end: Optional[int] = None,
+        *,
+        prefix: Iterable[Dict[str, Any]] = (),
+    ) -> EncodedMessages:
+        """Build the JSON array of a range of messages from the shared memory.
+
+        Args:
+            start: index of the first message
+            end: index after the last message, defaults to the end of the log
+            prefix: messages encoded before the ones of the log, e.g. a system
+                message
+
+        Returns:
+            The encoded JSON array.
+        """
+        end = len(self) if end is None else end
+        parts: List[Union[bytes, memoryview]] = [encode_message(m) for m in prefix]
+        if start < end:
+            first, last = self._start(start), self._end(end)
+            arena = memoryview(self._arena.ensure(last))
+            parts.append(arena[first:last])
+        data = EncodedMessages(b"[" + b",".join(parts) + b"]")
+        parts.clear()
+        if start < end:
+            arena.release()
+        return data
+
+    def to_log(self) -> MessageLog:
+        """Copy the messages to a `MessageLog`."""
+        log = MessageLog()
+        entries = self._entries(0, len(self))
+        if entries:
+            arena = self._arena.ensure(entries[-1] & _END_MASK)
+            start = 0
+            for entry in entries:
+                log._arena += arena[start : entry & _END_MASK]
+                log._ends.append(len(log._arena))
+                start = (entry & _END_MASK) + 1
+            self._load_roles()
+            codes = [log._role_code(role) for role in self._roles]
+            log._role_codes.extend(codes[e >> 56] for e in entries)
+        return log
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of shared memory used by the messages."""
+        n = len(self)
+        return _ENTRIES_OFFSET + 8 * n + self._start(n)
+
+    def _embedding_file(self) -> Optional[_MappedFile]:
+        if self._embeddings is None:
+            path = self._file(".emb")
+            if not self.writable and not path.exists():
+                return None
+            self._embeddings = _MappedFile(path, self.writable, _EMB_OFFSET)
+        return self._embeddings
+
+    def embeddings(self) -> "NDArray[Any]":
+        """Embeddings kept with the log, as a view into the shared memory.
+
+        Returns:
+            A float32 array with one row per embedding, read-only unless the
+            log is writable.
+        """
+        import numpy as np
+
+        file = self._embedding_file()
+        if file is None or len(file.map) < _EMB_OFFSET:
+            return np.zeros((0, 0), dtype=np.float32)
+        magic, dim, count = struct.unpack_from("<4s4xQQ", file.map)
+        if magic != _EMB_MAGIC:
+            return np.zeros((0, 0), dtype=np.float32)
+        buffer = file.ensure(_EMB_OFFSET + 4 * dim * count)
+        return np.frombuffer(  # type: ignore[no-any-return]
+            buffer, dtype=np.float32, count=dim * count, offset=_EMB_OFFSET
+        ).reshape(count, dim)
+
+    def add_embeddings(self, vectors: "ArrayLike") -> None:
+        """Append embeddings.
+
+        Args:
+            vectors: 2-D array of embeddings, all of the same dimension
+
+        Raises:
+            RuntimeError: if the log is not writable
+            ValueError: if the dimension differs from the stored embeddings
+        """
+        import numpy as np
+
+        if not self.writable:
+            raise RuntimeError("SharedLog is not writable")
+        rows = np.ascontiguousarray(vectors, dtype=np.float32)
+        if rows.ndim != 2:
+            raise ValueError("Embeddings must be a 2-D array")
+        file = self._embedding_file()
+        assert file is not None  # nosec: B101
+        magic, dim, count = struct.unpack_from("<4s4xQQ", file.map)
+        if magic != _EMB_MAGIC:
+            dim, count = rows.shape[1], 0
+        elif rows.shape[1] != dim:
+            raise ValueError(f"Expected embeddings of dimension {dim}")
+        start = _EMB_OFFSET + 4 * dim * count
+        buffer = file.ensure(start + rows.nbytes)
+        buffer[start : start + rows.nbytes] = rows.tobytes()
+        struct.pack_into("<4s4xQQ", buffer, 0, _EMB_MAGIC, dim, count + len(rows))
+
+    def close(self) -> None:
+        """Unmap the log, releasing its ownership."""
+        for file in (self._index, self._arena, self._embeddings):
+            if file is not None:
+                file.close()
+
+    def __enter__(self) -> "SharedLog":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __reduce__(self) -> Tuple[Any, Tuple[str]]:
+        # other processes map the log read-only instead of copying it
+        return SharedLog, (str(self.path),)
+
+    def __repr__(self) -> str:
+        return f"SharedLog({str(self.path)!r}, messages={len(self)})"
+
+
+class SharedLogStore:
+    """Shared logs of conversations in a directory, on tmpfs by default."""
+
+    def __init__(
+        self, directory: Union[str, Path, None] = None, *, size: int = 1 << 16
+    ) -> None:
+        """Create a new store.
+
+        Args:
+            directory: directory of the logs, created if missing, defaults
+                to `/dev/shm/fastagents` or a temporary directory
+            size: initial size of the arena of new logs in bytes
+        """
+        self.directory = _default_directory() if directory is None else Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.size = size
+
+    def _path(self, conversation_id: str) -> Path:
+        return self.directory / check_conversation_id(conversation_id)
+
+    def open(self, conversation_id: str, *, writable: bool = False) -> SharedLog:
+        """Open the log of a conversation.
+
+        Args:
+            conversation_id: id of the conversation
+            writable: take ownership of the log to append to it, it is
+                created if missing
+
+        Returns:
+            The log.
+
+        Raises:
+            FileNotFoundError: if the log does not exist and is not writable
+            RuntimeError: if `writable` and another process owns the log
+        """
+        return SharedLog(self._path(conversation_id), writable=writable, size=self.size)
+
+    def delete(self, conversation_id: str) -> None:
+        """Delete the log of a conversation, processes mapping it keep it.
+
+        Args:
+            conversation_id: id of the conversation
+        """
+        path = self._path(conversation_id)
+        for suffix in (".idx", ".arena", ".emb"):
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        path = self._path(conversation_id)
+        return path.with_name(path.name + ".idx").exists()
+
+    def __iter__(self) -> Iterator[str]:
+        return (p.name[:-4] for p in sorted(self.directory.glob("*.idx")))
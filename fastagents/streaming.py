@@ -0,0 +1,128 @@
+import json
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+__all__ = ["Delta", "MessageAccumulator", "iter_sse_events"]
+
+
+@dataclass
+class Delta:
+    """Incremental part of a streamed model reply.
+
+    Attributes:
+        content: new text of the reply
+        tool_calls: tool call deltas as sent by the model, `arguments` of a
+            tool call with the same `index` arrive split over many deltas
+        finish_reason: set on the last delta
+    """
+
+    content: Optional[str] = None
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+    finish_reason: Optional[str] = None
+
+    @classmethod
+    def from_chunk(cls, chunk: Dict[str, Any]) -> Optional["Delta"]:
+        """Create a delta from a chat completion chunk.
+
+        Args:
+            chunk: the decoded chunk
+
+        Returns:
+            The delta of the first choice or `None` if the chunk has no choices.
+        """
+        choices = chunk.get("choices") or []
+        if not choices:
+            return None
+        delta = choices[0].get("delta") or {}
+        return cls(
+            content=delta.get("content"),
+            tool_calls=delta.get("tool_calls") or [],
+            finish_reason=choices[0].get("finish_reason"),
+        )
+
+
+class MessageAccumulator:
+    """Assembles the full assistant message from streamed deltas."""
+
+    def __init__(self) -> None:
+        self._content: List[str] = []
+        self._tool_calls: Dict[int, Dict[str, Any]] = {}
+        self.finish_reason: Optional[str] = None
+
+    def add(self, delta: Delta) -> None:
+        """Add the next delta.
+
+        Args:
+            delta: the delta
+        """
+        if delta.content:
+            self._content.append(delta.content)
+        for tool_call in delta.tool_calls:
+            index = tool_call.get("index", len(self._tool_calls))
+            acc = self._tool_calls.setdefault(
+                index, {"type": "function", "function": {"name": "", "arguments": ""}}
+            )
+            if tool_call.get("id"):
+                acc["id"] = tool_call["id"]
+            if tool_call.get("type"):
+                acc["type"] = tool_call["type"]
+            function = tool_call.get("function") or {}
+            acc["function"]["name"] += function.get("name") or ""
+            acc["function"]["arguments"] += function.get("arguments") or ""
+        if delta.finish_reason is not None:
+            self.finish_reason = delta.finish_reason
+
+    @property
+    def message(self) -> Dict[str, Any]:
+        """The message assembled so far."""
+        message: Dict[str, Any] = {
+            "role": "assistant",
+            "content": "".join(self._content) if self._content else None,
+        }
+        if self._tool_calls:
+            message["tool_calls"] = [
+                self._tool_calls[i] for i in sorted(self._tool_calls)
+            ]
+        return message
+
+    def to_response(self) -> Dict[str, Any]:
+        """The assembled message as a non-streamed chat completion."""
+        return {
+            "object": "chat.completion",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": self.message,
+                    "finish_reason": self.finish_reason,
+                }
+            ],
+        }
+
+
+async def iter_sse_events(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Decode the JSON data of server-sent events.
+
+    Args:
+        lines: lines of the event stream
+
+    Yields:
+        The decoded data of each event, until the `[DONE]` event.
+    """
+    data: List[str] = []
+    done = False
+    # the stream is read to the end even after `[DONE]`, so that the
+    # connection can be reused
+    async for line in lines:
+        if done:
+            continue
+        if line.startswith("data:"):
+            data.append(line[5:].lstrip())
+        elif line == "" and data:
+            payload = "\n".join(data)
+            data = []
+            if payload == "[DONE]":
+                done = True
+                continue
+            yield json.loads(payload)
+    if data and not done and data != ["[DONE]"]:
+        yield json.loads("\n".join(data))
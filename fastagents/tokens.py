@@ -0,0 +1,245 @@
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from .cache.base import CacheStats
+
+__all__ = [
+    "BatchTokenizer",
+    "TokenCounter",
+    "Tokenizer",
+    "approximate_tokens",
+    "get_token_counter",
+    "message_tokens",
+]
+
+Tokenizer = Callable[[str], int]
+BatchTokenizer = Callable[[List[str]], List[int]]
+
+# tokens added by the chat format to every message
+_MESSAGE_OVERHEAD = 4
+
+
+def approximate_tokens(text: str) -> int:
+    """Approximate the number of tokens of a text as one per four characters."""
+    return (len(text) + 3) // 4
+
+
+def _message_texts(message: Dict[str, Any]) -> List[str]:
+    """Texts of a message counted as tokens: content, name and tool calls."""
+    content = message.get("content")
+    if isinstance(content, list):
+        content = "".join(
+            str(part.get("text", "")) for part in content if isinstance(part, dict)
+        )
+    texts = [content or ""]
+    if message.get("name"):
+        texts.append(message["name"])
+    if message.get("tool_calls"):
+        texts.append(json.dumps(message["tool_calls"]))
+    if message.get("function_call"):
+        texts.append(json.dumps(message["function_call"]))
+    return texts
+
+
+def message_tokens(message: Dict[str, Any], tokenizer: Tokenizer) -> int:
+    """Count the tokens of a message.
+
+    Args:
+        message: the message
+        tokenizer: function returning the number of tokens of a text
+
+    Returns:
+        The number of tokens of the content, name and tool calls of the
+        message plus the per-message overhead of the chat format.
+    """
+    return _MESSAGE_OVERHEAD + sum(map(tokenizer, _message_texts(message)))
+
+
+class TokenCounter:
+    """Token counts of texts and messages, cached by a hash of their text.
+
+    Counts are cached under a 64-bit hash of the text, the texts themselves
+    are not kept. Texts missing from the cache are tokenized together with
+    a single call to the batch tokenizer, e.g. `encode_ordinary_batch` of a
+    tiktoken encoding, which tokenizes them in parallel.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Tokenizer = approximate_tokens,
+        *,
+        batch_tokenizer: Optional[BatchTokenizer] = None,
+        max_entries: int = 100_000,
+    ) -> None:
+        """Create a new counter.
+
+        Args:
+            tokenizer: function returning the number of tokens of a text
+            batch_tokenizer: function returning the number of tokens of many
+                texts, defaults to calling `tokenizer` on each of them
+            max_entries: maximum number of cached counts, the oldest are
+                evicted first, 0 to not cache counts, e.g. for tokenizers
+                cheaper than hashing the text
+        """
+        self.tokenizer = tokenizer
+        self.batch_tokenizer = batch_tokenizer
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._counts: Dict[int, int] = {}
+
+    @classmethod
+    def from_encoding(cls, encoding: Any, **kwargs: Any) -> "TokenCounter":
+        """Create a counter for a tiktoken encoding.
+
+        Args:
+            encoding: the encoding, or any object with `encode_ordinary` and
+                `encode_ordinary_batch` methods
+            kwargs: other arguments of the constructor
+
+        Returns:
+            The counter.
+        """
+
+        def tokenizer(text: str) -> int:
+            return len(encoding.encode_ordinary(text))
+
+        def batch_tokenizer(texts: List[str]) -> List[int]:
+            return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+
+        return cls(tokenizer, batch_tokenizer=batch_tokenizer, **kwargs)
+
+    @classmethod
+    def from_model(cls, model: str, **kwargs: Any) -> "TokenCounter":
+        """Create a counter with the tiktoken encoding of a model.
+
+        Args:
+            model: name of the model, e.g. `"gpt-4o"`
+            kwargs: other arguments of the constructor
+
+        Returns:
+            The counter.
+
+        Raises:
+            ImportError: if tiktoken is not installed
+        """
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return cls.from_encoding(encoding, **kwargs)
+
+    def _tokenize(self, texts: List[str]) -> List[int]:
+        if self.batch_tokenizer is not None and len(texts) > 1:
+            return self.batch_tokenizer(texts)
+        return [self.tokenizer(text) for text in texts]
+
+    def count(self, text: str) -> int:
+        """Number of tokens of a text."""
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: Sequence[str]) -> List[int]:
+        """Number of tokens of many texts, tokenizing the new ones in one call.
+
+        Args:
+            texts: the texts
+
+        Returns:
+            The number of tokens of every text.
+        """
+        if self.max_entries <= 0:
+            return self._tokenize(list(texts))
+        counts = [0] * len(texts)
+        # indices of the texts missing from the cache, by hash
+        missing: Dict[int, List[int]] = {}
+        cache = self._counts
+        for i, text in enumerate(texts):
+            key = hash(text)
+            n = cache.get(key)
+            if n is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                counts[i] = n
+        self.stats.hits += len(texts) - sum(map(len, missing.values()))
+        self.stats.misses += len(missing)
+        if missing:
+            new = self._tokenize([texts[indices[0]] for indices in missing.values()])
+            for (key, indices), n in zip(missing.items(), new):
+                cache[key] = n
+                for i in indices:
+                    counts[i] = n
+            self._evict()
+        return counts
+
+    def _evict(self) -> None:
+        excess = len(self._counts) - self.max_entries
+        if excess > 0:
+            # dicts keep insertion order, the oldest counts come first
+            for key in list(self._counts)[:excess]:
+                del self._counts[key]
+            self.stats.evictions += excess
+
+    def message_tokens(self, message: Dict[str, Any]) -> int:
+        """Number of tokens of a message, see `messages_tokens`."""
+        return self.messages_tokens([message])[0]
+
+    def messages_tokens(self, messages: Iterable[Dict[str, Any]]) -> List[int]:
+        """Number of tokens of messages, tokenizing the new texts in one call.
+
+        Args:
+            messages: the messages
+
+        Returns:
+            The number of tokens of the content, name and tool calls of every
+            message plus the per-message overhead of the chat format.
+        """
+        texts: List[str] = []
+        sizes: List[int] = []
+        for message in messages:
+            message_parts = _message_texts(message)
+            texts += message_parts
+            sizes.append(len(message_parts))
+        counts = iter(self.count_many(texts))
+        return [
+            _MESSAGE_OVERHEAD + sum(next(counts) for _ in range(size)) for size in sizes
+        ]
+
+    def total(self, messages: Iterable[Dict[str, Any]]) -> int:
+        """Number of tokens of all messages."""
+        return sum(self.messages_tokens(messages))
+
+    def clear(self) -> None:
+        """Forget all cached counts."""
+        self._counts.clear()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+_counters: Dict[Optional[str], TokenCounter] = {}
+
+
+def get_token_counter(model: Optional[str] = None) -> TokenCounter:
+    """Get the process-wide counter of a model, created on first use.
+
+    Args:
+        model: name of the model, counted with its tiktoken encoding, or
+            `None` to approximate counts with `approximate_tokens`, which are
+            not cached, counting characters is cheaper than hashing them
+
+    Returns:
+        The counter.
+
+    Raises:
+        ImportError: if a model is given and tiktoken is not installed
+    """
+    counter = _counters.get(model)
+    if counter is None:
+        counter = (
+            TokenCounter(max_entries=0)
+            if model is None
+            else TokenCounter.from_model(model)
+        )
+        _counters[model] = counter
+    return counter
@@ -0,0 +1,378 @@
+import asyncio
+import functools
+import inspect
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError, create_model
+
+from .concurrency import run_bounded
+from .tracing import span
+
+__all__ = ["Tool", "ToolExecutor", "ToolSchema", "get_tool_schema"]
+
+# executors a tool can run on
+ASYNC = "async"
+THREAD = "thread"
+PROCESS = "process"
+
+
+class ToolSchema:
+    """JSON schema and validator of the arguments of a tool function.
+
+    Built from the signature of the function with pydantic, see
+    `get_tool_schema`.
+    """
+
+    def __init__(self, func: Callable[..., Any]) -> None:
+        """Build the schema of a function.
+
+        Args:
+            func: the function, its parameters without annotation accept any
+                value
+        """
+        fields: Dict[str, Any] = {}
+        extra = False
+        for name, parameter in inspect.signature(func).parameters.items():
+            if parameter.kind == parameter.VAR_KEYWORD:
+                extra = True
+            elif parameter.kind in (
+                parameter.POSITIONAL_OR_KEYWORD,
+                parameter.KEYWORD_ONLY,
+            ):
+                annotation = (
+                    Any
+                    if parameter.annotation is parameter.empty
+                    else parameter.annotation
+                )
+                default = (
+                    ... if parameter.default is parameter.empty else parameter.default
+                )
+                fields[name] = (annotation, default)
+        self.name = getattr(func, "__name__", type(func).__name__)
+        self.description = inspect.getdoc(func) or ""
+        model: "type[BaseModel]" = create_model(  # type: ignore[call-overload]
+            f"{self.name}_arguments",
+            __config__=ConfigDict(
+                extra="allow" if extra else "forbid", arbitrary_types_allowed=True
+            ),
+            **fields,
+        )
+        self._adapter: TypeAdapter[BaseModel] = TypeAdapter(model)
+        self._parameters: Optional[Dict[str, Any]] = None
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        """JSON schema of the arguments, built on first use."""
+        if self._parameters is None:
+            self._parameters = self._adapter.json_schema()
+            self._parameters.pop("title", None)
+        return self._parameters
+
+    def to_tool(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """The function as a tool of a chat completion request.
+
+        Args:
+            name: name of the tool, defaults to the name of the function
+        """
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name if name is None else name,
+                "description": self.description,
+                "parameters": self.parameters,
+            },
+        }
+
+    def validate_json(self, arguments: Union[str, bytes]) -> Dict[str, Any]:
+        """Parse and validate the JSON arguments of a tool call in one pass.
+
+        Args:
+            arguments: the arguments, an empty string for no arguments
+
+        Returns:
+            The keyword arguments of the function, the ones the model did not
+            pass are left out so that the function uses its defaults.
+
+        Raises:
+            pydantic.ValidationError: if the arguments are not valid JSON or
+                not valid arguments of the function
+        """
+        model = self._adapter.validate_json(arguments or "{}")
+        kwargs = {name: getattr(model, name) for name in model.model_fields_set}
+        if model.model_extra:
+            kwargs.update(model.model_extra)
+        return kwargs
+
+
+# schemas built in this process, by function, and by the underlying
+# function for bound methods, which are created on every attribute access
+_schemas: "weakref.WeakKeyDictionary[Callable[..., Any], ToolSchema]" = (
+    weakref.WeakKeyDictionary()
+)
+_method_schemas: "weakref.WeakKeyDictionary[Callable[..., Any], ToolSchema]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_tool_schema(func: Callable[..., Any]) -> ToolSchema:
+    """Get the schema of a tool function, built once per process.
+
+    Args:
+        func: the function
+
+    Returns:
+        The schema.
+    """
+    key: Callable[..., Any] = func
+    cache = _schemas
+    if inspect.ismethod(func):
+        key, cache = func.__func__, _method_schemas
+    try:
+        schema = cache.get(key)
+    except TypeError:  # not weakly referenceable
+        return ToolSchema(func)
+    if schema is None:
+        schema = cache[key] = ToolSchema(func)
+    return schema
+
+
+@dataclass
+class Tool:
+    """A function callable by the model and how to run it.
+
+    Attributes:
+        func: the function, called with the arguments of the tool call as
+            keyword arguments
+        executor: `"async"` to await a coroutine function on the event loop,
+            `"thread"` to run a blocking function on a thread pool, or
+            `"process"` to run a CPU-bound function on a process pool, in
+            which case the function, its arguments and its result must be
+            picklable
+        timeout: seconds to wait for the result, `None` for no limit
+        max_result_size: maximum number of characters of the result sent
+            back to the model, longer results are truncated
+    """
+
+    func: Callable[..., Any]
+    executor: str = THREAD
+    timeout: Optional[float] = None
+    max_result_size: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.executor not in (ASYNC, THREAD, PROCESS):
+            raise ValueError(f"Unknown executor: {self.executor!r}")
+        if self.executor == ASYNC and not inspect.iscoroutinefunction(self.func):
+            raise ValueError("The async executor requires a coroutine function")
+
+    @property
+    def schema(self) -> ToolSchema:
+        """Schema of the arguments of the function."""
+        return get_tool_schema(self.func)
+
+
+def _truncate(content: str, max_size: Optional[int]) -> str:
+    if max_size is None or len(content) <= max_size:
+        return content
+    return f"{content[:max_size]}... [truncated {len(content) - max_size} characters]"
+
+
+class ToolExecutor:
+    """Runs the tool calls of a model reply concurrently.
+
+    Coroutine functions are awaited on the event loop, blocking functions run
+    on a thread pool and CPU-bound functions on a process pool. Every tool
+    has its own timeout and result size limit, and failures are reported to
+    the model as the result of the call, as pyautogen does. Arguments are
+    parsed and validated against the signature of the function in a single
+    pass over the JSON sent by the model.
+
+    A tool still running on a thread or a process when its timeout expires
+    is not interrupted, only its result is discarded.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 32,
+        thread_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_result_size: Optional[int] = None,
+    ) -> None:
+        """Create a new executor.
+
+        Args:
+            max_concurrency: maximum number of tool calls running at once
+            thread_workers: size of the thread pool, defaults to the one of
+                `concurrent.futures.ThreadPoolExecutor`
+            process_workers: size of the process pool, defaults to the number
+                of CPUs
+            timeout: default timeout of tools in seconds
+            max_result_size: default result size limit of tools in characters
+        """
+        self.max_concurrency = max_concurrency
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.timeout = timeout
+        self.max_result_size = max_result_size
+        self.tools: Dict[str, Tool] = {}
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    def register(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        *,
+        executor: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_result_size: Optional[int] = None,
+    ) -> None:
+        """Register a tool.
+
+        The JSON schema and the validator of its arguments are built from the
+        annotations of the function, once per process.
+
+        Args:
+            name: name of the tool in the tool calls of the model
+            func: the function
+            executor: where to run the function, see `Tool`, defaults to
+                `"async"` for coroutine functions and `"thread"` otherwise
+            timeout: timeout in seconds, defaults to the one of the executor
+            max_result_size: result size limit in characters, defaults to the
+                one of the executor
+        """
+        tool = self._make_tool(func, executor, timeout, max_result_size)
+        # build the schema now rather than on the first call
+        tool.schema  # noqa: B018
+        self.tools[name] = tool
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """The registered tools, as in the `tools` of a chat completion request.
+
+        Add them to the `llm_config` of the agent using the executor.
+        """
+        return [tool.schema.to_tool(name) for name, tool in self.tools.items()]
+
+    def _make_tool(
+        self,
+        func: Callable[..., Any],
+        executor: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_result_size: Optional[int] = None,
+    ) -> Tool:
+        if executor is None:
+            executor = ASYNC if inspect.iscoroutinefunction(func) else THREAD
+        return Tool(
+            func,
+            executor,
+            self.timeout if timeout is None else timeout,
+            self.max_result_size if max_result_size is None else max_result_size,
+        )
+
+    def _pool(self, executor: str) -> Executor:
+        if executor == PROCESS:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(self.process_workers)
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                self.thread_workers, thread_name_prefix="fastagents-tool"
+            )
+        return self._thread_pool
+
+    async def _run(self, tool: Tool, arguments: Dict[str, Any]) -> Any:
+        if tool.executor == ASYNC:
+            return await tool.func(**arguments)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool(tool.executor), functools.partial(tool.func, **arguments)
+        )
+
+    async def call(
+        self,
+        tool_call: Dict[str, Any],
+        functions: Optional[Mapping[str, Callable[..., Any]]] = None,
+    ) -> Dict[str, Any]:
+        """Run a single tool call.
+
+        Args:
+            tool_call: the tool call from the model reply
+            functions: functions of tools not registered with the executor,
+                run with the default settings
+
+        Returns:
+            The tool message with the result.
+        """
+        function = tool_call.get("function") or {}
+        name = function.get("name", "")
+        tool = self.tools.get(name)
+        if tool is None and functions is not None and functions.get(name):
+            tool = self._make_tool(functions[name])
+
+        if tool is None:
+            content = f"Error: Function {name} not found."
+        else:
+            try:
+                arguments = tool.schema.validate_json(function.get("arguments") or "")
+            except ValidationError as e:
+                content = f"Error: {e}"
+                if any(error["type"] == "json_invalid" for error in e.errors()):
+                    content += "\n The argument must be in JSON format."
+            else:
+                with span("tool.call", tool=name, executor=tool.executor) as tool_span:
+                    try:
+                        result = await asyncio.wait_for(
+                            self._run(tool, arguments), tool.timeout
+                        )
+                        content = _truncate(str(result), tool.max_result_size)
+                        tool_span.set("result_size", len(content))
+                    except asyncio.TimeoutError:
+                        content = (
+                            f"Error: Function {name} timed out after {tool.timeout}s."
+                        )
+                        tool_span.set("error", "timeout")
+                    except Exception as e:
+                        content = f"Error: {e}"
+                        tool_span.set("error", type(e).__name__)
+
+        message = {"role": "tool", "content": content}
+        if tool_call.get("id") is not None:
+            message["tool_call_id"] = tool_call["id"]
+        return message
+
+    async def execute(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        functions: Optional[Mapping[str, Callable[..., Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Run the tool calls of a model reply concurrently.
+
+        Args:
+            tool_calls: the tool calls
+            functions: functions of tools not registered with the executor,
+                run with the default settings
+
+        Returns:
+            The tool messages with the results, in the order of `tool_calls`.
+        """
+        results: List[Dict[str, Any]] = await run_bounded(
+            lambda tool_call: self.call(tool_call, functions),
+            tool_calls,
+            max_concurrency=self.max_concurrency,
+        )  # type: ignore[assignment]
+        return results
+
+    def close(self, wait: bool = True) -> None:
+        """Shut down the thread and process pools.
+
+        Args:
+            wait: wait for the running tools to finish
+        """
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait)
+        self._thread_pool = self._process_pool = None
@@ -0,0 +1,325 @@
+import json
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Union
+
+__all__ = [
+    "FileExporter",
+    "NOOP_SPAN",
+    "NoopSpan",
+    "RingBufferExporter",
+    "Span",
+    "SpanExporter",
+    "Tracer",
+    "current_span",
+    "span",
+]
+
+_current: ContextVar[Optional["Span"]] = ContextVar("fastagents_span", default=None)
+
+
+class NoopSpan:
+    """Span returned when tracing is disabled, every method does nothing."""
+
+    __slots__ = ()
+
+    recording = False
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "NoopSpan":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Span:
+    """A timed operation with attributes, part of a trace.
+
+    Spans are context managers: entering one makes it the parent of the spans
+    started inside, in the same task or in tasks created from it, and
+    exiting it records its end and hands it to the exporter of its tracer.
+
+    Attributes:
+        name: name of the operation, e.g. `"model.call"`
+        trace_id: 128-bit id shared by all spans of a trace
+        span_id: 64-bit id of the span
+        parent_id: id of the parent span, `None` for the root span of a trace
+        start_time: start time in nanoseconds since the epoch
+        end_time: end time in nanoseconds since the epoch, 0 until ended
+        attributes: attributes of the span, e.g. token counts
+        error: description of the exception raised in the span, if any
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_time",
+        "end_time",
+        "attributes",
+        "error",
+        "_tracer",
+        "_token",
+    )
+
+    recording = True
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        parent: Optional["Span"] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.name = name
+        self.trace_id: int = (
+            random.getrandbits(128) if parent is None else parent.trace_id
+        )
+        self.span_id: int = random.getrandbits(64)
+        self.parent_id: Optional[int] = None if parent is None else parent.span_id
+        self.start_time = 0
+        self.end_time = 0
+        self.attributes: Dict[str, Any] = attributes or {}
+        self.error: Optional[str] = None
+        self._tracer = tracer
+        self._token: Optional[Token[Optional[Span]]] = None
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds."""
+        return (self.end_time - self.start_time) / 1e9
+
+    def set(self, key: str, value: Any) -> None:
+        """Set an attribute.
+
+        Args:
+            key: name of the attribute
+            value: a string, a number or a boolean
+        """
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        self.start_time = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.end_time = time.time_ns()
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self._tracer.exporter.export(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Encode in the OpenTelemetry protocol JSON format."""
+        span: Dict[str, Any] = {
+            "traceId": f"{self.trace_id:032x}",
+            "spanId": f"{self.span_id:016x}",
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [
+                {"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()
+            ],
+            "status": (
+                {"code": 2, "message": self.error} if self.error else {"code": 1}
+            ),
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = f"{self.parent_id:016x}"
+        return span
+
+    def __repr__(self) -> str:
+        return (
+            f"Span(name={self.name!r}, duration={self.duration:.6f}, "
+            f"attributes={self.attributes!r})"
+        )
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def current_span() -> Optional[Span]:
+    """The span of the current context, `None` outside of traced code."""
+    return _current.get()
+
+
+def span(name: str, **attributes: Any) -> Union[Span, NoopSpan]:
+    """Start a child of the current span.
+
+    Outside of a span started by a `Tracer`, this returns `NOOP_SPAN`, so
+    instrumented code costs next to nothing when tracing is disabled.
+
+    Args:
+        name: name of the operation
+        **attributes: initial attributes
+
+    Returns:
+        The span, to be used as a context manager.
+    """
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent._tracer, name, parent, attributes)
+
+
+class SpanExporter(ABC):
+    """Receives the spans of a `Tracer` as they end."""
+
+    @abstractmethod
+    def export(self, span: Span) -> None:
+        """Export an ended span.
+
+        Args:
+            span: the span
+        """
+        ...
+
+    def shutdown(self) -> None:  # noqa: B027
+        """Flush buffered spans and release resources."""
+
+
+class RingBufferExporter(SpanExporter):
+    """Keeps the most recent spans in memory."""
+
+    def __init__(self, capacity: int = 4096) -> None:
+        """Create a new exporter.
+
+        Args:
+            capacity: maximum number of spans kept, older ones are dropped
+        """
+        self._spans: "deque[Span]" = deque(maxlen=capacity)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span)
+
+    @property
+    def spans(self) -> List[Span]:
+        """The kept spans, in order of their end."""
+        return list(self._spans)
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+
+class FileExporter(SpanExporter):
+    """Appends spans to a file in the OpenTelemetry protocol JSON format.
+
+    Each line is an `ExportTraceServiceRequest`, the format written by the
+    file exporter of the OpenTelemetry Collector, so the file can be
+    replayed into any OpenTelemetry backend.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        service_name: str = "fastagents",
+        batch_size: int = 64,
+    ) -> None:
+        """Create a new exporter.
+
+        Args:
+            path: the file, spans are appended to it
+            service_name: `service.name` resource attribute of the spans
+            batch_size: number of spans written per line
+        """
+        self.path = Path(path)
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self._batch: List[Span] = []
+        self._lock = threading.Lock()
+        self._file: Optional[IO[str]] = None
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._batch.append(span)
+            if len(self._batch) >= self.batch_size:
+                self._write()
+
+    def flush(self) -> None:
+        """Write the buffered spans."""
+        with self._lock:
+            self._write()
+
+    def _write(self) -> None:
+        if not self._batch:
+            return
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "fastagents"},
+                            "spans": [s.to_otlp() for s in self._batch],
+                        }
+                    ],
+                }
+            ]
+        }
+        self._batch = []
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")  # noqa: SIM115
+        self._file.write(json.dumps(request, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._write()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Tracer:
+    """Starts traces and sends their spans to an exporter."""
+
+    def __init__(self, exporter: Optional[SpanExporter] = None) -> None:
+        """Create a new tracer.
+
+        Args:
+            exporter: receiver of the spans, defaults to a `RingBufferExporter`
+        """
+        self.exporter = RingBufferExporter() if exporter is None else exporter
+
+    def span(self, name: str, **attributes: Any) -> Span:
+        """Start a span, a child of the current span if there is one.
+
+        Args:
+            name: name of the operation
+            **attributes: initial attributes
+
+        Returns:
+            The span, to be used as a context manager.
+        """
+        return Span(self, name, _current.get(), attributes)
@@ -0,0 +1,442 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+import queue
+import random
+import signal
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from multiprocessing.process import BaseProcess
+    from multiprocessing.queues import Queue
+    from multiprocessing.sharedctypes import Synchronized, SynchronizedArray
+    from multiprocessing.synchronize import Event
+
+    from .agent import Agent, Task
+
+__all__ = ["WorkResult", "WorkerPool", "WorkerStats", "load_factory"]
+
+AgentFactory = Callable[[], "Agent"]
+
+
+def load_factory(factory: Union[str, AgentFactory]) -> AgentFactory:
+    """Resolve an agent factory given as `"module:function"`.
+
+    Args:
+        factory: the factory or its import path
+
+    Returns:
+        The factory.
+
+    Raises:
+        ValueError: if `factory` is not of the form `"module:function"`
+    """
+    if callable(factory):
+        return factory
+    module_name, sep, name = factory.partition(":")
+    if not sep or not module_name or not name:
+        raise ValueError(f"Expected 'module:function', got {factory!r}")
+    obj: Any = importlib.import_module(module_name)
+    for attr in name.split("."):
+        obj = getattr(obj, attr)
+    return obj  # type: ignore[no-any-return]
+
+
+@dataclass
+class WorkResult:
+    """Reply to a task run by a `WorkerPool`.
+
+    Attributes:
+        task_id: id of the task
+        reply: reply of the agent, `None` if it failed
+        error: description of the error if the task failed
+        worker: index of the worker that ran the task
+    """
+
+    task_id: Any
+    reply: Any = None
+    error: Optional[str] = None
+    worker: int = -1
+
+
+@dataclass
+class WorkerStats:
+    """Counters of a `WorkerPool`.
+
+    Attributes:
+        submitted: tasks submitted
+        completed: results received
+        stolen: tasks taken by a worker from the queue of another worker
+    """
+
+    submitted: int = 0
+    completed: int = 0
+    stolen: int = 0
+
+
+# sequence number, id and task of the submitted tasks
+_Queues = List["Queue[Tuple[int, Any, Any]]"]
+# sequence number of a task, its claim slot and its result
+_Message = Tuple[int, int, WorkResult]
+
+# seconds between checks that the workers are still alive
+_LIVENESS_INTERVAL = 0.1
+
+
+def _free_slot(
+    claims: "SynchronizedArray[Any]", slots: range, cursor: int
+) -> Optional[int]:
+    for i in range(len(slots)):
+        slot = slots[(cursor + i) % len(slots)]
+        if claims[slot] < 0:
+            return slot
+    return None
+
+
+def _take(
+    own: "Queue[Tuple[int, Any, Any]]",
+    others: _Queues,
+    pending: "Synchronized[int]",
+    stolen: "Synchronized[int]",
+) -> Optional[Tuple[int, Any, Any]]:
+    try:
+        item = own.get_nowait()
+    except queue.Empty:
+        item = None
+        # steal from the other workers, starting at a random one so that
+        # idle workers do not all drain the same queue
+        start = random.randrange(len(others)) if others else 0  # nosec: B311
+        for victim in others[start:] + others[:start]:
+            try:
+                item = victim.get_nowait()
+            except queue.Empty:
+                continue
+            with stolen.get_lock():
+                stolen.value += 1
+            break
+        if item is None:
+            return None
+    with pending.get_lock():
+        pending.value -= 1
+    return item
+
+
+async def _run_task(
+    agent: "Agent",
+    index: int,
+    seq: int,
+    slot: int,
+    task_id: Any,
+    task: "Task",
+    results: "Queue[_Message]",
+) -> None:
+    try:
+        reply = await agent.run(task)
+    except Exception as e:
+        result = WorkResult(task_id, error=f"{type(e).__name__}: {e}", worker=index)
+    else:
+        result = WorkResult(task_id, reply, worker=index)
+    results.put((seq, slot, result))
+
+
+async def _serve(
+    index: int,
+    factory: Union[str, AgentFactory],
+    queues: _Queues,
+    results: "Queue[_Message]",
+    claims: "SynchronizedArray[Any]",
+    pending: "Synchronized[int]",
+    stolen: "Synchronized[int]",
+    draining: "Event",
+    concurrency: int,
+    poll_interval: float,
+) -> None:
+    agent = load_factory(factory)()
+    own = queues[index]
+    others = queues[index + 1 :] + queues[:index]
+    # twice as many slots as running tasks, so that a worker keeps going
+    # while the parent has not yet received its last results
+    slots = range(index * 2 * concurrency, (index + 1) * 2 * concurrency)
+    cursor = 0
+    running: Set["asyncio.Future[None]"] = set()
+    while True:
+        while len(running) < concurrency:
+            slot = _free_slot(claims, slots, cursor)
+            if slot is None:
+                break
+            item = _take(own, others, pending, stolen)
+            if item is None:
+                break
+            seq, task_id, task = item
+            # a slot holds the task from the moment it is taken until the
+            # parent receives its result, it is written right away, unlike
+            # messages sent through a queue, so the parent knows the tasks of
+            # a worker that dies
+            claims[slot] = seq
+            cursor = (slot - slots[0] + 1) % len(slots)
+            running.add(
+                asyncio.ensure_future(
+                    _run_task(agent, index, seq, slot, task_id, task, results)
+                )
+            )
+        if running:
+            _, running = await asyncio.wait(
+                running, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED
+            )
+        elif draining.is_set() and pending.value == 0:
+            return
+        else:
+            await asyncio.sleep(poll_interval)
+
+
+def _worker_main(*args: Any) -> None:
+    # the parent decides when to stop, in-flight conversations are never
+    # interrupted by a Ctrl-C sent to the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve(*args))
+
+
+class WorkerPool:
+    """Runs conversations on many processes to use all CPU cores.
+
+    Every worker process hosts one agent built by `agent_factory` and runs up
+    to `concurrency` conversations at once on its event loop. Tasks are
+    dealt round-robin to per-worker queues, and a worker with nothing to do
+    steals tasks from the queues of the others, so a worker stuck on slow
+    conversations does not hold up the tasks queued behind them.
+
+    `drain` stops the pool gracefully: workers finish all submitted tasks
+    before exiting. If a worker dies, the tasks it was running fail with an
+    error result instead of being waited for forever.
+    """
+
+    def __init__(
+        self,
+        agent_factory: Union[str, AgentFactory],
+        *,
+        workers: Optional[int] = None,
+        concurrency: int = 100,
+        poll_interval: float = 0.005,
+        mp_context: Optional[str] = None,
+    ) -> None:
+        """Create a new pool.
+
+        Args:
+            agent_factory: function creating the `Agent` of a worker,
+                or its import path as `"module:function"`; it is called in
+                the worker process and must be picklable
+            workers: number of worker processes, defaults to the number of CPUs
+            concurrency: maximum number of conversations run by a worker at once
+            poll_interval: seconds an idle worker waits before looking for
+                tasks again
+            mp_context: multiprocessing start method, defaults to the one of
+                the platform
+        """
+        self.agent_factory = agent_factory
+        self.workers = workers or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._ctx: Any = multiprocessing.get_context(mp_context)
+        self._queues: _Queues = []
+        self._results: Optional["Queue[_Message]"] = None
+        self._pending: "Synchronized[int]" = self._ctx.Value("q", 0)
+        self._stolen: "Synchronized[int]" = self._ctx.Value("q", 0)
+        self._draining = self._ctx.Event()
+        self._processes: List["BaseProcess"] = []
+        self._next = 0
+        self._submitted = 0
+        self._completed = 0
+        self._claims: Optional["SynchronizedArray[Any]"] = None
+        # ids of the tasks without a result, by sequence number
+        self._task_ids: Dict[int, Any] = {}
+        self._dead: Set[int] = set()
+        self._ready: Deque[WorkResult] = deque()
+
+    @property
+    def stats(self) -> WorkerStats:
+        return WorkerStats(self._submitted, self._completed, self._stolen.value)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._processes)
+
+    def start(self) -> None:
+        """Start the worker processes."""
+        if self._processes:
+            raise RuntimeError("WorkerPool is already started")
+        self._queues = [self._ctx.Queue() for _ in range(self.workers)]
+        self._results = self._ctx.Queue()
+        self._claims = self._ctx.Array("q", [-1] * self.workers * 2 * self.concurrency)
+        self._draining.clear()
+        self._task_ids.clear()
+        self._dead.clear()
+        self._ready.clear()
+        for i in range(self.workers):
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(
+                    i,
+                    self.agent_factory,
+                    self._queues,
+                    self._results,
+                    self._claims,
+                    self._pending,
+                    self._stolen,
+                    self._draining,
+                    self.concurrency,
+                    self.poll_interval,
+                ),
+                name=f"fastagents-worker-{i}",
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+    def submit(self, task_id: Any, task: "Task") -> None:
+        """Queue a conversation.
+
+        Args:
+            task_id: id of the task, returned with its result
+            task: the conversation, as passed to `Agent.run`
+        """
+        if not self._processes or self._draining.is_set():
+            raise RuntimeError("WorkerPool is not running")
+        with self._pending.get_lock():
+            self._pending.value += 1
+        seq = self._submitted
+        self._task_ids[seq] = task_id
+        self._queues[self._next].put((seq, task_id, task))
+        self._next = (self._next + 1) % len(self._queues)
+        self._submitted += 1
+
+    def get_result(self, timeout: Optional[float] = None) -> WorkResult:
+        """Wait for the next result, in order of completion.
+
+        Args:
+            timeout: seconds to wait, `None` to wait forever
+
+        Returns:
+            The result.
+
+        Raises:
+            queue.Empty: if no result arrives in time
+        """
+        if self._results is None:
+            raise RuntimeError("WorkerPool is not running")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ready:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            wait = (
+                _LIVENESS_INTERVAL
+                if remaining is None
+                else max(0.0, min(remaining, _LIVENESS_INTERVAL))
+            )
+            try:
+                self._receive(self._results.get(timeout=wait))
+            except queue.Empty:
+                self._check_workers()
+                if remaining is not None and remaining <= wait and not self._ready:
+                    raise
+        self._completed += 1
+        return self._ready.popleft()
+
+    def _receive(self, message: _Message) -> None:
+        assert self._claims is not None  # nosec: B101
+        seq, slot, result = message
+        self._claims[slot] = -1
+        del self._task_ids[seq]
+        self._ready.append(result)
+
+    def _check_workers(self) -> None:
+        assert self._results is not None and self._claims is not None  # nosec: B101
+        dead = [
+            i
+            for i, p in enumerate(self._processes)
+            if i not in self._dead and not p.is_alive()
+        ]
+        if dead:
+            self._dead.update(dead)
+            # everything a dead worker managed to send is already in the queue
+            while True:
+                try:
+                    self._receive(self._results.get_nowait())
+                except queue.Empty:
+                    break
+            # the tasks it still holds will never get a result
+            size = 2 * self.concurrency
+            for worker in dead:
+                code = self._processes[worker].exitcode
+                for slot in range(worker * size, (worker + 1) * size):
+                    seq = self._claims[slot]
+                    if seq >= 0:
+                        self._claims[slot] = -1
+                        self._ready.append(
+                            WorkResult(
+                                self._task_ids.pop(seq),
+                                error=f"Worker {worker} exited with code {code}",
+                                worker=worker,
+                            )
+                        )
+        if len(self._dead) == len(self._processes):
+            # nothing left to run the queued tasks, or the ones taken by a
+            # worker that died before claiming them
+            for seq in sorted(self._task_ids):
+                self._ready.append(
+                    WorkResult(
+                        self._task_ids.pop(seq), error="No worker left to run the task"
+                    )
+                )
+
+    def drain(self, timeout: Optional[float] = None) -> List[WorkResult]:
+        """Stop the pool after all submitted tasks are done.
+
+        Args:
+            timeout: seconds to wait for the workers, they are killed after it
+
+        Returns:
+            The results not yet returned by `get_result`.
+        """
+        self._draining.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = []
+        while self._completed < self._submitted:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                results.append(self.get_result(timeout=remaining))
+            except queue.Empty:
+                break
+        for process in self._processes:
+            remaining = (
+                None if deadline is None else max(0, deadline - time.monotonic())
+            )
+            process.join(remaining)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self._processes = []
+        return results
+
+    def __enter__(self) -> "WorkerPool":
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self._processes:
+            self.drain()
@@ -1,7 +1,534 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+from autogen import Agent, ConversableAgent
+
+from fastagents.autogen import SandboxCodeExecutor
 from fastagents.autogen.agent import AutogenAgent
+from fastagents.bench import Latency, MockLLMServer
+from fastagents.cache import ResponseCache, SemanticCache
+from fastagents.client import ClientRegistry
+from fastagents.hedging import HedgedClient, HedgingPolicy
+from fastagents.history import History, SlidingWindow
+from fastagents.messages import MessageLog
+from fastagents.prefix import PrefixCache
+from fastagents.sandbox import Output, SandboxPool
+from fastagents.scheduler import RequestScheduler
+from fastagents.sharedlog import SharedLog
+from fastagents.streaming import Delta
+from fastagents.tools import ToolExecutor
+from fastagents.tracing import RingBufferExporter, Tracer
+
+from ..utils import MockServer, chat_completion, chat_completion_chunks, sse_handler
+
+
+def _create_echo_agent(delay: float = 0.0) -> ConversableAgent:
+    agent = ConversableAgent(name="echo", llm_config=False, human_input_mode="NEVER")
+
+    async def echo(
+        recipient: ConversableAgent,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        config: Optional[Any] = None,
+    ) -> Tuple[bool, str]:
+        await asyncio.sleep(delay)
+        return True, f"echo: {messages[-1]['content']}"  # type: ignore[index]
+
+    agent.register_reply([Agent, None], echo)
+    return agent
+
+
+def _create_llm_agent(base_url: str, **llm_config: Any) -> ConversableAgent:
+    config_list = [{"model": "gpt-mock", "api_key": "sk-test", "base_url": base_url}]
+    return ConversableAgent(
+        name="assistant",
+        system_message="You are a helpful assistant.",
+        llm_config={"config_list": config_list, "cache_seed": None, **llm_config},
+        human_input_mode="NEVER",
+    )
 
 
 class TestAutogenAgent:
     def test___init__(self) -> None:
         agent = AutogenAgent()
         assert agent is not None
+
+    @pytest.mark.asyncio()
+    async def test_run(self) -> None:
+        agent = AutogenAgent(_create_echo_agent())
+
+        assert await agent.run("hello") == "echo: hello"
+        assert await agent.run({"role": "user", "content": "hi"}) == "echo: hi"
+        messages = [
+            {"role": "user", "content": "hello"},
+            {"role": "assistant", "content": "echo: hello"},
+            {"role": "user", "content": "again"},
+        ]
+        assert await agent.run(messages) == "echo: again"
+
+    @pytest.mark.asyncio()
+    async def test_run_default_agent(self) -> None:
+        agent = AutogenAgent()
+        assert await agent.run("hello") == ""
+
+    @pytest.mark.asyncio()
+    async def test_run_timeout(self) -> None:
+        agent = AutogenAgent(_create_echo_agent(delay=1.0), timeout=0.01)
+        with pytest.raises(asyncio.TimeoutError):
+            await agent.run("hello")
+
+    @pytest.mark.asyncio()
+    async def test_run_many(self) -> None:
+        agent = AutogenAgent(_create_echo_agent(delay=0.05))
+        tasks = [f"task {i}" for i in range(500)]
+
+        t0 = time.monotonic()
+        actual = await agent.run_many(tasks, max_concurrency=250)
+        elapsed = time.monotonic() - t0
+
+        assert actual == [f"echo: task {i}" for i in range(500)]
+        # two waves of 250 concurrent conversations, not 500 sequential sleeps
+        assert elapsed < 1.0
+
+    @pytest.mark.asyncio()
+    async def test_run_many_timeout(self) -> None:
+        agent = AutogenAgent(_create_echo_agent(delay=1.0))
+        actual = await agent.run_many(["a", "b"], timeout=0.01, return_exceptions=True)
+        assert all(isinstance(x, asyncio.TimeoutError) for x in actual)
+
+    @pytest.mark.asyncio()
+    async def test_run_with_model(self) -> None:
+        async with MockServer() as server:
+            registry = ClientRegistry()
+            agents = [
+                AutogenAgent(
+                    _create_llm_agent(server.url, temperature=0), registry=registry
+                )
+                for _ in range(3)
+            ]
+            for i, agent in enumerate(agents):
+                assert await agent.run(f"hello {i}") == f"echo: hello {i}"
+
+            # all agents share one keep-alive connection
+            assert server.connections == 1
+            params = json.loads(server.requests[0][3])
+            assert params["model"] == "gpt-mock"
+            assert params["temperature"] == 0
+            assert "cache_seed" not in params
+            assert params["messages"] == [
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": "hello 0"},
+            ]
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_run_with_model_tool_calls(self) -> None:
+        tool_calls = [
+            {
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "add", "arguments": '{"a": 1, "b": 2}'},
+            }
+        ]
+
+        async def handler(
+            method: str, path: str, headers: Dict[str, str], body: bytes
+        ) -> Tuple[int, Dict[str, str], bytes]:
+            return (
+                200,
+                {},
+                json.dumps(chat_completion(None, tool_calls=tool_calls)).encode(),
+            )
+
+        async with MockServer(handler) as server:  # type: ignore[arg-type]
+            registry = ClientRegistry()
+            agent = AutogenAgent(_create_llm_agent(server.url), registry=registry)
+            actual = await agent.run("add 1 and 2")
+            assert actual == {"role": "assistant", "tool_calls": tool_calls}
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_run_with_prefix_cache(self) -> None:
+        async def handler(
+            method: str, path: str, headers: Dict[str, str], body: bytes
+        ) -> Tuple[int, Dict[str, str], bytes]:
+            messages = json.loads(body)["messages"]
+            response = chat_completion(f"echo: {messages[-1]['content']}")
+            response["usage"] = {
+                "prompt_tokens": 100,
+                "prompt_tokens_details": {"cached_tokens": 60},
+            }
+            return 200, {}, json.dumps(response).encode()
+
+        tools = [
+            {"type": "function", "function": {"name": name, "parameters": {}}}
+            for name in ["sub", "add"]
+        ]
+        async with MockServer(handler) as server:  # type: ignore[arg-type]
+            registry = ClientRegistry()
+            prefix_cache = PrefixCache()
+            agent = AutogenAgent(
+                _create_llm_agent(server.url, tools=tools),
+                registry=registry,
+                prefix_cache=prefix_cache,
+            )
+            messages: List[Dict[str, Any]] = []
+            for content in ["hello", "again"]:
+                messages.append({"role": "user", "content": content})
+                reply = await agent.run(messages)
+                assert reply == f"echo: {content}"
+                messages.append({"role": "assistant", "content": reply})
+
+            first, second = [json.loads(r[3]) for r in server.requests]
+            assert [t["function"]["name"] for t in first["tools"]] == ["add", "sub"]
+            assert second["messages"][:2] == first["messages"]
+            assert second["messages"][0]["role"] == "system"
+            # the second request starts with the bytes of the first one
+            first_bytes, second_bytes = [
+                r[3][r[3].index(b'"messages":') :] for r in server.requests
+            ]
+            assert second_bytes.startswith(first_bytes[:-2])
+            assert prefix_cache.stats.requests == 2
+            assert 0.5 < prefix_cache.stats.reuse_ratio < 1
+            assert prefix_cache.stats.hit_ratio == 0.6
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_run_with_cache(self) -> None:
+        async with MockServer() as server:
+            registry = ClientRegistry()
+            cache = ResponseCache()
+            agents = [
+                AutogenAgent(
+                    _create_llm_agent(server.url), registry=registry, cache=cache
+                )
+                for _ in range(2)
+            ]
+            for agent in agents:
+                assert await agent.run("hello") == "echo: hello"
+                assert await agent.run("bye") == "echo: bye"
+
+            assert len(server.requests) == 2
+            assert cache.stats.hits == 2
+            assert cache.stats.misses == 2
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_run_with_semantic_cache(self) -> None:
+        async with MockServer() as server:
+            registry = ClientRegistry()
+            cache = ResponseCache()
+            semantic_cache = SemanticCache(threshold=0.9)
+            agent = AutogenAgent(
+                _create_llm_agent(server.url),
+                registry=registry,
+                cache=cache,
+                semantic_cache=semantic_cache,
+            )
+            question = "What is the capital of France?"
+            assert await agent.run(question) == f"echo: {question}"
+            assert await agent.run(question) == f"echo: {question}"
+            assert await agent.run("what is the capital of france") == (
+                f"echo: {question}"
+            )
+            assert await agent.run("How do I bake bread?") == (
+                "echo: How do I bake bread?"
+            )
+
+            assert len(server.requests) == 2
+            assert cache.stats.hits == 1
+            assert semantic_cache.stats.hits == 1
+            assert semantic_cache.stats.misses == 2
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_stream(self) -> None:
+        chunks = chat_completion_chunks("one two three four")
+        async with MockServer(sse_handler(chunks, delay=0.05)) as server:
+            registry = ClientRegistry()
+            cache = ResponseCache()
+            agent = AutogenAgent(
+                _create_llm_agent(server.url), registry=registry, cache=cache
+            )
+
+            t0 = time.monotonic()
+            deltas = []
+            first_delta_at = None
+            async for delta in agent.stream("count"):
+                if delta.content and first_delta_at is None:
+                    first_delta_at = time.monotonic() - t0
+                deltas.append(delta)
+            elapsed = time.monotonic() - t0
+
+            assert "".join(d.content or "" for d in deltas) == "one two three four"
+            assert first_delta_at is not None
+            assert first_delta_at < elapsed / 2
+
+            # the assembled reply is cached and replayed as a single delta
+            cached = [d async for d in agent.stream("count")]
+            assert cached == [Delta(content="one two three four", finish_reason="stop")]
+            assert len(server.requests) == 1
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_stream_without_model(self) -> None:
+        agent = AutogenAgent()
+        with pytest.raises(RuntimeError):
+            async for _ in agent.stream("hello"):
+                pass
+
+    @pytest.mark.asyncio()
+    async def test_run_with_on_delta(self) -> None:
+        tool_calls = [
+            {
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "add", "arguments": '{"a": 1, "b": 2}'},
+            }
+        ]
+        chunks = chat_completion_chunks("", tool_calls)
+        async with MockServer(sse_handler(chunks)) as server:
+            registry = ClientRegistry()
+            deltas: List[Delta] = []
+
+            async def on_delta(delta: Delta) -> None:
+                deltas.append(delta)
+
+            agent = AutogenAgent(
+                _create_llm_agent(server.url), registry=registry, on_delta=on_delta
+            )
+            actual = await agent.run("add 1 and 2")
+            assert actual == {"role": "assistant", "tool_calls": tool_calls}
+            assert len(deltas) == len(chunks)
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_run_with_on_delta_per_turn(self) -> None:
+        chunks = chat_completion_chunks("hello to you")
+        async with MockServer(sse_handler(chunks)) as server:
+            registry = ClientRegistry()
+            deltas: Dict[str, List[Delta]] = {"a": [], "b": []}
+
+            agent = AutogenAgent(_create_llm_agent(server.url), registry=registry)
+            actual = await asyncio.gather(
+                agent.run("hello", on_delta=deltas["a"].append),
+                agent.run("hello", on_delta=deltas["b"].append),
+            )
+            assert list(actual) == ["hello to you", "hello to you"]
+            assert len(deltas["a"]) == len(deltas["b"]) == len(chunks)
+            assert agent.on_delta is None
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_run_with_scheduler(self) -> None:
+        async with MockServer() as server:
+            registry = ClientRegistry()
+            scheduler = RequestScheduler()
+            agents = [
+                AutogenAgent(
+                    _create_llm_agent(server.url),
+                    registry=registry,
+                    scheduler=scheduler,
+                )
+                for _ in range(10)
+            ]
+            actual = await asyncio.gather(*[agent.run("hello") for agent in agents])
+            assert actual == ["echo: hello"] * 10
+            assert len(server.requests) == 1
+            assert scheduler.stats.coalesced == 9
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_run_with_hedging(self) -> None:
+        slow = MockLLMServer(latency=Latency.constant(1.0))
+        async with slow, MockServer() as fast:
+            registry = ClientRegistry()
+            agent = _create_llm_agent(slow.url)
+            agent.llm_config["config_list"].append(
+                {"model": "gpt-backup", "api_key": "sk-test", "base_url": fast.url}
+            )
+            wrapper = AutogenAgent(
+                agent, registry=registry, hedging=HedgingPolicy(initial_delay=0.1)
+            )
+            t0 = time.monotonic()
+            assert await wrapper.run("hello") == "echo: hello"
+            assert time.monotonic() - t0 < 0.5
+            await registry.aclose()
+
+        assert isinstance(wrapper.client, HedgedClient)
+        assert wrapper.client.stats.hedge_wins == 1
+        assert json.loads(fast.requests[0][3])["model"] == "gpt-backup"
+
+    @pytest.mark.asyncio()
+    async def test_run_with_history_strategy(self) -> None:
+        async with MockServer() as server:
+            registry = ClientRegistry()
+            agent = AutogenAgent(
+                _create_llm_agent(server.url),
+                registry=registry,
+                history_strategy=SlidingWindow(),
+                max_prompt_tokens=100,
+            )
+            history = History()
+            for i in range(20):
+                history.append({"role": "user", "content": f"message {i} " + "x" * 40})
+                reply = await agent.run(history)
+                assert reply == f"echo: message {i} " + "x" * 40
+                history.append({"role": "assistant", "content": reply})
+
+            messages = json.loads(server.requests[-1][3])["messages"]
+            assert messages[0]["role"] == "system"
+            assert len(messages) < 10
+            assert History(messages).total_tokens <= 100
+
+            # plain lists of messages are compacted too
+            await agent.run(
+                list(history.messages) + [{"role": "user", "content": "hi"}]
+            )
+            messages = json.loads(server.requests[-1][3])["messages"]
+            assert len(messages) < 10
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_run_and_stream_message_log(self) -> None:
+        chunks = chat_completion_chunks("streamed reply")
+        async with MockServer(sse_handler(chunks)) as server:
+            registry = ClientRegistry()
+            cache = ResponseCache()
+            agent = AutogenAgent(
+                _create_llm_agent(server.url), registry=registry, cache=cache
+            )
+            log = MessageLog([{"role": "user", "content": "hello"}])
+
+            deltas = [d async for d in agent.stream(log)]
+            assert "".join(d.content or "" for d in deltas) == "streamed reply"
+            params = json.loads(server.requests[0][3])
+            assert params["messages"] == [
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": "hello"},
+            ]
+
+            # the same conversation as a list of messages hits the cache
+            _ = [d async for d in agent.stream([{"role": "user", "content": "hello"}])]
+            assert cache.stats.hits == 1
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_run_and_stream_shared_log(self, tmp_path: Path) -> None:
+        async with MockServer() as server:
+            registry = ClientRegistry()
+            agent = AutogenAgent(_create_llm_agent(server.url), registry=registry)
+            with SharedLog(tmp_path / "c1", writable=True) as log:
+                log.append({"role": "user", "content": "hello"})
+                assert await agent.run(SharedLog(log.path)) == "echo: hello"
+                # sent without decoding the messages
+                _ = [d async for d in agent.stream(log)]
+            assert len(server.requests) == 2
+            for _, _, _, body in server.requests:
+                assert json.loads(body)["messages"][1:] == [
+                    {"role": "user", "content": "hello"}
+                ]
+            await registry.aclose()
+
+    def test_state(self) -> None:
+        agent = AutogenAgent(_create_echo_agent())
+        agent.agent.update_system_message("Be brief.")
+        state = agent.get_state()
+        assert state == {"name": "echo", "system_message": "Be brief."}
+
+        restored = AutogenAgent(_create_echo_agent())
+        restored.set_state(json.loads(json.dumps(state)))
+        assert restored.agent.system_message == "Be brief."
+
+    @pytest.mark.asyncio()
+    async def test_run_with_tools(self) -> None:
+        async def slow_add(a: int, b: int) -> int:
+            await asyncio.sleep(0.2)
+            return a + b
+
+        tool_calls = [
+            {
+                "id": f"call_{i}",
+                "type": "function",
+                "function": {"name": "add", "arguments": json.dumps({"a": i, "b": 1})},
+            }
+            for i in range(5)
+        ]
+        agent = ConversableAgent(
+            name="executor", llm_config=False, human_input_mode="NEVER"
+        )
+        agent.register_function({"add": slow_add})
+        executor = ToolExecutor()
+        fast_agent = AutogenAgent(agent, tools=executor)
+
+        t0 = time.monotonic()
+        reply = await fast_agent.run(
+            {"role": "assistant", "content": None, "tool_calls": tool_calls}
+        )
+        assert time.monotonic() - t0 < 0.5
+        assert isinstance(reply, dict)
+        assert [r["content"] for r in reply["tool_responses"]] == [
+            str(i + 1) for i in range(5)
+        ]
+        assert reply["tool_responses"][0]["tool_call_id"] == "call_0"
+        executor.close()
+
+    @pytest.mark.asyncio()
+    async def test_run_with_code_executor(self) -> None:
+        message = {"role": "user", "content": "```python\nprint(6 * 7)\n```"}
+        with SandboxPool(1, timeout=5) as pool:
+            outputs: List[Output] = []
+            executor = SandboxCodeExecutor(pool, on_output=outputs.append)
+            fast_agent = AutogenAgent(code_executor=executor)
+            reply = await fast_agent.run(message)
+            assert reply == "exitcode: 0 (execution succeeded)\nCode output: 42\n"
+            assert outputs == [Output("stdout", "42\n")]
+
+            # replaces the code executor of the wrapped agent
+            agent = ConversableAgent(
+                name="executor",
+                llm_config=False,
+                human_input_mode="NEVER",
+                code_execution_config={"executor": "commandline-local"},
+            )
+            fast_agent = AutogenAgent(agent, code_executor=executor)
+            assert agent.code_executor is executor
+            reply = await fast_agent.run(
+                [message, {"role": "user", "content": "```python\n1 / 0\n```"}]
+            )
+            assert isinstance(reply, str)
+            assert reply.startswith("exitcode: 1 (execution failed)\n")
+            assert reply.endswith("ZeroDivisionError: division by zero\n")
+            assert pool.stats.runs == 2
+
+    @pytest.mark.asyncio()
+    async def test_run_with_tracer(self) -> None:
+        async with MockServer() as server:
+            registry = ClientRegistry()
+            exporter = RingBufferExporter()
+            agent = AutogenAgent(
+                _create_llm_agent(server.url),
+                registry=registry,
+                cache=ResponseCache(),
+                scheduler=RequestScheduler(),
+                tracer=Tracer(exporter),
+            )
+            assert await agent.run("hello") == "echo: hello"
+            await registry.aclose()
+
+        spans = {s.name: s for s in exporter.spans}
+        assert list(spans) == ["cache.lookup", "serialize", "model.call", "agent.turn"]
+        turn = spans["agent.turn"]
+        assert turn.attributes == {"agent": "assistant", "messages": 1}
+        assert spans["cache.lookup"].attributes == {"hit": False}
+        assert spans["serialize"].attributes["bytes"] > 0
+        model_call = spans["model.call"]
+        assert model_call.parent_id == turn.span_id
+        assert model_call.attributes["model"] == "gpt-mock"
+        assert model_call.attributes["prompt_tokens"] == 1
+        assert model_call.attributes["total_tokens"] == 2
+        assert model_call.attributes["queue_wait"] >= 0
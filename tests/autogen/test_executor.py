@@ -0,0 +1,41 @@
+from typing import List
+
+from autogen.coding import CodeBlock, CodeExecutor
+
+from fastagents.autogen import SandboxCodeExecutor
+from fastagents.sandbox import Output, SandboxPool
+
+
+def test_execute_code_blocks() -> None:
+    outputs: List[Output] = []
+    with SandboxPool(1, timeout=5) as pool:
+        executor = SandboxCodeExecutor(pool, on_output=outputs.append)
+        assert isinstance(executor, CodeExecutor)
+
+        blocks = executor.code_extractor.extract_code_blocks(
+            "```python\nprint(6 * 7)\n```\n```sh\necho hello\n```"
+        )
+        result = executor.execute_code_blocks(blocks)
+        assert (result.exit_code, result.output) == (0, "42\nhello\n")
+        assert [o.text for o in outputs] == ["42\n", "hello\n"]
+
+        # code blocks after a failed one are not run
+        result = executor.execute_code_blocks(
+            [
+                CodeBlock(code="exit 2", language="bash"),
+                CodeBlock(code="print(1)", language="python"),
+            ]
+        )
+        assert (result.exit_code, result.output) == (2, "")
+
+        result = executor.execute_code_blocks([CodeBlock(code="x", language="rust")])
+        assert (result.exit_code, result.output) == (1, "unknown language rust")
+
+        executor.timeout = 0.2
+        result = executor.execute_code_blocks(
+            [CodeBlock(code="import time; time.sleep(5)", language="python")]
+        )
+        assert (result.exit_code, result.output) == (124, "\nTimeout")
+
+        executor.restart()
+        assert pool.stats.workers_started == 3
@@ -0,0 +1,99 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+from autogen import ConversableAgent
+
+from fastagents.autogen import AutogenAgent
+from fastagents.bench import Cassette, Recorder
+from fastagents.client import ClientRegistry
+from fastagents.messages import MessageLog
+from fastagents.tools import ToolExecutor
+
+from ..utils import MockServer
+
+
+def create_agent(base_url: str, **kwargs: Any) -> AutogenAgent:
+    agent = ConversableAgent(
+        name="assistant",
+        llm_config={
+            "config_list": [
+                {"model": "gpt-mock", "api_key": "sk-test", "base_url": base_url}
+            ],
+            "cache_seed": None,
+        },
+        human_input_mode="NEVER",
+    )
+    return AutogenAgent(agent, **kwargs)
+
+
+def test_responses() -> None:
+    cassette = Cassette()
+    params = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    assert cassette.response(params) is None
+    cassette.add_response(params, {"n": 1})
+    cassette.add_response({**params, "stream": True}, {"n": 2})
+    # identical requests are answered in the recorded order
+    assert [cassette.response(params)["n"] for _ in range(3)] == [1, 2, 1]  # type: ignore[index]
+    cassette.rewind()
+    assert cassette.response(params) == {"n": 1}
+
+    cassette.add_tool_output("add", '{"b": 2, "a": 1}', "3")
+    assert cassette.tool_output("add", '{"a": 1, "b": 2}') == "3"
+    assert cassette.tool_output("add", '{"a": 2}') is None
+
+
+def test_save_load(tmp_path: Path) -> None:
+    cassette = Cassette()
+    cassette.add_turn("s1", "hello")
+    cassette.add_turn("s2", MessageLog([{"role": "user", "content": "hi"}]))
+    cassette.add_turn("s1", "again")
+    cassette.add_response({"messages": []}, {"choices": []})
+    cassette.add_tool_output("add", "{}", "0")
+    cassette.save(tmp_path / "cassette.jsonl")
+
+    loaded = Cassette.load(tmp_path / "cassette.jsonl")
+    assert loaded.sessions() == [
+        ["hello", "again"],
+        [[{"role": "user", "content": "hi"}]],
+    ]
+    assert loaded.responses == cassette.responses
+    assert loaded.tool_outputs == cassette.tool_outputs
+
+    (tmp_path / "other.jsonl").write_text("{}\n")
+    with pytest.raises(ValueError):
+        Cassette.load(tmp_path / "other.jsonl")
+
+
+@pytest.mark.asyncio()
+async def test_recorder() -> None:
+    async with MockServer() as server:
+        registry = ClientRegistry()
+        tools = ToolExecutor()
+        tools.register("add", lambda a, b: a + b)
+        agent = create_agent(server.url, registry=registry, tools=tools)
+        client = agent.client
+
+        with Recorder(agent) as recorder:
+            assert await recorder.run("hello", session="a") == "echo: hello"
+            tool_call = {
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "add", "arguments": '{"a": 1, "b": 2}'},
+            }
+            reply = await recorder.run(
+                {"role": "assistant", "content": None, "tool_calls": [tool_call]},
+                session="a",
+            )
+            assert reply["tool_responses"][0]["content"] == "3"  # type: ignore[index]
+            async for _ in agent.stream("streamed"):
+                pass
+        assert agent.client is client
+        assert agent.tools is tools
+        await registry.aclose()
+        tools.close()
+
+    cassette = recorder.cassette
+    assert len(cassette.turns) == 2
+    assert sum(len(r) for r in cassette.responses.values()) == 2
+    assert cassette.tool_output("add", '{"a": 1, "b": 2}') == "3"
@@ -0,0 +1,132 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from fastagents.autogen import AutogenAgent
+from fastagents.bench import (
+    BenchmarkResult,
+    Cassette,
+    Latency,
+    Recorder,
+    compare,
+    replay_agent,
+    run_benchmark,
+)
+from fastagents.bench.__main__ import main
+from fastagents.client import ClientRegistry
+
+from ..utils import MockServer
+from .test_cassette import create_agent
+
+
+def create_replay_agent() -> AutogenAgent:
+    # the model client is replaced by the replay
+    return create_agent("http://127.0.0.1:1/v1")
+
+
+async def _record(sessions: int, turns: int) -> Cassette:
+    async with MockServer() as server:
+        registry = ClientRegistry()
+        agent = create_agent(server.url, registry=registry)
+        with Recorder(agent) as recorder:
+            for s in range(sessions):
+                for t in range(turns):
+                    await recorder.run(f"session {s} turn {t}", session=str(s))
+        await registry.aclose()
+    return recorder.cassette
+
+
+@pytest.mark.asyncio()
+async def test_run_benchmark() -> None:
+    cassette = await _record(sessions=10, turns=3)
+    result = await run_benchmark(
+        create_replay_agent,
+        cassette,
+        latency=Latency.constant(0.01),
+        concurrency=10,
+        repeat=2,
+    )
+    assert result.turns == 60
+    # sessions run concurrently, their turns one after the other
+    assert result.seconds < 60 * 0.01
+    assert result.turns_per_second == pytest.approx(60 / result.seconds)
+    assert 0.01 <= result.p50 <= result.p99
+    assert 0 < result.overhead_per_turn < result.p50
+    assert result.memory_per_conversation is not None
+    assert result.memory_per_conversation > 0
+
+
+@pytest.mark.asyncio()
+async def test_replay_native_function() -> None:
+    tool_call = {
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "add", "arguments": '{"a": 1, "b": 2}'},
+    }
+    task = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+    async with MockServer() as server:
+        registry = ClientRegistry()
+        agent = create_agent(server.url, registry=registry)
+        # registered with pyautogen only, not with a `ToolExecutor`
+        agent._agent.register_function({"add": lambda a, b: a + b})  # type: ignore[union-attr]
+        with Recorder(agent) as recorder:
+            reply = await recorder.run(task)
+        assert reply["tool_responses"][0]["content"] == "3"  # type: ignore[index]
+        assert agent.tools is None
+        reply = await agent.run(task)
+        assert reply["tool_responses"][0]["content"] == "3"  # type: ignore[index]
+        await registry.aclose()
+
+    agent = create_replay_agent()
+    registry = ClientRegistry()
+    replay_agent(agent, recorder.cassette, "http://127.0.0.1:1/v1", registry=registry)
+    reply = await agent.run(task)
+    assert reply["tool_responses"][0]["content"] == "3"  # type: ignore[index]
+    await registry.aclose()
+
+
+def test_compare() -> None:
+    baseline = BenchmarkResult(
+        turns=10,
+        seconds=1.0,
+        turns_per_second=100.0,
+        p50=0.01,
+        p99=0.02,
+        overhead_per_turn=0.001,
+        memory_per_conversation=None,
+    )
+    assert compare(baseline, baseline) == []
+    result = BenchmarkResult(
+        turns=10,
+        seconds=1.2,
+        turns_per_second=80.0,
+        p50=0.0105,
+        p99=0.03,
+        overhead_per_turn=0.0005,
+        memory_per_conversation=1000,
+    )
+    regressions = compare(result, baseline, tolerance=0.1)
+    assert [r.split(":")[0] for r in regressions] == ["turns_per_second", "p99"]
+    assert compare(result, baseline, tolerance=0.6) == []
+
+
+def test_main(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    cassette = asyncio.run(_record(sessions=3, turns=2))
+    cassette.save(tmp_path / "cassette.jsonl")
+    args = [
+        str(tmp_path / "cassette.jsonl"),
+        "--agent",
+        "tests.bench.test_runner:create_replay_agent",
+        "--baseline",
+        str(tmp_path / "baseline.json"),
+    ]
+    assert main([*args, "--save-baseline"]) == 0
+    assert "turns/s" in capsys.readouterr().out
+    assert BenchmarkResult.load(tmp_path / "baseline.json").turns == 6
+
+    baseline = BenchmarkResult.load(tmp_path / "baseline.json")
+    baseline.turns_per_second *= 100
+    baseline.save(tmp_path / "baseline.json")
+    assert main(args) == 1
+    assert "REGRESSION turns_per_second" in capsys.readouterr().out
@@ -0,0 +1,74 @@
+import json
+import random
+
+import pytest
+
+from fastagents.bench import Cassette, Latency, MockLLMServer
+from fastagents.client import APIError, ClientRegistry, ModelClient
+
+
+def test_latency() -> None:
+    rng = random.Random(0)  # nosec: B311
+    assert Latency().sample(rng) == 0.0
+    assert Latency.parse("0.5") == Latency.constant(0.5)
+    assert Latency.parse("uniform:0.1,0.2") == Latency.uniform(0.1, 0.2)
+    assert 0.1 <= Latency.uniform(0.1, 0.2).sample(rng) <= 0.2
+    samples = [Latency.lognormal(0.1, 0.5).sample(rng) for _ in range(1000)]
+    assert 0.08 < sorted(samples)[500] < 0.12
+    assert max(samples) > 0.2
+    assert Latency.parse("empirical:1,2").sample(rng) in (1.0, 2.0)
+    with pytest.raises(ValueError):
+        Latency.parse("uniform:1")
+    with pytest.raises(ValueError):
+        Latency.empirical([])
+
+
+@pytest.mark.asyncio()
+async def test_echo() -> None:
+    async with MockLLMServer(latency=Latency.constant(0.01)) as server:
+        registry = ClientRegistry()
+        client = ModelClient(server.url, registry=registry)
+        params = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+        response = await client.create(params)
+        assert response["choices"][0]["message"]["content"] == "echo: hi"
+        chunks = [chunk async for chunk in client.stream(params)]
+        assert chunks[0]["choices"][0]["delta"]["content"] == "echo: hi"
+        assert server.stats.requests == 2
+        assert server.stats.total_latency == pytest.approx(0.02)
+        await registry.aclose()
+
+
+@pytest.mark.asyncio()
+async def test_cassette() -> None:
+    cassette = Cassette()
+    params = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    tool_calls = [
+        {"id": "1", "type": "function", "function": {"name": "f", "arguments": "{}"}}
+    ]
+    recorded = {
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "tool_calls",
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": tool_calls,
+                },
+            }
+        ]
+    }
+    cassette.add_response(params, recorded)
+
+    async with MockLLMServer(cassette) as server:
+        registry = ClientRegistry()
+        client = ModelClient(server.url, registry=registry)
+        assert await client.create(params) == recorded
+        chunks = [chunk async for chunk in client.stream(params)]
+        assert chunks[0]["choices"][0]["delta"]["tool_calls"][0]["index"] == 0
+        with pytest.raises(APIError) as e:
+            await client.create({"model": "m", "messages": []})
+        assert e.value.status == 404
+        assert "cassette" in json.loads(e.value.body)["error"]["message"]
+        assert server.stats.misses == 1
+        await registry.aclose()
@@ -0,0 +1,54 @@
+import time
+
+from fastagents.cache import MemoryCache
+
+
+class TestMemoryCache:
+    def test_get_set(self) -> None:
+        cache = MemoryCache()
+        assert cache.get("a") is None
+        cache.set("a", b"1")
+        assert cache.get("a") == b"1"
+        assert len(cache) == 1
+        assert cache.stats.hits == 1
+        assert cache.stats.misses == 1
+        assert cache.stats.hit_ratio == 0.5
+
+        cache.delete("a")
+        assert cache.get("a") is None
+        cache.set("b", b"2")
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.size == 0
+
+    def test_lru_eviction(self) -> None:
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        assert cache.get("a") == b"1"
+        cache.set("c", b"3")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1"
+        assert cache.get("c") == b"3"
+        assert cache.stats.evictions == 1
+
+    def test_max_bytes(self) -> None:
+        cache = MemoryCache(max_bytes=10)
+        cache.set("a", b"12345")
+        cache.set("b", b"12345")
+        assert cache.size == 10
+        cache.set("a", b"123")
+        assert cache.size == 8
+        cache.set("c", b"12345")
+        assert cache.get("b") is None
+        assert cache.size == 8
+
+    def test_ttl(self) -> None:
+        cache = MemoryCache(ttl=0.01)
+        cache.set("a", b"1")
+        cache.set("b", b"2", ttl=60)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert cache.get("b") == b"2"
+        assert len(cache) == 1
@@ -0,0 +1,64 @@
+from typing import Any, Dict
+
+from fastagents.cache import MemoryCache, ResponseCache, make_cache_key
+
+
+def _params(**kwargs: Any) -> Dict[str, Any]:
+    params: Dict[str, Any] = {
+        "model": "gpt-4",
+        "temperature": 0,
+        "messages": [{"role": "user", "content": "hi"}],
+    }
+    params.update(kwargs)
+    return params
+
+
+def test_make_cache_key() -> None:
+    key = make_cache_key(_params())
+    assert len(key) == 64
+
+    # irrelevant fields are ignored
+    assert key == make_cache_key(
+        _params(
+            messages=[{"content": "hi", "role": "user", "name": None}], stream=False
+        )
+    )
+
+    assert key != make_cache_key(_params(model="gpt-3.5-turbo"))
+    assert key != make_cache_key(_params(temperature=1))
+    assert key != make_cache_key(_params(messages=[{"role": "user", "content": "ho"}]))
+    # every parameter affecting the reply counts
+    for name, value in [
+        ("max_tokens", 10),
+        ("response_format", {"type": "json_object"}),
+        ("top_p", 0.5),
+        ("n", 2),
+        ("stop", ["\n"]),
+        ("seed", 1),
+    ]:
+        assert key != make_cache_key(_params(**{name: value})), name
+    assert key == make_cache_key(_params(timeout=10, user="u", stream=True))
+
+    tool_a = {"type": "function", "function": {"name": "a", "parameters": {}}}
+    tool_b = {"type": "function", "function": {"name": "b", "parameters": {}}}
+    assert key != make_cache_key(_params(tools=[tool_a]))
+    assert make_cache_key(_params(tools=[tool_a, tool_b])) == make_cache_key(
+        _params(tools=[tool_b, tool_a])
+    )
+
+
+class TestResponseCache:
+    def test_get_set(self) -> None:
+        cache = ResponseCache(MemoryCache(), ttl=60)
+        response = {"choices": [{"message": {"role": "assistant", "content": "ho"}}]}
+
+        assert cache.get(_params()) is None
+        cache.set(_params(), response)
+        actual = cache.get(_params())
+        assert actual == response
+        assert actual is not response
+        assert cache.stats.hits == 1
+        assert cache.stats.misses == 1
+
+    def test_default_backend(self) -> None:
+        assert isinstance(ResponseCache().backend, MemoryCache)
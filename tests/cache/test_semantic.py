@@ -0,0 +1,181 @@
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import pytest
+from numpy.typing import NDArray
+
+from fastagents.cache import FlatIndex, HashingEmbedder, SemanticCache
+
+
+def _params(content: str, **kwargs: Any) -> Dict[str, Any]:
+    params: Dict[str, Any] = {
+        "model": "gpt-4",
+        "temperature": 0,
+        "messages": [
+            {"role": "system", "content": "You are helpful."},
+            {"role": "user", "content": content},
+        ],
+    }
+    params.update(kwargs)
+    return params
+
+
+def _response(content: str) -> Dict[str, Any]:
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def test_hashing_embedder() -> None:
+    embedder = HashingEmbedder(dim=256)
+    vectors = embedder(
+        ["What is the capital of France?", "what is the capital of france", ""]
+    )
+
+    assert vectors.shape == (3, 256)
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(vectors[:2], axis=1), 1.0, rtol=1e-5)
+    assert vectors[0] @ vectors[1] == pytest.approx(1.0, abs=1e-5)
+    assert not vectors[2].any()
+
+    # deterministic across instances, unlike hash()
+    np.testing.assert_array_equal(
+        vectors,
+        HashingEmbedder(dim=256)(
+            ["What is the capital of France?", "what is the capital of france", ""]
+        ),
+    )
+
+
+class TestFlatIndex:
+    def test_search(self) -> None:
+        index = FlatIndex(2, max_entries=4)
+        vectors = np.array([[1, 0], [0, 1], [0.6, 0.8]], dtype=np.float32)
+        ids = index.add(vectors, np.array([1, 1, 2]))
+
+        assert ids == [0, 1, 2]
+        assert len(index) == 3
+
+        queries = np.array([[0.8, 0.6], [0.8, 0.6], [1, 0]], dtype=np.float32)
+        scores, found = index.search(queries, np.array([1, 2, 3]))
+        assert list(found) == [0, 2, -1]
+        assert scores[:2] == pytest.approx([0.8, 0.96])
+
+    def test_remove(self) -> None:
+        index = FlatIndex(2, max_entries=2)
+        index.add(np.eye(2, dtype=np.float32), np.zeros(2, dtype=np.int64))
+
+        with pytest.raises(MemoryError):
+            index.add(np.eye(2, dtype=np.float32)[:1], np.zeros(1, dtype=np.int64))
+
+        index.remove([0])
+        assert len(index) == 1
+        _, found = index.search(
+            np.eye(2, dtype=np.float32), np.zeros(2, dtype=np.int64)
+        )
+        assert list(found) == [1, 1]
+
+        assert index.add(
+            np.eye(2, dtype=np.float32)[:1], np.zeros(1, dtype=np.int64)
+        ) == [0]
+
+    def test_grow(self) -> None:
+        index = FlatIndex(8, max_entries=3000)
+        initial = index.nbytes
+        vectors = np.eye(8, dtype=np.float32)[np.arange(2000) % 8]
+        index.add(vectors, np.arange(2000))
+
+        assert len(index) == 2000
+        assert initial < index.nbytes <= 3000 * (8 * 4 + 8 + 1)
+        _, found = index.search(vectors[1999:], np.array([1999]))
+        assert list(found) == [1999]
+
+
+class TestSemanticCache:
+    def test_get_set(self) -> None:
+        cache = SemanticCache(threshold=0.9)
+
+        assert cache.get(_params("What is the capital of France?")) is None
+        cache.set(_params("What is the capital of France?"), _response("Paris"))
+
+        assert cache.get(_params("what is the capital of France ?")) == _response(
+            "Paris"
+        )
+        assert cache.get(_params("How do I bake bread?")) is None
+        assert cache.stats.hits == 1
+        assert cache.stats.misses == 2
+
+    def test_context_must_match(self) -> None:
+        cache = SemanticCache()
+        cache.set(_params("What is the capital of France?"), _response("Paris"))
+
+        assert (
+            cache.get(_params("What is the capital of France?", model="gpt-3.5"))
+            is None
+        )
+        assert (
+            cache.get(_params("What is the capital of France?", temperature=1)) is None
+        )
+        other_system = _params("What is the capital of France?")
+        other_system["messages"][0]["content"] = "Answer in French."
+        assert cache.get(other_system) is None
+
+        # only requests ending with a user message are cached
+        tool_reply = _params("x")
+        tool_reply["messages"][-1] = {
+            "role": "tool",
+            "content": "42",
+            "tool_call_id": "1",
+        }
+        cache.set(tool_reply, _response("The answer is 42"))
+        assert len(cache) == 1
+        assert cache.get(tool_reply) is None
+
+    def test_threshold(self) -> None:
+        strict = SemanticCache(threshold=0.99)
+        loose = SemanticCache(threshold=0.5)
+        for cache in (strict, loose):
+            cache.set(_params("What is the capital of France?"), _response("Paris"))
+
+        query = _params("What is the capital city of France?")
+        assert strict.get(query) is None
+        assert loose.get(query) == _response("Paris")
+
+    def test_get_many(self) -> None:
+        calls: List[int] = []
+        hashing = HashingEmbedder()
+
+        def embedder(texts: Sequence[str]) -> NDArray[np.float32]:
+            calls.append(len(texts))
+            return hashing(texts)
+
+        cache = SemanticCache(embedder)
+        cache.set_many(
+            [_params("What is the capital of France?"), _params("Who wrote Hamlet?")],
+            [_response("Paris"), _response("Shakespeare")],
+        )
+        results = cache.get_many(
+            [
+                _params("who wrote hamlet"),
+                _params("How do I bake bread?"),
+                _params("what is the capital of france"),
+            ]
+        )
+
+        assert results == [_response("Shakespeare"), None, _response("Paris")]
+        assert calls == [2, 3]
+
+    def test_max_entries(self) -> None:
+        cache = SemanticCache(max_entries=2)
+        for i, question in enumerate(
+            ["Who wrote Hamlet?", "What is 2 + 2?", "Why is the sky blue?"]
+        ):
+            cache.set(_params(question), _response(str(i)))
+
+        assert len(cache) == 2
+        assert cache.index is not None and len(cache.index) == 2
+        assert cache.stats.evictions == 1
+        assert cache.get(_params("Who wrote Hamlet?")) is None
+        assert cache.get(_params("Why is the sky blue?")) == _response("2")
+
+        cache.clear()
+        assert len(cache) == 0
+        assert len(cache.index) == 0
@@ -0,0 +1,88 @@
+import multiprocessing
+import time
+from pathlib import Path
+
+from fastagents.cache import SQLiteCache
+
+
+def _write(path: str, i: int) -> None:
+    cache = SQLiteCache(path)
+    for j in range(20):
+        cache.set(f"{i}-{j}", f"{i}-{j}".encode())
+    cache.close()
+
+
+class TestSQLiteCache:
+    def test_get_set(self, tmp_path: Path) -> None:
+        cache = SQLiteCache(tmp_path / "cache.db")
+        assert cache.get("a") is None
+        cache.set("a", b"1")
+        assert cache.get("a") == b"1"
+        assert len(cache) == 1
+        assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+        cache.delete("a")
+        assert cache.get("a") is None
+        cache.set("b", b"2")
+        cache.clear()
+        assert len(cache) == 0
+        cache.close()
+
+    def test_persistence(self, tmp_path: Path) -> None:
+        cache = SQLiteCache(tmp_path / "cache.db")
+        cache.set("a", b"1")
+        cache.close()
+
+        cache = SQLiteCache(tmp_path / "cache.db")
+        assert cache.get("a") == b"1"
+        cache.close()
+
+    def test_lru_eviction(self, tmp_path: Path) -> None:
+        cache = SQLiteCache(tmp_path / "cache.db", max_entries=2)
+        cache.set("a", b"1")
+        time.sleep(0.001)
+        cache.set("b", b"2")
+        time.sleep(0.001)
+        assert cache.get("a") == b"1"
+        time.sleep(0.001)
+        cache.set("c", b"3")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1"
+        assert cache.stats.evictions == 1
+        cache.close()
+
+    def test_max_bytes(self, tmp_path: Path) -> None:
+        cache = SQLiteCache(tmp_path / "cache.db", max_bytes=10)
+        for i in range(5):
+            cache.set(str(i), b"1234")
+            time.sleep(0.001)
+        assert len(cache) == 2
+        assert cache.get("4") == b"1234"
+        assert cache.stats.evictions == 3
+        cache.close()
+
+    def test_ttl(self, tmp_path: Path) -> None:
+        cache = SQLiteCache(tmp_path / "cache.db", ttl=0.01)
+        cache.set("a", b"1")
+        cache.set("b", b"2", ttl=60)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert cache.get("b") == b"2"
+        cache.close()
+
+    def test_shared_between_processes(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "cache.db")
+        SQLiteCache(path).close()
+        ctx = multiprocessing.get_context("spawn")
+        processes = [ctx.Process(target=_write, args=(path, i)) for i in range(4)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+            assert p.exitcode == 0
+
+        cache = SQLiteCache(path)
+        assert len(cache) == 80
+        assert cache.get("3-19") == b"3-19"
+        cache.close()
@@ -0,0 +1,54 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from fastagents.cache import MemoryCache, SQLiteCache, TieredCache
+
+
+class TestTieredCache:
+    def test_get_set(self, tmp_path: Path) -> None:
+        memory = MemoryCache(max_entries=1)
+        disk = SQLiteCache(tmp_path / "cache.db")
+        cache = TieredCache(memory, disk)
+
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        assert len(memory) == 1
+        assert len(cache) == 2
+
+        # served from disk and promoted to memory
+        assert cache.get("a") == b"1"
+        assert memory.get("a") == b"1"
+        assert disk.stats.hits == 1
+        assert cache.stats.hits == 1
+
+        assert cache.get("c") is None
+        assert cache.stats.misses == 1
+
+        cache.delete("a")
+        assert memory.get("a") is None
+        assert disk.get("a") is None
+        cache.clear()
+        assert len(cache) == 0
+        disk.close()
+
+    def test_promotion_keeps_ttl(self, tmp_path: Path) -> None:
+        memory = MemoryCache()
+        disk = SQLiteCache(tmp_path / "cache.db")
+        cache = TieredCache(memory, disk)
+
+        disk.set("a", b"1", ttl=0.2)
+        assert cache.get("a") == b"1"
+        entry = memory.get_entry("a")
+        assert entry is not None
+        assert entry[1] is not None and 0 < entry[1] <= 0.2
+
+        time.sleep(0.25)
+        assert memory.get("a") is None
+        assert cache.get("a") is None
+        disk.close()
+
+    def test_no_tiers(self) -> None:
+        with pytest.raises(ValueError):
+            TieredCache()
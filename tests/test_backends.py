@@ -0,0 +1,125 @@
+import subprocess  # nosec: B404
+import sys
+from importlib.metadata import EntryPoint
+from typing import Any, Dict, List
+
+import pytest
+
+import fastagents.backends
+from fastagents import Agent, create_agent, get_backend_registry
+from fastagents.agent import Reply
+from fastagents.autogen import AutogenAgent
+from fastagents.backends import BackendRegistry
+
+from .test_main import HEAVY_MODULES
+
+
+class EchoAgent(Agent):
+    backend = "echo"
+
+    @property
+    def name(self) -> str:
+        return "echo"
+
+    @property
+    def system_messages(self) -> List[Dict[str, Any]]:
+        return []
+
+    async def _generate(self, messages: List[Dict[str, Any]]) -> Reply:
+        return str(messages[-1]["content"])
+
+    def get_state(self) -> Dict[str, Any]:
+        return {}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        pass
+
+
+class NotAnAgent:
+    pass
+
+
+def test_builtin() -> None:
+    registry = BackendRegistry(entry_point_group=None)
+
+    assert registry.names() == ["autogen"]
+    assert "autogen" in registry
+    assert registry.get("autogen") is AutogenAgent
+
+
+def test_register() -> None:
+    registry = BackendRegistry({}, entry_point_group=None)
+
+    registry.register("echo", EchoAgent)
+    assert registry.get("echo") is EchoAgent
+
+    registry.register("lazy", f"{__name__}:EchoAgent")
+    assert registry.names() == ["echo", "lazy"]
+    assert isinstance(registry.create("lazy"), EchoAgent)
+
+
+def test_unknown() -> None:
+    registry = BackendRegistry(entry_point_group=None)
+
+    with pytest.raises(KeyError, match="Unknown backend 'nope', available: autogen"):
+        registry.get("nope")
+
+
+def test_not_an_agent() -> None:
+    registry = BackendRegistry({"bad": f"{__name__}:NotAnAgent"})
+
+    with pytest.raises(TypeError, match="not an Agent subclass"):
+        registry.get("bad")
+
+
+def test_entry_points(monkeypatch: pytest.MonkeyPatch) -> None:
+    groups = []
+
+    def entry_points(group: str) -> List[EntryPoint]:
+        groups.append(group)
+        return [
+            EntryPoint("echo", f"{__name__}:EchoAgent", group),
+            EntryPoint("autogen", f"{__name__}:EchoAgent", group),
+        ]
+
+    monkeypatch.setattr(fastagents.backends, "_entry_points", entry_points)
+    registry = BackendRegistry()
+
+    # registered backends are found without reading the entry points
+    assert registry.get("autogen") is AutogenAgent
+    assert groups == []
+
+    assert registry.get("echo") is EchoAgent
+    assert registry.names() == ["autogen", "echo"]
+    assert groups == ["fastagents.backends"]
+
+
+@pytest.mark.asyncio()
+async def test_create_agent() -> None:
+    assert "autogen" in get_backend_registry().names()
+
+    agent = create_agent("autogen", timeout=5)
+    assert isinstance(agent, AutogenAgent)
+    assert agent.timeout == 5
+
+    registry = get_backend_registry()
+    registry.register("echo", EchoAgent)
+    try:
+        agent = create_agent("echo")
+        assert await agent.run("hello") == "hello"
+    finally:
+        registry._paths.pop("echo")
+        registry._classes.pop("echo")
+
+
+def test_lazy_backends() -> None:
+    code = (
+        "import sys, fastagents, fastagents.agent; "
+        "fastagents.get_backend_registry().names(); "
+        "print(' '.join(sys.modules))"
+    )
+    modules = subprocess.run(  # nosec: B603
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.split()
+
+    assert not {name.split(".")[0] for name in modules} & HEAVY_MODULES
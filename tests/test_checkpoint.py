@@ -0,0 +1,199 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from fastagents.checkpoint import CheckpointStore, ConversationState, pending_tool_calls
+from fastagents.messages import MessageLog
+
+
+def _turn(i: int) -> List[Dict[str, Any]]:
+    return [
+        {"role": "user", "content": f"question {i}"},
+        {"role": "assistant", "content": f"answer {i}"},
+    ]
+
+
+def _tool_call(i: int) -> Dict[str, Any]:
+    return {
+        "id": f"call_{i}",
+        "type": "function",
+        "function": {"name": "add", "arguments": f'{{"a": {i}}}'},
+    }
+
+
+def test_save_load(tmp_path: Path) -> None:
+    store = CheckpointStore(tmp_path)
+    assert store.load("c1") is None
+
+    conversation = ConversationState(
+        MessageLog(_turn(0)), {"system_message": "Be brief."}, [_tool_call(0)]
+    )
+    assert store.save("c1", conversation) > 0
+    assert "c1" in store
+    assert list(store) == ["c1"]
+
+    loaded = store.load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == _turn(0)
+    assert loaded.state == {"system_message": "Be brief."}
+    assert loaded.pending_tool_calls == [_tool_call(0)]
+
+    store.delete("c1")
+    assert "c1" not in store
+    with pytest.raises(ValueError):
+        store.save("../c1", conversation)
+
+
+def test_incremental(tmp_path: Path) -> None:
+    store = CheckpointStore(tmp_path)
+    conversation = ConversationState(state={"step": 0})
+    sizes = []
+    for i in range(50):
+        conversation.messages.extend(_turn(i))
+        sizes.append(store.save("c1", conversation))
+
+    # snapshots do not grow with the conversation
+    assert max(sizes[1:]) <= sizes[1] + 8
+    # nothing changed, nothing written
+    assert store.save("c1", conversation) == 0
+    conversation.state["step"] = 1
+    assert 0 < store.save("c1", conversation) < sizes[1]
+
+    loaded = store.load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == conversation.messages.to_dicts()
+    assert loaded.state == {"step": 1}
+
+    store.compact("c1")
+    assert (tmp_path / "c1.ckpt").stat().st_size < sum(sizes)
+    loaded = store.load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == conversation.messages.to_dicts()
+
+
+def test_torn_write(tmp_path: Path) -> None:
+    store = CheckpointStore(tmp_path)
+    conversation = ConversationState(MessageLog(_turn(0)))
+    store.save("c1", conversation)
+    size = (tmp_path / "c1.ckpt").stat().st_size
+    conversation.messages.extend(_turn(1))
+    store.save("c1", conversation)
+
+    # crash in the middle of the second snapshot
+    with open(tmp_path / "c1.ckpt", "r+b") as f:
+        f.truncate(size + 10)
+
+    store = CheckpointStore(tmp_path)
+    loaded = store.load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == _turn(0)
+
+    loaded.messages.extend(_turn(1))
+    store.save("c1", loaded)
+    resumed = CheckpointStore(tmp_path).load("c1")
+    assert resumed is not None
+    assert resumed.messages.to_dicts() == _turn(0) + _turn(1)
+
+
+def test_torn_snapshot(tmp_path: Path) -> None:
+    store = CheckpointStore(tmp_path)
+    conversation = ConversationState(MessageLog(_turn(0)), {"step": 0})
+    store.save("c1", conversation)
+    conversation.messages.extend(_turn(1))
+    conversation.state["step"] = 1
+    store.save("c1", conversation)
+
+    # crash after the messages of the snapshot were written, not its state
+    path = tmp_path / "c1.ckpt"
+    path.write_bytes(path.read_bytes()[:-8])
+
+    loaded = CheckpointStore(tmp_path).load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == _turn(0)
+    assert loaded.state == {"step": 0}
+
+
+def test_rewrite_same_length(tmp_path: Path) -> None:
+    store = CheckpointStore(tmp_path)
+    store.save("c1", ConversationState(MessageLog(_turn(0))))
+    store.save("c1", ConversationState(MessageLog(_turn(1))))
+    loaded = store.load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == _turn(1)
+
+    # also when the store does not know what it saved before
+    store = CheckpointStore(tmp_path)
+    store.save("c1", ConversationState(MessageLog(_turn(2) + _turn(3))))
+    loaded = store.load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == _turn(2) + _turn(3)
+
+
+def test_rewrite_shorter(tmp_path: Path) -> None:
+    store = CheckpointStore(tmp_path)
+    store.save("c1", ConversationState(MessageLog(_turn(0) + _turn(1))))
+    store.save("c1", ConversationState(MessageLog(_turn(2))))
+    loaded = store.load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == _turn(2)
+
+
+def test_rewrite_crash(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    store = CheckpointStore(tmp_path)
+    store.save("c1", ConversationState(MessageLog(_turn(0))))
+
+    def crash(*args: Any) -> None:
+        raise OSError("crash")
+
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(OSError):
+        store.save("c1", ConversationState(MessageLog(_turn(1))))
+    # the old checkpoint is still there
+    loaded = CheckpointStore(tmp_path).load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == _turn(0)
+
+
+def test_resume_in_other_process(tmp_path: Path) -> None:
+    store = CheckpointStore(tmp_path, fsync=True)
+    conversation = ConversationState(MessageLog(_turn(0)), {"step": 1})
+    store.save("c1", conversation)
+
+    script = f"""
+from fastagents.checkpoint import CheckpointStore
+
+store = CheckpointStore({str(tmp_path)!r})
+conversation = store.load("c1")
+conversation.messages.append({{"role": "user", "content": "resumed"}})
+conversation.state["step"] += 1
+store.save("c1", conversation)
+"""
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    loaded = CheckpointStore(tmp_path).load("c1")
+    assert loaded is not None
+    assert loaded.messages.to_dicts() == _turn(0) + [
+        {"role": "user", "content": "resumed"}
+    ]
+    assert loaded.state == {"step": 2}
+
+
+def test_pending_tool_calls() -> None:
+    log = MessageLog(_turn(0))
+    assert pending_tool_calls(log) == []
+    log.append(
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [_tool_call(1), _tool_call(2)],
+        }
+    )
+    assert pending_tool_calls(log) == [_tool_call(1), _tool_call(2)]
+    log.append({"role": "tool", "tool_call_id": "call_1", "content": "1"})
+    assert pending_tool_calls(log) == [_tool_call(2)]
+    log.append({"role": "tool", "tool_call_id": "call_2", "content": "2"})
+    assert pending_tool_calls(log) == []
@@ -0,0 +1,231 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Tuple
+
+import pytest
+
+from fastagents.client import (
+    APIError,
+    ClientRegistry,
+    ConnectionPool,
+    ModelClient,
+    get_registry,
+)
+from fastagents.messages import MessageLog
+
+from .utils import Body, MockServer, chat_completion_chunks, sse_handler
+
+
+class TestConnectionPool:
+    @pytest.mark.asyncio()
+    async def test_keep_alive(self) -> None:
+        async with MockServer() as server:
+            pool = ConnectionPool(server.url)
+            for _ in range(10):
+                response = await pool.request("GET", "/")
+                assert response.status == 200
+                await response.aread()
+
+            assert pool.connections_opened == 1
+            assert server.connections == 1
+            assert len(server.requests) == 10
+            await pool.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_max_connections(self) -> None:
+        async def slow_handler(
+            method: str, path: str, headers: Dict[str, str], body: bytes
+        ) -> Tuple[int, Dict[str, str], Body]:
+            await asyncio.sleep(0.01)
+            return 200, {}, b"ok"
+
+        async with MockServer(slow_handler) as server:
+            pool = ConnectionPool(server.url, max_connections=3)
+
+            async def get() -> bytes:
+                response = await pool.request("GET", "/")
+                return await response.aread()
+
+            actual = await asyncio.gather(*[get() for _ in range(30)])
+            assert actual == [b"ok"] * 30
+            assert pool.connections_opened == 3
+            assert pool.num_idle == 3
+            await pool.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_reap_idle(self) -> None:
+        async with MockServer() as server:
+            pool = ConnectionPool(server.url, keepalive_expiry=0.05)
+            response = await pool.request("GET", "/")
+            await response.aread()
+            assert pool.num_idle == 1
+            assert pool.reap_idle() == 0
+
+            await asyncio.sleep(0.1)
+            # closed by the background reaper
+            assert pool.num_idle == 0
+
+            response = await pool.request("GET", "/")
+            await response.aread()
+            assert pool.connections_opened == 2
+            await pool.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_reconnect_after_server_close(self) -> None:
+        async with MockServer() as server:
+            pool = ConnectionPool(server.url)
+            response = await pool.request("GET", "/", headers={"Connection": "close"})
+            assert await response.aread() != b""
+            assert pool.num_idle == 0
+
+            response = await pool.request("GET", "/")
+            await response.aread()
+            assert pool.connections_opened == 2
+            await pool.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_chunked_response(self) -> None:
+        async def chunked_handler(
+            method: str, path: str, headers: Dict[str, str], body: bytes
+        ) -> Tuple[int, Dict[str, str], Body]:
+            async def chunks() -> AsyncIterator[bytes]:
+                for line in [b"one\n", b"two\nthr", b"ee\n"]:
+                    yield line
+
+            return 200, {}, chunks()
+
+        async with MockServer(chunked_handler) as server:
+            pool = ConnectionPool(server.url)
+            response = await pool.request("GET", "/")
+            assert [x async for x in response.aiter_lines()] == ["one", "two", "three"]
+
+            response = await pool.request("GET", "/")
+            assert await response.aread() == b"one\ntwo\nthree\n"
+            assert pool.connections_opened == 1
+            await pool.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_unread_response_is_not_reused(self) -> None:
+        async with MockServer() as server:
+            pool = ConnectionPool(server.url)
+            response = await pool.request("GET", "/")
+            await response.aclose()
+            assert pool.num_idle == 0
+
+            response = await pool.request("GET", "/")
+            await response.aread()
+            assert pool.connections_opened == 2
+            await pool.aclose()
+
+
+class TestClientRegistry:
+    @pytest.mark.asyncio()
+    async def test_get_pool(self) -> None:
+        registry = ClientRegistry(max_connections=5)
+        registry.configure("http://localhost:8000/v2", max_connections=2)
+
+        pool = registry.get_pool("http://localhost:8000/v1")
+        assert pool is registry.get_pool("http://localhost:8000")
+        assert pool.max_connections == 2
+        assert registry.get_pool("http://localhost:8001").max_connections == 5
+        assert registry.get_pool("https://localhost").port == 443
+
+        await registry.aclose()
+        assert registry.get_pool("http://localhost:8000") is not pool
+
+    def test_get_registry(self) -> None:
+        assert get_registry() is get_registry()
+
+
+class TestModelClient:
+    @pytest.mark.asyncio()
+    async def test_create(self) -> None:
+        async with MockServer() as server:
+            registry = ClientRegistry()
+            clients = [
+                ModelClient(f"{server.url}/v1", api_key="sk-test", registry=registry)
+                for _ in range(5)
+            ]
+            for client in clients:
+                response = await client.create(
+                    {
+                        "model": "gpt-mock",
+                        "messages": [{"role": "user", "content": "hi"}],
+                    }
+                )
+                assert response["choices"][0]["message"]["content"] == "echo: hi"
+
+            assert server.connections == 1
+            method, path, headers, body = server.requests[0]
+            assert (method, path) == ("POST", "/v1/chat/completions")
+            assert headers["authorization"] == "Bearer sk-test"
+            assert json.loads(body)["model"] == "gpt-mock"
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_create_error(self) -> None:
+        async def error_handler(
+            method: str, path: str, headers: Dict[str, str], body: bytes
+        ) -> Tuple[int, Dict[str, str], Body]:
+            return 429, {}, b'{"error": "rate limited"}'
+
+        async with MockServer(error_handler) as server:
+            client = ModelClient(server.url, registry=ClientRegistry())
+            with pytest.raises(APIError) as e:
+                await client.create({"model": "gpt-mock", "messages": []})
+            assert e.value.status == 429
+
+    @pytest.mark.asyncio()
+    async def test_stream(self) -> None:
+        chunks = chat_completion_chunks("Hello there world")
+        async with MockServer(sse_handler(chunks)) as server:
+            registry = ClientRegistry()
+            client = ModelClient(server.url, registry=registry)
+            params = {"model": "gpt-mock", "messages": []}
+            actual = [x async for x in client.stream(params)]
+            assert actual == chunks
+            assert json.loads(server.requests[0][3])["stream"] is True
+
+            # the connection is reused after the stream is consumed
+            actual = [x async for x in client.stream(params)]
+            assert server.connections == 1
+            await registry.aclose()
+
+    @pytest.mark.asyncio()
+    async def test_stream_error(self) -> None:
+        async def error_handler(
+            method: str, path: str, headers: Dict[str, str], body: bytes
+        ) -> Tuple[int, Dict[str, str], Body]:
+            return 500, {}, b"oops"
+
+        async with MockServer(error_handler) as server:
+            client = ModelClient(server.url, registry=ClientRegistry())
+            with pytest.raises(APIError):
+                async for _ in client.stream({"model": "gpt-mock", "messages": []}):
+                    pass
+
+    @pytest.mark.asyncio()
+    async def test_create_with_encoded_messages(self) -> None:
+        async with MockServer() as server:
+            registry = ClientRegistry()
+            client = ModelClient(server.url, registry=registry)
+            log = MessageLog([{"role": "user", "content": "hi"}])
+            params = {"model": "gpt-mock", "messages": log.json_array()}
+            response = await client.create(params)
+            assert response["choices"][0]["message"]["content"] == "echo: hi"
+            assert json.loads(server.requests[0][3]) == {
+                "model": "gpt-mock",
+                "messages": [{"role": "user", "content": "hi"}],
+            }
+
+            await client.create({"messages": log.json_array()})
+            assert json.loads(server.requests[1][3]) == {
+                "messages": [{"role": "user", "content": "hi"}]
+            }
+            await registry.aclose()
+
+    def test_from_config(self) -> None:
+        client = ModelClient.from_config(
+            {"model": "gpt-4", "api_key": "sk-test", "base_url": "http://localhost/v1/"}
+        )
+        assert client.base_url == "http://localhost/v1"
@@ -0,0 +1,117 @@
+import asyncio
+from typing import Iterator, List
+
+import pytest
+
+from fastagents.concurrency import run_bounded
+
+
+@pytest.mark.asyncio()
+async def test_run_bounded_preserves_order() -> None:
+    async def double(x: int) -> int:
+        await asyncio.sleep(0.001 * (10 - x % 10))
+        return 2 * x
+
+    actual = await run_bounded(double, range(50), max_concurrency=7)
+    assert actual == [2 * x for x in range(50)]
+
+
+@pytest.mark.asyncio()
+async def test_run_bounded_limits_concurrency() -> None:
+    running = 0
+    max_running = 0
+
+    async def f(x: int) -> int:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        return x
+
+    await run_bounded(f, range(100), max_concurrency=5)
+    assert max_running == 5
+
+
+@pytest.mark.asyncio()
+async def test_run_bounded_backpressure() -> None:
+    pulled: List[int] = []
+
+    def items() -> Iterator[int]:
+        for i in range(1000):
+            pulled.append(i)
+            yield i
+
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def f(x: int) -> int:
+        started.set()
+        await release.wait()
+        return x
+
+    task = asyncio.ensure_future(
+        run_bounded(f, items(), max_concurrency=4, max_pending=2)
+    )
+    await started.wait()
+    await asyncio.sleep(0.01)
+    # 4 running + 2 queued + 1 blocked on a full queue
+    assert len(pulled) <= 7
+
+    release.set()
+    actual = await task
+    assert len(actual) == 1000
+
+
+@pytest.mark.asyncio()
+async def test_run_bounded_timeout() -> None:
+    async def f(x: float) -> float:
+        await asyncio.sleep(x)
+        return x
+
+    actual = await run_bounded(f, [0.0, 1.0, 0.0], timeout=0.05, return_exceptions=True)
+    assert actual[0] == 0.0
+    assert isinstance(actual[1], asyncio.TimeoutError)
+    assert actual[2] == 0.0
+
+    with pytest.raises(asyncio.TimeoutError):
+        await run_bounded(f, [0.0, 1.0, 0.0], timeout=0.05)
+
+
+@pytest.mark.asyncio()
+async def test_run_bounded_cancellation() -> None:
+    cancelled = 0
+
+    async def f(x: int) -> int:
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+        return x
+
+    task = asyncio.ensure_future(run_bounded(f, range(100), max_concurrency=10))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert cancelled == 10
+
+
+@pytest.mark.asyncio()
+async def test_run_bounded_errors() -> None:
+    async def f(x: int) -> int:
+        if x == 3:
+            raise RuntimeError("boom")
+        return x
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await run_bounded(f, range(10), max_concurrency=2)
+
+    actual = await run_bounded(f, range(5), return_exceptions=True)
+    assert isinstance(actual[3], RuntimeError)
+    assert actual[4] == 4
+
+    with pytest.raises(ValueError):
+        await run_bounded(f, range(5), max_concurrency=0)
@@ -0,0 +1,338 @@
+import asyncio
+import json
+import time
+from email.parser import BytesParser
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from urllib.parse import unquote, urlsplit
+
+import pytest
+from autogen import ConversableAgent
+from googleapiclient.errors import HttpError
+
+from fastagents.autogen.agent import AutogenAgent
+from fastagents.google_api import DiscoveryCache, GoogleAPI
+from fastagents.tools import ToolExecutor
+
+from .utils import Body, MockServer
+
+
+def _discovery_document(root_url: str) -> Dict[str, Any]:
+    path_params = {
+        "spreadsheetId": {
+            "type": "string",
+            "required": True,
+            "location": "path",
+            "description": "The ID of the spreadsheet.",
+        },
+        "range": {"type": "string", "required": True, "location": "path"},
+    }
+    return {
+        "kind": "discovery#restDescription",
+        "discoveryVersion": "v1",
+        "id": "sheets:v4",
+        "name": "sheets",
+        "version": "v4",
+        "rootUrl": root_url,
+        "servicePath": "",
+        "batchPath": "batch",
+        "parameters": {},
+        "schemas": {
+            "ValueRange": {
+                "id": "ValueRange",
+                "type": "object",
+                "properties": {
+                    "range": {"type": "string"},
+                    "values": {
+                        "type": "array",
+                        "items": {"type": "array", "items": {"type": "any"}},
+                    },
+                },
+            }
+        },
+        "resources": {
+            "spreadsheets": {
+                "resources": {
+                    "values": {
+                        "methods": {
+                            "get": {
+                                "id": "sheets.spreadsheets.values.get",
+                                "path": "v4/spreadsheets/{spreadsheetId}/values/{range}",
+                                "httpMethod": "GET",
+                                "description": "Returns a range of values.",
+                                "parameters": path_params,
+                                "parameterOrder": ["spreadsheetId", "range"],
+                                "response": {"$ref": "ValueRange"},
+                            },
+                            "update": {
+                                "id": "sheets.spreadsheets.values.update",
+                                "path": "v4/spreadsheets/{spreadsheetId}/values/{range}",
+                                "httpMethod": "PUT",
+                                "description": "Sets values in a range.",
+                                "parameters": {
+                                    **path_params,
+                                    "valueInputOption": {
+                                        "type": "string",
+                                        "location": "query",
+                                        "enum": ["RAW", "USER_ENTERED"],
+                                    },
+                                },
+                                "parameterOrder": ["spreadsheetId", "range"],
+                                "request": {"$ref": "ValueRange"},
+                                "response": {"$ref": "ValueRange"},
+                            },
+                        }
+                    }
+                }
+            }
+        },
+    }
+
+
+class FakeGoogleServer:
+    """Serves a Sheets-like discovery document, its methods and batches."""
+
+    def __init__(self) -> None:
+        self.server = MockServer(self.handle)
+        self.cells: Dict[str, Any] = {}
+
+    @property
+    def url(self) -> str:
+        return self.server.url
+
+    @property
+    def discovery_url(self) -> str:
+        return self.url + "/discovery/v1/apis/{api}/{apiVersion}/rest"
+
+    def requests(self, prefix: str) -> List[Tuple[str, str, Dict[str, str], bytes]]:
+        return [r for r in self.server.requests if r[1].startswith(prefix)]
+
+    async def __aenter__(self) -> "FakeGoogleServer":
+        await self.server.__aenter__()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.server.__aexit__(*args)
+
+    def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        parts = [unquote(p) for p in urlsplit(path).path.split("/")]
+        if parts[1:3] == ["discovery", "v1"]:
+            return 200, _discovery_document(self.url + "/")
+        _, _, _, spreadsheet, _, cells = parts
+        if spreadsheet == "missing":
+            return 404, {"error": {"code": 404, "message": "Not found"}}
+        if method == "PUT":
+            self.cells[cells] = json.loads(body)["values"]
+        return 200, {"range": cells, "values": self.cells.get(cells, [])}
+
+    def _batch(self, headers: Dict[str, str], body: bytes) -> Tuple[str, bytes]:
+        message = BytesParser().parsebytes(
+            f"Content-Type: {headers['content-type']}\r\n\r\n".encode() + body
+        )
+        boundary = "batch_response"
+        lines = []
+        for part in message.get_payload():  # type: ignore[union-attr]
+            raw = part.get_payload(decode=True)  # type: ignore[union-attr]
+            head, _, inner_body = raw.replace(b"\r\n", b"\n").partition(b"\n\n")
+            method, path, _ = head.split(b"\n")[0].decode().split(" ")
+            status, response = self._route(method, path, inner_body)
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            lines += [
+                f"--{boundary}",
+                "Content-Type: application/http",
+                f"Content-ID: {content_id}",
+                "",
+                f"HTTP/1.1 {status} OK",
+                "Content-Type: application/json",
+                "",
+                json.dumps(response),
+            ]
+        lines.append(f"--{boundary}--")
+        return f"multipart/mixed; boundary={boundary}", "\r\n".join(lines).encode()
+
+    async def handle(
+        self, method: str, path: str, headers: Dict[str, str], body: bytes
+    ) -> Tuple[int, Dict[str, str], Body]:
+        if path == "/batch":
+            content_type, payload = self._batch(headers, body)
+            return 200, {"Content-Type": content_type}, payload
+        status, response = self._route(method, path, body)
+        return (
+            status,
+            {"Content-Type": "application/json"},
+            json.dumps(response).encode(),
+        )
+
+
+def _google(server: FakeGoogleServer, tmp_path: Path, **kwargs: Any) -> GoogleAPI:
+    return GoogleAPI(
+        discovery_cache=DiscoveryCache(tmp_path),
+        discovery_url=server.discovery_url,
+        **kwargs,
+    )
+
+
+class TestDiscoveryCache:
+    def test_get_set(self, tmp_path: Path) -> None:
+        cache = DiscoveryCache(tmp_path / "discovery")
+        assert cache.get("https://example.com/rest") is None
+
+        cache.set("https://example.com/rest", '{"name": "x"}')
+        assert cache.get("https://example.com/rest") == '{"name": "x"}'
+        assert DiscoveryCache(tmp_path / "discovery").get(
+            "https://example.com/rest"
+        ) == ('{"name": "x"}')
+        assert [p.suffix for p in (tmp_path / "discovery").iterdir()] == [".json"]
+
+    def test_max_age(self, tmp_path: Path) -> None:
+        DiscoveryCache(tmp_path).set("https://example.com/rest", "{}")
+        assert (
+            DiscoveryCache(tmp_path, max_age=0).get("https://example.com/rest") is None
+        )
+
+
+class TestGoogleAPI:
+    @pytest.mark.asyncio()
+    async def test_discovery_is_cached(self, tmp_path: Path) -> None:
+        async with FakeGoogleServer() as server:
+            for _ in range(2):
+                google = _google(server, tmp_path)
+                assert await google.call(
+                    "sheets",
+                    "v4",
+                    "spreadsheets.values.get",
+                    spreadsheetId="s",
+                    range="A1",
+                ) == {"range": "A1", "values": []}
+                google.close()
+
+        # fetched once, the second client read it from disk
+        assert len(server.requests("/discovery")) == 1
+
+    @pytest.mark.asyncio()
+    async def test_calls_are_batched(self, tmp_path: Path) -> None:
+        async with FakeGoogleServer() as server:
+            google = _google(server, tmp_path)
+            responses = await asyncio.gather(
+                *(
+                    google.call(
+                        "sheets",
+                        "v4",
+                        "spreadsheets.values.update",
+                        spreadsheetId="s",
+                        range=f"A{i}",
+                        valueInputOption="RAW",
+                        body={"values": [[i]]},
+                    )
+                    for i in range(10)
+                )
+            )
+            google.close()
+
+        assert [r["values"] for r in responses] == [[[i]] for i in range(10)]
+        assert len(server.requests("/batch")) == 1
+        assert len(server.requests("/v4")) == 0
+        assert google.stats.calls == 10
+        assert google.stats.batching_ratio == 10
+        # one connection for discovery and the batch
+        assert server.server.connections == 1
+
+    @pytest.mark.asyncio()
+    async def test_errors(self, tmp_path: Path) -> None:
+        async with FakeGoogleServer() as server:
+            google = _google(server, tmp_path, max_batch_size=2)
+            results = await asyncio.gather(
+                *(
+                    google.call(
+                        "sheets",
+                        "v4",
+                        "spreadsheets.values.get",
+                        spreadsheetId=spreadsheet,
+                        range="A1",
+                    )
+                    for spreadsheet in ("s", "missing", "missing")
+                ),
+                return_exceptions=True,
+            )
+            with pytest.raises(TypeError):
+                await google.call("sheets", "v4", "spreadsheets.values.get")
+            google.close()
+
+        assert results[0] == {"range": "A1", "values": []}
+        assert isinstance(results[1], HttpError)
+        assert results[1].status_code == 404
+        assert isinstance(results[2], HttpError)
+        # a full batch of 2 and a single request
+        assert len(server.requests("/batch")) == 1
+        assert len(server.requests("/v4")) == 1
+
+    @pytest.mark.asyncio()
+    async def test_tool_schema(self, tmp_path: Path) -> None:
+        async with FakeGoogleServer() as server:
+            google = _google(server, tmp_path)
+            tool = await asyncio.get_running_loop().run_in_executor(
+                None, google.tool_schema, "sheets", "v4", "spreadsheets.values.update"
+            )
+            google.close()
+
+        function = tool["function"]
+        assert function["name"] == "sheets_spreadsheets_values_update"
+        assert function["description"] == "Sets values in a range."
+        parameters = function["parameters"]
+        assert parameters["required"] == ["spreadsheetId", "range", "body"]
+        assert parameters["properties"]["valueInputOption"] == {
+            "type": "string",
+            "enum": ["RAW", "USER_ENTERED"],
+        }
+        assert parameters["properties"]["body"]["properties"]["values"] == {
+            "type": "array",
+            "items": {"type": "array", "items": {}},
+        }
+
+    @pytest.mark.asyncio()
+    async def test_agent_tools(self, tmp_path: Path) -> None:
+        async with FakeGoogleServer() as server:
+            google = _google(server, tmp_path)
+            executor = ToolExecutor()
+            tools = await asyncio.get_running_loop().run_in_executor(
+                None,
+                google.register_tools,
+                executor,
+                "sheets",
+                "v4",
+                ["spreadsheets.values.get"],
+            )
+            assert [t["function"]["name"] for t in tools] == [
+                "sheets_spreadsheets_values_get"
+            ]
+            server.cells = {f"A{i}": [[i]] for i in range(5)}
+
+            agent = ConversableAgent(
+                name="executor", llm_config=False, human_input_mode="NEVER"
+            )
+            tool_calls = [
+                {
+                    "id": f"call_{i}",
+                    "type": "function",
+                    "function": {
+                        "name": "sheets_spreadsheets_values_get",
+                        "arguments": json.dumps(
+                            {"spreadsheetId": "s", "range": f"A{i}"}
+                        ),
+                    },
+                }
+                for i in range(5)
+            ]
+            t0 = time.monotonic()
+            reply = await AutogenAgent(agent, tools=executor).run(
+                {"role": "assistant", "content": None, "tool_calls": tool_calls}
+            )
+            assert time.monotonic() - t0 < 1
+            google.close()
+            executor.close()
+
+        assert isinstance(reply, dict)
+        assert [json.loads(r["content"]) for r in reply["tool_responses"]] == [
+            {"range": f"A{i}", "values": [[i]]} for i in range(5)
+        ]
+        assert len(server.requests("/batch")) == 1
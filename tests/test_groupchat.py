@@ -0,0 +1,255 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pytest
+from autogen import Agent, ConversableAgent
+
+from fastagents.autogen.agent import AutogenAgent
+from fastagents.groupchat import (
+    ClassifierSelector,
+    GraphSelector,
+    GroupChat,
+    LLMSelector,
+    Rule,
+)
+
+
+def _create_agent(
+    name: str,
+    reply: Callable[[List[Dict[str, Any]]], Any],
+    delay: float = 0.0,
+    calls: Optional[List[List[Dict[str, Any]]]] = None,
+) -> AutogenAgent:
+    agent = ConversableAgent(name=name, llm_config=False, human_input_mode="NEVER")
+
+    async def generate(
+        recipient: ConversableAgent,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        config: Optional[Any] = None,
+    ) -> Tuple[bool, Any]:
+        assert messages is not None  # nosec: B101
+        if calls is not None:
+            calls.append(messages)
+        await asyncio.sleep(delay)
+        return True, reply(messages)
+
+    agent.register_reply([Agent, None], generate)
+    return AutogenAgent(agent)
+
+
+def _team(delay: float = 0.0) -> List[AutogenAgent]:
+    return [
+        _create_agent("planner", lambda m: "Plan: write the code", delay),
+        _create_agent("coder", lambda m: "```python\nprint(1)\n```", delay),
+        _create_agent("reviewer", lambda m: "Looks good. TERMINATE", delay),
+    ]
+
+
+class TestSelectors:
+    @pytest.mark.asyncio()
+    async def test_graph(self) -> None:
+        selector = GraphSelector(
+            {"planner": ["coder"], "coder": ["reviewer", "planner"]},
+            [Rule("planner", source="coder", when=r"(?i)\bhelp\b")],
+        )
+        names = ["planner", "coder", "reviewer"]
+        after_planner = [{"role": "user", "name": "planner", "content": "plan"}]
+        after_coder = [{"role": "user", "name": "coder", "content": "done"}]
+        stuck = [{"role": "user", "name": "coder", "content": "I need HELP"}]
+
+        candidates = selector.candidates(after_planner, names)
+        assert candidates == ["coder"]
+        assert await selector.select(after_planner, candidates) == "coder"
+
+        candidates = selector.candidates(after_coder, names)
+        assert candidates == ["reviewer", "planner"]
+        assert await selector.select(after_coder, candidates) is None
+        assert selector.guess(after_coder, candidates) == "reviewer"
+        assert await selector.select(stuck, candidates) == "planner"
+
+        # reviewer has no transitions, everyone is allowed
+        after_reviewer = [{"role": "user", "name": "reviewer", "content": "ok"}]
+        assert selector.candidates(after_reviewer, names) == names
+
+    @pytest.mark.asyncio()
+    async def test_classifier(self) -> None:
+        selector = ClassifierSelector(
+            {
+                "coder": ["write the code", "implement the function", "fix the bug"],
+                "reviewer": ["review the code", "check the pull request"],
+            }
+        )
+        names = ["coder", "reviewer"]
+
+        def message(content: str) -> List[Dict[str, Any]]:
+            return [{"role": "user", "content": content}]
+
+        assert await selector.select(message("please fix the bug"), names) == "coder"
+        assert await selector.select(message("review this pull request"), names) == (
+            "reviewer"
+        )
+        assert await selector.select(message("how warm is it today"), names) is None
+        assert selector.guess(message("how warm is it today"), names) == "reviewer"
+
+        selector.observe(message("how warm is it today"), "coder")
+        assert await selector.select(message("how warm is it today?"), names) == (
+            "coder"
+        )
+
+    @pytest.mark.asyncio()
+    async def test_llm(self) -> None:
+        calls: List[List[Dict[str, Any]]] = []
+        agent = _create_agent("selector", lambda m: "I pick the coder.", calls=calls)
+        selector = LLMSelector(agent, descriptions={"coder": "Writes Python code"})
+        messages = [{"role": "user", "content": "write hello world"}]
+
+        assert await selector.select(messages, ["planner", "coder"]) == "coder"
+        prompt = calls[0][-1]["content"]
+        assert "coder: Writes Python code" in prompt
+        assert "planner: planner" in prompt
+
+        nobody = LLMSelector(_create_agent("selector", lambda m: "no idea"))
+        assert await nobody.select(messages, ["planner", "coder"]) is None
+
+
+class TestGroupChat:
+    @pytest.mark.asyncio()
+    async def test_round_robin(self) -> None:
+        chat = GroupChat(_team(), max_turns=5)
+        messages = await chat.run("write hello world")
+
+        assert [m.get("name") for m in messages] == [
+            None,
+            "planner",
+            "coder",
+            "reviewer",
+        ]
+        assert messages[-1] == {
+            "role": "user",
+            "name": "reviewer",
+            "content": "Looks good. TERMINATE",
+        }
+        assert chat.stats.turns == 3
+        assert chat.stats.selections == {}
+
+    @pytest.mark.asyncio()
+    async def test_views(self) -> None:
+        calls: List[List[Dict[str, Any]]] = []
+        agents = [
+            _create_agent("a", lambda m: "from a", calls=calls),
+            _create_agent("b", lambda m: "from b"),
+        ]
+        await GroupChat(agents, max_turns=3).run("start")
+
+        # a sees its own message as an assistant message
+        assert calls[1] == [
+            {"role": "user", "content": "start"},
+            {"role": "assistant", "name": "a", "content": "from a"},
+            {"role": "user", "name": "b", "content": "from b"},
+        ]
+
+    @pytest.mark.asyncio()
+    async def test_tool_calls(self) -> None:
+        tool_calls = [
+            {
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "add", "arguments": '{"a": 1, "b": 2}'},
+            }
+        ]
+        tool_responses = [{"role": "tool", "tool_call_id": "call_1", "content": "3"}]
+        calls: List[List[Dict[str, Any]]] = []
+        agents = [
+            _create_agent(
+                "caller", lambda m: {"content": None, "tool_calls": tool_calls}
+            ),
+            _create_agent(
+                "executor",
+                lambda m: {
+                    "role": "tool",
+                    "tool_responses": tool_responses,
+                    "content": "3",
+                },
+            ),
+            _create_agent("writer", lambda m: "1 + 2 = 3", calls=calls),
+        ]
+        messages = await GroupChat(agents, max_turns=3).run("add 1 and 2")
+
+        assert [m["role"] for m in messages] == ["user", "assistant", "tool", "user"]
+        assert messages[1]["tool_calls"] == tool_calls
+        assert messages[2]["tool_responses"] == tool_responses
+        # the others see them unchanged, not as user messages
+        assert calls[0] == messages[:3]
+
+    @pytest.mark.asyncio()
+    async def test_graph_selection(self) -> None:
+        selector = GraphSelector(
+            {"planner": ["coder"], "coder": ["reviewer"], "reviewer": ["coder"]}
+        )
+        chat = GroupChat(list(reversed(_team())), [selector], max_turns=5)
+        messages = await chat.run(
+            [{"role": "user", "name": "planner", "content": "write hello world"}]
+        )
+
+        assert [m.get("name") for m in messages] == ["planner", "coder", "reviewer"]
+        assert chat.stats.selections == {"GraphSelector": 2}
+
+    @pytest.mark.asyncio()
+    async def test_speculation(self) -> None:
+        delay = 0.2
+        picks = iter(["coder", "reviewer", "coder"])
+        llm = LLMSelector(_create_agent("selector", lambda m: next(picks), delay))
+        graph = GraphSelector({"planner": ["coder", "reviewer"]})
+        chat = GroupChat(_team(delay), [graph, llm], max_turns=2)
+
+        t0 = time.monotonic()
+        await chat.run(
+            [{"role": "user", "name": "planner", "content": "write hello world"}]
+        )
+        elapsed = time.monotonic() - t0
+
+        # the coder was guessed and started with the selection, the
+        # reviewer was not guessed
+        assert chat.stats.speculations == 1
+        assert chat.stats.speculation_hits == 1
+        assert chat.stats.selections == {"LLMSelector": 2}
+        assert 3 * delay <= elapsed < 4 * delay
+
+    @pytest.mark.asyncio()
+    async def test_wrong_speculation(self) -> None:
+        calls: List[List[Dict[str, Any]]] = []
+        llm = LLMSelector(_create_agent("selector", lambda m: "reviewer", 0.1))
+        graph = GraphSelector({"planner": ["coder", "reviewer"]})
+        agents = [
+            _create_agent("coder", lambda m: "code", 0.2, calls=calls),
+            _create_agent("reviewer", lambda m: "TERMINATE"),
+        ]
+        chat = GroupChat(agents, [graph, llm], max_turns=1)
+        messages = await chat.run(
+            [{"role": "user", "name": "planner", "content": "write hello world"}]
+        )
+        await asyncio.sleep(0.3)
+
+        assert messages[-1]["name"] == "reviewer"
+        assert chat.stats.speculations == 1
+        assert chat.stats.speculation_hits == 0
+        # started, then cancelled
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio()
+    async def test_classifier_learns(self) -> None:
+        llm_calls: List[List[Dict[str, Any]]] = []
+        llm = LLMSelector(_create_agent("selector", lambda m: "coder", calls=llm_calls))
+        classifier = ClassifierSelector(threshold=0.8)
+        agents = [
+            _create_agent("coder", lambda m: "done"),
+            _create_agent("reviewer", lambda m: "ok"),
+        ]
+        chat = GroupChat(agents, [classifier, llm], max_turns=1)
+
+        for _ in range(3):
+            await chat.run("please write the parser")
+        assert len(llm_calls) == 1
+        assert chat.stats.selections == {"LLMSelector": 1, "ClassifierSelector": 2}
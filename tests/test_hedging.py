@@ -0,0 +1,243 @@
+import asyncio
+import json
+import time
+from typing import Dict, Tuple
+
+import pytest
+
+from fastagents.bench import Latency, MockLLMServer
+from fastagents.client import APIError, ClientRegistry, ModelClient
+from fastagents.hedging import (
+    Endpoint,
+    EndpointHealth,
+    HedgedClient,
+    HedgingPolicy,
+    is_retriable,
+)
+
+from .utils import Body, MockServer, chat_completion_chunks, sse_handler
+
+PARAMS = {"model": "gpt-mock", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def _status_handler(status: int) -> "MockServer":
+    async def handler(
+        method: str, path: str, headers: Dict[str, str], body: bytes
+    ) -> Tuple[int, Dict[str, str], Body]:
+        return status, {"Content-Type": "application/json"}, b'{"error": {}}'
+
+    return MockServer(handler)
+
+
+def _content(response: Dict[str, object]) -> object:
+    return response["choices"][0]["message"]["content"]  # type: ignore[index]
+
+
+class TestEndpointHealth:
+    def test_hedge_delay(self) -> None:
+        health = EndpointHealth(HedgingPolicy(min_samples=10, initial_delay=2.0))
+        assert health.hedge_delay() == 2.0
+        assert health.quantile(0.95) is None
+        for i in range(100):
+            health.record_success(i / 100)
+
+        assert health.hedge_delay() == pytest.approx(0.95)
+        assert health.quantile(0.5) == pytest.approx(0.5)
+        # streamed requests are tracked separately
+        assert health.hedge_delay("stream") == 2.0
+        assert HedgingPolicy().initial_delay is None
+        assert EndpointHealth(HedgingPolicy()).hedge_delay() is None
+
+    def test_window(self) -> None:
+        health = EndpointHealth(HedgingPolicy(window=3))
+        for latency in (1.0, 2.0, 3.0, 4.0):
+            health.record_latency(latency)
+        assert health.latencies() == [2.0, 3.0, 4.0]
+
+    def test_health(self) -> None:
+        policy = HedgingPolicy(alpha=0.5, max_failures=2, cooldown=10.0)
+        health = EndpointHealth(policy)
+        assert health.is_healthy()
+
+        health.record_failure(now=0.0)
+        assert health.score == 0.5
+        assert health.is_healthy(now=0.0)
+        health.record_success(0.1)
+        assert health.score == 0.75
+
+        health.record_failure(now=0.0)
+        health.record_failure(now=0.0)
+        # in cooldown after two consecutive failures, then unhealthy score
+        assert not health.is_healthy(now=5.0)
+        assert health.score < policy.min_health
+        assert not health.is_healthy(now=11.0)
+        health.record_success(0.1)
+        assert health.is_healthy(now=11.0)
+        assert health.failures == 3
+        assert health.requests == 5
+
+
+def test_is_retriable() -> None:
+    assert is_retriable(APIError(500, b""))
+    assert is_retriable(APIError(429, b""))
+    assert not is_retriable(APIError(400, b""))
+    assert is_retriable(ConnectionResetError())
+    assert is_retriable(asyncio.TimeoutError())
+    assert not is_retriable(ValueError())
+
+
+class TestHedgedClient:
+    @pytest.mark.asyncio()
+    async def test_hedge(self) -> None:
+        slow = MockLLMServer(latency=Latency.constant(1.0))
+        fast = MockLLMServer(latency=Latency.constant(0.01))
+        async with slow, fast:
+            registry = ClientRegistry()
+            client = HedgedClient(
+                [
+                    ModelClient(slow.url, registry=registry),
+                    Endpoint(ModelClient(fast.url, registry=registry), {"model": "b"}),
+                ],
+                HedgingPolicy(initial_delay=0.1),
+            )
+            t0 = time.monotonic()
+            response = await client.create(PARAMS)
+            elapsed = time.monotonic() - t0
+            await registry.aclose()
+
+        assert _content(response) == "echo: hi"
+        assert response["model"] == "b"
+        assert 0.1 <= elapsed < 0.5
+        assert slow.stats.requests == fast.stats.requests == 1
+        assert client.stats.hedges == 1
+        assert client.stats.hedge_wins == 1
+        assert client.stats.hedge_ratio == 1.0
+        # the cancelled request took at least the hedge delay
+        assert client.health[0].latencies()[0] >= 0.1
+        assert client.health[0].failures == 0
+
+    @pytest.mark.asyncio()
+    async def test_no_hedge(self) -> None:
+        fast = MockLLMServer(latency=Latency.constant(0.01))
+        backup = MockLLMServer()
+        async with fast, backup:
+            registry = ClientRegistry()
+            client = HedgedClient(
+                [
+                    ModelClient(fast.url, registry=registry),
+                    ModelClient(backup.url, registry=registry),
+                ],
+                HedgingPolicy(initial_delay=0.5),
+            )
+            for _ in range(3):
+                assert _content(await client.create(PARAMS)) == "echo: hi"
+            await registry.aclose()
+
+        assert backup.stats.requests == 0
+        assert client.stats.hedges == 0
+        assert client.stats.requests == 3
+        assert len(client.health[0].latencies()) == 3
+
+    @pytest.mark.asyncio()
+    async def test_fallback(self) -> None:
+        failing = _status_handler(503)
+        async with failing, MockLLMServer() as backup:
+            registry = ClientRegistry()
+            client = HedgedClient(
+                [
+                    Endpoint(ModelClient(failing.url, registry=registry)),
+                    Endpoint(ModelClient(backup.url, registry=registry)),
+                ],
+                HedgingPolicy(max_failures=2),
+            )
+            for _ in range(4):
+                assert _content(await client.create(PARAMS)) == "echo: hi"
+            await registry.aclose()
+
+        # the failing endpoint is skipped after two failures
+        assert len(failing.requests) == 2
+        assert backup.stats.requests == 4
+        assert client.stats.fallbacks == 2
+        assert client.stats.failures == 0
+        assert not client.health[0].is_healthy()
+
+    @pytest.mark.asyncio()
+    async def test_errors(self) -> None:
+        bad_request = _status_handler(400)
+        failing = _status_handler(500)
+        async with bad_request, failing:
+            registry = ClientRegistry()
+            client = HedgedClient(
+                [
+                    ModelClient(bad_request.url, registry=registry),
+                    ModelClient(failing.url, registry=registry),
+                ]
+            )
+            # not retried on the next endpoint
+            with pytest.raises(APIError) as e:
+                await client.create(PARAMS)
+            assert e.value.status == 400
+            assert len(failing.requests) == 0
+
+            client = HedgedClient([ModelClient(failing.url, registry=registry)])
+            with pytest.raises(APIError) as e:
+                await client.create(PARAMS)
+            assert e.value.status == 500
+            assert client.stats.failures == 1
+            await registry.aclose()
+
+        with pytest.raises(ValueError):
+            HedgedClient([])
+
+    @pytest.mark.asyncio()
+    async def test_stream(self) -> None:
+        async def late_handler(
+            method: str, path: str, headers: Dict[str, str], body: bytes
+        ) -> Tuple[int, Dict[str, str], Body]:
+            await asyncio.sleep(1.0)
+            return await sse_handler(chat_completion_chunks("late"))(
+                method, path, headers, body
+            )
+
+        late = MockServer(late_handler)
+        slow = MockServer(sse_handler(chat_completion_chunks("slow reply"), 0.3))
+        fast = MockServer(sse_handler(chat_completion_chunks("fast reply")))
+        async with late, slow, fast:
+            registry = ClientRegistry()
+            policy = HedgingPolicy(initial_delay=0.1)
+
+            async def stream(*servers: MockServer) -> str:
+                client = HedgedClient(
+                    [ModelClient(s.url, registry=registry) for s in servers], policy
+                )
+                contents = [
+                    chunk["choices"][0]["delta"].get("content") or ""
+                    async for chunk in client.stream(PARAMS)
+                ]
+                return "".join(contents)
+
+            t0 = time.monotonic()
+            assert await stream(late, fast) == "fast reply"
+            assert time.monotonic() - t0 < 0.5
+            # hedged on the first chunk, a slow stream is not hedged
+            assert await stream(slow, fast) == "slow reply"
+            await registry.aclose()
+
+        assert json.loads(late.requests[0][3])["stream"] is True
+        assert len(fast.requests) == 1
+
+    @pytest.mark.asyncio()
+    async def test_from_config_list(self) -> None:
+        client = HedgedClient.from_config_list(
+            [
+                {"model": "a", "base_url": "http://localhost:1/v1"},
+                {"model": "b", "base_url": "http://localhost:2/v1", "api_key": "k"},
+            ],
+            HedgingPolicy(max_hedges=2),
+        )
+        assert [e.name for e in client.endpoints] == [
+            "http://localhost:1/v1 a",
+            "http://localhost:2/v1 b",
+        ]
+        assert client.base_url == "http://localhost:1/v1"
+        assert client.policy.max_hedges == 2
@@ -0,0 +1,176 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from fastagents.history import (
+    History,
+    SlidingWindow,
+    SummaryCheckpoints,
+    approximate_tokens,
+    message_tokens,
+)
+
+
+def _message(role: str, content: str, **kwargs: Any) -> Dict[str, Any]:
+    return {"role": role, "content": content, **kwargs}
+
+
+def _conversation(turns: int) -> List[Dict[str, Any]]:
+    messages = [_message("system", "You are helpful.")]
+    for i in range(turns):
+        messages.append(_message("user", f"question {i} " + "x" * 36))
+        messages.append(_message("assistant", f"answer {i} " + "y" * 36))
+    return messages
+
+
+def test_approximate_tokens() -> None:
+    assert approximate_tokens("") == 0
+    assert approximate_tokens("abcd") == 1
+    assert approximate_tokens("abcde") == 2
+
+
+def test_message_tokens() -> None:
+    tool_calls = [{"id": "1", "function": {"name": "f", "arguments": "{}"}}]
+    assert message_tokens(_message("user", "abcd"), approximate_tokens) == 5
+    assert message_tokens(_message("user", None), approximate_tokens) == 4  # type: ignore[arg-type]
+    assert (
+        message_tokens(
+            _message("user", [{"type": "text", "text": "abcd"}]), approximate_tokens  # type: ignore[arg-type]
+        )
+        == 5
+    )
+    assert (
+        message_tokens(
+            _message("assistant", "", tool_calls=tool_calls), approximate_tokens
+        )
+        > 4
+    )
+
+
+class TestHistory:
+    def test_tokens(self) -> None:
+        calls: List[str] = []
+
+        def tokenizer(text: str) -> int:
+            calls.append(text)
+            return len(text)
+
+        history = History(tokenizer=tokenizer)
+        history.append(_message("user", "abc"))
+        history.append(_message("assistant", "de"))
+        assert history.total_tokens == 3 + 2 + 8
+        assert history.tokens(1) == 6
+        assert history.tokens(0, 1) == 7
+        assert len(calls) == 2
+
+        # totals never re-tokenize old messages
+        history.append(_message("user", "f"))
+        assert history.total_tokens == 18
+        assert len(calls) == 3
+        assert len(history) == 3
+        assert history[2]["content"] == "f"
+        assert [m["content"] for m in history] == ["abc", "de", "f"]
+
+    def test_groups(self) -> None:
+        tool_calls = [{"id": "1", "function": {"name": "f", "arguments": "{}"}}]
+        history = History(
+            [
+                _message("system", "s"),
+                _message("user", "u"),
+                _message("assistant", "", tool_calls=tool_calls),
+                _message("tool", "1", tool_call_id="1"),
+                _message("tool", "2", tool_call_id="2"),
+                _message("assistant", "a"),
+            ]
+        )
+        assert history.num_groups == 4
+        assert [history.group(i) for i in range(4)] == [(0, 1), (1, 2), (2, 5), (5, 6)]
+        assert history.pinned_groups == [0]
+        assert history.group_at(3) == 2
+        assert history.group_at(5) == 3
+
+    def test_custom_pin(self) -> None:
+        history = History(
+            [_message("user", "a"), _message("user", "b", pinned=True)],
+            pin=lambda m: bool(m.get("pinned")),
+        )
+        assert history.pinned_groups == [1]
+
+
+class TestSlidingWindow:
+    @pytest.mark.asyncio()
+    async def test_select(self) -> None:
+        history = History(_conversation(50))
+        strategy = SlidingWindow()
+
+        assert await strategy.select(history, 10_000) == history.messages
+
+        selected = await strategy.select(history, 200)
+        assert selected[0]["role"] == "system"
+        assert selected[-1] == history.messages[-1]
+        assert selected[1:] == history.messages[-len(selected) + 1 :]
+        assert History(selected).total_tokens <= 200
+
+    @pytest.mark.asyncio()
+    async def test_tool_groups_are_not_split(self) -> None:
+        tool_calls = [{"id": "1", "function": {"name": "f", "arguments": "{}"}}]
+        history = History(
+            [
+                _message("user", "u" * 400),
+                _message("assistant", "", tool_calls=tool_calls),
+                _message("tool", "r" * 40, tool_call_id="1"),
+                _message("assistant", "a"),
+            ]
+        )
+        tool_tokens = history.tokens(1, 3)
+        selected = await SlidingWindow().select(history, tool_tokens + 5)
+        assert [m["role"] for m in selected] == ["assistant", "tool", "assistant"]
+
+        selected = await SlidingWindow().select(history, tool_tokens)
+        assert [m["role"] for m in selected] == ["assistant"]
+
+    @pytest.mark.asyncio()
+    async def test_oversized_last_turn(self) -> None:
+        history = History(
+            [
+                _message("system", "s" * 40),
+                _message("user", "u" * 40),
+                _message("assistant", "a" * 40),
+                _message("user", "u" * 4000),
+            ]
+        )
+        with pytest.warns(RuntimeWarning, match="exceed the token budget"):
+            selected = await SlidingWindow().select(history, 100)
+        # the question being replied to is never dropped
+        assert selected == [history.messages[0], history.messages[-1]]
+
+
+class TestSummaryCheckpoints:
+    @pytest.mark.asyncio()
+    async def test_select(self) -> None:
+        summarized: List[List[Dict[str, Any]]] = []
+
+        async def summarize(messages: List[Dict[str, Any]]) -> str:
+            summarized.append(messages)
+            return f"{len(messages)} messages"
+
+        strategy = SummaryCheckpoints(summarize)
+        history = History(_conversation(5))
+        assert await strategy.select(history, 1000) == history.messages
+        assert history.checkpoint is None
+
+        for turn in range(5, 60):
+            history.extend(_conversation(turn + 1)[-2:])
+            selected = await strategy.select(history, 300)
+            assert History(selected).total_tokens <= 300
+            assert selected[0]["role"] == "system"
+            assert selected[-1] == history.messages[-1]
+
+        assert history.checkpoint is not None
+        assert selected[1] == history.checkpoint.message
+        # summaries are made only when the budget is exceeded again
+        assert 1 < len(summarized) < 20
+        # each summary folds the previous one
+        assert summarized[1][0]["content"].startswith("Summary of")
+        # the pinned system message is never summarized
+        assert all(m["role"] != "system" for m in summarized[0])
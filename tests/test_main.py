@@ -1,5 +1,134 @@
+import json
+import signal
+import subprocess  # nosec: B404
+import sys
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
 from fastagents.__main__ import main
 
 
-def test_me() -> None:
-    main()
+def test_me(capsys: pytest.CaptureFixture[str]) -> None:
+    assert main([]) == 0
+    assert capsys.readouterr().out.startswith("version: ")
+
+
+# seconds `python -m fastagents` may spend importing modules after the
+# interpreter has started
+IMPORT_BUDGET = 0.2
+
+# dependencies only needed once an agent or a backend is used
+HEAVY_MODULES = {"autogen", "openai", "pydantic", "googleapiclient", "numpy"}
+
+
+def _import_times(*args: str) -> List[Tuple[str, float]]:
+    """Modules imported by a Python command and their cumulative import time."""
+    stderr = subprocess.run(  # nosec: B603
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = []
+    # lines are "import time: <self us> | <cumulative us> | <indented name>"
+    for line in stderr.splitlines()[1:]:
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        times.append((name[1:].rstrip(), int(cumulative) / 1e6))
+    return times
+
+
+def test_startup_time() -> None:
+    times = _import_times("-m", "fastagents")
+
+    imported = {name.strip().split(".")[0] for name, _ in times}
+    assert not imported & HEAVY_MODULES
+
+    # top-level imports after site are the ones of fastagents
+    names = [name for name, _ in times]
+    after_site = times[names.index("site") + 1 :]
+    total = sum(t for name, t in after_site if not name.startswith(" "))
+    assert total < IMPORT_BUDGET, f"{total:.3f}s spent importing"
+
+
+def test_run(tmp_path: Path) -> None:
+    tasks = tmp_path / "tasks.jsonl"
+    tasks.write_text(
+        "\n".join(
+            [json.dumps({"id": f"t{i}", "task": f"hello {i}"}) for i in range(10)]
+            + [json.dumps("plain")]
+        )
+    )
+    output = tmp_path / "results.jsonl"
+    exit_code = main(
+        [
+            "run",
+            "tests.test_workers:create_agent",
+            "--workers",
+            "2",
+            "--input",
+            str(tasks),
+            "--output",
+            str(output),
+        ]
+    )
+    assert exit_code == 0
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    replies = {r["id"]: r["reply"] for r in results}
+    expected: Dict[Any, str] = {f"t{i}": f"echo: hello {i}" for i in range(10)}
+    assert replies == {**expected, 10: "echo: plain"}
+
+
+def test_run_malformed_line(tmp_path: Path) -> None:
+    tasks = tmp_path / "tasks.jsonl"
+    tasks.write_text('"first"\n{not json\n"last"\n')
+    output = tmp_path / "results.jsonl"
+    exit_code = main(
+        [
+            "run",
+            "tests.test_workers:create_agent",
+            "--workers",
+            "1",
+            "--input",
+            str(tasks),
+            "--output",
+            str(output),
+        ]
+    )
+    # the bad line is reported and the other tasks still run
+    assert exit_code == 1
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    results.sort(key=lambda r: r["id"])
+    assert [r["reply"] for r in results] == ["echo: first", None, "echo: last"]
+    assert results[1]["error"].startswith("JSONDecodeError: ")
+
+
+def test_serve() -> None:
+    process = subprocess.Popen(  # nosec: B603
+        [
+            sys.executable,
+            "-m",
+            "fastagents",
+            "serve",
+            "tests.test_workers:create_agent",
+            "named=tests.test_workers:create_agent",
+            "--port",
+            "0",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert process.stdout is not None
+        line = process.stdout.readline()
+        assert line.startswith("serving echo, named on http://127.0.0.1:")
+        url = line.split()[-1]
+        with urllib.request.urlopen(f"{url}/agents") as response:  # nosec: B310
+            assert json.load(response) == {"agents": ["echo", "named"]}
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=10) == 0
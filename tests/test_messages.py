@@ -0,0 +1,154 @@
+import json
+import sys
+from typing import Any, Dict, List
+
+import pytest
+
+from fastagents.messages import (
+    EncodedMessages,
+    Message,
+    MessageLog,
+    check_conversation_id,
+    encode_message,
+)
+
+
+def _deep_sizeof(obj: Any) -> int:
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, list):
+        size += sum(_deep_sizeof(x) for x in obj)
+    return size
+
+
+def _messages(n: int) -> List[Dict[str, Any]]:
+    messages: List[Dict[str, Any]] = [{"role": "system", "content": "Be helpful."}]
+    for i in range(n):
+        messages.append({"role": "user", "content": f"question {i}", "name": "alice"})
+        messages.append({"role": "assistant", "content": f"answer {i} ünïcödé"})
+    return messages
+
+
+def test_encode_message() -> None:
+    assert (
+        encode_message({"content": "hé", "name": None, "role": "user", "extra": 1})
+        == '{"role":"user","content":"hé"}'.encode()
+    )
+
+
+def test_check_conversation_id() -> None:
+    assert check_conversation_id("c-1.2_x") == "c-1.2_x"
+    for invalid in ["", "../c1", "c 1", "c/1"]:
+        with pytest.raises(ValueError, match="Invalid conversation id"):
+            check_conversation_id(invalid)
+
+
+class TestMessage:
+    def test_roundtrip(self) -> None:
+        message = Message("user", "hi", name="alice")
+        assert message.to_dict() == {"role": "user", "content": "hi", "name": "alice"}
+        assert Message.from_dict({**message.to_dict(), "extra": 1}) == message
+        assert Message("user", "hi") != message
+        assert repr(Message("user", "hi")) == "Message(role='user', content='hi')"
+
+    def test_interned(self) -> None:
+        name = "".join(["al", "ice"])
+        assert (
+            Message("user", "hi", name=name).name
+            is Message("user", "", name="alice").name
+        )
+
+    def test_slots(self) -> None:
+        with pytest.raises(AttributeError):
+            Message("user").extra = 1  # type: ignore[attr-defined]
+
+
+class TestMessageLog:
+    def test_append(self) -> None:
+        messages = _messages(3)
+        log = MessageLog(messages)
+        assert len(log) == 7
+        assert log.to_dicts() == messages
+        assert log.to_dicts(1, 3) == messages[1:3]
+        assert log[0] == Message("system", "Be helpful.")
+        assert log[-1].content == "answer 2 ünïcödé"
+        assert [m.role for m in log[1:3]] == ["user", "assistant"]
+        assert [m.role for m in log] == [m["role"] for m in messages]
+        assert log.role(1) == "user"
+        assert log.role(-1) == "assistant"
+        with pytest.raises(IndexError):
+            log[7]
+
+        log.append(Message("user", "more"))
+        assert log[7].content == "more"
+
+    def test_tool_responses(self) -> None:
+        tool_response = {"role": "tool", "tool_call_id": "1", "content": "3"}
+        log = MessageLog(
+            [
+                {"role": "tool", "content": "3", "tool_responses": [tool_response]},
+                {"role": "user", "content": "ok", "tool_responses": [tool_response]},
+            ]
+        )
+        assert log.to_dicts() == [
+            tool_response,
+            tool_response,
+            {"role": "user", "content": "ok"},
+        ]
+
+    def test_json_array(self) -> None:
+        messages = _messages(3)
+        log = MessageLog(messages)
+        system = {"role": "system", "content": "prefix"}
+
+        encoded = log.json_array(2, 5, prefix=[system])
+        assert isinstance(encoded, EncodedMessages)
+        assert json.loads(encoded) == [system] + messages[2:5]
+        assert json.loads(log.json_array(3, 3)) == []
+
+        # the arena can grow after building an array
+        log.append({"role": "user", "content": "more"})
+        assert len(log) == 8
+
+    def test_raw(self) -> None:
+        log = MessageLog(_messages(1))
+        view = log.raw(1)
+        assert json.loads(view.tobytes()) == _messages(1)[1]
+        view.release()
+
+    def test_serialization(self) -> None:
+        messages = _messages(10)
+        messages.append({"role": "critic", "content": "custom role"})
+        log = MessageLog(messages)
+        data = log.to_bytes()
+
+        restored = MessageLog.from_bytes(data)
+        assert restored.to_dicts() == messages
+        assert restored.role(len(messages) - 1) == "critic"
+        restored.append({"role": "user", "content": "more"})
+        assert restored[-1].content == "more"
+
+        with pytest.raises(ValueError):
+            MessageLog.from_bytes(b"nope")
+        with pytest.raises(ValueError):
+            MessageLog.from_bytes(data[:-1])
+
+    def test_serialization_delta(self) -> None:
+        messages = _messages(5)
+        log = MessageLog(messages[:4])
+        restored = MessageLog.from_bytes(log.to_bytes())
+
+        log.append({"role": "critic", "content": "new role"})
+        log.extend(messages[4:])
+        delta = MessageLog.from_bytes(log.to_bytes(4))
+        assert len(delta) == len(messages) - 3
+        restored.extend_log(delta)
+        assert restored.to_dicts() == log.to_dicts()
+        assert restored.role(4) == "critic"
+        assert len(MessageLog.from_bytes(log.to_bytes(len(log)))) == 0
+
+    def test_memory(self) -> None:
+        messages = _messages(1000)
+        log = MessageLog(messages)
+        assert log.nbytes * 3 < _deep_sizeof(messages)
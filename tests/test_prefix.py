@@ -0,0 +1,109 @@
+import json
+from typing import Any, Dict, List
+
+from fastagents.prefix import PrefixCache, PromptPrefix, canonical_tools
+
+SYSTEM = [{"role": "system", "content": "You are a helpful assistant."}]
+
+
+def test_canonical_tools() -> None:
+    tools: List[Dict[str, Any]] = [
+        {
+            "type": "function",
+            "function": {
+                "name": "sub",
+                "parameters": {"type": "object", "properties": {"b": {}, "a": {}}},
+            },
+        },
+        {"function": {"name": "add"}, "type": "function"},
+    ]
+    actual = canonical_tools(tools)
+    assert [t["function"]["name"] for t in actual] == ["add", "sub"]
+    assert json.dumps(actual) == json.dumps(
+        [
+            {"function": {"name": "add"}, "type": "function"},
+            {
+                "function": {
+                    "name": "sub",
+                    "parameters": {"properties": {"a": {}, "b": {}}, "type": "object"},
+                },
+                "type": "function",
+            },
+        ]
+    )
+
+
+def test_prompt_prefix() -> None:
+    prefix = PromptPrefix(SYSTEM)
+    assert (
+        prefix.encoded == b'{"role":"system","content":"You are a helpful assistant."}'
+    )
+    assert prefix.matches([dict(SYSTEM[0])])
+    assert not prefix.matches([{"role": "system", "content": "Be brief."}])
+    assert not prefix.matches([])
+    assert PromptPrefix([]).encoded == b""
+
+
+def test_encode() -> None:
+    cache = PrefixCache()
+    prefix = PromptPrefix(SYSTEM)
+    messages: List[Dict[str, Any]] = [
+        {"content": "héllo", "role": "user", "name": None, "extra": 1}
+    ]
+
+    first = cache.encode(prefix, messages)
+    assert json.loads(first) == SYSTEM + [{"role": "user", "content": "héllo"}]
+    assert cache.stats.encoded_bytes == len(b'{"role":"user","content":"h\xc3\xa9llo"}')
+
+    messages.append({"role": "assistant", "content": "hi"})
+    second = cache.encode(prefix, messages)
+    assert second.startswith(first[:-1] + b",")
+    assert len(cache) == 2
+    assert cache.stats.requests == 2
+    # the system message twice and the user message once
+    assert cache.stats.reused_bytes == 2 * len(prefix.encoded) + len(
+        '{"role":"user","content":"héllo"}'.encode()
+    )
+    assert PrefixCache().encode(PromptPrefix([]), []) == b"[]"
+
+
+def test_encode_by_identity() -> None:
+    cache = PrefixCache()
+    prefix = PromptPrefix([])
+    message = {"role": "user", "content": "hello"}
+    cache.encode(prefix, [message])
+
+    # an equal message is another message
+    cache.encode(prefix, [dict(message)])
+    assert cache.stats.reused_bytes == 0
+    cache.encode(prefix, [message])
+    assert cache.stats.reused_bytes == cache.stats.encoded_bytes // 2
+
+
+def test_evict() -> None:
+    cache = PrefixCache(max_entries=2)
+    prefix = PromptPrefix([])
+    messages = [{"role": "user", "content": str(i)} for i in range(3)]
+    cache.encode(prefix, messages[:2])
+    # the first message is used again, the second one is evicted
+    cache.encode(prefix, [messages[0], messages[2]])
+    assert len(cache) == 2
+    cache.encode(prefix, messages[:1])
+    assert cache.stats.reused_bytes == 2 * len(b'{"role":"user","content":"0"}')
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_record() -> None:
+    cache = PrefixCache()
+    assert cache.stats.hit_ratio == 0.0
+    assert cache.stats.reuse_ratio == 0.0
+
+    cache.record({"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 0}})
+    cache.record(
+        {"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 900}}
+    )
+    cache.record({"prompt_tokens": 0})
+    cache.record(None)
+    assert cache.stats.hit_ratio == 0.45
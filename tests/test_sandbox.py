@@ -0,0 +1,148 @@
+import asyncio
+import subprocess  # nosec: B404
+import sys
+import threading
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+
+from fastagents.sandbox import Output, ResourceLimits, SandboxPool
+
+
+@pytest.fixture()
+def pool() -> Iterator[SandboxPool]:
+    with SandboxPool(2, timeout=10, preload=["json"]) as pool:
+        yield pool
+
+
+class TestSandboxPool:
+    def test_run(self, pool: SandboxPool) -> None:
+        result = pool.run("import sys\nprint('out')\nprint('err', file=sys.stderr)")
+        assert result.exit_code == 0
+        assert result.outputs == [Output("stdout", "out\n"), Output("stderr", "err\n")]
+        assert (result.stdout, result.stderr) == ("out\n", "err\n")
+        assert result.output == "out\nerr\n"
+        assert not result.timed_out
+
+        result = pool.run("import sys\nsys.exit(3)")
+        assert (result.exit_code, result.output) == (3, "")
+
+        result = pool.run("def f():\n    1 / 0\nf()")
+        assert result.exit_code == 1
+        assert result.stderr.startswith("Traceback (most recent call last):\n")
+        assert 'File "<sandbox>", line 2, in f' in result.stderr
+        assert "_execute" not in result.stderr
+        assert result.stderr.endswith("ZeroDivisionError: division by zero\n")
+
+        result = pool.run("def f(:")
+        assert result.exit_code == 1
+        assert "SyntaxError" in result.stderr
+
+    def test_reset(self, pool: SandboxPool, tmp_path: Path) -> None:
+        code = (
+            "import os, sys\n"
+            "print(globals().get('x'), os.environ.get('SANDBOX'), len(sys.path))\n"
+            "x = 1\n"
+            "os.environ['SANDBOX'] = '1'\n"
+            "sys.path.append('/tmp')\n"
+            f"os.chdir({str(tmp_path)!r})\n"
+        )
+        first = pool.run(code)
+        # both workers run the code twice
+        for _ in range(3):
+            assert pool.run(code).output == first.output
+        assert first.output.startswith("None None ")
+        assert pool.run("import os; print(os.getcwd())").output != f"{tmp_path}\n"
+        assert pool.stats.workers_started == 2
+
+    def test_streaming(self, pool: SandboxPool) -> None:
+        async def run() -> List[str]:
+            outputs: List[str] = []
+            result = await pool.arun(
+                "import time\nfor i in range(3):\n    print(i)\n    time.sleep(0.1)",
+                on_output=lambda output: outputs.append(output.text),
+            )
+            assert result.exit_code == 0
+            return outputs
+
+        # every line is sent as soon as it is printed
+        assert asyncio.run(run()) == ["0\n", "1\n", "2\n"]
+
+    def test_timeout(self, pool: SandboxPool) -> None:
+        result = pool.run("import time\nprint('start')\ntime.sleep(10)", timeout=0.5)
+        assert result.timed_out
+        assert result.exit_code == 124
+        assert result.output == "start\n"
+        assert 0.5 <= result.seconds < 2
+        assert pool.stats.timeouts == 1
+
+        # the worker is replaced
+        assert pool.run("print(1)").output == "1\n"
+        assert pool.stats.workers_started == 3
+
+    def test_worker_crash(self, pool: SandboxPool) -> None:
+        result = pool.run("import os\nos._exit(5)")
+        assert result.exit_code == 1
+        assert result.stderr == "Worker died, exit code 5\n"
+        assert pool.run("print(1)").exit_code == 0
+
+    def test_max_uses(self) -> None:
+        with SandboxPool(1, max_uses=2) as pool:
+            pids = [pool.run("import os; print(os.getpid())").output for _ in range(4)]
+            assert pids[0] == pids[1] != pids[2] == pids[3]
+            assert pool.stats.runs == 4
+            assert pool.stats.warm_runs >= 1
+
+            pool.restart()
+            assert pool.run("import os; print(os.getpid())").output != pids[3]
+
+    def test_limits(self) -> None:
+        limits = ResourceLimits(cpu_seconds=1, memory_bytes=1 << 30, max_output=30)
+        with SandboxPool(1, timeout=10, limits=limits) as pool:
+            result = pool.run("while True: pass")
+            assert not result.timed_out
+            assert result.exit_code == 1
+            assert result.output == "CPU time limit exceeded\n"
+
+            result = pool.run("x = bytearray(2 << 30)")
+            assert result.exit_code == 1
+            assert result.stderr.endswith("[output truncated]\n")
+
+            result = pool.run("print('x' * 100)")
+            assert result.output == "x" * 30 + "\n[output truncated]\n"
+            assert pool.stats.workers_started == 3
+
+    def test_close_wakes_waiting_runs(self) -> None:
+        pool = SandboxPool(1, timeout=10)
+        errors: List[Exception] = []
+
+        def run() -> None:
+            try:
+                pool.run("print(1)")
+            except RuntimeError as e:
+                errors.append(e)
+
+        pool.run("print(1)")
+        # take the only worker so that the runs wait for one
+        pool._idle.get()
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        pool.close()
+        for thread in threads:
+            thread.join(5)
+        assert not any(thread.is_alive() for thread in threads)
+        assert len(errors) == 2
+
+
+def test_import_without_resource() -> None:
+    # the `resource` module does not exist on Windows
+    script = (
+        "import sys; sys.modules['resource'] = None; "
+        "import fastagents.autogen; print(fastagents.autogen.AutogenAgent.__name__)"
+    )
+    output = subprocess.run(  # nosec: B603
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout
+    assert output == "AutogenAgent\n"
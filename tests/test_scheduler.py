@@ -0,0 +1,204 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+from fastagents.client import ClientRegistry, ModelClient
+from fastagents.scheduler import (
+    RateLimit,
+    RequestScheduler,
+    SupportsBatch,
+    TokenBucket,
+    estimate_tokens,
+)
+
+from .utils import MockServer, chat_completion
+
+
+def _params(content: str = "hi", model: str = "gpt-mock") -> Dict[str, Any]:
+    return {"model": model, "messages": [{"role": "user", "content": content}]}
+
+
+class BatchClient(ModelClient):
+    def __init__(self) -> None:
+        super().__init__("http://localhost")
+        self.batches: List[List[Dict[str, Any]]] = []
+
+    async def create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return (await self.create_batch([params]))[0]
+
+    async def create_batch(self, params: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self.batches.append(params)
+        await asyncio.sleep(0.001)
+        return [chat_completion(p["messages"][-1]["content"]) for p in params]
+
+
+def test_estimate_tokens() -> None:
+    assert estimate_tokens(_params("x" * 400)) == 101
+    assert estimate_tokens({**_params("x" * 400), "max_tokens": 50}) == 151
+    assert estimate_tokens({}) == 1
+
+
+class TestTokenBucket:
+    def test_try_acquire(self) -> None:
+        bucket = TokenBucket(rate=1, capacity=2)
+        assert bucket.try_acquire()
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+
+    @pytest.mark.asyncio()
+    async def test_acquire(self) -> None:
+        bucket = TokenBucket(rate=100, capacity=5)
+        t0 = time.monotonic()
+        for _ in range(10):
+            await bucket.acquire()
+        # 5 tokens from the full bucket, 5 more at 100 tokens per second
+        assert 0.04 <= time.monotonic() - t0 < 0.5
+
+        # requests larger than the capacity are capped instead of waiting forever
+        await asyncio.wait_for(bucket.acquire(1000), timeout=1)
+
+    def test_invalid_rate(self) -> None:
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+
+
+class TestRequestScheduler:
+    @pytest.mark.asyncio()
+    async def test_coalescing(self) -> None:
+        async def slow_handler(*args: Any) -> Any:
+            await asyncio.sleep(0.02)
+            return 200, {}, b'{"choices": [{"message": {"content": "ok"}}]}'
+
+        async with MockServer(slow_handler) as server:
+            client = ModelClient(server.url, registry=ClientRegistry())
+            scheduler = RequestScheduler()
+
+            responses = await asyncio.gather(
+                *[scheduler.submit(client, _params()) for _ in range(20)],
+                scheduler.submit(client, _params("other")),
+            )
+            assert all(r == responses[0] for r in responses)
+            assert len(server.requests) == 2
+            assert scheduler.stats.submitted == 21
+            assert scheduler.stats.coalesced == 19
+            assert scheduler.stats.sent == 2
+
+            # requests are coalesced only while in flight
+            await scheduler.submit(client, _params())
+            assert len(server.requests) == 3
+
+    @pytest.mark.asyncio()
+    async def test_coalescing_identical_only(self) -> None:
+        client = BatchClient()
+        scheduler = RequestScheduler()
+        await asyncio.gather(
+            scheduler.submit(client, _params()),
+            scheduler.submit(client, {**_params(), "max_tokens": 10}),
+            scheduler.submit(
+                client, {**_params(), "response_format": {"type": "json_object"}}
+            ),
+            scheduler.submit(client, {**_params(), "seed": 1}),
+        )
+        assert scheduler.stats.coalesced == 0
+        assert len(client.batches) == 4
+
+    @pytest.mark.asyncio()
+    async def test_coalescing_cancelled_caller(self) -> None:
+        client = BatchClient()
+        scheduler = RequestScheduler()
+        first = asyncio.ensure_future(scheduler.submit(client, _params()))
+        second = asyncio.ensure_future(scheduler.submit(client, _params()))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert (await second)["choices"][0]["message"]["content"] == "hi"
+
+    @pytest.mark.asyncio()
+    async def test_rate_limit(self) -> None:
+        client = BatchClient()
+        scheduler = RequestScheduler(
+            limits={"slow": RateLimit(requests_per_minute=1200)},
+        )
+        t0 = time.monotonic()
+        await asyncio.gather(
+            *[scheduler.submit(client, _params(str(i), "slow")) for i in range(25)]
+        )
+        # a burst of 20 requests, then 20 requests per second
+        assert time.monotonic() - t0 >= 0.2
+        assert scheduler.stats.max_queue_depth >= 5
+        assert scheduler.stats.queue_depth == 0
+        assert scheduler.stats.mean_wait > 0
+
+        t0 = time.monotonic()
+        await asyncio.gather(
+            *[scheduler.submit(client, _params(str(i), "fast")) for i in range(25)]
+        )
+        assert time.monotonic() - t0 < 0.2
+
+    @pytest.mark.asyncio()
+    async def test_token_limit(self) -> None:
+        client = BatchClient()
+        scheduler = RequestScheduler(
+            default_limit=RateLimit(tokens_per_minute=6000),
+        )
+        t0 = time.monotonic()
+        await asyncio.gather(
+            *[scheduler.submit(client, _params(str(i) * 4000)) for i in range(5)]
+        )
+        # 5005 tokens of a budget of 6000 tokens refilled at 100 tokens per second
+        assert time.monotonic() - t0 < 0.05
+
+        t0 = time.monotonic()
+        await scheduler.submit(client, _params("x" * 4040))
+        assert time.monotonic() - t0 >= 0.1
+
+    @pytest.mark.asyncio()
+    async def test_batching(self) -> None:
+        client = BatchClient()
+        assert isinstance(client, SupportsBatch)
+        scheduler = RequestScheduler(max_batch_size=4, batch_window=0.01)
+
+        responses = await asyncio.gather(
+            *[scheduler.submit(client, _params(str(i))) for i in range(10)]
+        )
+        actual = [r["choices"][0]["message"]["content"] for r in responses]
+        assert actual == [str(i) for i in range(10)]
+        assert [len(b) for b in client.batches] == [4, 4, 2]
+        assert scheduler.stats.batches == 3
+        assert scheduler.stats.batching_ratio == 10 / 3
+        assert scheduler.stats.queue_depth == 0
+
+    @pytest.mark.asyncio()
+    async def test_batching_error(self) -> None:
+        class FailingClient(BatchClient):
+            async def create_batch(
+                self, params: List[Dict[str, Any]]
+            ) -> List[Dict[str, Any]]:
+                raise RuntimeError("boom")
+
+        scheduler = RequestScheduler(max_batch_size=2)
+        with pytest.raises(RuntimeError, match="boom"):
+            await scheduler.submit(FailingClient(), _params())
+
+    @pytest.mark.asyncio()
+    async def test_batching_missing_responses(self) -> None:
+        class ShortClient(BatchClient):
+            async def create_batch(
+                self, params: List[Dict[str, Any]]
+            ) -> List[Dict[str, Any]]:
+                return (await super().create_batch(params))[:1]
+
+        client = ShortClient()
+        scheduler = RequestScheduler(max_batch_size=2)
+        first, second = await asyncio.wait_for(
+            asyncio.gather(
+                scheduler.submit(client, _params("a")),
+                scheduler.submit(client, _params("b")),
+                return_exceptions=True,
+            ),
+            timeout=1,
+        )
+        assert first["choices"][0]["message"]["content"] == "a"  # type: ignore[index]
+        assert isinstance(second, RuntimeError)
+        assert "Expected 2 responses" in str(second)
@@ -0,0 +1,320 @@
+import asyncio
+import base64
+import json
+import os
+import struct
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import pytest
+from autogen import ConversableAgent
+
+from fastagents.autogen import AutogenAgent
+from fastagents.bench import MockLLMServer
+from fastagents.client import ClientRegistry, ConnectionPool
+from fastagents.server import AgentServer
+from fastagents.streaming import iter_sse_events
+
+from .test_workers import create_agent
+
+
+async def _request(
+    pool: ConnectionPool, method: str, target: str, data: Any = None
+) -> Tuple[int, Any]:
+    body = b"" if data is None else json.dumps(data).encode()
+    response = await pool.request(method, target, body=body)
+    payload = await response.aread()
+    if response.headers.get("content-type", "").startswith("application/json"):
+        return response.status, json.loads(payload) if payload else None
+    return response.status, payload.decode()
+
+
+@asynccontextmanager
+async def _serve(**kwargs: Any) -> AsyncIterator[Tuple[AgentServer, ConnectionPool]]:
+    async with AgentServer({"echo": create_agent()}, **kwargs) as server:
+        pool = ConnectionPool(server.url, max_connections=100)
+        try:
+            yield server, pool
+        finally:
+            for connection in pool._idle:
+                connection.close()
+
+
+class TestAgentServer:
+    @pytest.mark.asyncio()
+    async def test_health(self) -> None:
+        async with _serve() as (server, pool):
+            status, body = await _request(pool, "GET", "/health")
+            assert status == 200
+            assert body["status"] == "ok"
+            assert body["sessions"] == 0
+
+            assert await _request(pool, "GET", "/agents") == (200, {"agents": ["echo"]})
+            assert (await _request(pool, "GET", "/nope"))[0] == 404
+            assert (await _request(pool, "POST", "/health"))[0] == 405
+
+    @pytest.mark.asyncio()
+    async def test_session(self) -> None:
+        async with _serve() as (server, pool):
+            status, body = await _request(pool, "POST", "/sessions", {})
+            assert status == 201
+            assert body["agent"] == "echo"
+            target = f"/sessions/{body['id']}"
+
+            for content in ["hello", "again"]:
+                assert await _request(
+                    pool, "POST", f"{target}/messages", {"content": content}
+                ) == (200, {"reply": f"echo: {content}"})
+
+            status, body = await _request(pool, "GET", target)
+            assert [m["content"] for m in body["messages"]] == [
+                "hello",
+                "echo: hello",
+                "again",
+                "echo: again",
+            ]
+            # every request went over the same keep-alive connection
+            assert server.stats.connections == 1
+
+            assert (await _request(pool, "DELETE", target))[0] == 204
+            assert (await _request(pool, "GET", target))[0] == 404
+            assert server.stats.sessions_closed == 1
+
+    @pytest.mark.asyncio()
+    async def test_bad_requests(self) -> None:
+        async with _serve() as (server, pool):
+            status, body = await _request(pool, "POST", "/sessions", {"agent": "nope"})
+            assert status == 404
+            assert "nope" in body["error"]
+
+            _, body = await _request(pool, "POST", "/sessions")
+            target = f"/sessions/{body['id']}/messages"
+            status, _ = await _request(pool, "POST", target, {"text": "hello"})
+            assert status == 400
+            response = await pool.request("POST", target, body=b"{")
+            assert response.status == 400
+            await response.aread()
+
+    @pytest.mark.asyncio()
+    async def test_bad_content_length(self) -> None:
+        async with _serve() as (server, pool):
+            host, port = server.url.rsplit("/", 1)[-1].split(":")
+            for length in ["abc", "-1"]:
+                reader, writer = await asyncio.open_connection(host, int(port))
+                writer.write(
+                    f"POST /sessions HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode()
+                )
+                head = await reader.readuntil(b"\r\n\r\n")
+                assert head.split(b" ")[1] == b"400"
+                writer.close()
+
+    @pytest.mark.asyncio()
+    async def test_failed_turn(self) -> None:
+        async with _serve() as (server, pool):
+            _, body = await _request(pool, "POST", "/sessions", {})
+            target = f"/sessions/{body['id']}"
+
+            status, body = await _request(
+                pool, "POST", f"{target}/messages", {"content": "fail"}
+            )
+            assert status == 500
+            assert body == {"error": "ValueError: failed"}
+
+            # the failed turn is not part of the conversation
+            _, body = await _request(pool, "GET", target)
+            assert body["messages"] == []
+            assert server.stats.errors == 1
+
+    @pytest.mark.asyncio()
+    async def test_concurrent_sessions(self) -> None:
+        async with _serve() as (server, pool):
+
+            async def session(i: int) -> List[Any]:
+                _, body = await _request(pool, "POST", "/sessions", {})
+                target = f"/sessions/{body['id']}/messages"
+                return [
+                    (
+                        await _request(
+                            pool, "POST", target, {"content": f"slow {i} {j}"}
+                        )
+                    )[1]
+                    for j in range(2)
+                ]
+
+            t0 = time.monotonic()
+            replies = await asyncio.gather(*[session(i) for i in range(100)])
+            elapsed = time.monotonic() - t0
+
+            assert replies[7] == [
+                {"reply": "echo: slow 7 0"},
+                {"reply": "echo: slow 7 1"},
+            ]
+            # two turns of 0.2 seconds for all sessions at once
+            assert elapsed < 2.0
+            assert server.stats.turns == 200
+
+    @pytest.mark.asyncio()
+    async def test_evict_idle(self) -> None:
+        async with _serve(idle_timeout=10) as (server, _):
+            sessions = [server.create_session("echo") for _ in range(3)]
+            await server.turn(sessions[0], {"role": "user", "content": "hello"})
+
+            now = time.monotonic()
+            assert server.evict_idle(now) == 0
+            sessions[1].last_used -= 11
+            sessions[2].last_used -= 11
+            # sessions are ordered by last use
+            server.sessions.move_to_end(sessions[0].id)
+            assert server.evict_idle(now) == 2
+            assert list(server.sessions) == [sessions[0].id]
+            assert server.stats.sessions_evicted == 2
+
+    @pytest.mark.asyncio()
+    async def test_max_sessions(self) -> None:
+        async with AgentServer({"echo": create_agent()}, max_sessions=2) as server:
+            first = server.create_session("echo")
+            server.create_session("echo")
+            server.create_session("echo")
+            assert first.id not in server.sessions
+            assert len(server.sessions) == 2
+
+            turns = [
+                asyncio.create_task(server.turn(session, {"content": "slow"}))
+                for session in server.sessions.values()
+            ]
+            await asyncio.sleep(0.05)
+            with pytest.raises(RuntimeError, match="Too many sessions"):
+                server.create_session("echo")
+            await asyncio.gather(*turns)
+
+    @pytest.mark.asyncio()
+    async def test_metrics(self) -> None:
+        async with _serve() as (server, pool):
+            _, body = await _request(pool, "POST", "/sessions", {})
+            await _request(
+                pool, "POST", f"/sessions/{body['id']}/messages", {"content": "a"}
+            )
+
+            status, text = await _request(pool, "GET", "/metrics")
+            assert status == 200
+            lines = text.splitlines()
+            assert "# TYPE fastagents_turns_total counter" in lines
+            assert "fastagents_turns_total 1" in lines
+            assert "fastagents_sessions 1" in lines
+            assert "fastagents_requests_total 3" in lines
+
+
+@pytest.mark.asyncio()
+async def test_stream() -> None:
+    async with MockLLMServer() as llm:
+        registry = ClientRegistry()
+        config_list = [{"model": "gpt-mock", "api_key": "sk-test", "base_url": llm.url}]
+        agent = AutogenAgent(
+            ConversableAgent(
+                name="assistant",
+                llm_config={"config_list": config_list, "cache_seed": None},
+                human_input_mode="NEVER",
+            ),
+            registry=registry,
+        )
+        async with AgentServer({"assistant": agent}) as server:
+            pool = ConnectionPool(server.url)
+            _, body = await _request(pool, "POST", "/sessions", {})
+            response = await pool.request(
+                "POST",
+                f"/sessions/{body['id']}/messages",
+                body=json.dumps({"content": "hello", "stream": True}).encode(),
+            )
+            assert response.headers["content-type"] == "text/event-stream"
+            events = [e async for e in iter_sse_events(response.aiter_lines())]
+            assert events == [
+                {
+                    "content": "echo: hello",
+                    "finish_reason": "stop",
+                },
+                {"reply": "echo: hello"},
+            ]
+            # the connection is reused after the stream
+            assert (await _request(pool, "GET", "/health"))[0] == 200
+            assert server.stats.connections == 1
+            assert len(server.sessions[body["id"]].history) == 2
+        await registry.aclose()
+
+
+class _WebSocketClient:
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url: str, path: str) -> Tuple[int, "_WebSocketClient"]:
+        host, port = url.rsplit("/", 1)[-1].split(":")
+        reader, writer = await asyncio.open_connection(host, int(port))
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(
+            (
+                f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\n"
+                f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode()
+        )
+        head = await reader.readuntil(b"\r\n\r\n")
+        return int(head.split(b" ")[1]), cls(reader, writer)
+
+    def send(self, data: Dict[str, Any], opcode: int = 0x1) -> None:
+        payload = json.dumps(data).encode()
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        head = struct.pack("!BB", 0x80 | opcode, 0x80 | 126) + struct.pack(
+            "!H", len(payload)
+        )
+        self.writer.write(head + mask + masked)
+
+    async def receive(self) -> Tuple[int, bytes]:
+        b0, b1 = await self.reader.readexactly(2)
+        n = b1 & 0x7F
+        if n == 126:
+            (n,) = struct.unpack("!H", await self.reader.readexactly(2))
+        return b0 & 0x0F, await self.reader.readexactly(n)
+
+    async def receive_json(self) -> Dict[str, Any]:
+        opcode, payload = await self.receive()
+        assert opcode == 0x1
+        return json.loads(payload)  # type: ignore[no-any-return]
+
+
+@pytest.mark.asyncio()
+async def test_websocket() -> None:
+    async with _serve() as (server, _):
+        status, _ = await _WebSocketClient.connect(server.url, "/sessions/nope/ws")
+        assert status == 404
+
+        session = server.create_session("echo")
+        status, ws = await _WebSocketClient.connect(
+            server.url, f"/sessions/{session.id}/ws"
+        )
+        assert status == 101
+
+        ws.send({"content": "hello"})
+        assert await ws.receive_json() == {"type": "reply", "reply": "echo: hello"}
+        ws.send({"content": "fail"})
+        assert await ws.receive_json() == {
+            "type": "error",
+            "error": "ValueError: failed",
+        }
+        ws.send({"nope": "again"})
+        assert (await ws.receive_json())["type"] == "error"
+
+        # ping, then close
+        ws.send({}, opcode=0x9)
+        assert (await ws.receive())[0] == 0xA
+        ws.send({}, opcode=0x8)
+        opcode, payload = await ws.receive()
+        assert (opcode, payload) == (0x8, struct.pack("!H", 1000))
+        ws.writer.close()
+
+        assert [m["content"] for m in session.history] == ["hello", "echo: hello"]
+        assert server.stats.websockets == 1
@@ -0,0 +1,154 @@
+import multiprocessing
+import pickle
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from fastagents.messages import MessageLog
+from fastagents.sharedlog import SharedLog, SharedLogStore
+
+
+def _turn(i: int) -> List[Dict[str, Any]]:
+    return [
+        {"role": "user", "content": f"question {i}"},
+        {"role": "assistant", "content": f"answer {i} é"},
+    ]
+
+
+def _read_in_child(log: SharedLog, results: "multiprocessing.Queue[Any]") -> None:
+    results.put((len(log), log.to_dicts()[-1], log.embeddings().tolist()))
+
+
+class TestSharedLog:
+    def test_append_read(self, tmp_path: Path) -> None:
+        messages = _turn(0) + [{"role": "system", "content": "Be brief."}]
+        with SharedLog(tmp_path / "c1", writable=True) as log:
+            assert len(log) == 0
+            assert log.json_array() == b"[]"
+            log.extend(messages)
+            log.append({"role": "tool", "tool_call_id": "1", "content": "2"})
+            messages.append({"role": "tool", "tool_call_id": "1", "content": "2"})
+
+            expected = MessageLog(messages)
+            assert len(log) == 4
+            assert log.to_dicts() == messages
+            assert log.to_dicts(1, 3) == messages[1:3]
+            assert log.json_array() == expected.json_array()
+            prefix = [{"role": "system", "content": "Hi"}]
+            assert log.json_array(2, prefix=prefix) == expected.json_array(
+                2, prefix=prefix
+            )
+            assert bytes(log.raw(-1)) == bytes(expected.raw(-1))
+            assert [log.role(i) for i in range(4)] == [
+                "user",
+                "assistant",
+                "system",
+                "tool",
+            ]
+            assert log[1] == expected[1]
+            assert list(log) == list(expected)
+            assert log[1:3] == expected[1:3]
+            assert log.to_log().to_bytes() == expected.to_bytes()
+            assert log.nbytes > len(expected.json_array())
+            with pytest.raises(IndexError):
+                log.raw(4)
+
+    def test_growth(self, tmp_path: Path) -> None:
+        with SharedLog(tmp_path / "c1", writable=True, size=64) as log:
+            reader = SharedLog(tmp_path / "c1")
+            log.extend(_turn(0))
+            view = reader.raw(0)
+            for i in range(1, 2000):
+                log.extend(_turn(i))
+            # the reader remaps as the writer grows the files, earlier views
+            # stay valid
+            assert len(reader) == 4000
+            assert reader.to_dicts()[-2:] == _turn(1999)
+            assert bytes(view) == b'{"role":"user","content":"question 0"}'
+            view.release()
+            reader.close()
+
+    def test_ownership(self, tmp_path: Path) -> None:
+        owner = SharedLog(tmp_path / "c1", writable=True)
+        owner.extend(_turn(0))
+        with pytest.raises(RuntimeError):
+            SharedLog(tmp_path / "c1", writable=True)
+        reader = SharedLog(tmp_path / "c1")
+        with pytest.raises(RuntimeError):
+            reader.append({"role": "user", "content": "hi"})
+        owner.close()
+
+        # the next owner continues the log
+        with SharedLog(tmp_path / "c1", writable=True) as owner:
+            owner.extend(_turn(1))
+        assert reader.to_dicts() == _turn(0) + _turn(1)
+        reader.close()
+
+        with pytest.raises(FileNotFoundError):
+            SharedLog(tmp_path / "missing")
+        (tmp_path / "bad.idx").write_bytes(b"x" * 8192)
+        (tmp_path / "bad.arena").write_bytes(b"x")
+        with pytest.raises(ValueError):
+            SharedLog(tmp_path / "bad")
+
+    def test_embeddings(self, tmp_path: Path) -> None:
+        with SharedLog(tmp_path / "c1", writable=True) as log:
+            with SharedLog(tmp_path / "c1") as reader:
+                assert reader.embeddings().shape == (0, 0)
+            log.add_embeddings(np.eye(3, dtype=np.float32)[:2])
+            log.add_embeddings([[0.0, 0.0, 1.0]])
+            with pytest.raises(ValueError):
+                log.add_embeddings([[1.0, 2.0]])
+
+            reader = SharedLog(tmp_path / "c1")
+            embeddings = reader.embeddings()
+            assert np.array_equal(embeddings, np.eye(3))
+            assert not embeddings.flags.writeable
+            with pytest.raises(RuntimeError):
+                reader.add_embeddings([[1.0, 0.0, 0.0]])
+            del embeddings
+            reader.close()
+
+    def test_pickle(self, tmp_path: Path) -> None:
+        with SharedLog(tmp_path / "c1", writable=True) as log:
+            for i in range(1000):
+                log.extend(_turn(i))
+            log.add_embeddings([[1.0, 2.0]])
+            data = pickle.dumps(log)
+            # only the path is pickled
+            assert len(data) < 200
+
+            copy = pickle.loads(data)
+            assert not copy.writable
+            assert len(copy) == 2000
+            copy.close()
+
+            # spawn, so that the log is pickled to the child
+            ctx = multiprocessing.get_context("spawn")
+            results: "multiprocessing.Queue[Any]" = ctx.Queue()
+            process = ctx.Process(  # type: ignore[attr-defined]
+                target=_read_in_child, args=(log, results)
+            )
+            process.start()
+            assert results.get(timeout=30) == (2000, _turn(999)[1], [[1.0, 2.0]])
+            process.join()
+
+
+def test_store(tmp_path: Path) -> None:
+    store = SharedLogStore(tmp_path)
+    assert "c.1" not in store
+    with store.open("c.1", writable=True) as log:
+        log.extend(_turn(0))
+        log.add_embeddings([[1.0]])
+    assert "c.1" in store
+    assert list(store) == ["c.1"]
+    with store.open("c.1") as log:
+        assert log.to_dicts() == _turn(0)
+
+    store.delete("c.1")
+    assert list(store) == []
+    assert list(tmp_path.iterdir()) == []
+    with pytest.raises(ValueError):
+        store.open("../c1")
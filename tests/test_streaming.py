@@ -0,0 +1,79 @@
+from typing import AsyncIterator, List
+
+import pytest
+
+from fastagents.streaming import Delta, MessageAccumulator, iter_sse_events
+
+from .utils import chat_completion_chunks
+
+
+async def _aiter(lines: List[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line
+
+
+class TestDelta:
+    def test_from_chunk(self) -> None:
+        chunk = {"choices": [{"delta": {"content": "hi"}, "finish_reason": None}]}
+        assert Delta.from_chunk(chunk) == Delta(content="hi")
+        assert Delta.from_chunk({"choices": []}) is None
+
+
+class TestMessageAccumulator:
+    def test_content(self) -> None:
+        accumulator = MessageAccumulator()
+        for chunk in chat_completion_chunks("Hello there world"):
+            delta = Delta.from_chunk(chunk)
+            assert delta is not None
+            accumulator.add(delta)
+
+        assert accumulator.message == {
+            "role": "assistant",
+            "content": "Hello there world",
+        }
+        assert accumulator.finish_reason == "stop"
+        assert accumulator.to_response()["choices"][0]["finish_reason"] == "stop"
+
+    def test_tool_calls(self) -> None:
+        tool_calls = [
+            {
+                "id": f"call_{i}",
+                "type": "function",
+                "function": {"name": f"f{i}", "arguments": f'{{"x": {i}}}'},
+            }
+            for i in range(2)
+        ]
+        accumulator = MessageAccumulator()
+        for chunk in chat_completion_chunks("", tool_calls):
+            delta = Delta.from_chunk(chunk)
+            assert delta is not None
+            accumulator.add(delta)
+
+        assert accumulator.message == {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": tool_calls,
+        }
+        assert accumulator.finish_reason == "tool_calls"
+
+
+@pytest.mark.asyncio()
+async def test_iter_sse_events() -> None:
+    lines = [
+        ": comment",
+        'data: {"a": 1}',
+        "",
+        "event: message",
+        'data: {"b":',
+        "data: 2}",
+        "",
+        "data: [DONE]",
+        "",
+        'data: {"c": 3}',
+        "",
+    ]
+    actual = [x async for x in iter_sse_events(_aiter(lines))]
+    assert actual == [{"a": 1}, {"b": 2}]
+
+    actual = [x async for x in iter_sse_events(_aiter(['data: {"a": 1}']))]
+    assert actual == [{"a": 1}]
@@ -0,0 +1,113 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from fastagents.history import History, message_tokens
+from fastagents.tokens import TokenCounter, approximate_tokens, get_token_counter
+
+
+class _Encoding:
+    """Encoding splitting texts on spaces, recording its calls."""
+
+    def __init__(self) -> None:
+        self.calls: List[List[str]] = []
+
+    def encode_ordinary(self, text: str) -> List[str]:
+        self.calls.append([text])
+        return text.split()
+
+    def encode_ordinary_batch(self, texts: List[str]) -> List[List[str]]:
+        self.calls.append(texts)
+        return [text.split() for text in texts]
+
+
+def _messages() -> List[Dict[str, Any]]:
+    tool_calls = [{"id": "1", "function": {"name": "f", "arguments": "{}"}}]
+    return [
+        {"role": "system", "content": "be brief"},
+        {"role": "user", "name": "alice", "content": "what is two plus two"},
+        {"role": "assistant", "content": None, "tool_calls": tool_calls},
+        {"role": "tool", "tool_call_id": "1", "content": "four"},
+        {"role": "user", "content": [{"type": "text", "text": "thanks a lot"}]},
+    ]
+
+
+class TestTokenCounter:
+    def test_count(self) -> None:
+        encoding = _Encoding()
+        counter = TokenCounter.from_encoding(encoding)
+        assert counter.count("a b c") == 3
+        assert counter.count("a b c") == 3
+        assert encoding.calls == [["a b c"]]
+        assert (counter.stats.hits, counter.stats.misses) == (1, 1)
+
+        # new texts are tokenized together, once each
+        assert counter.count_many(["a b", "a b c", "d", "a b"]) == [2, 3, 1, 2]
+        assert encoding.calls[1:] == [["a b", "d"]]
+        assert len(counter) == 3
+
+        counter.clear()
+        assert len(counter) == 0
+        assert counter.count("a b c") == 3
+        assert len(encoding.calls) == 3
+
+    def test_messages(self) -> None:
+        encoding = _Encoding()
+        counter = TokenCounter.from_encoding(encoding)
+        messages = _messages()
+        tokenizer = counter.tokenizer
+        expected = [message_tokens(m, tokenizer) for m in messages]
+        encoding.calls.clear()
+
+        assert counter.messages_tokens(messages) == expected
+        assert len(encoding.calls) == 1
+        assert counter.total(messages) == sum(expected)
+        assert counter.message_tokens(messages[1]) == expected[1]
+        assert len(encoding.calls) == 1
+
+    def test_eviction(self) -> None:
+        counter = TokenCounter(len, max_entries=2)
+        assert counter.count_many(["a", "bb", "ccc"]) == [1, 2, 3]
+        assert len(counter) == 2
+        assert counter.stats.evictions == 1
+        counter.count("a")
+        assert counter.stats.misses == 4
+
+        uncached = TokenCounter(len, max_entries=0)
+        assert uncached.count_many(["a", "a"]) == [1, 1]
+        assert len(uncached) == 0
+
+
+def test_get_token_counter(monkeypatch: pytest.MonkeyPatch) -> None:
+    counter = get_token_counter()
+    assert get_token_counter() is counter
+    assert counter.tokenizer is approximate_tokens
+    assert counter.max_entries == 0
+
+    models: List[str] = []
+
+    def from_model(model: str) -> TokenCounter:
+        models.append(model)
+        return TokenCounter.from_encoding(_Encoding())
+
+    monkeypatch.setattr(TokenCounter, "from_model", from_model)
+    monkeypatch.setattr("fastagents.tokens._counters", {})
+    counter = get_token_counter("gpt-4o")
+    assert get_token_counter("gpt-4o") is counter
+    assert counter.count("a b") == 2
+    assert models == ["gpt-4o"]
+
+
+def test_history() -> None:
+    encoding = _Encoding()
+    counter = TokenCounter.from_encoding(encoding)
+    messages = _messages()
+    history = History(messages, tokenizer=counter)
+    assert history.counter is counter
+    assert history.total_tokens == counter.total(messages)
+    assert len(encoding.calls) == 1
+
+    # the counts of a conversation seen before are cached
+    again = History(messages + [{"role": "user", "content": "bye"}], tokenizer=counter)
+    assert again.tokens(0, len(messages)) == history.total_tokens
+    assert encoding.calls[1:] == [["bye"]]
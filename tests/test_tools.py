@@ -0,0 +1,230 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import pytest
+from pydantic import BaseModel, ValidationError
+
+from fastagents.tools import Tool, ToolExecutor, ToolSchema, get_tool_schema
+from fastagents.tracing import Tracer
+
+
+def _tool_call(i: int, name: str, **arguments: Any) -> Dict[str, Any]:
+    return {
+        "id": f"call_{i}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+def blocking_sleep(seconds: float) -> str:
+    time.sleep(seconds)
+    return f"slept {seconds}"
+
+
+async def async_sleep(seconds: float) -> str:
+    await asyncio.sleep(seconds)
+    return f"slept {seconds}"
+
+
+class Point(BaseModel):
+    x: float
+    y: float
+
+
+def distance(a: Point, b: Point, scale: float = 1.0) -> float:
+    """Distance between two points."""
+    return float(scale * ((a.x - b.x) ** 2 + (a.y - b.y) ** 2) ** 0.5)
+
+
+class TestToolSchema:
+    def test_parameters(self) -> None:
+        tool = ToolSchema(distance).to_tool()
+        function = tool["function"]
+        assert function["name"] == "distance"
+        assert function["description"] == "Distance between two points."
+        parameters = function["parameters"]
+        assert parameters["required"] == ["a", "b"]
+        assert parameters["properties"]["scale"]["default"] == 1.0
+        assert parameters["additionalProperties"] is False
+
+    def test_validate_json(self) -> None:
+        schema = ToolSchema(distance)
+        arguments = schema.validate_json(
+            b'{"a": {"x": 0, "y": 0}, "b": {"x": "3", "y": 4}}'
+        )
+        assert arguments == {"a": Point(x=0, y=0), "b": Point(x=3, y=4)}
+        assert distance(**arguments) == 5.0
+
+        with pytest.raises(ValidationError):
+            schema.validate_json('{"a": {"x": 0, "y": 0}}')
+        with pytest.raises(ValidationError):
+            schema.validate_json('{"a": {"x": 0, "y": 0}, "b": {}, "c": 1}')
+
+    def test_untyped(self) -> None:
+        def f(a, *args, b=2, **kwargs):  # type: ignore[no-untyped-def]
+            return a
+
+        schema = ToolSchema(f)
+        assert schema.validate_json('{"a": [1], "z": 3}') == {"a": [1], "z": 3}
+        with pytest.raises(ValidationError):
+            schema.validate_json("")
+        assert schema.parameters["required"] == ["a"]
+
+    def test_cached(self) -> None:
+        class Calculator:
+            def add(self, a: int, b: int) -> int:
+                return a + b
+
+        assert get_tool_schema(square) is get_tool_schema(square)
+        schema = get_tool_schema(Calculator().add)
+        assert schema is get_tool_schema(Calculator().add)
+        assert list(schema.parameters["properties"]) == ["a", "b"]
+
+
+def test_tool() -> None:
+    with pytest.raises(ValueError):
+        Tool(square, executor="gpu")
+    with pytest.raises(ValueError):
+        Tool(square, executor="async")
+
+
+@pytest.mark.asyncio()
+async def test_execute_concurrently() -> None:
+    executor = ToolExecutor()
+    executor.register("async_sleep", async_sleep)
+    executor.register("blocking_sleep", blocking_sleep)
+    assert executor.tools["async_sleep"].executor == "async"
+    assert executor.tools["blocking_sleep"].executor == "thread"
+
+    tool_calls = [
+        _tool_call(i, name, seconds=0.2 - 0.02 * i)
+        for i, name in enumerate(["async_sleep", "blocking_sleep"] * 3)
+    ]
+    t0 = time.monotonic()
+    results = await executor.execute(tool_calls)
+    elapsed = time.monotonic() - t0
+    executor.close()
+
+    assert elapsed < 0.5
+    # results are in the order of the calls, not of completion
+    assert [r["tool_call_id"] for r in results] == [f"call_{i}" for i in range(6)]
+    assert results[0] == {
+        "role": "tool",
+        "tool_call_id": "call_0",
+        "content": "slept 0.2",
+    }
+
+
+@pytest.mark.asyncio()
+async def test_execute_process() -> None:
+    executor = ToolExecutor(process_workers=2)
+    executor.register("square", square, executor="process")
+    results = await executor.execute([_tool_call(i, "square", x=i) for i in range(4)])
+    executor.close()
+    assert [r["content"] for r in results] == ["0", "1", "4", "9"]
+
+
+@pytest.mark.asyncio()
+async def test_timeout() -> None:
+    executor = ToolExecutor(timeout=0.05)
+    executor.register("async_sleep", async_sleep)
+    executor.register("blocking_sleep", blocking_sleep, timeout=1.0)
+    results = await executor.execute(
+        [
+            _tool_call(0, "async_sleep", seconds=1.0),
+            _tool_call(1, "blocking_sleep", seconds=0.1),
+        ]
+    )
+    executor.close()
+    assert results[0]["content"] == "Error: Function async_sleep timed out after 0.05s."
+    assert results[1]["content"] == "slept 0.1"
+
+
+@pytest.mark.asyncio()
+async def test_max_result_size() -> None:
+    executor = ToolExecutor(max_result_size=5)
+    executor.register("echo", lambda text: text)
+    executor.register("echo_all", lambda text: text, max_result_size=100)
+    results = await executor.execute(
+        [
+            _tool_call(0, "echo", text="0123456789"),
+            _tool_call(1, "echo_all", text="0123456789"),
+        ]
+    )
+    executor.close()
+    assert results[0]["content"] == "01234... [truncated 5 characters]"
+    assert results[1]["content"] == "0123456789"
+
+
+@pytest.mark.asyncio()
+async def test_validation() -> None:
+    executor = ToolExecutor()
+    executor.register("distance", distance)
+    results = await executor.execute(
+        [
+            _tool_call(0, "distance", a={"x": 0, "y": 0}, b={"x": 6, "y": "8"}),
+            _tool_call(1, "distance", a={"x": 0, "y": 0}, b={"x": 6, "y": 8}, scale=2),
+            _tool_call(2, "distance", a={"x": 0, "y": 0}),
+        ]
+    )
+    executor.close()
+    assert [r["content"] for r in results[:2]] == ["10.0", "20.0"]
+    assert results[2]["content"].startswith("Error: 1 validation error")
+    assert "b\n  Field required" in results[2]["content"]
+
+    tools: List[Dict[str, Any]] = executor.schemas()
+    assert [t["function"]["name"] for t in tools] == ["distance"]
+
+
+@pytest.mark.asyncio()
+async def test_errors() -> None:
+    def fail() -> None:
+        raise RuntimeError("boom")
+
+    executor = ToolExecutor()
+    executor.register("fail", fail)
+    bad_arguments = _tool_call(1, "fail")
+    bad_arguments["function"]["arguments"] = "{"
+    results = await executor.execute(
+        [
+            _tool_call(0, "fail"),
+            bad_arguments,
+            _tool_call(2, "missing"),
+            {"function": {"name": "square", "arguments": '{"x": 3}'}},
+        ],
+        functions={"square": square},
+    )
+    executor.close()
+    assert results[0]["content"] == "Error: boom"
+    assert results[1]["content"].startswith("Error: 1 validation error")
+    assert results[1]["content"].endswith("The argument must be in JSON format.")
+    assert results[2]["content"] == "Error: Function missing not found."
+    assert results[3] == {"role": "tool", "content": "9"}
+
+
+@pytest.mark.asyncio()
+async def test_tracing() -> None:
+    tracer = Tracer()
+    executor = ToolExecutor(timeout=0.05)
+    executor.register("square", square)
+    executor.register("async_sleep", async_sleep)
+    with tracer.span("turn"):
+        await executor.execute(
+            [_tool_call(0, "square", x=3), _tool_call(1, "async_sleep", seconds=1)]
+        )
+    executor.close()
+    spans = tracer.exporter.spans  # type: ignore[attr-defined]
+    attributes = sorted(
+        [s.attributes for s in spans if s.name == "tool.call"],
+        key=lambda a: a["tool"],
+    )
+    assert attributes == [
+        {"tool": "async_sleep", "executor": "async", "error": "timeout"},
+        {"tool": "square", "executor": "thread", "result_size": 1},
+    ]
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from fastagents.tracing import (
+    NOOP_SPAN,
+    FileExporter,
+    RingBufferExporter,
+    Tracer,
+    current_span,
+    span,
+)
+
+
+def test_disabled() -> None:
+    assert current_span() is None
+    with span("noop", a=1) as s:
+        s.set("b", 2)
+        assert s is NOOP_SPAN
+        assert not s.recording
+
+
+def test_nested() -> None:
+    exporter = RingBufferExporter()
+    tracer = Tracer(exporter)
+    with tracer.span("turn", agent="a") as turn:
+        assert current_span() is turn
+        with span("model.call") as call:
+            call.set("prompt_tokens", 10)
+        with pytest.raises(ValueError), span("tool.call"):
+            raise ValueError("boom")
+    assert current_span() is None
+
+    model_call, tool_call, root = exporter.spans
+    assert [s.name for s in exporter.spans] == ["model.call", "tool.call", "turn"]
+    assert root.parent_id is None
+    assert model_call.parent_id == tool_call.parent_id == root.span_id
+    assert model_call.trace_id == root.trace_id
+    assert model_call.attributes == {"prompt_tokens": 10}
+    assert tool_call.error == "ValueError: boom"
+    assert root.duration >= model_call.duration >= 0
+
+    exporter.clear()
+    assert exporter.spans == []
+
+
+def test_ring_buffer_capacity() -> None:
+    exporter = RingBufferExporter(capacity=3)
+    tracer = Tracer(exporter)
+    for i in range(5):
+        with tracer.span(f"span {i}"):
+            pass
+    assert [s.name for s in exporter.spans] == ["span 2", "span 3", "span 4"]
+
+
+@pytest.mark.asyncio()
+async def test_tasks() -> None:
+    tracer = Tracer()
+
+    async def child(i: int) -> None:
+        with span("child", i=i):
+            await asyncio.sleep(0.01)
+
+    with tracer.span("root") as root:
+        await asyncio.gather(*[child(i) for i in range(3)])
+
+    spans = tracer.exporter.spans  # type: ignore[attr-defined]
+    assert len(spans) == 4
+    assert all(s.parent_id == root.span_id for s in spans[:3])
+
+
+def test_file_exporter(tmp_path: Path) -> None:
+    path = tmp_path / "traces.jsonl"
+    exporter = FileExporter(path, batch_size=2)
+    tracer = Tracer(exporter)
+    with tracer.span("root", ok=True, ratio=0.5, n=3, model="gpt"):
+        for _ in range(2):
+            with span("child"):
+                pass
+    exporter.shutdown()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(lines) == 2
+    spans = [
+        s
+        for line in lines
+        for resource in line["resourceSpans"]
+        for scope in resource["scopeSpans"]
+        for s in scope["spans"]
+    ]
+    assert [s["name"] for s in spans] == ["child", "child", "root"]
+    root = spans[-1]
+    assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+    assert "parentSpanId" not in root
+    assert spans[0]["parentSpanId"] == root["spanId"]
+    assert root["attributes"] == [
+        {"key": "ok", "value": {"boolValue": True}},
+        {"key": "ratio", "value": {"doubleValue": 0.5}},
+        {"key": "n", "value": {"intValue": "3"}},
+        {"key": "model", "value": {"stringValue": "gpt"}},
+    ]
+    assert root["status"] == {"code": 1}
+    assert int(root["endTimeUnixNano"]) >= int(root["startTimeUnixNano"])
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import queue
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+from autogen import Agent, ConversableAgent
+
+from fastagents.autogen import AutogenAgent
+from fastagents.workers import WorkerPool, load_factory
+
+
+def create_agent() -> AutogenAgent:
+    agent = ConversableAgent(name="echo", llm_config=False, human_input_mode="NEVER")
+
+    async def echo(
+        recipient: ConversableAgent,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        config: Optional[Any] = None,
+    ) -> Tuple[bool, str]:
+        content = messages[-1]["content"]  # type: ignore[index]
+        if content == "fail":
+            raise ValueError("failed")
+        if content.startswith("slow"):
+            await asyncio.sleep(0.2)
+        if content == "crash":
+            # let the results of earlier tasks reach the parent first, they
+            # are lost with the process otherwise
+            await asyncio.sleep(0.1)
+            os._exit(1)
+        return True, f"echo: {content}"
+
+    agent.register_reply([Agent, None], echo)
+    return AutogenAgent(agent)
+
+
+def test_load_factory() -> None:
+    assert load_factory("tests.test_workers:create_agent") is create_agent
+    assert load_factory(create_agent) is create_agent
+    with pytest.raises(ValueError):
+        load_factory("tests.test_workers")
+
+
+def test_worker_pool() -> None:
+    with WorkerPool(create_agent, workers=2, concurrency=10) as pool:
+        for i in range(50):
+            pool.submit(i, f"hello {i}")
+        pool.submit("bad", "fail")
+        results = [pool.get_result(timeout=10) for _ in range(51)]
+        with pytest.raises(queue.Empty):
+            pool.get_result(timeout=0.01)
+
+    replies = {r.task_id: r.reply for r in results}
+    expected: Dict[Any, Any] = {i: f"echo: hello {i}" for i in range(50)}
+    assert replies == {**expected, "bad": None}
+    errors = [r.error for r in results if r.error is not None]
+    assert errors == ["ValueError: failed"]
+    assert {r.worker for r in results} <= {0, 1}
+    assert pool.stats.completed == pool.stats.submitted == 51
+    assert not pool.running
+    with pytest.raises(RuntimeError):
+        pool.submit(0, "too late")
+
+
+def test_work_stealing() -> None:
+    pool = WorkerPool(create_agent, workers=2, concurrency=1)
+    pool.start()
+    # slow tasks all go to the first worker, the second one steals them
+    for i in range(12):
+        pool.submit(i, "slow" if i % 2 == 0 else "fast")
+    results = pool.drain(timeout=30)
+    assert len(results) == 12
+    assert pool.stats.stolen > 0
+    assert sum(r.worker == 1 and r.reply == "echo: slow" for r in results) > 0
+
+
+def test_drain_finishes_submitted_tasks() -> None:
+    pool = WorkerPool("tests.test_workers:create_agent", workers=2)
+    pool.start()
+    for i in range(20):
+        pool.submit(i, "slow")
+    results = pool.drain()
+    assert sorted(r.task_id for r in results) == list(range(20))
+    assert all(r.reply == "echo: slow" for r in results)
+
+
+def test_dead_worker() -> None:
+    pool = WorkerPool(create_agent, workers=2, concurrency=1)
+    pool.start()
+    pool.submit("crash", "crash")
+    for i in range(4):
+        pool.submit(i, "hello")
+    results = pool.drain(timeout=30)
+
+    # the task of the dead worker fails, the other worker runs the rest
+    crashed = next(r for r in results if r.task_id == "crash")
+    assert crashed.error == f"Worker {crashed.worker} exited with code 1"
+    others = {r.task_id: r.reply for r in results if r is not crashed}
+    assert others == {i: "echo: hello" for i in range(4)}
+
+
+def test_all_workers_dead() -> None:
+    pool = WorkerPool(create_agent, workers=2, concurrency=1)
+    pool.start()
+    for i in range(5):
+        pool.submit(i, "crash")
+    results = [pool.get_result() for _ in range(5)]
+    pool.drain(timeout=10)
+
+    errors = {r.task_id: r.error for r in results}
+    assert errors.keys() == set(range(5))
+    assert all(errors.values())
+    # each worker dies on its first task, the others are never taken
+    assert "No worker left to run the task" in errors.values()
+
+
+def test_default_workers() -> None:
+    assert WorkerPool(create_agent).workers == (os.cpu_count() or 1)
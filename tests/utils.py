@@ -0,0 +1,166 @@
+import asyncio
+import json
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+Body = Union[bytes, AsyncIterator[bytes]]
+Handler = Callable[
+    [str, str, Dict[str, str], bytes], Awaitable[Tuple[int, Dict[str, str], Body]]
+]
+
+
+def chat_completion(content: Optional[str], **message: Any) -> Dict[str, Any]:
+    return {
+        "id": "chatcmpl-0",
+        "object": "chat.completion",
+        "model": "gpt-mock",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content, **message},
+            }
+        ],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+async def echo_handler(
+    method: str, path: str, headers: Dict[str, str], body: bytes
+) -> Tuple[int, Dict[str, str], Body]:
+    params = json.loads(body) if body else {}
+    messages = params.get("messages", [])
+    content = f"echo: {messages[-1]['content']}" if messages else ""
+    payload = json.dumps(chat_completion(content)).encode()
+    return 200, {"Content-Type": "application/json"}, payload
+
+
+class MockServer:
+    """Minimal asyncio HTTP/1.1 server with keep-alive and chunked streaming."""
+
+    def __init__(self, handler: Handler = echo_handler) -> None:
+        self.handler = handler
+        self.connections = 0
+        self.requests: List[Tuple[str, str, Dict[str, str], bytes]] = []
+        self._server: Optional[asyncio.Server] = None
+        self._writers: List[asyncio.StreamWriter] = []
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None  # nosec: B101
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def __aenter__(self) -> "MockServer":
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        assert self._server is not None  # nosec: B101
+        self._server.close()
+        for writer in self._writers:
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        self._writers.append(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests.append((method, path, headers, body))
+
+                status, response_headers, response_body = await self.handler(
+                    method, path, headers, body
+                )
+                close = headers.get("connection", "").lower() == "close"
+                lines = [f"HTTP/1.1 {status} OK"]
+                lines.extend(f"{k}: {v}" for k, v in response_headers.items())
+                if close:
+                    lines.append("Connection: close")
+                if isinstance(response_body, bytes):
+                    lines.append(f"Content-Length: {len(response_body)}")
+                    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+                    writer.write(response_body)
+                else:
+                    lines.append("Transfer-Encoding: chunked")
+                    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+                    async for chunk in response_body:
+                        writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                        await writer.drain()
+                    writer.write(b"0\r\n\r\n")
+                await writer.drain()
+                if close:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            writer.close()
+
+
+def chat_completion_chunks(
+    content: str, tool_calls: Optional[List[Dict[str, Any]]] = None
+) -> List[Dict[str, Any]]:
+    """Split a reply into chat completion chunks, one per word or tool call."""
+    words = content.split(" ") if content else []
+    deltas: List[Dict[str, Any]] = [{"role": "assistant", "content": ""}]
+    deltas += [{"content": w if i == 0 else f" {w}"} for i, w in enumerate(words)]
+    for i, tool_call in enumerate(tool_calls or []):
+        arguments = tool_call["function"]["arguments"]
+        half = len(arguments) // 2
+        first = {
+            "index": i,
+            "id": tool_call["id"],
+            "type": "function",
+            "function": {"name": tool_call["function"]["name"], "arguments": ""},
+        }
+        deltas += [
+            {"tool_calls": [first]},
+            {"tool_calls": [{"index": i, "function": {"arguments": arguments[:half]}}]},
+            {"tool_calls": [{"index": i, "function": {"arguments": arguments[half:]}}]},
+        ]
+    chunks: List[Dict[str, Any]] = [
+        {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": d}]}
+        for d in deltas
+    ]
+    chunks[-1]["choices"][0]["finish_reason"] = "tool_calls" if tool_calls else "stop"
+    return chunks
+
+
+def sse_handler(chunks: List[Dict[str, Any]], delay: float = 0.0) -> Handler:
+    """Create a handler streaming the chunks as server-sent events."""
+
+    async def handler(
+        method: str, path: str, headers: Dict[str, str], body: bytes
+    ) -> Tuple[int, Dict[str, str], Body]:
+        async def events() -> AsyncIterator[bytes]:
+            for chunk in chunks:
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+                await asyncio.sleep(delay)
+            yield b"data: [DONE]\n\n"
+
+        return 200, {"Content-Type": "text/event-stream"}, events()
+
+    return handler